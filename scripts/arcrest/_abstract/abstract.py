@@ -81,7 +81,7 @@ class BaseSecurityHandler(BaseWebOperations):
 ########################################################################
 class AbstractGeometry(object):
     """ Base Geometry Class """
-    pass
+    __slots__ = ()
 ########################################################################
 class BaseFilter(object):
     """ base filter class """
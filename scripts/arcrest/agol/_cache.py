@@ -0,0 +1,482 @@
+"""
+   Local query cache for feature layers, answering queries from a SQLite
+   mirror with an R-tree index.
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+import re
+import json
+import time
+import datetime
+
+from ..common import filters
+from ..common.general import FeatureSet, local_time_to_epoch
+from ..web._parallel import DEFAULT_WORKERS
+from ._changes import ChangeTracker
+########################################################################
+__version__ = "3.5.3"
+_TOKENS = re.compile(r"""\s*(?:
+    (?P<string>'(?:[^']|'')*') |
+    (?P<number>-?\d+(?:\.\d*)?(?:[eE][-+]?\d+)?|-?\.\d+) |
+    (?P<op><>|!=|<=|>=|=|<|>|\(|\)|,) |
+    (?P<name>[A-Za-z_][A-Za-z0-9_]*)
+    )""", re.VERBOSE)
+_KEYWORDS = frozenset(["and", "or", "not", "in", "like", "is", "null",
+                       "between"])
+_COLUMN_TYPES = {"esriFieldTypeInteger" : "INTEGER",
+                 "esriFieldTypeSmallInteger" : "INTEGER",
+                 "esriFieldTypeDate" : "INTEGER",
+                 "esriFieldTypeDouble" : "REAL",
+                 "esriFieldTypeSingle" : "REAL",
+                 "esriFieldTypeString" : "TEXT COLLATE NOCASE",
+                 "esriFieldTypeGUID" : "TEXT COLLATE NOCASE",
+                 "esriFieldTypeGlobalID" : "TEXT COLLATE NOCASE"}
+_ENVELOPE_RELATIONS = ("esriSpatialRelEnvelopeIntersects",
+                       "esriSpatialRelIndexIntersects")
+#----------------------------------------------------------------------
+def _tokens(where):
+    """
+       splits a where clause into (kind, text) tokens
+       Output:
+          list of tuples, or None if the clause has other characters
+    """
+    pos = 0
+    tokens = []
+    where = where.strip()
+    while pos < len(where):
+        match = _TOKENS.match(where, pos)
+        if match is None or match.end() == pos:
+            return None
+        pos = match.end()
+        tokens.append((match.lastgroup, match.group(match.lastgroup)))
+    return tokens
+#----------------------------------------------------------------------
+def _parse_where(where, columns, dates=()):
+    """
+       checks that a where clause only uses field names, literals,
+       comparisons, AND/OR/NOT, IN, LIKE, IS NULL and BETWEEN
+       Inputs:
+          where - the where clause
+          columns - dictionary of lower case field name to column name
+          dates - lower case names of the date fields; they are stored
+                  as epoch milliseconds, so a clause comparing them with
+                  text literals runs on the server
+       Output:
+          the clause to run in SQLite, or None if it must run on the server
+    """
+    if where is None or where.strip() in ("", "1=1"):
+        return "1=1"
+    tokens = _tokens(where)
+    if tokens is None:
+        return None
+    parts = []
+    for kind, text in tokens:
+        if kind == 'name':
+            if text.lower() in _KEYWORDS:
+                parts.append(text.upper())
+            elif text.lower() in columns:
+                parts.append('"%s"' % columns[text.lower()])
+            else:
+                return None
+        else:
+            parts.append(text)
+    names = set([text.lower() for kind, text in tokens if kind == 'name'])
+    if names & set(dates) and \
+       any(kind == 'string' for kind, text in tokens):
+        return None
+    return " ".join(parts)
+#----------------------------------------------------------------------
+def _conjuncts(where):
+    """
+       splits a where clause on its top level ANDs
+       Output:
+          set of normalized conditions, or None if the clause can not be
+          split
+    """
+    if where is None or where.strip() in ("", "1=1"):
+        return set()
+    tokens = _tokens(where)
+    if tokens is None:
+        return None
+    conditions = []
+    current = []
+    depth = 0
+    for kind, text in tokens:
+        word = text.upper() if kind == 'name' else text
+        if word == "(":
+            depth += 1
+        elif word == ")":
+            depth -= 1
+        if depth == 0 and word == "OR":
+            return None
+        if depth == 0 and word == "AND" and \
+           not (len(current) > 2 and current[-2] == "BETWEEN"):
+            conditions.append(current)
+            current = []
+            continue
+        current.append(word)
+    conditions.append(current)
+    normalized = set()
+    for condition in conditions:
+        while len(condition) > 2 and condition[0] == "(" and \
+              condition[-1] == ")" and _balanced(condition[1:-1]):
+            condition = condition[1:-1]
+        normalized.add(" ".join(condition))
+    return normalized
+#----------------------------------------------------------------------
+def _balanced(words):
+    """checks that the parentheses of a token list are balanced"""
+    depth = 0
+    for word in words:
+        if word == "(":
+            depth += 1
+        elif word == ")":
+            depth -= 1
+            if depth < 0:
+                return False
+    return depth == 0
+#----------------------------------------------------------------------
+def _implies(where, mirror_where):
+    """
+       checks that every row matching where also matches the filter the
+       mirror was created with, i.e. that the mirror holds all the rows
+       of the query
+    """
+    required = _conjuncts(mirror_where)
+    if required is not None and len(required) == 0:
+        return True
+    given = _conjuncts(where)
+    if required is None or given is None:
+        return False
+    return required.issubset(given)
+#----------------------------------------------------------------------
+def _envelope(geometry):
+    """returns (xmin, xmax, ymin, ymax) of an Esri JSON geometry"""
+    if geometry is None:
+        return None
+    if 'x' in geometry:
+        if geometry['x'] is None or geometry['x'] == "NaN":
+            return None
+        return geometry['x'], geometry['x'], geometry['y'], geometry['y']
+    if 'xmin' in geometry:
+        return geometry['xmin'], geometry['xmax'], geometry['ymin'], geometry['ymax']
+    coords = []
+    if 'points' in geometry:
+        coords = geometry['points']
+    else:
+        for part in geometry.get('paths', geometry.get('rings', [])) or []:
+            coords.extend(part)
+    if len(coords) == 0:
+        return None
+    xs = [c[0] for c in coords]
+    ys = [c[1] for c in coords]
+    return min(xs), max(xs), min(ys), max(ys)
+#----------------------------------------------------------------------
+def _time_value(value):
+    """
+       converts a TimeFilter value to epoch milliseconds; datetimes are
+       local time, like the dates of a feature class
+    """
+    if isinstance(value, datetime.datetime):
+        return local_time_to_epoch(value)
+    if value is None or ("%s" % value).lower() == "null":
+        return None
+    return float(value)
+########################################################################
+class QueryCache(ChangeTracker):
+    """
+       Answers FeatureLayer.query calls from a local copy of the layer.
+
+       The copy is the ChangeTracker SQLite mirror with two more tables:
+       the attributes in typed columns, and an R-tree of the feature
+       envelopes.  A query is run locally when
+          - the where clause only uses field names, literals, comparisons,
+            AND/OR/NOT, IN, LIKE, IS NULL and BETWEEN, and does not
+            compare a date field with a text literal,
+          - the mirror holds every row of the query: it was created with
+            where="1=1", or each top level AND condition of its where
+            clause is also a top level AND condition of the query,
+          - the geometry filter is an envelope compared with
+            esriSpatialRelEnvelopeIntersects or IndexIntersects (or any
+            envelope intersects test on a point layer), in the spatial
+            reference of the layer and without a buffer,
+          - the time filter can be checked against the layer's timeInfo
+            fields,
+       and no statistics, distinct, extent or extra parameters are given.
+       Every other query is sent to the server.  Text comparisons are
+       case insensitive, like hosted feature services.
+
+       Staleness: when the last sync is older than max_age seconds, the
+       mirror is brought up to date (only the changes are downloaded)
+       before the query is answered.  max_age=None never refreshes after
+       the first fill; call refresh() to update it.
+
+       Inputs:
+          layer - agol FeatureLayer
+          service - FeatureService the layer belongs to
+          mirror_path - path of the SQLite file
+          max_age - seconds a sync stays fresh
+          see ChangeTracker for the other parameters
+    """
+    _max_age = None
+    _columns = None
+    _dates = None
+    _local = 0
+    _remote = 0
+    #----------------------------------------------------------------------
+    def __init__(self, layer, service, mirror_path,
+                 max_age=300,
+                 mode="auto",
+                 where="1=1",
+                 replicaName=None,
+                 page_size=None,
+                 max_workers=DEFAULT_WORKERS):
+        """Constructor"""
+        super(QueryCache, self).__init__(layer=layer,
+                                         service=service,
+                                         mirror_path=mirror_path,
+                                         mode=mode,
+                                         where=where,
+                                         replicaName=replicaName,
+                                         page_size=page_size,
+                                         max_workers=max_workers)
+        self._max_age = max_age
+        with self._connect() as conn:
+            conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS features_rtree "
+                         "USING rtree(oid, minx, maxx, miny, maxy)")
+    #----------------------------------------------------------------------
+    @property
+    def stats(self):
+        """gets the number of queries answered locally and by the server"""
+        return {"local" : self._local, "remote" : self._remote}
+    #----------------------------------------------------------------------
+    def _fields(self, conn):
+        """returns the fields stored in typed columns"""
+        fields = self._get_state("fields", conn) or self._layer.fields
+        return [f for f in fields if f['type'] in _COLUMN_TYPES]
+    #----------------------------------------------------------------------
+    def _table(self, conn):
+        """
+           creates the attribute table if needed
+           Output:
+              dictionary of lower case field name to field name
+        """
+        if self._columns is None:
+            fields = self._fields(conn)
+            oidField = self._layer.objectIdField
+            columns = dict((f['name'].lower(), f['name']) for f in fields)
+            columns[oidField.lower()] = "oid"
+            self._dates = set([f['name'].lower() for f in fields
+                               if f['type'] == "esriFieldTypeDate"])
+            definition = ", ".join(['"%s" %s' % (f['name'], _COLUMN_TYPES[f['type']])
+                                    for f in fields
+                                    if f['name'].lower() != oidField.lower()])
+            conn.execute("CREATE TABLE IF NOT EXISTS attributes "
+                         "(oid INTEGER PRIMARY KEY%s)" % \
+                         ((", " + definition) if definition else ""))
+            self._columns = columns
+        return self._columns
+    #----------------------------------------------------------------------
+    def _upsert(self, conn, features):
+        """writes features to the mirror, the attribute table and the index"""
+        features = [f.asDictionary if not isinstance(f, dict) else f
+                    for f in features]
+        counts = super(QueryCache, self)._upsert(conn, features)
+        columns = self._table(conn)
+        names = [name for name in columns.values() if name != "oid"]
+        rows = []
+        boxes = []
+        for feature in features:
+            attributes = dict((k.lower(), v) for k, v in \
+                              (feature.get('attributes', {}) or {}).items())
+            oid = attributes.get(self._layer.objectIdField.lower())
+            if oid is None:
+                continue
+            rows.append([oid] + [attributes.get(name.lower()) for name in names])
+            box = _envelope(feature.get('geometry'))
+            if box is not None:
+                boxes.append((oid,) + tuple(box))
+        if len(rows) > 0:
+            conn.executemany('INSERT OR REPLACE INTO attributes (oid%s) VALUES (?%s)' % \
+                             ("".join([', "%s"' % n for n in names]),
+                              ", ?" * len(names)), rows)
+            conn.executemany("DELETE FROM features_rtree WHERE oid = ?",
+                             [(row[0],) for row in rows])
+            conn.executemany("INSERT INTO features_rtree (oid, minx, maxx, miny, maxy) "
+                             "VALUES (?, ?, ?, ?, ?)", boxes)
+        return counts
+    #----------------------------------------------------------------------
+    def _delete(self, conn, oids):
+        """removes features from the mirror, the attribute table and the index"""
+        oids = list(oids)
+        removed = super(QueryCache, self)._delete(conn, oids)
+        self._table(conn)
+        conn.executemany("DELETE FROM attributes WHERE oid = ?",
+                         [(oid,) for oid in oids])
+        conn.executemany("DELETE FROM features_rtree WHERE oid = ?",
+                         [(oid,) for oid in oids])
+        return removed
+    #----------------------------------------------------------------------
+    def _clear(self, conn):
+        """empties the mirror, the attribute table and the index"""
+        super(QueryCache, self)._clear(conn)
+        self._table(conn)
+        conn.execute("DELETE FROM attributes")
+        conn.execute("DELETE FROM features_rtree")
+    #----------------------------------------------------------------------
+    def refresh(self):
+        """brings the cache up to date with the server"""
+        return self.sync()
+    #----------------------------------------------------------------------
+    def _fresh(self):
+        """syncs the cache when it is empty or older than max_age"""
+        synced = self._get_state("synced")
+        if synced is None or \
+           (self._max_age is not None and time.time() - synced > self._max_age):
+            self.sync()
+    #----------------------------------------------------------------------
+    def _plan(self, where, timeFilter, geometryFilter, columns):
+        """
+           builds the SQL for a query
+           Output:
+              tuple of (sql, parameters), or None if the query must run on
+              the server
+        """
+        if not _implies(where, self._where):
+            return None
+        clause = _parse_where(where, columns, self._dates or ())
+        if clause is None:
+            return None
+        sql = ["SELECT a.oid FROM attributes a WHERE (%s)" % clause]
+        params = []
+        if geometryFilter is not None:
+            if not isinstance(geometryFilter, filters.GeometryFilter):
+                return None
+            gf = geometryFilter.filter
+            geom = geometryFilter.geometry.asDictionary
+            relation = geometryFilter.spatialRelation
+            sr = (self._get_state("spatialReference") or {})
+            wkids = (sr.get('wkid'), sr.get('latestWkid'))
+            if 'xmin' not in geom or 'buffer' in gf or \
+               gf['inSR'] not in wkids:
+                return None
+            if relation not in _ENVELOPE_RELATIONS and \
+               not (relation == "esriSpatialRelIntersects" and \
+                    self._layer.geometryType == "esriGeometryPoint"):
+                return None
+            sql.append("AND a.oid IN (SELECT oid FROM features_rtree "
+                       "WHERE minx <= ? AND maxx >= ? AND miny <= ? AND maxy >= ?)")
+            params.extend([geom['xmax'], geom['xmin'], geom['ymax'], geom['ymin']])
+        if timeFilter is not None:
+            if not isinstance(timeFilter, filters.TimeFilter):
+                return None
+            info = self._layer.timeInfo or {}
+            startField = columns.get((info.get('startTimeField') or "").lower())
+            endField = columns.get((info.get('endTimeField') or "").lower())
+            if startField is None:
+                return None
+            start = _time_value(timeFilter._startTime)
+            end = _time_value(timeFilter._endTime) if timeFilter._endTime is not None \
+                else start
+            if endField is None:
+                endField = startField
+            if end is not None:
+                sql.append('AND "%s" <= ?' % startField)
+                params.append(end)
+            if start is not None:
+                sql.append('AND "%s" >= ?' % endField)
+                params.append(start)
+        sql.append("ORDER BY a.oid")
+        return " ".join(sql), params
+    #----------------------------------------------------------------------
+    def query(self,
+              where="1=1",
+              out_fields="*",
+              timeFilter=None,
+              geometryFilter=None,
+              returnGeometry=True,
+              returnIDsOnly=False,
+              returnCountOnly=False,
+              resultOffset="",
+              resultRecordCount="",
+              objectIds="",
+              **kwargs):
+        """
+           queries the layer, using the local copy when the filters can be
+           evaluated on the client
+           Inputs:
+              see FeatureLayer.query. Other FeatureLayer.query parameters
+              can be passed as keywords; they send the query to the server.
+           Output:
+              FeatureSet, or the ids/count response when returnIDsOnly or
+              returnCountOnly is set
+        """
+        local = len(kwargs) == 0
+        plan = None
+        if local:
+            self._fresh()
+            with self._connect() as conn:
+                columns = self._table(conn)
+            plan = self._plan(where, timeFilter, geometryFilter, columns)
+        if plan is None:
+            self._remote += 1
+            return self._layer.query(where=where,
+                                     out_fields=out_fields,
+                                     timeFilter=timeFilter,
+                                     geometryFilter=geometryFilter,
+                                     returnGeometry=returnGeometry,
+                                     returnIDsOnly=returnIDsOnly,
+                                     returnCountOnly=returnCountOnly,
+                                     resultOffset=resultOffset,
+                                     resultRecordCount=resultRecordCount,
+                                     objectIds=objectIds,
+                                     **kwargs)
+        self._local += 1
+        sql, params = plan
+        if objectIds is not None and objectIds != "":
+            if isinstance(objectIds, (list, tuple)):
+                ids = [int(i) for i in objectIds]
+            else:
+                ids = [int(i) for i in ("%s" % objectIds).split(",") if i.strip() != ""]
+            sql = sql.replace("ORDER BY", "AND a.oid IN (%s) ORDER BY" % \
+                              ",".join(["%s" % i for i in ids]))
+        if resultRecordCount is not None and resultRecordCount != "":
+            sql += " LIMIT %s" % int(resultRecordCount)
+        elif resultOffset is not None and resultOffset != "":
+            sql += " LIMIT -1"
+        if resultOffset is not None and resultOffset != "":
+            sql += " OFFSET %s" % int(resultOffset)
+        oidField = self._layer.objectIdField
+        with self._connect() as conn:
+            oids = [row[0] for row in conn.execute(sql, params)]
+            if returnCountOnly:
+                return {"count" : len(oids)}
+            if returnIDsOnly:
+                return {"objectIdFieldName" : oidField, "objectIds" : oids}
+            fields = self._get_state("fields", conn) or self._layer.fields
+            sr = self._get_state("spatialReference", conn)
+            features = []
+            for start in range(0, len(oids), 500):
+                batch = oids[start:start + 500]
+                rows = conn.execute("SELECT oid, attributes, geometry FROM features "
+                                    "WHERE oid IN (%s) ORDER BY oid" % \
+                                    ",".join(["%s" % o for o in batch]))
+                for oid, attributes, geom in rows:
+                    feature = {"attributes" : json.loads(attributes)}
+                    if returnGeometry and geom is not None:
+                        feature['geometry'] = json.loads(geom)
+                    features.append(feature)
+        if out_fields != "*":
+            names = set([n.strip().lower() for n in out_fields.split(",")])
+            names.add(oidField.lower())
+            fields = [f for f in fields if f['name'].lower() in names]
+            for feature in features:
+                feature['attributes'] = dict((k, v) for k, v in feature['attributes'].items()
+                                             if k.lower() in names)
+        results = {"objectIdFieldName" : oidField,
+                   "fields" : fields,
+                   "features" : features}
+        if returnGeometry:
+            results['geometryType'] = self._layer.geometryType
+            results['spatialReference'] = sr
+        return FeatureSet.fromJSON(json.dumps(results))
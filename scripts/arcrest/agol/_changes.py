@@ -0,0 +1,447 @@
+"""
+   Incremental copies of feature layers kept in a local SQLite mirror.
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+import os
+import re
+import json
+import sqlite3
+import contextlib
+import time
+import datetime
+import tempfile
+
+from ..packages.six.moves.urllib.error import HTTPError
+from ..common.general import Feature, _date_handler
+from ..common.spatial import create_feature_class, insert_json_rows
+from ..web._download import DownloadManager
+from ..web._parallel import DEFAULT_WORKERS
+########################################################################
+__version__ = "3.5.3"
+_EMBEDDED = "esriTransportTypeEmbedded"
+_MODES = ("auto", "replica", "editdate", "full")
+_NOT_FOUND = re.compile(r"not found|does not exist|no longer exists|"
+                        r"invalid replica", re.IGNORECASE)
+########################################################################
+class ChangeTracker(object):
+    """
+       Keeps a local copy of a feature layer and only downloads what
+       changed since the last call to sync().
+
+       The copy is a SQLite file holding one row per feature (object id,
+       attributes and geometry as Esri JSON) and the sync state, so a
+       later run in a new process continues from the same point.
+
+       Modes:
+          replica - a replica is created once with createReplica and each
+                    sync downloads the adds, updates and deletes since
+                    the stored server generation with synchronizeReplica.
+                    Needs a sync enabled service.
+          editdate - features whose editor tracking edit date is newer
+                     than the stored watermark are downloaded.  Deletes
+                     are found by comparing the object ids of the layer
+                     with the mirror.
+          full - every feature is downloaded on each sync.
+          auto - replica when the service is sync enabled, editdate when
+                 editor tracking is on, otherwise full.  The mode picked
+                 by the first sync is stored and reused.  Passing
+                 another mode switches the mirror to it on the next sync.
+
+       Inputs:
+          layer - agol FeatureLayer
+          service - FeatureService the layer belongs to
+          mirror_path - path of the SQLite file
+          mode - auto, replica, editdate or full
+          where - optional filter on the features that are mirrored
+          replicaName - name of the replica, defaults to a name built from
+                        the mirror file name
+          page_size - features per query in the editdate and full modes
+          max_workers - number of queries sent at the same time
+    """
+    _layer = None
+    _service = None
+    _mirror_path = None
+    _mode = None
+    _where = None
+    _replicaName = None
+    _page_size = None
+    _max_workers = None
+    #----------------------------------------------------------------------
+    def __init__(self, layer, service, mirror_path,
+                 mode="auto",
+                 where="1=1",
+                 replicaName=None,
+                 page_size=None,
+                 max_workers=DEFAULT_WORKERS):
+        """Constructor"""
+        if mode not in _MODES:
+            raise ValueError("mode must be one of %s" % ", ".join(_MODES))
+        self._layer = layer
+        self._service = service
+        self._mirror_path = mirror_path
+        self._mode = mode
+        self._where = where or "1=1"
+        if replicaName is None:
+            replicaName = "mirror_%s" % \
+                os.path.splitext(os.path.basename(mirror_path))[0]
+        self._replicaName = replicaName
+        self._page_size = page_size
+        self._max_workers = max_workers
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS features "
+                         "(oid INTEGER PRIMARY KEY, attributes TEXT, geometry TEXT)")
+            conn.execute("CREATE TABLE IF NOT EXISTS state "
+                         "(key TEXT PRIMARY KEY, value TEXT)")
+    #----------------------------------------------------------------------
+    @property
+    def mirror_path(self):
+        """gets the path of the SQLite mirror"""
+        return self._mirror_path
+    #----------------------------------------------------------------------
+    @property
+    def mode(self):
+        """gets the requested mode, or the mode used by the last sync"""
+        if self._mode != "auto":
+            return self._mode
+        return self._get_state("mode") or self._mode
+    #----------------------------------------------------------------------
+    @property
+    def count(self):
+        """gets the number of features in the mirror"""
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM features").fetchone()[0]
+    #----------------------------------------------------------------------
+    @contextlib.contextmanager
+    def _connect(self):
+        """opens the mirror for one transaction"""
+        conn = sqlite3.connect(self._mirror_path)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+    #----------------------------------------------------------------------
+    def _get_state(self, key, conn=None):
+        """reads a value of the sync state"""
+        if conn is None:
+            with self._connect() as conn:
+                return self._get_state(key, conn)
+        row = conn.execute("SELECT value FROM state WHERE key = ?",
+                           (key,)).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0])
+    #----------------------------------------------------------------------
+    def _set_state(self, conn, **values):
+        """writes values of the sync state"""
+        conn.executemany("INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)",
+                         [(k, json.dumps(v)) for k, v in values.items()])
+    #----------------------------------------------------------------------
+    def _oid(self, attributes):
+        """returns the object id of a feature's attributes"""
+        oidField = self._layer.objectIdField
+        if oidField in attributes:
+            return attributes[oidField]
+        for k, v in attributes.items():
+            if k.lower() == oidField.lower():
+                return v
+        return None
+    #----------------------------------------------------------------------
+    def _upsert(self, conn, features):
+        """
+           writes features to the mirror
+           Output:
+              tuple of the number of new and of replaced features
+        """
+        adds = 0
+        updates = 0
+        rows = []
+        for feature in features:
+            if isinstance(feature, Feature):
+                feature = feature.asDictionary
+            oid = self._oid(feature.get('attributes', {}))
+            if oid is None:
+                continue
+            rows.append((oid,
+                         json.dumps(feature.get('attributes', {}),
+                                    default=_date_handler),
+                         json.dumps(feature['geometry']) \
+                         if feature.get('geometry') is not None else None))
+        for row in rows:
+            if conn.execute("SELECT 1 FROM features WHERE oid = ?",
+                            (row[0],)).fetchone() is None:
+                adds += 1
+            else:
+                updates += 1
+        conn.executemany("INSERT OR REPLACE INTO features (oid, attributes, geometry) "
+                         "VALUES (?, ?, ?)", rows)
+        return adds, updates
+    #----------------------------------------------------------------------
+    def _clear(self, conn):
+        """removes every feature from the mirror"""
+        conn.execute("DELETE FROM features")
+    #----------------------------------------------------------------------
+    def _delete(self, conn, oids):
+        """removes features from the mirror and returns the number removed"""
+        before = conn.total_changes
+        conn.executemany("DELETE FROM features WHERE oid = ?",
+                         [(oid,) for oid in oids])
+        return conn.total_changes - before
+    #----------------------------------------------------------------------
+    def _resolve_mode(self):
+        """picks the mode supported by the service"""
+        if self._mode != "auto":
+            return self._mode
+        if self._service.syncEnabled:
+            return "replica"
+        info = self._layer.editFieldsInfo or {}
+        if info.get('editDateField') is not None:
+            return "editdate"
+        return "full"
+    #----------------------------------------------------------------------
+    def _load(self, res):
+        """
+           returns the replica JSON, downloading it when the server
+           returned a URL
+        """
+        if not isinstance(res, dict) or 'error' in res:
+            raise Exception("Replica request failed: %s" % res)
+        url = res.get('responseUrl', res.get('resultUrl'))
+        if url is None or 'layers' in res or 'edits' in res:
+            return res
+        dm = DownloadManager(securityHandler=self._layer._securityHandler,
+                             proxy_url=self._layer._proxy_url,
+                             proxy_port=self._layer._proxy_port)
+        data = dm.download(url=url, out_folder=tempfile.gettempdir())
+        if isinstance(data, dict):
+            return data
+        with open(data, 'r') as reader:
+            result = json.load(reader)
+        os.remove(data)
+        return result
+    #----------------------------------------------------------------------
+    def _server_gen(self, res):
+        """reads the server generation of the layer from a replica response"""
+        for gen in res.get('layerServerGens', []) or []:
+            if gen.get('id') == self._layer.id:
+                return gen.get('serverGen')
+        return res.get('replicaServerGen')
+    #----------------------------------------------------------------------
+    def _sync_replica(self, conn):
+        """downloads the changes with createReplica/synchronizeReplica"""
+        layerId = self._layer.id
+        replicaID = self._get_state("replicaID", conn)
+        serverGen = self._get_state("serverGen", conn)
+        perLayer = (self._service.syncCapabilities or {}).get('supportsPerLayerSync', False)
+        if replicaID is not None:
+            if self._get_state("syncModel", conn) == "perLayer":
+                syncLayers = [{"id" : layerId,
+                               "serverGen" : serverGen,
+                               "syncDirection" : "download"}]
+                replicaServerGen = None
+            else:
+                syncLayers = "perReplica"
+                replicaServerGen = serverGen
+            res = self._service.synchronizeReplica(replicaID=replicaID,
+                                                   transportType=_EMBEDDED,
+                                                   replicaServerGen=replicaServerGen,
+                                                   syncDirection="download",
+                                                   syncLayers=syncLayers,
+                                                   dataFormat="json")
+            if isinstance(res, dict) and 'error' not in res:
+                res = self._load(res)
+                counts = {"adds" : 0, "updates" : 0, "deletes" : 0}
+                for edit in res.get('edits', []) or []:
+                    if edit.get('id') != layerId:
+                        continue
+                    features = edit.get('features', {}) or {}
+                    adds, updates = self._upsert(conn,
+                                                 (features.get('adds', []) or []) + \
+                                                 (features.get('updates', []) or []))
+                    counts['adds'] += adds
+                    counts['updates'] += updates
+                    counts['deletes'] += self._delete(conn,
+                                                      features.get('deleteIds', []) or [])
+                self._set_state(conn, serverGen=self._server_gen(res) or serverGen)
+                return counts
+            # the replica expired or the sync failed: remove it from the
+            # server before a new one is created under the same name
+            self._unregister(replicaID)
+            self._set_state(conn, replicaID=None)
+        syncModel = "perLayer" if perLayer else "perReplica"
+        layerQueries = None
+        if self._where != "1=1":
+            layerQueries = json.dumps({"%s" % layerId : {"queryOption" : "useFilter",
+                                                         "useGeometry" : False,
+                                                         "where" : self._where}})
+        res = self._service.createReplica(replicaName=self._replicaName,
+                                          layers="%s" % layerId,
+                                          layerQueries=layerQueries,
+                                          transportType=_EMBEDDED,
+                                          syncModel=syncModel,
+                                          dataFormat="json")
+        res = self._load(res)
+        features = []
+        for layer in res.get('layers', []) or []:
+            if layer.get('id') == layerId:
+                features = layer.get('features', []) or []
+        self._clear(conn)
+        adds, updates = self._upsert(conn, features)
+        self._set_state(conn,
+                        replicaID=res.get('replicaID'),
+                        syncModel=syncModel,
+                        serverGen=self._server_gen(res))
+        return {"adds" : adds, "updates" : 0, "deletes" : 0}
+    #----------------------------------------------------------------------
+    def _sync_query(self, conn, mode):
+        """downloads new and edited features with paged queries"""
+        where = self._where
+        dateField = None
+        watermark = self._get_state("watermark", conn)
+        if mode == "editdate":
+            dateField = self._layer.editFieldsInfo['editDateField']
+            if watermark is not None:
+                stamp = datetime.datetime.utcfromtimestamp(watermark / 1000)
+                where = "(%s) AND %s >= timestamp '%s'" % \
+                        (self._where, dateField, stamp.strftime("%Y-%m-%d %H:%M:%S"))
+        first = watermark is None or mode == "full"
+        if first:
+            self._clear(conn)
+        latest = watermark
+        counts = {"adds" : 0, "updates" : 0, "deletes" : 0}
+        page = []
+        for feature in self._layer.query_all(where=where,
+                                             page_size=self._page_size,
+                                             max_workers=self._max_workers):
+            feature = feature.asDictionary
+            if dateField is not None:
+                value = feature['attributes'].get(dateField)
+                if value is not None and (latest is None or value > latest):
+                    latest = value
+            page.append(feature)
+            if len(page) >= 1000:
+                adds, updates = self._upsert(conn, page)
+                counts['adds'] += adds
+                counts['updates'] += updates
+                page = []
+        adds, updates = self._upsert(conn, page)
+        counts['adds'] += adds
+        counts['updates'] += updates
+        if not first:
+            res = self._layer.query(where=self._where, returnIDsOnly=True)
+            current = set(res.get('objectIds', []) or [])
+            local = [row[0] for row in conn.execute("SELECT oid FROM features")]
+            counts['deletes'] = self._delete(conn,
+                                             [oid for oid in local if oid not in current])
+        if mode == "editdate":
+            self._set_state(conn, watermark=latest)
+        return counts
+    #----------------------------------------------------------------------
+    def sync(self):
+        """
+           brings the mirror up to date
+           Output:
+              dictionary with the mode used and the number of adds,
+              updates and deletes applied to the mirror
+        """
+        stored = self._get_state("mode")
+        if self._mode != "auto":
+            mode = self._mode
+        else:
+            mode = stored or self._resolve_mode()
+        if stored == "replica" and mode != "replica":
+            replicaID = self._get_state("replicaID")
+            if replicaID is not None:
+                self._unregister(replicaID)
+        with self._connect() as conn:
+            if stored is not None and stored != mode:
+                # the state of the other mode does not apply
+                self._set_state(conn, replicaID=None, serverGen=None,
+                                watermark=None)
+            if self._get_state("fields", conn) is None:
+                self._set_state(conn,
+                                fields=self._layer.fields,
+                                geometryType=self._layer.geometryType,
+                                spatialReference=(self._layer.extent or {}).get('spatialReference'))
+            if mode == "replica":
+                counts = self._sync_replica(conn)
+            else:
+                counts = self._sync_query(conn, mode)
+            self._set_state(conn, mode=mode, synced=time.time())
+        counts['mode'] = mode
+        return counts
+    #----------------------------------------------------------------------
+    def reset(self):
+        """
+           empties the mirror and unregisters its replica, so the next
+           sync downloads the full layer
+        """
+        replicaID = self._get_state("replicaID")
+        if replicaID is not None:
+            self._unregister(replicaID)
+        with self._connect() as conn:
+            self._clear(conn)
+            conn.execute("DELETE FROM state")
+    #----------------------------------------------------------------------
+    def _unregister(self, replicaID):
+        """
+           unregisters a replica; a replica the server does not know any
+           more is ignored
+        """
+        try:
+            res = self._service.unRegisterReplica(replica_id=replicaID)
+        except HTTPError as err:
+            if err.code == 404:
+                return None
+            raise
+        if isinstance(res, dict) and isinstance(res.get('error'), dict):
+            error = res['error']
+            message = "%s %s" % (error.get('message', ""),
+                                 " ".join(["%s" % d for d in error.get('details', []) or []]))
+            if error.get('code') == 404 or _NOT_FOUND.search(message) is not None:
+                return None
+            raise Exception("unRegisterReplica failed: %s" % res)
+        return res
+    #----------------------------------------------------------------------
+    def features(self):
+        """
+           reads the mirror
+           Output:
+              generator of Feature objects in object id order
+        """
+        with self._connect() as conn:
+            for attributes, geom in conn.execute("SELECT attributes, geometry "
+                                                 "FROM features ORDER BY oid"):
+                feature = {"attributes" : json.loads(attributes)}
+                if geom is not None:
+                    feature['geometry'] = json.loads(geom)
+                yield Feature(json_string=feature)
+    #----------------------------------------------------------------------
+    def to_featureclass(self, out_fc):
+        """
+           writes the mirror to a new feature class, or to a table if the
+           layer has no geometry
+           Inputs:
+              out_fc - path of the feature class to create
+           Output:
+              path to the feature class
+        """
+        with self._connect() as conn:
+            fields = self._get_state("fields", conn) or self._layer.fields
+            geometryType = self._get_state("geometryType", conn)
+            sr = self._get_state("spatialReference", conn) or {}
+        wkid = sr.get('latestWkid', sr.get('wkid', 4326))
+        fc, field_names = create_feature_class(out_path=os.path.dirname(out_fc),
+                                               out_name=os.path.basename(out_fc),
+                                               geom_type=geometryType,
+                                               wkid=wkid,
+                                               fields=fields,
+                                               objectIdField=self._layer.objectIdField)
+        dateFields = [f['name'] for f in fields
+                      if f['type'] == "esriFieldTypeDate"]
+        insert_json_rows(fc=fc,
+                         features=(f.asDictionary for f in self.features()),
+                         fields=field_names,
+                         date_fields=dateFields)
+        return fc
@@ -0,0 +1,316 @@
+"""
+   Chunked, parallel applyEdits for feature layers.
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+import re
+import json
+
+from ..packages import six
+from ..packages.six.moves.urllib.error import HTTPError
+from ..common.general import Feature, FeatureSet, _date_handler
+from ..web._parallel import parallel_imap, serial_imap, DEFAULT_WORKERS
+########################################################################
+__version__ = "3.5.3"
+DEFAULT_MAX_COUNT = 1000
+DEFAULT_MAX_BYTES = 2000000
+# only messages about the size of the request body, not field lengths or
+# other limits named in per feature errors
+_SIZE_ERROR = re.compile(r"(request|payload|entity|content|body|post)\s+"
+                         r"(entity\s+)?(is\s+)?too\s+large|"
+                         r"maxRequestLength|maxAllowedContentLength|"
+                         r"(request|content|payload|post)[\s_-]?(size|length)"
+                         r"\s+(limit\s+)?(was\s+|is\s+)?exceeded|"
+                         r"exceeds?\s+the\s+(maximum\s+)?(request|content|"
+                         r"payload|post)\s+(size|length)",
+                         re.IGNORECASE)
+_RESULT_KEYS = {"adds" : "addResults",
+                "updates" : "updateResults",
+                "deletes" : "deleteResults"}
+#----------------------------------------------------------------------
+def iter_encoded(features):
+    """
+       converts features to JSON strings one at a time
+       Inputs:
+          features - iterable of Feature objects or dictionaries (it can
+                     be a generator), a single feature, or a FeatureSet
+       Output:
+          generator of strings
+    """
+    if isinstance(features, FeatureSet):
+        features = features.features
+    elif isinstance(features, (Feature, dict)):
+        features = [features]
+    for feature in features or []:
+        if isinstance(feature, Feature):
+            yield feature.toJSON
+        else:
+            yield json.dumps(feature, default=_date_handler)
+#----------------------------------------------------------------------
+def encode_features(features):
+    """
+       converts features to a list of JSON strings
+       Inputs:
+          features - list of Feature objects or dictionaries, or a
+                     FeatureSet
+       Output:
+          list of strings
+    """
+    return list(iter_encoded(features))
+#----------------------------------------------------------------------
+def chunk_edits(items, max_count, max_bytes):
+    """
+       splits encoded edits into lists limited by count and by size
+       Inputs:
+          items - iterable of JSON strings or object ids
+          max_count - maximum number of edits in a chunk
+          max_bytes - maximum encoded size of a chunk, or a callable
+                      returning it so the limit can change while the
+                      items are read
+       Output:
+          generator of (start index, list of items)
+    """
+    chunk = []
+    size = 2
+    start = 0
+    for index, item in enumerate(items):
+        length = len(item) + 1
+        limit = max_bytes() if callable(max_bytes) else max_bytes
+        if len(chunk) > 0 and \
+           (len(chunk) >= max_count or size + length > limit):
+            yield start, chunk
+            chunk = []
+            size = 2
+            start = index
+        chunk.append(item)
+        size += length
+    if len(chunk) > 0:
+        yield start, chunk
+########################################################################
+class EditPipeline(object):
+    """
+       Sends large sets of adds, updates and deletes to a layer's
+       applyEdits operation.
+
+       Each kind of edit is split into chunks bounded by feature count
+       and by encoded payload size. The chunks of a kind are sent on a
+       pool of threads; adds are sent before updates, and updates before
+       deletes, so edits to the same feature keep their order.  When the
+       server rejects a chunk because the request is too large, the chunk
+       is split in half and sent again, and the size limit used for the
+       following chunks is lowered.
+
+       rollbackOnFailure applies to each chunk.  When it is True, or
+       stop_on_failure is True, chunks are sent one at a time and nothing
+       is sent after the first chunk that fails, so the layer only holds
+       the chunks that completed before the failure.  Set
+       rollbackOnFailure to False to send the chunks in parallel.
+
+       Inputs:
+          layer - agol FeatureLayer
+          max_count - maximum number of edits per request
+          max_bytes - maximum encoded size of the edits of a request
+          max_workers - number of requests sent at the same time when
+                        rollbackOnFailure is False
+          rollbackOnFailure - passed to applyEdits; chunks are sent one
+                              at a time when it is True
+          stop_on_failure - send chunks serially and stop at the first
+                            failure
+          gdbVersion - geodatabase version to edit. Versioned edits are
+                       sent one chunk at a time.
+          useGlobalIds - passed to applyEdits
+    """
+    _layer = None
+    _max_count = None
+    _max_bytes = None
+    _max_workers = None
+    _rollbackOnFailure = None
+    _stop_on_failure = None
+    _gdbVersion = None
+    _useGlobalIds = None
+    #----------------------------------------------------------------------
+    def __init__(self, layer,
+                 max_count=DEFAULT_MAX_COUNT,
+                 max_bytes=DEFAULT_MAX_BYTES,
+                 max_workers=DEFAULT_WORKERS,
+                 rollbackOnFailure=True,
+                 stop_on_failure=False,
+                 gdbVersion=None,
+                 useGlobalIds=False):
+        """Constructor"""
+        self._layer = layer
+        self._max_count = max_count
+        self._max_bytes = max_bytes
+        self._max_workers = max_workers
+        self._rollbackOnFailure = rollbackOnFailure
+        self._stop_on_failure = stop_on_failure
+        self._gdbVersion = gdbVersion
+        self._useGlobalIds = useGlobalIds
+    #----------------------------------------------------------------------
+    @property
+    def max_bytes(self):
+        """gets the current payload size limit"""
+        return self._max_bytes
+    #----------------------------------------------------------------------
+    def _is_size_error(self, result):
+        """checks if a failure means the request was too large"""
+        if isinstance(result, HTTPError):
+            return result.code == 413 or \
+                   (result.code == 400 and \
+                    _SIZE_ERROR.search("%s" % result.msg) is not None)
+        if isinstance(result, dict) and isinstance(result.get('error'), dict):
+            error = result['error']
+            if error.get('code') == 413:
+                return True
+            message = "%s %s" % (error.get('message', ""),
+                                 " ".join(["%s" % d for d in error.get('details', []) or []]))
+            return _SIZE_ERROR.search(message) is not None
+        return False
+    #----------------------------------------------------------------------
+    def _post(self, kind, chunk):
+        """sends one chunk to applyEdits"""
+        params = {"f" : "json",
+                  "useGlobalIds" : self._useGlobalIds,
+                  "rollbackOnFailure" : self._rollbackOnFailure}
+        if self._gdbVersion is not None:
+            params['gdbVersion'] = self._gdbVersion
+        if kind == "deletes":
+            params['deletes'] = ",".join(chunk)
+        else:
+            params[kind] = "[%s]" % ",".join(chunk)
+        layer = self._layer
+        return layer._post(url=layer.url + "/applyEdits",
+                           param_dict=params,
+                           securityHandler=layer._securityHandler,
+                           proxy_port=layer._proxy_port,
+                           proxy_url=layer._proxy_url)
+    #----------------------------------------------------------------------
+    def _send(self, kind, start, chunk):
+        """
+           sends a chunk, splitting it while the server reports that the
+           request is too large
+           Output:
+              list of (start index, items, response) tuples
+        """
+        try:
+            result = self._post(kind, chunk)
+        except HTTPError as err:
+            result = err
+        if len(chunk) > 1 and self._is_size_error(result):
+            size = sum(len(item) + 1 for item in chunk)
+            self._max_bytes = max(1, min(self._max_bytes, size // 2))
+            half = len(chunk) // 2
+            return self._send(kind, start, chunk[:half]) + \
+                   self._send(kind, start + half, chunk[half:])
+        return [(start, chunk, result)]
+    #----------------------------------------------------------------------
+    def _chunks(self, kind, items, counts):
+        """
+           generator of (kind, start, chunk) tuples.  The number of items
+           read is kept in counts[kind].
+        """
+        for start, chunk in chunk_edits(items, self._max_count,
+                                        lambda: self._max_bytes):
+            counts[kind] = start + len(chunk)
+            yield kind, start, chunk
+    #----------------------------------------------------------------------
+    def run(self, adds=None, updates=None, deletes=None):
+        """
+           applies the edits
+           Inputs:
+              adds - features to add (Feature objects or dictionaries, a
+                     FeatureSet, or a generator of features)
+              updates - features to update
+              deletes - object ids (or global ids) to delete, as a list or
+                        comma separated string
+           Output:
+              dictionary with the addResults, updateResults and
+              deleteResults in the order of the inputs, and a 'failed' list
+              of {"type", "index", "result"} entries for every edit that
+              did not succeed
+
+           Features are read, encoded and chunked on the calling thread
+           while earlier chunks are sent on worker threads, and only a
+           few chunks are held in memory at a time, so adds can be a
+           generator reading an arcpy cursor.
+        """
+        if isinstance(deletes, six.string_types):
+            deletes = [d.strip() for d in deletes.split(',') if d.strip() != ""]
+        elif isinstance(deletes, six.integer_types):
+            deletes = [deletes]
+        edits = [("adds", adds, iter_encoded),
+                 ("updates", updates, iter_encoded),
+                 ("deletes", deletes, lambda ids: ("%s" % d for d in ids or []))]
+        results = {"addResults" : [],
+                   "updateResults" : [],
+                   "deleteResults" : [],
+                   "failed" : []}
+        workers = self._max_workers
+        serial = self._stop_on_failure or self._rollbackOnFailure
+        if serial or self._gdbVersion is not None:
+            workers = 1
+        stopped = False
+        counts = {}
+        def send(args):
+            return self._send(*args)
+        for kind, items, encode in edits:
+            if items is None:
+                continue
+            key = _RESULT_KEYS[kind]
+            slots = {}
+            counts[kind] = 0
+            if not stopped:
+                chunks = self._chunks(kind, encode(items), counts)
+                if workers == 1:
+                    sending = serial_imap(send, chunks)
+                else:
+                    sending = parallel_imap(send, chunks,
+                                            max_workers=workers,
+                                            ordered=False)
+                for sent in sending:
+                    for start, chunk, result in sent:
+                        failed = self._collect(kind, key, start, chunk,
+                                               result, slots, results)
+                        if failed and serial:
+                            stopped = True
+                    if stopped:
+                        break
+            if isinstance(items, (list, tuple, FeatureSet)):
+                counts[kind] = max(counts[kind], len(items))
+            for index in range(counts[kind]):
+                slot = slots.get(index)
+                if slot is None:
+                    slot = {"success" : False,
+                            "error" : {"code" : -1,
+                                       "description" : "edit not sent"}}
+                    results['failed'].append({"type" : kind, "index" : index,
+                                              "result" : slot})
+                results[key].append(slot)
+        results['failed'].sort(key=lambda f: (f['type'], f['index']))
+        return results
+    #----------------------------------------------------------------------
+    def _collect(self, kind, key, start, chunk, result, slots, results):
+        """
+           stores the per feature results of a chunk
+           Output:
+              True if an edit of the chunk failed
+        """
+        failed = False
+        if isinstance(result, dict) and key in result:
+            values = result[key]
+        else:
+            if isinstance(result, HTTPError):
+                error = {"code" : result.code, "description" : "%s" % result}
+            elif isinstance(result, dict) and 'error' in result:
+                error = result['error']
+            else:
+                error = {"code" : -1, "description" : "%s" % result}
+            values = [{"success" : False, "error" : error}] * len(chunk)
+        for offset, value in enumerate(values[:len(chunk)]):
+            slots[start + offset] = value
+            if value.get('success', False) != True:
+                failed = True
+                results['failed'].append({"type" : kind,
+                                          "index" : start + offset,
+                                          "result" : value})
+        return failed
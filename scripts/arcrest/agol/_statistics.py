@@ -0,0 +1,549 @@
+"""
+   Grouped and time binned statistics for feature layers, computed by the
+   server with outStatistics or, when the layer cannot, by streaming the
+   features through a client side aggregator.
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+import re
+import math
+import json
+import bisect
+import calendar
+import datetime
+
+from ..common import filters
+from ..common.general import local_time_to_online
+from ..web._parallel import parallel_map, DEFAULT_WORKERS
+########################################################################
+__version__ = "3.5.3"
+_TYPES = ("count", "sum", "min", "max", "avg", "stddev", "var",
+          "percentile_cont", "percentile_disc")
+_INTERVALS = ("hour", "day", "week", "month", "year")
+# date parts grouped on by the server for each calendar interval
+_EXTRACT_UNITS = {"hour" : ("YEAR", "MONTH", "DAY", "HOUR"),
+                  "day" : ("YEAR", "MONTH", "DAY"),
+                  "month" : ("YEAR", "MONTH"),
+                  "year" : ("YEAR",)}
+# most outStatistics requests sent when each bin needs its own query
+MAX_BIN_QUERIES = 24
+_DIGITS = re.compile(r"(\d+)")
+#----------------------------------------------------------------------
+def normalize_statistics(statistics):
+    """
+       converts statistics definitions to outStatistics dictionaries
+       Inputs:
+          statistics - a StatisticFilter, or a list of outStatistics
+                       dictionaries or of tuples:
+                         (statisticType, field)
+                         (statisticType, field, outStatisticFieldName)
+                         (percentile_cont or percentile_disc, field,
+                          outStatisticFieldName, percentile between 0 and 1)
+       Output:
+          list of dictionaries, each with an outStatisticFieldName
+    """
+    if isinstance(statistics, filters.StatisticFilter):
+        statistics = statistics.filter
+    results = []
+    for stat in statistics:
+        if isinstance(stat, dict):
+            stat = dict(stat)
+        else:
+            stat = list(stat)
+            value = {"statisticType" : stat[0],
+                     "onStatisticField" : stat[1]}
+            if len(stat) > 2 and stat[2] is not None:
+                value['outStatisticFieldName'] = stat[2]
+            if len(stat) > 3:
+                value['statisticParameters'] = {"value" : stat[3]}
+            stat = value
+        stat['statisticType'] = stat['statisticType'].lower()
+        if stat['statisticType'] not in _TYPES:
+            raise ValueError("statisticType must be one of %s" % ", ".join(_TYPES))
+        if stat['statisticType'].startswith("percentile") and \
+           'value' not in stat.get('statisticParameters', {}):
+            raise ValueError("percentile statistics need a percentile value")
+        if not stat.get('outStatisticFieldName'):
+            stat['outStatisticFieldName'] = "%s_%s" % (stat['statisticType'],
+                                                       stat['onStatisticField'])
+        results.append(stat)
+    return results
+#----------------------------------------------------------------------
+def _get(attributes, name):
+    """reads an attribute without regard to the case of its name"""
+    if name in attributes:
+        return attributes[name]
+    for key, value in attributes.items():
+        if key.lower() == name.lower():
+            return value
+    return None
+########################################################################
+class _Accumulator(object):
+    """running statistics of one field in one group"""
+    __slots__ = ("count", "total", "low", "high", "mean", "m2", "values")
+    #----------------------------------------------------------------------
+    def __init__(self, keep_values):
+        """Constructor"""
+        self.count = 0
+        self.total = 0
+        self.low = None
+        self.high = None
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.values = [] if keep_values else None
+    #----------------------------------------------------------------------
+    def add(self, value):
+        """adds a value, ignoring nulls like the server does"""
+        if value is None:
+            return
+        self.count += 1
+        if self.low is None or value < self.low:
+            self.low = value
+        if self.high is None or value > self.high:
+            self.high = value
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            self.total += value
+            delta = value - self.mean
+            self.mean += delta / float(self.count)
+            self.m2 += delta * (value - self.mean)
+        if self.values is not None:
+            self.values.append(value)
+    #----------------------------------------------------------------------
+    def result(self, stat):
+        """returns the value of a statistic"""
+        kind = stat['statisticType']
+        if kind == "count":
+            return self.count
+        if self.count == 0:
+            return None
+        if kind == "sum":
+            return self.total
+        if kind == "min":
+            return self.low
+        if kind == "max":
+            return self.high
+        if kind == "avg":
+            return self.total / float(self.count)
+        if kind in ("var", "stddev"):
+            if self.count < 2:
+                return 0.0
+            variance = self.m2 / (self.count - 1)
+            return variance if kind == "var" else math.sqrt(variance)
+        values = sorted(self.values)
+        p = float(stat['statisticParameters']['value'])
+        if stat['statisticParameters'].get('orderBy', "ASC").upper() == "DESC":
+            p = 1.0 - p
+        if kind == "percentile_disc":
+            index = max(0, int(math.ceil(p * len(values))) - 1)
+            return values[index]
+        position = p * (len(values) - 1)
+        lower = int(math.floor(position))
+        upper = min(lower + 1, len(values) - 1)
+        return values[lower] + (values[upper] - values[lower]) * (position - lower)
+########################################################################
+class StreamingAggregator(object):
+    """
+       Computes grouped statistics over a stream of feature attributes,
+       holding one set of running totals per group.  Percentiles keep the
+       values of their field for each group.
+
+       Inputs:
+          statistics - see normalize_statistics
+          group_by - list of field names
+    """
+    _statistics = None
+    _group_by = None
+    _groups = None
+    #----------------------------------------------------------------------
+    def __init__(self, statistics, group_by=None):
+        """Constructor"""
+        self._statistics = normalize_statistics(statistics)
+        self._group_by = list(group_by or [])
+        self._groups = {}
+    #----------------------------------------------------------------------
+    def add(self, attributes, key=()):
+        """
+           adds the attributes of a feature
+           Inputs:
+              attributes - dictionary of field values
+              key - values prepended to the group key (used for time bins)
+        """
+        key = tuple(key) + tuple(_get(attributes, g) for g in self._group_by)
+        accumulators = self._groups.get(key)
+        if accumulators is None:
+            accumulators = [_Accumulator(s['statisticType'].startswith("percentile"))
+                            for s in self._statistics]
+            self._groups[key] = accumulators
+        for stat, accumulator in zip(self._statistics, accumulators):
+            accumulator.add(_get(attributes, stat['onStatisticField']))
+    #----------------------------------------------------------------------
+    def rows(self, prefix=()):
+        """
+           returns the statistics
+           Inputs:
+              prefix - names of the values prepended to the group keys
+           Output:
+              list of dictionaries sorted by group
+        """
+        names = list(prefix) + self._group_by
+        results = []
+        for key in sorted(self._groups.keys()):
+            row = dict(zip(names, key))
+            for stat, accumulator in zip(self._statistics, self._groups[key]):
+                row[stat['outStatisticFieldName']] = accumulator.result(stat)
+            results.append(row)
+        return results
+#----------------------------------------------------------------------
+def _server_supported(layer, statistics):
+    """checks if the layer can compute the statistics"""
+    if layer.supportsStatistics != True:
+        return False
+    caps = layer.advancedQueryCapabilities or {}
+    if any(s['statisticType'].startswith("percentile") for s in statistics) and \
+       caps.get('supportsPercentileStatistics', False) != True:
+        return False
+    return True
+#----------------------------------------------------------------------
+def _filter_params(params, timeFilter, geometryFilter):
+    """adds the time and geometry filters to query parameters"""
+    if timeFilter is not None and \
+       isinstance(timeFilter, filters.TimeFilter):
+        params['time'] = timeFilter.filter
+    if geometryFilter is not None and \
+       isinstance(geometryFilter, filters.GeometryFilter):
+        gf = geometryFilter.filter
+        params['geometry'] = gf['geometry']
+        params['geometryType'] = gf['geometryType']
+        params['spatialRel'] = gf['spatialRel']
+        params['inSR'] = gf['inSR']
+    return params
+#----------------------------------------------------------------------
+def _server_rows(layer, statistics, group_by, where, timeFilter,
+                 geometryFilter, order_by):
+    """
+       runs an outStatistics query, paging through the groups
+       Output:
+          list of attribute dictionaries, or None when the groups do not
+          fit in one response and the layer cannot page them
+    """
+    params = {"f" : "json",
+              "where" : where,
+              "returnGeometry" : False,
+              "outStatistics" : json.dumps(statistics)}
+    _filter_params(params, timeFilter, geometryFilter)
+    if group_by:
+        params['groupByFieldsForStatistics'] = ",".join(group_by)
+        params['orderByFields'] = order_by or ",".join(group_by)
+    elif order_by:
+        params['orderByFields'] = order_by
+    caps = layer.advancedQueryCapabilities or {}
+    pageable = caps.get('supportsPaginationOnAggregatedQueries', False) == True
+    pageSize = layer.maxRecordCount or 1000
+    rows = []
+    offset = 0
+    while True:
+        if pageable and group_by:
+            params['resultOffset'] = offset
+            params['resultRecordCount'] = pageSize
+        res = layer._post(url=layer.url + "/query",
+                          param_dict=params,
+                          securityHandler=layer._securityHandler,
+                          proxy_url=layer._proxy_url,
+                          proxy_port=layer._proxy_port)
+        if 'error' in res:
+            raise ValueError(res)
+        features = res.get('features', [])
+        rows.extend([f['attributes'] for f in features])
+        more = res.get('exceededTransferLimit', False) == True
+        if not more:
+            return rows
+        if not (pageable and group_by) or len(features) == 0:
+            return None
+        offset += len(features)
+#----------------------------------------------------------------------
+def _client_fields(statistics, group_by, extra=()):
+    """returns the out_fields needed by the client side aggregator"""
+    names = list(extra) + list(group_by or []) + \
+            [s['onStatisticField'] for s in statistics]
+    seen = []
+    for name in names:
+        if name.lower() not in [s.lower() for s in seen]:
+            seen.append(name)
+    return ",".join(seen)
+#----------------------------------------------------------------------
+def _rename(rows, statistics, group_by):
+    """makes the names of the server results match the requested names"""
+    names = list(group_by or []) + \
+            [s['outStatisticFieldName'] for s in statistics]
+    results = []
+    for row in rows:
+        results.append(dict((name, _get(row, name)) for name in names))
+    return results
+#----------------------------------------------------------------------
+def aggregate(layer, statistics, group_by=None, where="1=1",
+              timeFilter=None, geometryFilter=None, order_by=None,
+              client_side=None, page_size=None, max_workers=DEFAULT_WORKERS):
+    """
+       computes grouped statistics on a layer
+       Inputs:
+          layer - agol FeatureLayer
+          statistics - see normalize_statistics
+          group_by - list of field names
+          where - filter on the features
+          timeFilter - optional TimeFilter
+          geometryFilter - optional GeometryFilter
+          order_by - orderByFields of the server query
+          client_side - True computes the statistics locally, False
+                        requires the server, None uses the server when the
+                        layer supports the statistics
+          page_size - features per query for the client side aggregator
+          max_workers - number of queries sent at the same time
+       Output:
+          list of dictionaries with the group_by fields and the
+          outStatisticFieldName of each statistic
+    """
+    statistics = normalize_statistics(statistics)
+    group_by = list(group_by or [])
+    if client_side != True and \
+       (client_side == False or _server_supported(layer, statistics)):
+        rows = _server_rows(layer, statistics, group_by, where,
+                            timeFilter, geometryFilter, order_by)
+        if rows is not None:
+            return _rename(rows, statistics, group_by)
+        if client_side == False:
+            raise ValueError("The groups exceed maxRecordCount and the layer "
+                             "cannot page aggregated queries")
+    aggregator = StreamingAggregator(statistics, group_by)
+    kwargs = _filter_params({}, timeFilter, geometryFilter)
+    for feature in layer.query_all(where=where,
+                                   out_fields=_client_fields(statistics, group_by),
+                                   returnGeometry=False,
+                                   page_size=page_size,
+                                   max_workers=max_workers,
+                                   **kwargs):
+        aggregator.add(feature.asDictionary['attributes'])
+    return aggregator.rows()
+#----------------------------------------------------------------------
+def bin_edges(start, end, interval):
+    """
+       splits a time range into bins
+       Inputs:
+          start, end - datetime objects (UTC)
+          interval - hour, day, week (starting on Monday), month, year or
+                     a datetime.timedelta
+       Output:
+          list of datetime objects; bin i covers edges[i] <= t < edges[i+1]
+    """
+    if isinstance(interval, datetime.timedelta):
+        step = lambda d: d + interval
+        edge = start
+    elif interval == "hour":
+        step = lambda d: d + datetime.timedelta(hours=1)
+        edge = start.replace(minute=0, second=0, microsecond=0)
+    elif interval in ("day", "week"):
+        days = 1 if interval == "day" else 7
+        step = lambda d: d + datetime.timedelta(days=days)
+        edge = start.replace(hour=0, minute=0, second=0, microsecond=0)
+        if interval == "week":
+            edge -= datetime.timedelta(days=edge.weekday())
+    elif interval == "month":
+        step = lambda d: d.replace(year=d.year + d.month // 12,
+                                   month=d.month % 12 + 1)
+        edge = start.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    elif interval == "year":
+        step = lambda d: d.replace(year=d.year + 1)
+        edge = start.replace(month=1, day=1, hour=0, minute=0, second=0,
+                             microsecond=0)
+    else:
+        raise ValueError("interval must be a timedelta or one of %s" % \
+                         ", ".join(_INTERVALS))
+    edges = [edge]
+    while edges[-1] <= end:
+        edges.append(step(edges[-1]))
+    return edges
+#----------------------------------------------------------------------
+def _epoch(dt):
+    """converts a UTC datetime to epoch milliseconds"""
+    return int(calendar.timegm(dt.timetuple()) * 1000)
+#----------------------------------------------------------------------
+def _timestamp(dt):
+    """formats a UTC datetime as a standardized SQL timestamp"""
+    return "timestamp '%s'" % dt.strftime("%Y-%m-%d %H:%M:%S")
+#----------------------------------------------------------------------
+def _empty_row(statistics):
+    """returns the statistics of a bin without features"""
+    return dict((s['outStatisticFieldName'],
+                 0 if s['statisticType'] == "count" else None)
+                for s in statistics)
+#----------------------------------------------------------------------
+def _bin_rows(layer, statistics, group_by, where, date_field, edges, interval):
+    """
+       computes the statistics of all the bins with one outStatistics
+       query grouped on EXTRACT(... FROM date_field) expressions
+       Output:
+          list of (bin index, row) tuples, or None when the layer does not
+          support SQL expressions or the response cannot be read
+    """
+    units = _EXTRACT_UNITS.get(interval) \
+        if not isinstance(interval, datetime.timedelta) else None
+    caps = layer.advancedQueryCapabilities or {}
+    if units is None or caps.get('supportsSqlExpression', False) != True:
+        return None
+    expressions = ["EXTRACT(%s FROM %s)" % (unit, date_field) for unit in units]
+    clause = "(%s) AND %s >= %s AND %s < %s" % \
+             (where, date_field, _timestamp(edges[0]),
+              date_field, _timestamp(edges[-1]))
+    try:
+        rows = _server_rows(layer, statistics, group_by + expressions, clause,
+                            None, None, ",".join(group_by + expressions))
+    except ValueError:
+        # some layers accept expressions in where clauses only
+        return None
+    if rows is None:
+        return None
+    known = set([name.lower() for name in group_by] +
+                [s['outStatisticFieldName'].lower() for s in statistics])
+    index = dict((edge, i) for i, edge in enumerate(edges[:-1]))
+    results = []
+    for row in rows:
+        extra = [key for key in row if key.lower() not in known]
+        if len(extra) != len(units):
+            return None
+        parts = {}
+        for unit in units:
+            # the server names the columns after the expression or EXPR_n
+            named = [key for key in extra
+                     if key.upper().replace(" ", "").startswith("EXTRACT(%sFROM" % unit)]
+            if named:
+                parts[unit] = row[named[0]]
+        if len(parts) != len(units):
+            extra.sort(key=lambda key: [int(t) if t.isdigit() else t
+                                        for t in _DIGITS.split(key)])
+            parts = dict((unit, row[key]) for unit, key in zip(units, extra))
+        try:
+            edge = datetime.datetime(int(parts["YEAR"]),
+                                     int(parts.get("MONTH", 1)),
+                                     int(parts.get("DAY", 1)),
+                                     int(parts.get("HOUR", 0)))
+        except (TypeError, ValueError):
+            return None
+        if edge not in index:
+            return None
+        results.append((index[edge], row))
+    return results
+#----------------------------------------------------------------------
+def time_bins(layer, date_field, interval="day", start=None, end=None,
+              statistics=None, group_by=None, where="1=1",
+              client_side=None, page_size=None,
+              max_workers=DEFAULT_WORKERS):
+    """
+       computes statistics for each time bin of a date field
+       Inputs:
+          layer - agol FeatureLayer
+          date_field - name of the date field
+          interval - hour, day, week, month, year or a datetime.timedelta
+          start, end - UTC datetime range. By default the minimum and
+                       maximum of the date field.
+          statistics - see normalize_statistics. By default the number of
+                       features in each bin, as "count".
+          group_by - optional fields grouped within each bin
+          see aggregate for the other parameters
+       When the server computes the statistics, hour, day, month and year
+       bins take one query grouped on EXTRACT(... FROM date_field) if the
+       layer supports SQL expressions.  Otherwise each bin is a query of
+       its own, for at most MAX_BIN_QUERIES bins; more bins are counted
+       client side from one attribute query (with client_side=False they
+       raise a ValueError).
+       Output:
+          list of dictionaries with the "start" and "end" of the bin, the
+          group_by fields and the statistics.  Bins without features are
+          included when group_by is not set.
+    """
+    if statistics is None:
+        statistics = [("count", layer.objectIdField, "count")]
+    statistics = normalize_statistics(statistics)
+    group_by = list(group_by or [])
+    if start is None or end is None:
+        bounds = aggregate(layer, [("min", date_field, "low"),
+                                   ("max", date_field, "high")],
+                           where=where, client_side=client_side,
+                           page_size=page_size, max_workers=max_workers)
+        if len(bounds) == 0 or bounds[0]['low'] is None:
+            return []
+        if start is None:
+            start = datetime.datetime.utcfromtimestamp(bounds[0]['low'] / 1000)
+        if end is None:
+            end = datetime.datetime.utcfromtimestamp(bounds[0]['high'] / 1000)
+    edges = bin_edges(start, end, interval)
+    bins = list(zip(edges[:-1], edges[1:]))
+    results = []
+    if client_side != True and \
+       (client_side == False or _server_supported(layer, statistics)):
+        pages = None
+        grouped = _bin_rows(layer, statistics, group_by, where, date_field,
+                            edges, interval)
+        if grouped is not None:
+            pages = [[] for span in bins]
+            for index, row in grouped:
+                pages[index].append(row)
+        elif len(bins) <= MAX_BIN_QUERIES:
+            def run(span):
+                clause = "(%s) AND %s >= %s AND %s < %s" % \
+                         (where, date_field, _timestamp(span[0]),
+                          date_field, _timestamp(span[1]))
+                return _server_rows(layer, statistics, group_by, clause,
+                                    None, None, None)
+            pages = parallel_map(run, bins, max_workers=max_workers)
+        elif client_side == False:
+            raise ValueError("%s bins need one query each, more than "
+                             "MAX_BIN_QUERIES (%s); use fewer bins or "
+                             "client_side=None" % (len(bins), MAX_BIN_QUERIES))
+        if pages is not None and all(rows is not None for rows in pages):
+            for span, rows in zip(bins, pages):
+                rows = _rename(rows, statistics, group_by)
+                if len(rows) == 0 and not group_by:
+                    rows = [_empty_row(statistics)]
+                for row in rows:
+                    row['start'] = span[0]
+                    row['end'] = span[1]
+                    results.append(row)
+            return results
+        if pages is not None and client_side == False:
+            raise ValueError("The groups exceed maxRecordCount and the layer "
+                             "cannot page aggregated queries")
+    stamps = [_epoch(e) for e in edges]
+    aggregator = StreamingAggregator(statistics, group_by)
+    clause = "(%s) AND %s >= %s AND %s < %s" % \
+             (where, date_field, _timestamp(edges[0]),
+              date_field, _timestamp(edges[-1]))
+    for feature in layer.query_all(where=clause,
+                                   out_fields=_client_fields(statistics, group_by,
+                                                             [date_field]),
+                                   returnGeometry=False,
+                                   page_size=page_size,
+                                   max_workers=max_workers):
+        attributes = feature.asDictionary['attributes']
+        value = _get(attributes, date_field)
+        if isinstance(value, datetime.datetime):
+            value = local_time_to_online(value)
+        if value is None:
+            continue
+        index = bisect.bisect_right(stamps, value) - 1
+        if 0 <= index < len(bins):
+            aggregator.add(attributes, key=(index,))
+    rows = aggregator.rows(prefix=("bin",))
+    if not group_by:
+        found = dict((row['bin'], row) for row in rows)
+        rows = []
+        for index in range(len(bins)):
+            row = found.get(index)
+            if row is None:
+                row = _empty_row(statistics)
+                row['bin'] = index
+            rows.append(row)
+    for row in rows:
+        index = row.pop('bin')
+        row['start'] = bins[index][0]
+        row['end'] = bins[index][1]
+        results.append(row)
+    return results
@@ -3,11 +3,11 @@ handles the upload functions for all viable services
 """
 from __future__ import absolute_import
 import os
-import mmap
 import json
 from ..packages.six.moves import urllib_parse as urlparse
 from ..security import security
 from .._abstract import abstract
+from ..web._parts import PartUploader, part_numbers, succeeded
 ########################################################################
 class Uploads(abstract.BaseAGOLClass):
     """
@@ -27,7 +27,7 @@ class Uploads(abstract.BaseAGOLClass):
         self._proxy_port = proxy_port
         self._proxy_url = proxy_url
         self._securityHandler = securityHandler
-        if self._url.lower().endswith("/uploads"):
+        if url.lower().endswith("/uploads"):
             self._url = url
         else:
             self._url = url + "/uploads"
@@ -45,7 +45,7 @@ class Uploads(abstract.BaseAGOLClass):
          dictionary json response
         """
         url = self._url + "/upload"
-        files = {'file', filePath}
+        files = {'file': filePath}
         params = {
             "f" : "json"
         }
@@ -85,7 +85,8 @@ class Uploads(abstract.BaseAGOLClass):
                              proxy_port=self._proxy_port,
                              securityHandler=self._securityHandler)
     #----------------------------------------------------------------------
-    def uploadByParts(self, registerID, filePath, commit=True):
+    def uploadByParts(self, registerID, filePath, commit=True,
+                      part_size=1000000, max_workers=4, resume=True):
         """
         loads the data by small parts. If commit is set to true,
         then parts will be merged together.  If commit is false, the
@@ -93,62 +94,73 @@ class Uploads(abstract.BaseAGOLClass):
 
         If the user's file is over 10mbs, the uploadByParts should be used.
 
+        Parts are posted directly from a memory mapped view of the file on
+        several threads.  When resume is True, a manifest of the uploaded
+        parts is kept, so running the function again with the same
+        registerID only sends the parts the server does not have yet.
+
         Inputs:
          registerID - ID of the registered item
          filePath - path of the file to upload
          commit - default True, lets the function know if server will piece
           the file back together on the server side.
+         part_size - size of each part in bytes, default 1 MB.
+         max_workers - number of parts uploaded at the same time.
+         resume - default True, skips parts uploaded by an earlier call.
         Output:
-          dictionary or string
+          dictionary or string. If a part fails, the upload result with
+          the failed parts is returned and nothing is committed.
         """
         url = self._url + "/%s/uploadPart" % registerID
-        params = {
-            "f" : "json"
-        }
-        with open(filePath, 'rb') as f:
-            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
-            size = 1000000
-            steps =  int(os.fstat(f.fileno()).st_size / size)
-            if os.fstat(f.fileno()).st_size % size > 0:
-                steps += 1
-            for i in range(steps):
-                files = {}
-                tempFile = os.path.join(os.environ['TEMP'], "split.part%s" % i)
-                if os.path.isfile(tempFile):
-                    os.remove(tempFile)
-                with open(tempFile, 'wb') as writer:
-                    writer.write(mm.read(size))
-                    writer.flush()
-                    writer.close()
-                del writer
-                files['file'] = tempFile
-                params['partNum'] = i + 1
-                res = self._post(url=url,
-                                  param_dict=params,
-                                  files=files,
-                                  securityHandler=self._securityHandler,
-                                  proxy_url=self._proxy_url,
-                                  proxy_port=self._proxy_port)
-                os.remove(tempFile)
-                del files
-            del mm
-        return self.commit(registerID)
+        def upload_part(part_num, part):
+            params = {
+                "f" : "json",
+                "partNum" : part_num
+            }
+            return self._post(url=url,
+                              param_dict=params,
+                              files={'file' : part},
+                              securityHandler=self._securityHandler,
+                              proxy_url=self._proxy_url,
+                              proxy_port=self._proxy_port)
+        committed = None
+        if resume:
+            committed = part_numbers(self.parts(registerID=registerID))
+        uploader = PartUploader(filePath=filePath,
+                                upload_part=upload_part,
+                                key=registerID,
+                                part_size=part_size,
+                                max_workers=max_workers,
+                                manifest_path=None if resume else False)
+        result = uploader.upload(committed=committed)
+        if len(result['failed']) > 0:
+            return result
+        if commit:
+            res = self.commit(registerID,
+                              parts=result['parts'])
+            if succeeded(res):
+                uploader.clear_manifest()
+            return res
+        return registerID
     #----------------------------------------------------------------------
-    def commit(self, registerID, checksum=None):
+    def commit(self, registerID, checksum=None, parts=None):
         """
         Once a multipart upload is completed, the files need to be merged
         together.  The commit() does just that.
         Inputs:
          registerID - unique identifier of the registered item.
          checksum - upload id.
+         parts - optional list of part numbers to merge. By default the
+          parts listed by the server are used.
         output:
          dictionary
         """
-        parts = ",".join(self.parts(registerID=registerID))
-        url = self._url + "/%s/commit"
+        if parts is None:
+            parts = sorted(part_numbers(self.parts(registerID=registerID)))
+        url = self._url + "/%s/commit" % registerID
         params = {
             "f" : "json",
-            "parts" : parts
+            "parts" : ",".join([str(p) for p in parts])
         }
         if checksum is not None:
             params['checksum'] = checksum
@@ -12,17 +12,29 @@ from __future__ import absolute_import
 from __future__ import print_function
 
 import os
+import time
 import uuid
 import json
 import types
 from re import search
+from ..packages import six
 from ..packages.six.moves import urllib_parse as urlparse
 #from six.moves import urllib_parse as urlparse
 from ._uploads import Uploads
+from ..web._download import DownloadManager
+from ..web._batch import RequestBatch
+from ..web._parallel import parallel_imap
+from ._edits import EditPipeline, encode_features
+from ._edits import DEFAULT_MAX_COUNT, DEFAULT_MAX_BYTES
+from ._changes import ChangeTracker
+from ._cache import QueryCache
+from . import _statistics
 from ..security import security
 from .._abstract import abstract
 from ..common.filters import LayerDefinitionFilter, GeometryFilter, TimeFilter
 from ..common.general import FeatureSet
+from ..common.columnar import ColumnarFeatureSet
+from ..common import pbf
 from ..common import filters
 from ..common.geometry import SpatialReference
 from ..common.general import _date_handler, Feature
@@ -30,7 +42,9 @@ from ..common.spatial import scratchFolder, scratchGDB, json_to_featureclass
 from ..common.spatial import get_OID_field, get_records_with_attachments
 from ..common.spatial import create_feature_layer, merge_feature_class
 from ..common.spatial import featureclass_to_json, create_feature_class
-from ..common.spatial import get_attachment_data
+from ..common.spatial import featureclass_to_features
+from ..common.spatial import insert_json_rows
+from ..common.spatial import get_attachment_data, remove_attachment_data
 from ..common import geometry
 from ..hostedservice import AdminFeatureService, AdminFeatureServiceLayer
 from .._abstract.abstract import BaseSecurityHandler, BaseAGOLClass
@@ -780,11 +794,10 @@ class FeatureService(abstract.BaseAGOLClass):
             elif 'responseUrl' in res:
                 dlURL = res["responseUrl"]
             if dlURL is not None:
-                return self._get(url=dlURL,
-                                 securityHandler=self._securityHandler,
-                                 proxy_url=self._proxy_url,
-                                 proxy_port=self._proxy_port,
-                                 out_folder=out_path)
+                dm = DownloadManager(securityHandler=self._securityHandler,
+                                     proxy_url=self._proxy_url,
+                                     proxy_port=self._proxy_port)
+                return dm.download(url=dlURL, out_folder=out_path)
             else:
                 return res
         elif res is not None:
@@ -804,11 +817,45 @@ class FeatureService(abstract.BaseAGOLClass):
                            editsUploadID=None,
                            editsUploadFormat=None,
                            dataFormat="json",
-                           rollbackOnFailure=True):
+                           rollbackOnFailure=True,
+                           wait=False,
+                           out_path=None):
         """
-        TODO: implement synchronize replica
-        http://resources.arcgis.com/en/help/arcgis-rest-api/index.html#//02r3000000vv000000
+        The synchronizeReplica operation is performed on a feature service
+        resource. It synchronizes changes between the feature service and
+        a client based on a replica ID provided by the client. The client
+        obtains the replica ID by first calling createReplica.
+
+        Inputs:
+           replicaID - the ID of the replica to synchronize
+           transportType - esriTransportTypeUrl returns the changes in a
+            file and the URL of the file is returned.
+            esriTransportTypeEmbedded returns the changes in the response.
+           replicaServerGen - the generation returned by the last
+            createReplica or synchronizeReplica call.  Required for a
+            perReplica sync.
+           returnIdsForAdds - if true, the object ids of the client adds
+            are returned
+           edits - list of layer edits sent to the server when
+            syncDirection is upload or bidirectional
+           returnAttachmentDatabyURL - if true, attachments are returned as
+            URLs
+           async - if true, the request is processed as a job and a status
+            URL is returned
+           syncDirection - download, upload, bidirectional or snapshot
+           syncLayers - perReplica, or for replicas created with the
+            perLayer syncModel a list of {"id", "serverGen",
+            "syncDirection"} dictionaries
+           editsUploadID - item id of edits uploaded with the uploads
+            operation
+           editsUploadFormat - format of the uploaded edits (sqlite)
+           dataFormat - json or sqlite
+           rollbackOnFailure - if true, no edits are applied when one fails
+           wait - if async, wait until the job has completed
+           out_path - folder to save the result file to. If not set, the
+            response is returned.
         """
+        url = self._url + "/synchronizeReplica"
         params = {
             "f" : "json",
             "replicaID" : replicaID,
@@ -820,7 +867,40 @@ class FeatureService(abstract.BaseAGOLClass):
             "syncDirection" : syncDirection,
             "returnAttachmentDatabyURL" : returnAttachmentDatabyURL
         }
-        return
+        if replicaServerGen is not None:
+            params['replicaServerGen'] = replicaServerGen
+        if isinstance(syncLayers, (list, tuple)):
+            params['syncLayers'] = json.dumps(list(syncLayers))
+        elif syncLayers is not None:
+            params['syncLayers'] = syncLayers
+        if edits is not None:
+            params['edits'] = json.dumps(edits, default=_date_handler)
+        if editsUploadID is not None:
+            params['editsUploadID'] = editsUploadID
+        if editsUploadFormat is not None:
+            params['editsUploadFormat'] = editsUploadFormat
+        res = self._post(url=url,
+                         param_dict=params,
+                         securityHandler=self._securityHandler,
+                         proxy_url=self._proxy_url,
+                         proxy_port=self._proxy_port)
+        if async and wait and 'statusUrl' in res:
+            status = self.replicaStatus(url=res['statusUrl'])
+            while status['status'].lower() != "completed":
+                if status['status'].lower() == "failed":
+                    return status
+                time.sleep(1)
+                status = self.replicaStatus(url=res['statusUrl'])
+            res = status
+        if out_path is not None and \
+           os.path.isdir(out_path):
+            dlURL = res.get("resultUrl", res.get("responseUrl"))
+            if dlURL is not None:
+                dm = DownloadManager(securityHandler=self._securityHandler,
+                                     proxy_url=self._proxy_url,
+                                     proxy_port=self._proxy_port)
+                return dm.download(url=dlURL, out_folder=out_path)
+        return res
     #----------------------------------------------------------------------
     def replicaStatus(self, url):
         """gets the replica status when exported async set to True"""
@@ -1413,7 +1493,7 @@ class FeatureLayer(abstract.BaseAGOLClass):
             params = {'f':'json'}
             parsed = urlparse.urlparse(attachURL)
 
-            files = {'attachment', file_path}
+            files = {'attachment': file_path}
             res = self._post(url=attachURL,
                              param_dict=params,
                              files=files,
@@ -1521,6 +1601,8 @@ class FeatureLayer(abstract.BaseAGOLClass):
               resultRecordCount="",
               out_fc=None,
               objectIds="",
+              response_format="json",
+              quantization_tolerance=None,
               **kwargs):
         """ queries a feature service based on a sql statement
             Inputs:
@@ -1557,6 +1639,21 @@ class FeatureLayer(abstract.BaseAGOLClass):
                statisticFilter - object that performs statistic queries
                out_fc - only valid if returnFeatureClass is set to True.
                         Output location of query.
+               response_format - json (default), pbf or auto.  pbf asks for
+                        a protocol buffer response, which is smaller on the
+                        wire but slower to decode in pure Python than json
+                        (1.44 s against 0.66 s for 20k polylines), so it
+                        only pays off on slow links.  auto uses pbf when
+                        the layer lists it in supportedQueryFormats, the
+                        query returns geometry and the server is not on
+                        the local network (see pbf.worth_decoding).  The
+                        result is the same FeatureSet as with json.
+               quantization_tolerance - if set and the layer supports
+                        coordinate quantization, geometries are snapped to
+                        a grid of this size (in the units of the output
+                        spatial reference) and sent as integers, then
+                        converted back.  Coordinates are only accurate to
+                        the tolerance.
                kwargs - optional parameters that can be passed to the Query
                  function.  This will allow users to pass additional
                  parameters not explicitly implemented on the function. A
@@ -1597,12 +1694,11 @@ class FeatureLayer(abstract.BaseAGOLClass):
             params['groupByFieldsForStatistics'] = groupByFieldsForStatistics
         if not statisticFilter is None and \
            isinstance(statisticFilter, filters.StatisticFilter):
-            params['outStatistics'] = statisticFilter.filter
-        fURL = self._url + "/query"
-        results = self._post(fURL, params,
-                               securityHandler=self._securityHandler,
-                               proxy_port=self._proxy_port,
-                               proxy_url=self._proxy_url)
+            params['outStatistics'] = json.dumps(statisticFilter.filter)
+        params.update(self._format_params(response_format,
+                                          quantization_tolerance,
+                                          returnGeometry))
+        results = self._post_query(params)
         if 'error' in results:
             raise ValueError (results)
         if not returnCountOnly and not returnIDsOnly:
@@ -1623,6 +1719,316 @@ class FeatureLayer(abstract.BaseAGOLClass):
             return results
         return
     #----------------------------------------------------------------------
+    def _format_params(self, response_format="json",
+                       quantization_tolerance=None, returnGeometry=True):
+        """
+           returns the query parameters for the response format and
+           coordinate quantization supported by the layer
+        """
+        params = {}
+        response_format = (response_format or "json").lower()
+        if response_format == "auto":
+            formats = [f.strip().lower() for f in \
+                       (self.supportedQueryFormats or "").split(",")]
+            response_format = "json"
+            if "pbf" in formats and \
+               pbf.worth_decoding(self._url, returnGeometry):
+                response_format = "pbf"
+        if response_format not in ("json", "pbf"):
+            raise ValueError("response_format must be json, pbf or auto")
+        params['f'] = response_format
+        if quantization_tolerance is not None and \
+           self.supportsCoordinatesQuantization == True:
+            quantization = {"mode" : "edit",
+                            "originPosition" : "upperLeft",
+                            "tolerance" : quantization_tolerance}
+            if self.extent is not None:
+                quantization['extent'] = self.extent
+            params['quantizationParameters'] = json.dumps(quantization)
+        return params
+    #----------------------------------------------------------------------
+    def _post_query(self, params):
+        """
+           sends a query and decodes pbf and quantized responses to the
+           f=json layout
+        """
+        results = self._post(self._url + "/query", params,
+                             securityHandler=self._securityHandler,
+                             proxy_port=self._proxy_port,
+                             proxy_url=self._proxy_url)
+        if params.get('f') == "pbf" and \
+           isinstance(results, (bytes, bytearray)):
+            return pbf.decode_feature_collection(results)
+        if isinstance(results, dict) and 'transform' in results:
+            return pbf.dequantize(results)
+        return results
+    #----------------------------------------------------------------------
+    def _paging_strategy(self, strategy, returnGeometry):
+        """
+           picks how query_all pages through the layer
+           Output:
+              tuple of (strategy, page size, extra query parameters)
+        """
+        caps = self.advancedQueryCapabilities or {}
+        pageSize = self.maxRecordCount
+        extra = {}
+        if strategy is None or strategy == "auto":
+            if caps.get('supportsPagination', False) == True:
+                strategy = "offset"
+            else:
+                strategy = "oid"
+        if strategy == "offset" and returnGeometry == False and \
+           caps.get('supportsQueryWithResultType', False) == True and \
+           (self.standardMaxRecordCount or 0) > pageSize:
+            # attribute only pages can use the larger standard limit
+            pageSize = self.standardMaxRecordCount
+            extra['resultType'] = "standard"
+        if strategy not in ("oid", "offset"):
+            raise ValueError("strategy must be auto, oid or offset")
+        return strategy, pageSize, extra
+    #----------------------------------------------------------------------
+    def _query_page(self, params, oidField, expected):
+        """
+           runs one page query, following up on the page when the server
+           stops early with exceededTransferLimit
+           Output:
+              page dictionary with the features sorted by object id
+        """
+        page = None
+        while True:
+            results = self._post_query(params)
+            if 'error' in results:
+                raise ValueError (results)
+            if page is None:
+                page = results
+            else:
+                page['features'].extend(results.get('features', []))
+            features = results.get('features', [])
+            if results.get('exceededTransferLimit', False) != True or \
+               len(features) == 0 or \
+               len(page['features']) >= expected:
+                break
+            params = dict(params)
+            if 'resultOffset' in params:
+                params['resultOffset'] = int(params['resultOffset']) + len(features)
+                params['resultRecordCount'] = expected - len(page['features'])
+            else:
+                lastOID = max(f['attributes'][oidField] for f in features)
+                params['where'] = "(%s) AND %s > %s" % (params['where'], oidField, lastOID)
+        page['features'].sort(key=lambda f: f['attributes'].get(oidField))
+        page.pop('exceededTransferLimit', None)
+        return page
+    #----------------------------------------------------------------------
+    def _query_pages(self, where="1=1", out_fields="*", returnGeometry=True,
+                     outSR=None, page_size=None, max_workers=4,
+                     strategy="auto", response_format="json",
+                     quantization_tolerance=None, **kwargs):
+        """
+           generator of the raw page dictionaries of query_all in object
+           id order
+        """
+        strategy, pageSize, extra = self._paging_strategy(strategy,
+                                                          returnGeometry)
+        if page_size is not None:
+            pageSize = min(int(page_size), pageSize)
+        oidField = self.objectIdField
+        if out_fields != "*" and \
+           oidField not in [f.strip() for f in out_fields.split(',')]:
+            out_fields = "%s,%s" % (out_fields, oidField)
+        base = {"outFields": out_fields,
+                "returnGeometry" : returnGeometry}
+        base.update(self._format_params(response_format,
+                                        quantization_tolerance,
+                                        returnGeometry))
+        if outSR is not None:
+            if isinstance(outSR, SpatialReference):
+                base['outSR'] = outSR.asDictionary
+            else:
+                base['outSR'] = outSR
+        for key, value in kwargs.items():
+            base[key] = value
+        base.update(extra)
+        pages = []
+        if strategy == "offset":
+            count = self.query(where=where, returnCountOnly=True,
+                               **kwargs).get('count', 0)
+            for offset in range(0, count, pageSize):
+                params = dict(base)
+                params['where'] = where
+                params['orderByFields'] = "%s ASC" % oidField
+                params['resultOffset'] = offset
+                params['resultRecordCount'] = pageSize
+                pages.append((params, min(pageSize, count - offset)))
+        else:
+            res = self.query(where=where, returnIDsOnly=True, **kwargs)
+            OIDS = sorted(res.get('objectIds') or [])
+            for i in range(0, len(OIDS), pageSize):
+                chunk = OIDS[i:i + pageSize]
+                params = dict(base)
+                params['where'] = "(%s) AND %s >= %s AND %s <= %s" % \
+                    (where, oidField, chunk[0], oidField, chunk[-1])
+                pages.append((params, len(chunk)))
+        def fetch(page):
+            return self._query_page(params=page[0], oidField=oidField,
+                                    expected=page[1])
+        for page in parallel_imap(fetch, pages, max_workers=max_workers,
+                                  ordered=True):
+            yield page
+    #----------------------------------------------------------------------
+    def query_all(self, where="1=1", out_fields="*", returnGeometry=True,
+                  outSR=None, page_size=None, max_workers=4,
+                  strategy="auto", **kwargs):
+        """
+           Returns every feature matching a query, without the
+           maxRecordCount limit of a single query.  Pages are requested on
+           a pool of threads and the features are yielded as soon as the
+           pages before them have arrived, so memory stays bounded by a
+           few pages.
+           Inputs:
+              where - the selection sql statement
+              out_fields - the attribute fields to return. The object id
+                           field is always included.
+              returnGeometry - true means a geometry will be returned,
+                               else just the attributes
+              outSR - spatial reference of the returned geometries
+              page_size - number of features per request. It is limited
+                          to the maxRecordCount of the layer.
+              max_workers - number of pages requested at the same time
+              strategy - auto, oid or offset.  oid fetches the object ids
+                         first and queries ranges of ids. offset uses
+                         resultOffset/resultRecordCount ordered by object
+                         id and needs supportsPagination.  auto uses
+                         offset when the layer supports pagination.
+              kwargs - additional query parameters, including
+                       response_format and quantization_tolerance (see
+                       query)
+           Output:
+              generator of Feature objects in object id order
+        """
+        for page in self._query_pages(where=where, out_fields=out_fields,
+                                      returnGeometry=returnGeometry,
+                                      outSR=outSR, page_size=page_size,
+                                      max_workers=max_workers,
+                                      strategy=strategy, **kwargs):
+            wkid = None
+            sr = page.get('spatialReference', {})
+            if 'latestWkid' in sr:
+                wkid = sr['latestWkid']
+            for feat in page.get('features', []):
+                yield Feature(json_string=feat, wkid=wkid)
+    #----------------------------------------------------------------------
+    def query_columnar(self, where="1=1", out_fields="*", returnGeometry=True,
+                       outSR=None, page_size=None, max_workers=4,
+                       strategy="auto", **kwargs):
+        """
+           Returns every feature matching a query as a ColumnarFeatureSet.
+           The pages of query_all are appended straight to the columns, so
+           no Feature object is created.
+           Inputs:
+              see query_all
+           Output:
+              ColumnarFeatureSet
+        """
+        fs = None
+        for page in self._query_pages(where=where, out_fields=out_fields,
+                                      returnGeometry=returnGeometry,
+                                      outSR=outSR, page_size=page_size,
+                                      max_workers=max_workers,
+                                      strategy=strategy, **kwargs):
+            if fs is None:
+                fs = ColumnarFeatureSet.fromJSON(page)
+            else:
+                fs.extend(page.get('features', []))
+        if fs is None:
+            fs = ColumnarFeatureSet(fields=self.fields,
+                                    geometryType=self.geometryType if returnGeometry else None,
+                                    objectIdFieldName=self.objectIdField)
+        return fs
+    #----------------------------------------------------------------------
+    def query_all_to_json(self, out_file, where="1=1", out_fields="*",
+                          returnGeometry=True, outSR=None, page_size=None,
+                          max_workers=4, strategy="auto", **kwargs):
+        """
+           Writes every feature matching a query to an Esri JSON feature
+           set file. Features are written page by page as they arrive.
+           Inputs:
+              out_file - path of the .json file
+              see query_all for the other parameters
+           Output:
+              path to the file
+        """
+        header = None
+        with open(out_file, 'w') as writer:
+            for page in self._query_pages(where=where, out_fields=out_fields,
+                                          returnGeometry=returnGeometry,
+                                          outSR=outSR, page_size=page_size,
+                                          max_workers=max_workers,
+                                          strategy=strategy, **kwargs):
+                if header is None:
+                    header = dict((k, v) for k, v in page.items()
+                                  if k != 'features')
+                    writer.write(json.dumps(header)[:-1])
+                    writer.write(', "features": [')
+                    first = True
+                for feat in page.get('features', []):
+                    if not first:
+                        writer.write(", ")
+                    writer.write(json.dumps(feat, default=_date_handler))
+                    first = False
+            if header is None:
+                writer.write(json.dumps({"fields" : self.fields,
+                                         "geometryType" : self.geometryType,
+                                         "features" : []}))
+            else:
+                writer.write("]}")
+        return out_file
+    #----------------------------------------------------------------------
+    def query_all_to_featureclass(self, out_fc, where="1=1", out_fields="*",
+                                  returnGeometry=True, outSR=None,
+                                  page_size=None, max_workers=4,
+                                  strategy="auto", **kwargs):
+        """
+           Writes every feature matching a query to a new feature class,
+           or to a table when geometry is not returned. Features are
+           inserted page by page with an insert cursor.
+           Inputs:
+              out_fc - path of the feature class to create
+              see query_all for the other parameters
+           Output:
+              path to the feature class
+        """
+        pages = self._query_pages(where=where, out_fields=out_fields,
+                                  returnGeometry=returnGeometry,
+                                  outSR=outSR, page_size=page_size,
+                                  max_workers=max_workers,
+                                  strategy=strategy, **kwargs)
+        first = next(pages, None)
+        meta = first or {}
+        fields = meta.get('fields', self.fields)
+        geometryType = meta.get('geometryType', self.geometryType) \
+            if returnGeometry else None
+        sr = meta.get('spatialReference') or \
+             (self.extent or {}).get('spatialReference') or {}
+        wkid = sr.get('latestWkid', sr.get('wkid', 4326))
+        fc, field_names = create_feature_class(out_path=os.path.dirname(out_fc),
+                                               out_name=os.path.basename(out_fc),
+                                               geom_type=geometryType,
+                                               wkid=wkid,
+                                               fields=fields,
+                                               objectIdField=self.objectIdField)
+        dateFields = [f['name'] for f in fields
+                      if f['type'] == "esriFieldTypeDate"]
+        def features():
+            if first is not None:
+                for feat in first.get('features', []):
+                    yield feat
+                for page in pages:
+                    for feat in page.get('features', []):
+                        yield feat
+        insert_json_rows(fc=fc, features=features(), fields=field_names,
+                         date_fields=dateFields)
+        return fc
+    #----------------------------------------------------------------------
     def query_related_records(self,
                               objectIds,
                               relationshipId,
@@ -1772,32 +2178,141 @@ class FeatureLayer(abstract.BaseAGOLClass):
                                                   returnAttachments=includeAttachments,
                                                   out_path=out_path)[0]
         else:
-            result_features = []
-            res = self.query(returnIDsOnly=True)
-            OIDS = res['objectIds']
-            OIDS.sort()
-            OIDField = res['objectIdFieldName']
-            count = len(OIDS)
-            if count <= self.maxRecordCount:
-                bins = 1
-            else:
-                bins = count / self.maxRecordCount
-                v = count % self.maxRecordCount
-                if v > 0:
-                    bins += 1
-            chunks = self._chunks(OIDS, bins)
-            for chunk in chunks:
-                chunk.sort()
-                sql = "%s >= %s and %s <= %s" % (OIDField, chunk[0],
-                                                 OIDField, chunk[len(chunk) -1])
-                temp_base = "a" + uuid.uuid4().get_hex()[:6] + "a"
-                temp_fc = r"%s\%s" % (scratchGDB(), temp_base)
-                temp_fc = self.query(where=sql,
-                                     returnFeatureClass=True,
-                                     out_fc=temp_fc)
-                result_features.append(temp_fc)
-            return merge_feature_class(merges=result_features,
-                                       out_fc=out_path)
+            return self.query_all_to_featureclass(out_fc=out_path)
+    #----------------------------------------------------------------------
+    def trackChanges(self, mirror_path, mode="auto", where="1=1",
+                     replicaName=None, page_size=None, max_workers=4):
+        """
+           Returns a ChangeTracker that keeps a SQLite copy of the layer
+           and downloads only the features added, updated or deleted since
+           its last sync.
+           Inputs:
+              mirror_path - path of the SQLite file.  An existing file
+                            continues from its last sync.
+              mode - replica uses createReplica/synchronizeReplica and
+                     needs a sync enabled service.  editdate uses the
+                     editor tracking edit date.  full downloads the layer
+                     every time.  auto picks the first one supported.
+              where - filter on the mirrored features
+              replicaName - name of the replica created in replica mode
+              page_size - features per query
+              max_workers - number of queries sent at the same time
+           Output:
+              ChangeTracker; call its sync() method to update the mirror
+        """
+        service = FeatureService(url=os.path.dirname(self._url),
+                                 securityHandler=self._securityHandler,
+                                 proxy_url=self._proxy_url,
+                                 proxy_port=self._proxy_port,
+                                 initialize=False)
+        return ChangeTracker(layer=self,
+                             service=service,
+                             mirror_path=mirror_path,
+                             mode=mode,
+                             where=where,
+                             replicaName=replicaName,
+                             page_size=page_size,
+                             max_workers=max_workers)
+    #----------------------------------------------------------------------
+    def aggregate(self, statistics, group_by=None, where="1=1",
+                  timeFilter=None, geometryFilter=None, order_by=None,
+                  client_side=None, page_size=None, max_workers=4):
+        """
+           Computes count, sum, avg, min, max, stddev, var and percentile
+           statistics, optionally grouped by fields.  The statistics are
+           computed by the server with outStatistics, paging through the
+           groups when they exceed maxRecordCount.  When the layer does not
+           support the statistics, or the groups cannot be paged, the
+           features are streamed and aggregated on the client.
+           Inputs:
+              statistics - list of (statisticType, field) or
+                           (statisticType, field, outStatisticFieldName)
+                           tuples, (percentile_cont, field, name, 0.9) for
+                           percentiles, outStatistics dictionaries or a
+                           StatisticFilter
+              group_by - list of field names
+              where - filter on the features
+              timeFilter - optional TimeFilter
+              geometryFilter - optional GeometryFilter
+              order_by - orderByFields of the server query
+              client_side - True always aggregates on the client, False
+                            always on the server, None decides from the
+                            layer capabilities
+              page_size - features per query for client side aggregation
+              max_workers - number of queries sent at the same time
+           Output:
+              list of dictionaries with the group_by fields and one value
+              per outStatisticFieldName (type_field when not given)
+        """
+        return _statistics.aggregate(self, statistics=statistics,
+                                     group_by=group_by, where=where,
+                                     timeFilter=timeFilter,
+                                     geometryFilter=geometryFilter,
+                                     order_by=order_by,
+                                     client_side=client_side,
+                                     page_size=page_size,
+                                     max_workers=max_workers)
+    #----------------------------------------------------------------------
+    def time_bins(self, date_field, interval="day", start=None, end=None,
+                  statistics=None, group_by=None, where="1=1",
+                  client_side=None, page_size=None, max_workers=4):
+        """
+           Computes statistics (the feature count by default) for each
+           hour, day, week, month or year of a date field.  On the server
+           each bin is one outStatistics query filtered with timestamp
+           literals, sent in parallel; on the client the features are
+           read once and assigned to their bin.
+           Inputs:
+              date_field - name of the date field
+              interval - hour, day, week, month, year or a timedelta
+              start, end - UTC datetime range, by default the range of the
+                           date field
+              statistics - see aggregate, defaults to a "count"
+              group_by - optional fields grouped within each bin
+              see aggregate for the other parameters
+           Output:
+              list of dictionaries with the start and end of each bin, the
+              group_by fields and the statistics
+        """
+        return _statistics.time_bins(self, date_field=date_field,
+                                     interval=interval, start=start,
+                                     end=end, statistics=statistics,
+                                     group_by=group_by, where=where,
+                                     client_side=client_side,
+                                     page_size=page_size,
+                                     max_workers=max_workers)
+    #----------------------------------------------------------------------
+    def queryCache(self, mirror_path, max_age=300, mode="auto", where="1=1",
+                   page_size=None, max_workers=4):
+        """
+           Returns a QueryCache that answers query() calls from a local
+           SQLite copy of the layer when the where clause, time filter and
+           envelope filter can be evaluated on the client, and sends the
+           other queries to the server.
+           Inputs:
+              mirror_path - path of the SQLite file
+              max_age - seconds before the copy is refreshed with the
+                        changes made on the server. None never refreshes.
+              mode - how the copy is refreshed, see trackChanges
+              where - filter on the cached features
+              page_size - features per query while filling the copy
+              max_workers - number of queries sent at the same time
+           Output:
+              QueryCache
+        """
+        service = FeatureService(url=os.path.dirname(self._url),
+                                 securityHandler=self._securityHandler,
+                                 proxy_url=self._proxy_url,
+                                 proxy_port=self._proxy_port,
+                                 initialize=False)
+        return QueryCache(layer=self,
+                          service=service,
+                          mirror_path=mirror_path,
+                          max_age=max_age,
+                          mode=mode,
+                          where=where,
+                          page_size=page_size,
+                          max_workers=max_workers)
     #----------------------------------------------------------------------
     def updateFeature(self,
                       features,
@@ -1810,7 +2325,9 @@ class FeatureLayer(abstract.BaseAGOLClass):
                         feature, a list of feature objects can be passed,
                         or a FeatureSet object.
            Output:
-              dictionary of result messages
+              dictionary of result messages.  Lists larger than one
+              request are sent with applyEditsInChunks, and the edits of
+              the chunks that did not succeed are returned in 'failed'.
         """
         params = {
             "f" : "json",
@@ -1818,25 +2335,21 @@ class FeatureLayer(abstract.BaseAGOLClass):
         }
         if gdbVersion is not None:
             params['gdbVersion'] = gdbVersion
-        if isinstance(features, Feature):
-            params['features'] = json.dumps([features.asDictionary],
-                                            default=_date_handler
-                                            )
-        elif isinstance(features, list):
-            vals = []
-            for feature in features:
-                if isinstance(feature, Feature):
-                    vals.append(feature.asDictionary)
-            params['features'] = json.dumps(vals,
-                                            default=_date_handler
-                                            )
-        elif isinstance(features, FeatureSet):
-            params['features'] = json.dumps(
-                [feature.asDictionary for feature in features.features],
-                default=_date_handler
-            )
+        if isinstance(features, list):
+            features = [feature for feature in features
+                        if isinstance(feature, Feature)]
+        if isinstance(features, (list, Feature, FeatureSet)):
+            encoded = encode_features(features)
         else:
             return {'message' : "invalid inputs"}
+        if len(encoded) > DEFAULT_MAX_COUNT or \
+           sum(len(f) + 1 for f in encoded) > DEFAULT_MAX_BYTES:
+            res = self.applyEditsInChunks(updateFeatures=features,
+                                          gdbVersion=gdbVersion,
+                                          rollbackOnFailure=rollbackOnFailure)
+            return {"updateResults" : res['updateResults'],
+                    "failed" : res['failed']}
+        params['features'] = "[%s]" % ",".join(encoded)
         updateURL = self._url + "/updateFeatures"
         res = self._post(url=updateURL,
                             securityHandler=self._securityHandler,
@@ -1871,12 +2384,30 @@ class FeatureLayer(abstract.BaseAGOLClass):
                                   server will apply the edits only if all
                                   edits succeed. The default value is true.
             Output:
-               JSON response as dictionary
+               JSON response as dictionary.  More object ids than one
+               request holds are sent with applyEditsInChunks, and the
+               ids of the chunks that did not succeed are returned in
+               'failed'.
         """
+        if objectIds is not None and objectIds != "" and \
+           (where is None or where == "") and geometryFilter is None:
+            if isinstance(objectIds, (list, tuple, set)):
+                objectIds = ",".join(["%s" % oid for oid in objectIds])
+            elif not isinstance(objectIds, six.string_types):
+                objectIds = "%s" % objectIds
+            if objectIds.count(",") >= DEFAULT_MAX_COUNT:
+                res = self.applyEditsInChunks(deleteFeatures=objectIds,
+                                              gdbVersion=gdbVersion,
+                                              rollbackOnFailure=rollbackOnFailure)
+                return {"deleteResults" : res['deleteResults'],
+                        "failed" : res['failed']}
         dURL = self._url + "/deleteFeatures"
         params = {
             "f": "json",
+            "rollbackOnFailure" : rollbackOnFailure
         }
+        if gdbVersion is not None:
+            params['gdbVersion'] = gdbVersion
         if geometryFilter is not None and \
            isinstance(geometryFilter, filters.GeometryFilter):
             gfilter = geometryFilter.filter
@@ -1933,7 +2464,7 @@ class FeatureLayer(abstract.BaseAGOLClass):
         """
         editURL = self._url + "/applyEdits"
         params = {"f": "json",
-                  "useGlobalIds" : userGlobalIds,
+                  "useGlobalIds" : useGlobalIds,
                   "rollbackOnFailure" : rollbackOnFailure
                   }
         if gdbVersion is not None:
@@ -1954,6 +2485,56 @@ class FeatureLayer(abstract.BaseAGOLClass):
                              proxy_port=self._proxy_port,
                              proxy_url=self._proxy_url)
     #----------------------------------------------------------------------
+    def applyEditsInChunks(self,
+                           addFeatures=None,
+                           updateFeatures=None,
+                           deleteFeatures=None,
+                           gdbVersion=None,
+                           useGlobalIds=False,
+                           rollbackOnFailure=True,
+                           max_count=DEFAULT_MAX_COUNT,
+                           max_bytes=DEFAULT_MAX_BYTES,
+                           max_workers=4,
+                           stop_on_failure=False):
+        """
+           Applies any number of adds, updates and deletes through the
+           applyEdits operation.  The edits are split into requests
+           limited by max_count edits and max_bytes of encoded JSON, and
+           the requests are sent on a pool of threads.  A request the
+           server rejects as too large is split and sent again.
+           Inputs:
+              addFeatures - features to add (common.Feature objects,
+                            dictionaries or a FeatureSet)
+              updateFeatures - features to update
+              deleteFeatures - list or comma separated string of OIDs
+              gdbVersion - Geodatabase version to apply the edits.
+                           Versioned edits are sent one request at a time.
+              useGlobalIds - see applyEdits
+              rollbackOnFailure - applied to each request. When True the
+                                  requests are sent one at a time and
+                                  none is sent after the first failure.
+              max_count - maximum number of edits per request
+              max_bytes - maximum encoded size of the edits of a request
+              max_workers - number of requests sent at the same time
+                            when rollbackOnFailure is False
+              stop_on_failure - send the requests one at a time and stop
+                                after the first one that fails
+           Output:
+              dictionary with addResults, updateResults and deleteResults
+              in input order and a list of the failed edits
+        """
+        pipeline = EditPipeline(layer=self,
+                                max_count=max_count,
+                                max_bytes=max_bytes,
+                                max_workers=max_workers,
+                                rollbackOnFailure=rollbackOnFailure,
+                                stop_on_failure=stop_on_failure,
+                                gdbVersion=gdbVersion,
+                                useGlobalIds=useGlobalIds)
+        return pipeline.run(adds=addFeatures,
+                            updates=updateFeatures,
+                            deletes=deleteFeatures)
+    #----------------------------------------------------------------------
     def addFeature(self, features,
                    gdbVersion=None,
                    rollbackOnFailure=True):
@@ -1971,7 +2552,9 @@ class FeatureLayer(abstract.BaseAGOLClass):
                                   only if all edits succeed. The default
                                   value is true.
            Output:
-              JSON message as dictionary
+              JSON message as dictionary.  Lists larger than one request
+              are sent with applyEditsInChunks, and the edits of the
+              chunks that did not succeed are returned in 'failed'.
         """
         url = self._url + "/addFeatures"
         params = {
@@ -1981,17 +2564,18 @@ class FeatureLayer(abstract.BaseAGOLClass):
             params['gdbVersion'] = gdbVersion
         if isinstance(rollbackOnFailure, bool):
             params['rollbackOnFailure'] = rollbackOnFailure
-        if isinstance(features, list):
-            params['features'] = json.dumps([feature.asDictionary for feature in features],
-                                            default=_date_handler)
-        elif isinstance(features, Feature):
-            params['features'] = json.dumps([features.asDictionary],
-                                            default=_date_handler)
-        elif isinstance(features, FeatureSet):
-            params['features'] = json.dumps([feature.asDictionary for feature in features.features],
-                                            default=_date_handler)
+        if isinstance(features, (list, Feature, FeatureSet)):
+            encoded = encode_features(features)
         else:
             return None
+        if len(encoded) > DEFAULT_MAX_COUNT or \
+           sum(len(f) + 1 for f in encoded) > DEFAULT_MAX_BYTES:
+            res = self.applyEditsInChunks(addFeatures=features,
+                                          gdbVersion=gdbVersion,
+                                          rollbackOnFailure=rollbackOnFailure)
+            return {"addResults" : res['addResults'],
+                    "failed" : res['failed']}
+        params['features'] = "[%s]" % ",".join(encoded)
         return self._post(url=url,
                              param_dict=params,
                              securityHandler=self._securityHandler,
@@ -2002,7 +2586,8 @@ class FeatureLayer(abstract.BaseAGOLClass):
                     nameField="ATT_NAME", blobField="DATA",
                     contentTypeField="CONTENT_TYPE",
                     rel_object_field="REL_OBJECTID",
-                    lowerCaseFieldNames=False):
+                    lowerCaseFieldNames=False,
+                    max_workers=4):
         """ adds a feature to the feature service
            Inputs:
               fc - string - path to feature class data to add.
@@ -2011,6 +2596,9 @@ class FeatureLayer(abstract.BaseAGOLClass):
               blobField - string - (optional) name field containing blob data
               contentTypeField - string - (optional) name of field containing content type
               rel_object_field - string - (optional) name of field with OID of feature class
+              lowerCaseFieldNames - boolean - (optional) lower case the field names
+              max_workers - integer - (optional) number of requests sent at
+                            the same time
            Output:
               boolean, add results message as list of dictionaries
 
@@ -2018,82 +2606,100 @@ class FeatureLayer(abstract.BaseAGOLClass):
         messages = {'addResults':[]}
 
         if attachmentTable is None:
-            count = 0
-            bins = 1
-            uURL = self._url + "/addFeatures"
-            max_chunk = 250
-            js = json.loads(self._unicode_convert(
-                 featureclass_to_json(fc)))
-            js = js['features']
-            if lowerCaseFieldNames == True:
-                for feat in js:
-                    feat['attributes'] = dict((k.lower(), v) for k,v in feat['attributes'].items())
-            if len(js) == 0:
+            features = featureclass_to_features(fc,
+                                                lowerCaseFieldNames=lowerCaseFieldNames)
+            messages = self._post_features(features=features,
+                                           messages=messages,
+                                           max_workers=max_workers)
+            if len(messages['addResults']) == 0:
                 return {'addResults':None}
-            if len(js) <= max_chunk:
-                bins = 1
-            else:
-                bins = int(len(js)/max_chunk)
-                if len(js) % max_chunk > 0:
-                    bins += 1
-            chunks = self._chunks(l=js, n=bins)
-            for chunk in chunks:
-                params = {
-                    "f" : 'json',
-                    "features"  : json.dumps(chunk,
-                                             default=_date_handler)
-                }
-
-                result = self._post(url=uURL, param_dict=params,
-                                       securityHandler=self._securityHandler,
-                                       proxy_port=self._proxy_port,
-                                       proxy_url=self._proxy_url)
-                if messages is None:
-                    messages = result
-                else:
-                    if 'addResults' in result:
-                        if 'addResults' in messages:
-                            messages['addResults'] = messages['addResults'] + result['addResults']
-                        else:
-                            messages['addResults'] = result['addResults']
-                    else:
-                        messages['errors'] = result
-
-                del params
-                del result
             return messages
         else:
             oid_field = get_OID_field(fc)
-            OIDs = get_records_with_attachments(attachment_table=attachmentTable)
+            OIDs = get_records_with_attachments(attachment_table=attachmentTable,
+                                                rel_object_field=rel_object_field)
+            if len(OIDs) == 0:
+                return self.addFeatures(fc, lowerCaseFieldNames=lowerCaseFieldNames)
             fl = create_feature_layer(fc, "%s not in ( %s )" % (oid_field, ",".join(OIDs)))
-            result = self.addFeatures(fl)
-            if result is not None:
-                messages.update(result)
+            result = self.addFeatures(fl, lowerCaseFieldNames=lowerCaseFieldNames)
+            if result is not None and result.get('addResults') is not None:
+                messages['addResults'] = result['addResults']
             del fl
-            for oid in OIDs:
-                fl = create_feature_layer(fc, "%s = %s" % (oid_field, oid), name="layer%s" % oid)
-                msgs = self.addFeatures(fl)
-                for result in msgs['addResults']:
-                    oid_fs = result['objectId']
-                    sends = get_attachment_data(attachmentTable, sql="%s = %s" % (rel_object_field, oid))
+            # the features with attachments are sent in a single add
+            # request, the source OBJECTID of each one is kept so the add
+            # results can be matched to the attachment rows
+            fl = create_feature_layer(fc, "%s in ( %s )" % (oid_field, ",".join(OIDs)),
+                                      name="layerAttachments")
+            js = list(featureclass_to_features(fl))
+            del fl
+            sourceOIDs = ["%s" % feat['attributes'][oid_field] for feat in js]
+            if lowerCaseFieldNames == True:
+                for feat in js:
+                    feat['attributes'] = dict((k.lower(), v) for k,v in feat['attributes'].items())
+            msgs = self._post_features(features=js, max_workers=max_workers)
+            sends = {}
+            rows = get_attachment_data(attachmentTable,
+                                       sql="%s in ( %s )" % (rel_object_field, ",".join(OIDs)),
+                                       nameField=nameField,
+                                       blobField=blobField,
+                                       contentTypeField=contentTypeField,
+                                       rel_object_field=rel_object_field)
+            for s in rows:
+                sends.setdefault("%s" % s['rel_oid'], []).append(s)
+            batch = RequestBatch(max_workers=max_workers)
+            pending = []
+            try:
+                for oid, result in zip(sourceOIDs, msgs.get('addResults') or []):
                     result['addAttachmentResults'] = []
-                    for s in sends:
-                        attRes = self.addAttachment(oid_fs, s['blob'])
-
+                    if result.get('success', False) == False:
+                        continue
+                    for s in sends.get(oid, []):
+                        batch.add(self.addAttachment, result['objectId'], s['blob'])
+                        pending.append((result, s['name']))
+                if len(batch) > 0 and self.hasAttachments == True:
+                    for (result, name), attRes in zip(pending, batch.execute()):
                         if 'addAttachmentResult' in attRes:
-                            attRes['addAttachmentResult']['AttachmentName'] = s['name']
+                            attRes['addAttachmentResult']['AttachmentName'] = name
                             result['addAttachmentResults'].append(attRes['addAttachmentResult'])
                         else:
-                            attRes['AttachmentName'] = s['name']
+                            attRes['AttachmentName'] = name
                             result['addAttachmentResults'].append(attRes)
-                        del s
-                    del sends
-                    del result
-                messages.update( msgs)
-                del fl
-                del oid
+            finally:
+                remove_attachment_data(rows)
+            if 'errors' in msgs:
+                messages['errors'] = msgs['errors']
+            messages['addResults'] = messages['addResults'] + (msgs.get('addResults') or [])
+            del sends
+            del batch
             del OIDs
             return messages
+    #----------------------------------------------------------------------
+    def _post_features(self, features, messages=None, max_chunk=250,
+                       max_workers=4):
+        """
+           adds features in chunks through applyEditsInChunks, keeping
+           the order of the features so the add results line up with them.
+           Each chunk is applied on its own (rollbackOnFailure is False),
+           so a failed chunk does not stop the others and the chunks are
+           sent in parallel.
+           Inputs:
+              features - list or generator of feature dictionaries
+              messages - optional dictionary the add results are merged into
+              max_chunk - maximum number of features per request
+              max_workers - number of requests sent at the same time
+           Output:
+              dictionary of the merged add results
+        """
+        if messages is None:
+            messages = {'addResults':[]}
+        res = self.applyEditsInChunks(addFeatures=features,
+                                      max_count=max_chunk,
+                                      max_workers=max_workers,
+                                      rollbackOnFailure=False)
+        messages['addResults'] = messages.get('addResults', []) + res['addResults']
+        if len(res['failed']) > 0:
+            messages['errors'] = res['failed']
+        return messages
 
     #----------------------------------------------------------------------
     def calculate(self, where, calcExpression, sqlFormat="standard"):
@@ -10,5 +10,7 @@ from ._globeservice import GlobeService, GlobeServiceLayer
 from ._mobileservice import MobileService, MobileServiceLayer
 from ._geodataservice import GeoDataService
 from ._geocodeservice import GeocodeService
+from ._batchgeocode import BatchGeocoder
+from ._geocodecache import GeocodeCache
 from .server import Server as AGSServer
 __version__ = "3.5.3"
\ No newline at end of file
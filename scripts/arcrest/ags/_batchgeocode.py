@@ -0,0 +1,466 @@
+"""
+   Streams address records from a CSV file or table through
+   GeocodeService.geocodeAddresses in locator sized batches.
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+import os
+import sys
+import csv
+import json
+import time
+import threading
+try:
+    import arcpy
+    arcpyFound = True
+except:
+    arcpyFound = False
+
+from ..packages import six
+from ..common.spatial import featureclass_to_features, insert_json_rows, \
+     create_feature_class
+from ..web._retry import TokenBucket
+from ..web._parallel import parallel_imap, DEFAULT_WORKERS
+########################################################################
+__version__ = "3.5.3"
+__all__ = ["BatchGeocoder", "read_csv", "read_table", "write_csv",
+           "write_featureclass"]
+# locator attributes copied to every result row, with their field types
+RESULT_FIELDS = [
+    ("X", "esriFieldTypeDouble"),
+    ("Y", "esriFieldTypeDouble"),
+    ("Score", "esriFieldTypeDouble"),
+    ("Match_addr", "esriFieldTypeString"),
+    ("Addr_type", "esriFieldTypeString"),
+    ("Status", "esriFieldTypeString")
+]
+_DEFAULT_BATCH_SIZE = 150
+#----------------------------------------------------------------------
+def read_csv(path, fields=None):
+    """
+       reads a CSV file one row at a time
+       Inputs:
+          path - path to the CSV file; the first row holds the field names
+          fields - optional list of the fields to keep
+       Output:
+          generator of dictionaries; text is decoded from UTF-8
+    """
+    if six.PY2:
+        handle = open(path, 'rb')
+    else:
+        handle = open(path, 'r', newline='', encoding='utf-8')
+    with handle:
+        for row in csv.DictReader(handle):
+            if six.PY2:
+                row = dict((_decode(k), _decode(v)) for k, v in row.items())
+            if fields is not None:
+                row = dict((field, row.get(field)) for field in fields)
+            yield row
+#----------------------------------------------------------------------
+def _decode(value):
+    """decodes a Python 2 csv byte string"""
+    if isinstance(value, str):
+        return value.decode('utf-8')
+    return value
+#----------------------------------------------------------------------
+def _encode(value):
+    """encodes text for the Python 2 csv module"""
+    if isinstance(value, six.text_type):
+        return value.encode('utf-8')
+    return value
+#----------------------------------------------------------------------
+def read_table(table, fields=None, where_clause=None):
+    """
+       reads a table or feature class one row at a time
+       Inputs:
+          table - path to the table, feature class or layer
+          fields - optional list of the fields to keep
+          where_clause - optional sql filter
+       Output:
+          generator of attribute dictionaries
+    """
+    for feature in featureclass_to_features(table, where_clause=where_clause):
+        row = feature['attributes']
+        if fields is not None:
+            row = dict((field, row.get(field)) for field in fields)
+        yield row
+#----------------------------------------------------------------------
+def _peek(rows):
+    """returns the first row and a generator over all the rows"""
+    rows = iter(rows)
+    try:
+        first = next(rows)
+    except StopIteration:
+        return None, iter([])
+    def chain():
+        yield first
+        for row in rows:
+            yield row
+    return first, chain()
+#----------------------------------------------------------------------
+def write_csv(path, rows, fields=None):
+    """
+       writes result rows to a CSV file as they are produced
+       Inputs:
+          path - output CSV file
+          rows - iterable of dictionaries
+          fields - column order, defaults to the keys of the first row
+       Output:
+          number of rows written; text is written as UTF-8
+    """
+    first, rows = _peek(rows)
+    if fields is None:
+        fields = list(first.keys()) if first is not None else []
+    if six.PY2:
+        handle = open(path, 'wb')
+        fields = [_encode(field) for field in fields]
+    else:
+        handle = open(path, 'w', newline='', encoding='utf-8')
+    count = 0
+    with handle:
+        writer = csv.DictWriter(handle, fieldnames=fields,
+                                extrasaction='ignore')
+        writer.writeheader()
+        for row in rows:
+            if six.PY2:
+                row = dict((_encode(k), _encode(v)) for k, v in row.items())
+            writer.writerow(row)
+            count += 1
+    return count
+#----------------------------------------------------------------------
+def write_featureclass(out_fc, rows, fields=None, wkid=4326):
+    """
+       writes result rows to a point feature class with one insert cursor
+       Inputs:
+          out_fc - path of the feature class to create
+          rows - iterable of dictionaries with X and Y keys
+          fields - attribute fields, defaults to the keys of the first row
+          wkid - spatial reference of the X/Y values
+       Output:
+          number of rows written
+    """
+    if arcpyFound == False:
+        raise Exception("ArcPy is required to use this function")
+    first, rows = _peek(rows)
+    if fields is None:
+        fields = list(first.keys()) if first is not None else []
+    types = dict(RESULT_FIELDS)
+    out_path, out_name = os.path.split(out_fc)
+    names = {}
+    definitions = []
+    for field in fields:
+        name = arcpy.ValidateFieldName(field, out_path)
+        names[field] = name
+        definitions.append({"name" : name,
+                            "type" : types.get(field,
+                                               "esriFieldTypeString")})
+    fc, field_names = create_feature_class(out_path=out_path,
+                                           out_name=out_name,
+                                           geom_type="esriGeometryPoint",
+                                           wkid=wkid,
+                                           fields=definitions,
+                                           objectIdField=None)
+    sr = {"wkid" : wkid}
+    def features():
+        for row in rows:
+            feature = {"attributes" : dict((names[k], row.get(k))
+                                           for k in fields)}
+            if row.get('X') is not None and row.get('Y') is not None:
+                feature['geometry'] = {"x" : row['X'], "y" : row['Y'],
+                                       "spatialReference" : sr}
+            yield feature
+    return insert_json_rows(fc, features(), field_names)
+########################################################################
+class BatchGeocoder(object):
+    """
+       Geocodes a stream of address records with the geocodeAddresses
+       operation.  Records are grouped into batches of the locator's
+       SuggestedBatchSize, batches are sent on a pool of threads (no more
+       than rate requests per second when a rate is given), a failed batch
+       is sent again with exponential backoff, and the results come back
+       in input order.
+
+       Inputs:
+          service - GeocodeService
+          address_fields - how records map to the locator's address fields:
+                           a dictionary of {locator field : record field},
+                           the name of a record field holding single line
+                           addresses, or None when the records already use
+                           the locator's field names
+          batch_size - records per request, defaults to the locator's
+                       SuggestedBatchSize
+          max_workers - requests sent at the same time
+          rate - optional maximum requests per second
+          max_retries - times a failed batch is sent again
+          backoff_factor - delay in seconds before the first retry,
+                           doubled on each retry
+          outSR - spatial reference of the returned locations
+          sourceCountry - optional country filter
+          category - optional category filter
+          raise_errors - if True a batch that still fails raises; if
+                         False its records get Status "E"
+          on_progress - optional callback(stats) called after each batch
+
+       Usage:
+       >>> gc = GeocodeService(url, securityHandler=sh)
+       >>> geocoder = gc.batchGeocoder(address_fields={"Address" : "ADDR",
+       ...                                             "City" : "CITY",
+       ...                                             "Postal" : "ZIP"},
+       ...                             max_workers=4, rate=10)
+       >>> stats = geocoder.geocodeFile("incidents.csv", "results.csv")
+       >>> stats['rate']
+    """
+    _service = None
+    _address_fields = None
+    _batch_size = None
+    _max_workers = None
+    _bucket = None
+    _max_retries = None
+    _backoff_factor = None
+    _outSR = None
+    _sourceCountry = None
+    _category = None
+    _raise_errors = None
+    _on_progress = None
+    _stats = None
+    _lock = None
+    #----------------------------------------------------------------------
+    def __init__(self, service, address_fields=None, batch_size=None,
+                 max_workers=DEFAULT_WORKERS, rate=None, max_retries=3,
+                 backoff_factor=1.0, outSR=4326, sourceCountry=None,
+                 category=None, raise_errors=False, on_progress=None):
+        """Constructor"""
+        self._service = service
+        self._address_fields = address_fields
+        self._batch_size = batch_size
+        self._max_workers = max_workers
+        if rate:
+            self._bucket = TokenBucket(rate=rate, capacity=1)
+        self._max_retries = max_retries
+        self._backoff_factor = backoff_factor
+        self._outSR = outSR
+        self._sourceCountry = sourceCountry
+        self._category = category
+        self._raise_errors = raise_errors
+        self._on_progress = on_progress
+        self._lock = threading.Lock()
+        self._reset()
+    #----------------------------------------------------------------------
+    def _reset(self):
+        """clears the counters"""
+        self._stats = {"addresses" : 0, "matched" : 0, "tied" : 0,
+                       "unmatched" : 0, "failed" : 0, "requests" : 0,
+                       "retries" : 0, "cached" : 0, "elapsed" : 0.0,
+                       "rate" : 0.0}
+    #----------------------------------------------------------------------
+    @property
+    def stats(self):
+        """
+           gets the counters of the last run: addresses, matched, tied,
+           unmatched, failed, requests, retries, cached (answered by the
+           service's GeocodeCache), elapsed seconds and rate in addresses
+           per second
+        """
+        with self._lock:
+            return dict(self._stats)
+    #----------------------------------------------------------------------
+    @property
+    def batchSize(self):
+        """
+           gets the number of records sent per request: the batch_size
+           given to the constructor, else the locator's
+           SuggestedBatchSize (capped by MaxBatchSize)
+        """
+        if self._batch_size is None:
+            props = self._service.locatorProperties or {}
+            size = props.get('SuggestedBatchSize') or _DEFAULT_BATCH_SIZE
+            if props.get('MaxBatchSize'):
+                size = min(size, props['MaxBatchSize'])
+            self._batch_size = int(size)
+        return self._batch_size
+    #----------------------------------------------------------------------
+    def _address(self, record):
+        """returns the locator attributes of a record"""
+        fields = self._address_fields
+        if fields is None:
+            return dict(record)
+        if isinstance(fields, six.string_types):
+            name = self._service.singleLineAddressField['name']
+            return {name : record.get(fields)}
+        return dict((locatorField, record.get(recordField))
+                    for locatorField, recordField in fields.items())
+    #----------------------------------------------------------------------
+    def _batches(self, records):
+        """groups the records into lists of batchSize"""
+        size = self.batchSize
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= size:
+                yield batch
+                batch = []
+        if len(batch) > 0:
+            yield batch
+    #----------------------------------------------------------------------
+    def _cacheParams(self):
+        """returns the request parameters that shape a cached result"""
+        return {"outSR" : self._outSR,
+                "sourceCountry" : self._sourceCountry,
+                "category" : self._category}
+    #----------------------------------------------------------------------
+    def _splitCached(self, records):
+        """
+           returns the locations the service's GeocodeCache holds for
+           records and the records that still have to be sent
+        """
+        cache = getattr(self._service, 'cache', None)
+        if cache is None:
+            return [], records
+        cached, records = cache.splitRecords(self._service.cacheLocator,
+                                             records, self._cacheParams())
+        with self._lock:
+            self._stats['cached'] += len(cached)
+        return cached, records
+    #----------------------------------------------------------------------
+    def _request(self, records):
+        """sends records and returns the response locations"""
+        params = {"f" : "json",
+                  "addresses" : json.dumps({"records" : records}),
+                  "outSR" : json.dumps(self._outSR) \
+                      if isinstance(self._outSR, dict) else self._outSR}
+        if self._sourceCountry is not None:
+            params['sourceCountry'] = self._sourceCountry
+        if self._category is not None:
+            params['category'] = self._category
+        if self._bucket is not None:
+            self._bucket.acquire()
+        with self._lock:
+            self._stats['requests'] += 1
+        service = self._service
+        res = service._post(url=service._url + "/geocodeAddresses",
+                            param_dict=params,
+                            securityHandler=service._securityHandler,
+                            proxy_url=service._proxy_url,
+                            proxy_port=service._proxy_port)
+        if not isinstance(res, dict) or 'locations' not in res:
+            raise Exception("geocodeAddresses failed: %s" % res)
+        cache = getattr(service, 'cache', None)
+        if cache is not None:
+            cache.storeLocations(service.cacheLocator, records,
+                                 res['locations'], self._cacheParams())
+        return res['locations']
+    #----------------------------------------------------------------------
+    def _geocode_batch(self, batch):
+        """geocodes a batch with retries and returns the result rows"""
+        records = []
+        for index, record in enumerate(batch):
+            attributes = self._address(record)
+            attributes['OBJECTID'] = index + 1
+            records.append({"attributes" : attributes})
+        # the cache is read once, so a retry does not count its hits again
+        locations, records = self._splitCached(records)
+        attempt = 0
+        while len(records) > 0:
+            try:
+                locations = locations + self._request(records)
+                break
+            except Exception:
+                if attempt >= self._max_retries:
+                    if self._raise_errors:
+                        raise
+                    error = "%s" % sys.exc_info()[1]
+                    return [dict(record, Status="E", Match_addr=error)
+                            for record in batch]
+                time.sleep(self._backoff_factor * 2 ** attempt)
+                attempt += 1
+                with self._lock:
+                    self._stats['retries'] += 1
+        byId = {}
+        for location in locations:
+            attributes = location.get('attributes', {})
+            byId[attributes.get('ResultID')] = location
+        rows = []
+        for index, record in enumerate(batch):
+            row = dict(record)
+            location = byId.get(index + 1)
+            if location is None:
+                row['Status'] = "U"
+                rows.append(row)
+                continue
+            attributes = location.get('attributes', {})
+            point = location.get('location') or {}
+            row['X'] = point.get('x', attributes.get('X'))
+            row['Y'] = point.get('y', attributes.get('Y'))
+            row['Score'] = location.get('score', attributes.get('Score'))
+            row['Match_addr'] = location.get('address',
+                                             attributes.get('Match_addr'))
+            row['Addr_type'] = attributes.get('Addr_type')
+            row['Status'] = attributes.get('Status') or \
+                ("M" if row['X'] is not None else "U")
+            rows.append(row)
+        return rows
+    #----------------------------------------------------------------------
+    def geocode(self, records):
+        """
+           geocodes records as they are read
+           Inputs:
+              records - iterable of dictionaries; it can be a generator
+                        such as read_csv() or read_table()
+           Output:
+              generator of the records, in input order, with the X, Y,
+              Score, Match_addr, Addr_type and Status (M matched, T tied,
+              U unmatched, E failed) keys added
+        """
+        self._reset()
+        start = time.time()
+        keys = {"M" : "matched", "T" : "tied", "U" : "unmatched",
+                "E" : "failed"}
+        for rows in parallel_imap(self._geocode_batch,
+                                  self._batches(records),
+                                  max_workers=self._max_workers):
+            with self._lock:
+                stats = self._stats
+                stats['addresses'] += len(rows)
+                for row in rows:
+                    key = keys.get(row.get('Status'), "unmatched")
+                    stats[key] += 1
+                stats['elapsed'] = time.time() - start
+                if stats['elapsed'] > 0:
+                    stats['rate'] = stats['addresses'] / stats['elapsed']
+            if self._on_progress is not None:
+                self._on_progress(self.stats)
+            for row in rows:
+                yield row
+    #----------------------------------------------------------------------
+    def geocodeFile(self, source, output, fields=None, where_clause=None):
+        """
+           geocodes a CSV file or table and writes the results to a CSV
+           file or point feature class
+           Inputs:
+              source - CSV file (.csv) or table/feature class path
+              output - CSV file (.csv) or feature class path
+              fields - optional input fields to carry to the output
+              where_clause - optional filter when reading a table
+           Output:
+              stats dictionary (see the stats property)
+        """
+        if source.lower().endswith(".csv"):
+            records = read_csv(source, fields=fields)
+        else:
+            records = read_table(source, fields=fields,
+                                 where_clause=where_clause)
+        first, records = _peek(records)
+        columns = None
+        if first is not None:
+            columns = [k for k in first.keys()
+                       if k not in dict(RESULT_FIELDS)] + \
+                [name for name, fieldType in RESULT_FIELDS]
+        results = self.geocode(records)
+        if output.lower().endswith(".csv"):
+            write_csv(output, results, fields=columns)
+        else:
+            wkid = self._outSR
+            if isinstance(wkid, dict):
+                wkid = wkid.get('latestWkid', wkid.get('wkid'))
+            write_featureclass(output, results, fields=columns, wkid=wkid)
+        return self.stats
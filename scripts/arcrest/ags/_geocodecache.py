@@ -0,0 +1,328 @@
+"""
+   Local SQLite cache of geocode results keyed by normalized address.
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import contextlib
+
+from ..packages import six
+########################################################################
+__version__ = "3.5.3"
+__all__ = ["GeocodeCache", "normalize_address"]
+_PUNCTUATION = re.compile(r"[^\w#]+", re.UNICODE)
+_SPACES = re.compile(r"\s+")
+# USPS style abbreviations so "123 North Main Street" and "123 N Main St"
+# share a cache entry
+_ABBREVIATIONS = {
+    "STREET" : "ST", "AVENUE" : "AVE", "ROAD" : "RD", "BOULEVARD" : "BLVD",
+    "DRIVE" : "DR", "LANE" : "LN", "COURT" : "CT", "PLACE" : "PL",
+    "HIGHWAY" : "HWY", "PARKWAY" : "PKWY", "CIRCLE" : "CIR",
+    "TERRACE" : "TER", "SQUARE" : "SQ", "TRAIL" : "TRL", "EXPRESSWAY" : "EXPY",
+    "APARTMENT" : "APT", "SUITE" : "STE", "BUILDING" : "BLDG",
+    "NORTH" : "N", "SOUTH" : "S", "EAST" : "E", "WEST" : "W",
+    "NORTHEAST" : "NE", "NORTHWEST" : "NW", "SOUTHEAST" : "SE",
+    "SOUTHWEST" : "SW"
+}
+_MAX_VARIABLES = 500
+#----------------------------------------------------------------------
+def normalize_address(address):
+    """
+       returns the cache form of an address: upper case, punctuation
+       removed, white space collapsed and common street words abbreviated
+       Inputs:
+          address - single line address string, or a dictionary of
+                    address field values
+       Output:
+          string
+    """
+    if isinstance(address, dict):
+        return "|".join("%s=%s" % (k.upper(), normalize_address(v))
+                        for k, v in sorted(address.items())
+                        if v not in (None, "") and k.upper() != "OBJECTID")
+    if address is None:
+        return ""
+    if not isinstance(address, six.string_types):
+        address = "%s" % address
+    words = _SPACES.split(_PUNCTUATION.sub(" ", address.upper()).strip())
+    return " ".join(_ABBREVIATIONS.get(word, word) for word in words)
+########################################################################
+class GeocodeCache(object):
+    """
+       Stores geocode results in a SQLite file so an address that was
+       already located is answered without a request.  Entries are keyed
+       by the locator (url and version), the operation and its result
+       shaping parameters (outSR, outFields, ...) and the normalized
+       address.  Hits, misses, expirations and evictions are counted.
+
+       Inputs:
+          path - SQLite file, created if needed
+          ttl - optional time to live of an entry in seconds
+          max_entries - optional number of entries kept; the least
+                        recently used entries are removed beyond it
+
+       Usage:
+       >>> gc = GeocodeService(url, securityHandler=sh)
+       >>> gc.cache = GeocodeCache("geocodes.sqlite", ttl=30 * 86400,
+       ...                         max_entries=500000)
+       >>> gc.findAddressCandidates(singleLine="380 New York St, Redlands")
+       >>> gc.cache.stats['hitRate']
+    """
+    _path = None
+    _ttl = None
+    _max_entries = None
+    _lock = None
+    _counters = None
+    #----------------------------------------------------------------------
+    def __init__(self, path, ttl=None, max_entries=None):
+        """Constructor"""
+        self._path = path
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._counters = {"hits" : 0, "misses" : 0, "expired" : 0,
+                          "evictions" : 0, "stores" : 0}
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS geocodes "
+                         "(key TEXT PRIMARY KEY, locator TEXT, "
+                         "address TEXT, result TEXT, created REAL, "
+                         "accessed REAL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS geocodes_accessed "
+                         "ON geocodes (accessed)")
+    #----------------------------------------------------------------------
+    @contextlib.contextmanager
+    def _connect(self):
+        """opens the cache for one transaction"""
+        with self._lock:
+            conn = sqlite3.connect(self._path)
+            try:
+                with conn:
+                    yield conn
+            finally:
+                conn.close()
+    #----------------------------------------------------------------------
+    @property
+    def path(self):
+        """gets the path of the SQLite file"""
+        return self._path
+    #----------------------------------------------------------------------
+    @property
+    def ttl(self):
+        """gets/sets the time to live of an entry in seconds"""
+        return self._ttl
+    #----------------------------------------------------------------------
+    @ttl.setter
+    def ttl(self, value):
+        """gets/sets the time to live of an entry in seconds"""
+        self._ttl = value
+    #----------------------------------------------------------------------
+    @property
+    def max_entries(self):
+        """gets/sets the number of entries kept"""
+        return self._max_entries
+    #----------------------------------------------------------------------
+    @max_entries.setter
+    def max_entries(self, value):
+        """gets/sets the number of entries kept"""
+        self._max_entries = value
+        self._evict()
+    #----------------------------------------------------------------------
+    @property
+    def stats(self):
+        """
+           gets the hits, misses, expired, evictions and stores counted
+           by this object, the hitRate and the number of entries
+        """
+        with self._lock:
+            stats = dict(self._counters)
+        lookups = stats['hits'] + stats['misses']
+        stats['hitRate'] = float(stats['hits']) / lookups if lookups else 0.0
+        stats['entries'] = len(self)
+        return stats
+    #----------------------------------------------------------------------
+    def __len__(self):
+        """returns the number of entries"""
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM geocodes").fetchone()[0]
+    #----------------------------------------------------------------------
+    def _count(self, **values):
+        """adds to the counters"""
+        with self._lock:
+            for key, value in values.items():
+                self._counters[key] += value
+    #----------------------------------------------------------------------
+    def _key(self, locator, operation, params, address):
+        """returns the entry key and the normalized address"""
+        normalized = normalize_address(address)
+        value = json.dumps([locator, operation, params or {}, normalized],
+                           sort_keys=True)
+        return hashlib.sha1(value.encode('utf-8')).hexdigest(), normalized
+    #----------------------------------------------------------------------
+    def getMany(self, locator, operation, addresses, params=None):
+        """
+           looks up several addresses with one query
+           Inputs:
+              locator - locator identity (see GeocodeService.cacheLocator)
+              operation - name of the geocode operation
+              addresses - list of address strings or dictionaries
+              params - result shaping parameters of the request
+           Output:
+              list with the cached result or None for each address
+        """
+        keys = [self._key(locator, operation, params, a)[0]
+                for a in addresses]
+        found = {}
+        expired = []
+        now = time.time()
+        with self._connect() as conn:
+            unique = list(set(keys))
+            for start in range(0, len(unique), _MAX_VARIABLES):
+                chunk = unique[start:start + _MAX_VARIABLES]
+                rows = conn.execute(
+                    "SELECT key, result, created FROM geocodes WHERE key "
+                    "IN (%s)" % ",".join("?" * len(chunk)), chunk)
+                for key, result, created in rows:
+                    if self._ttl is not None and now - created > self._ttl:
+                        expired.append(key)
+                    else:
+                        found[key] = result
+            if expired:
+                conn.executemany("DELETE FROM geocodes WHERE key = ?",
+                                 [(key,) for key in expired])
+            if found:
+                conn.executemany("UPDATE geocodes SET accessed = ? "
+                                 "WHERE key = ?",
+                                 [(now, key) for key in found])
+        results = [json.loads(found[key]) if key in found else None
+                   for key in keys]
+        hits = len([r for r in results if r is not None])
+        self._count(hits=hits, misses=len(results) - hits,
+                    expired=len(expired))
+        return results
+    #----------------------------------------------------------------------
+    def get(self, locator, operation, address, params=None):
+        """
+           looks up one address
+           Output:
+              the cached result or None
+        """
+        return self.getMany(locator, operation, [address], params)[0]
+    #----------------------------------------------------------------------
+    def putMany(self, locator, operation, items, params=None):
+        """
+           stores results
+           Inputs:
+              locator - locator identity
+              operation - name of the geocode operation
+              items - list of (address, result) tuples
+              params - result shaping parameters of the request
+        """
+        now = time.time()
+        rows = []
+        for address, result in items:
+            key, normalized = self._key(locator, operation, params, address)
+            rows.append((key, locator, normalized, json.dumps(result),
+                         now, now))
+        if len(rows) == 0:
+            return
+        with self._connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO geocodes "
+                             "(key, locator, address, result, created, "
+                             "accessed) VALUES (?, ?, ?, ?, ?, ?)", rows)
+        self._count(stores=len(rows))
+        self._evict()
+    #----------------------------------------------------------------------
+    def put(self, locator, operation, address, result, params=None):
+        """stores the result of one address"""
+        self.putMany(locator, operation, [(address, result)], params)
+    #----------------------------------------------------------------------
+    def _evict(self):
+        """removes the least recently used entries beyond max_entries"""
+        if not self._max_entries:
+            return
+        with self._connect() as conn:
+            excess = conn.execute("SELECT COUNT(*) FROM geocodes"
+                                  ).fetchone()[0] - self._max_entries
+            if excess > 0:
+                conn.execute("DELETE FROM geocodes WHERE key IN (SELECT "
+                             "key FROM geocodes ORDER BY accessed LIMIT ?)",
+                             (excess,))
+        if excess > 0:
+            self._count(evictions=excess)
+    #----------------------------------------------------------------------
+    def purge(self):
+        """
+           removes the expired entries
+           Output:
+              number of entries removed
+        """
+        if self._ttl is None:
+            return 0
+        with self._connect() as conn:
+            cursor = conn.execute("DELETE FROM geocodes WHERE created < ?",
+                                  (time.time() - self._ttl,))
+            removed = cursor.rowcount
+        self._count(expired=removed)
+        return removed
+    #----------------------------------------------------------------------
+    def clear(self, locator=None):
+        """
+           removes all the entries, or the entries of one locator
+        """
+        with self._connect() as conn:
+            if locator is None:
+                conn.execute("DELETE FROM geocodes")
+            else:
+                conn.execute("DELETE FROM geocodes WHERE locator = ?",
+                             (locator,))
+    #----------------------------------------------------------------------
+    def splitRecords(self, locator, records, params=None):
+        """
+           splits geocodeAddresses records into cached locations and the
+           records that still have to be sent
+           Inputs:
+              locator - locator identity
+              records - list of {"attributes" : {...}} records with an
+                        OBJECTID attribute
+              params - result shaping parameters of the request
+           Output:
+              (locations, missing) - the cached locations with ResultID
+              set to the record OBJECTID, and the records not cached
+        """
+        addresses = [r['attributes'] for r in records]
+        cached = self.getMany(locator, "geocodeAddresses", addresses, params)
+        locations = []
+        missing = []
+        for record, location in zip(records, cached):
+            if location is None:
+                missing.append(record)
+                continue
+            attributes = dict(location.get('attributes', {}))
+            attributes['ResultID'] = record['attributes'].get('OBJECTID')
+            location['attributes'] = attributes
+            locations.append(location)
+        return locations, missing
+    #----------------------------------------------------------------------
+    def storeLocations(self, locator, records, locations, params=None):
+        """
+           stores the locations geocodeAddresses returned for records
+           Inputs:
+              locator - locator identity
+              records - the records that were sent
+              locations - the locations of the response
+              params - result shaping parameters of the request
+        """
+        byId = dict((r['attributes'].get('OBJECTID'), r['attributes'])
+                    for r in records)
+        items = []
+        for location in locations:
+            attributes = location.get('attributes', {})
+            address = byId.get(attributes.get('ResultID'))
+            if address is not None:
+                items.append((address, location))
+        self.putMany(locator, "geocodeAddresses", items, params)
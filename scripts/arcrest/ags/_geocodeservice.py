@@ -3,6 +3,9 @@ from __future__ import print_function
 from .._abstract.abstract import BaseAGSServer
 from ..security import AGOLTokenSecurityHandler, OAuthSecurityHandler
 from ..common.geometry import Point
+from ..web._parallel import DEFAULT_WORKERS
+from ._batchgeocode import BatchGeocoder
+from ._geocodecache import GeocodeCache
 import json
 ########################################################################
 class GeocodeService(BaseAGSServer):
@@ -34,6 +37,7 @@ class GeocodeService(BaseAGSServer):
     _serviceDescription = None
     _countries = None
     _categories = None
+    _cache = None
     #----------------------------------------------------------------------
     def __init__(self, url,
                  securityHandler=None,
@@ -159,6 +163,27 @@ class GeocodeService(BaseAGSServer):
             self.__init()
         return self._serviceDescription
     #----------------------------------------------------------------------
+    @property
+    def cache(self):
+        """
+        gets/sets the GeocodeCache consulted by findAddressCandidates,
+        geocodeAddresses and batchGeocoder before sending a request.  A
+        path is also accepted and opens a GeocodeCache at that path.
+        """
+        return self._cache
+    #----------------------------------------------------------------------
+    @cache.setter
+    def cache(self, value):
+        """gets/sets the GeocodeCache"""
+        if value is not None and not isinstance(value, GeocodeCache):
+            value = GeocodeCache(path=value)
+        self._cache = value
+    #----------------------------------------------------------------------
+    @property
+    def cacheLocator(self):
+        """gets the locator identity used in cache keys: url and version"""
+        return "%s|%s" % (self._url, self.currentVersion)
+    #----------------------------------------------------------------------
     def find(self,
              text,
              magicKey=None,
@@ -400,7 +425,7 @@ class GeocodeService(BaseAGSServer):
         if not category is None:
             params['category'] = category
         if not addressDict is None:
-            params = params.update(addressDict)
+            params.update(addressDict)
         if not singleLine is None:
             params['singleLine'] = singleLine
         if not maxLocations is None:
@@ -415,11 +440,29 @@ class GeocodeService(BaseAGSServer):
             params['location'] = location.asDictionary
         elif isinstance(location, list):
             params['location'] = "%s,%s" % (location[0], location[1])
-        return self._post(url=url,
+        if self._cache is None:
+            return self._post(url=url,
+                                 param_dict=params,
+                                 securityHandler=self._securityHandler,
+                                 proxy_url=self._proxy_url,
+                                 proxy_port=self._proxy_port)
+        address = singleLine if addressDict is None else addressDict
+        shape = dict((k, v) for k, v in params.items()
+                     if k not in ('f', 'singleLine') and \
+                     (addressDict is None or k not in addressDict))
+        locator = self.cacheLocator
+        res = self._cache.get(locator, "findAddressCandidates",
+                              address, shape)
+        if res is None:
+            res = self._post(url=url,
                              param_dict=params,
                              securityHandler=self._securityHandler,
                              proxy_url=self._proxy_url,
                              proxy_port=self._proxy_port)
+            if isinstance(res, dict) and 'candidates' in res:
+                self._cache.put(locator, "findAddressCandidates",
+                                address, res, shape)
+        return res
     #----------------------------------------------------------------------
     def geocodeAddresses(self,
                          addresses,
@@ -483,14 +526,87 @@ class GeocodeService(BaseAGSServer):
         }
         url = self._url + "/geocodeAddresses"
         params['outSR'] = outSR
-        params['sourceCountry'] = sourceCountry
-        params['category'] = category
-        params['addresses'] = addresses
-        return self._post(url=url,
+        if sourceCountry is not None:
+            params['sourceCountry'] = sourceCountry
+        if category is not None:
+            params['category'] = category
+        if self._cache is None:
+            if isinstance(addresses, dict):
+                addresses = json.dumps(addresses)
+            params['addresses'] = addresses
+            return self._post(url=url,
+                                 param_dict=params,
+                                 securityHandler=self._securityHandler,
+                                 proxy_url=self._proxy_url,
+                                 proxy_port=self._proxy_port)
+        if not isinstance(addresses, dict):
+            addresses = json.loads(addresses)
+        shape = {"outSR" : outSR, "sourceCountry" : sourceCountry,
+                 "category" : category}
+        locator = self.cacheLocator
+        locations, missing = self._cache.splitRecords(
+            locator, addresses['records'], shape)
+        res = {"spatialReference" : outSR if isinstance(outSR, dict) \
+               else {"wkid" : outSR}}
+        if len(missing) > 0:
+            params['addresses'] = json.dumps({"records" : missing})
+            res = self._post(url=url,
                              param_dict=params,
                              securityHandler=self._securityHandler,
                              proxy_url=self._proxy_url,
                              proxy_port=self._proxy_port)
+            if not isinstance(res, dict) or 'locations' not in res:
+                return res
+            self._cache.storeLocations(locator, missing,
+                                       res['locations'], shape)
+            locations = locations + res['locations']
+        res['locations'] = locations
+        return res
+    #----------------------------------------------------------------------
+    def batchGeocoder(self,
+                      address_fields=None,
+                      batch_size=None,
+                      max_workers=DEFAULT_WORKERS,
+                      rate=None,
+                      max_retries=3,
+                      outSR=4326,
+                      sourceCountry=None,
+                      category=None,
+                      raise_errors=False,
+                      on_progress=None):
+        """
+        returns a BatchGeocoder that streams address records through
+        geocodeAddresses in batches of the locator's SuggestedBatchSize,
+        sending several batches at once.
+
+        Inputs:
+           address_fields - dictionary of {locator field : record field},
+            the record field holding single line addresses, or None if
+            the records use the locator's field names
+           batch_size - records per request, defaults to the locator's
+            SuggestedBatchSize
+           max_workers - requests sent at the same time
+           rate - optional maximum requests per second
+           max_retries - times a failed batch is sent again
+           outSR - spatial reference of the returned locations
+           sourceCountry - optional country filter
+           category - optional category filter
+           raise_errors - raise when a batch still fails after retries
+           on_progress - optional callback(stats) called after each batch
+        Output:
+           BatchGeocoder
+        """
+        return BatchGeocoder(service=self,
+                             address_fields=address_fields,
+                             batch_size=batch_size,
+                             max_workers=max_workers,
+                             rate=rate,
+                             max_retries=max_retries,
+                             outSR=outSR,
+                             sourceCountry=sourceCountry,
+                             category=category,
+                             raise_errors=raise_errors,
+                             on_progress=on_progress)
     #----------------------------------------------------------------------
     def reverseGeocode(self, location):
         """
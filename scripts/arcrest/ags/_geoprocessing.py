@@ -1,9 +1,31 @@
 from __future__ import absolute_import
 from __future__ import print_function
+import sys
 import json
+import time
 from ._gpobjects import *
 from .._abstract.abstract import BaseAGSServer, BaseGPObject
 from ..common.general import local_time_to_online
+from ..web._parallel import DEFAULT_WORKERS, parallel_map, parallel_imap, \
+     run_in_background
+from ..web._batch import BatchError
+from ..packages import six
+_FINAL_STATUS = ("esriJobSucceeded", "esriJobFailed", "esriJobTimedOut",
+                 "esriJobCancelled")
+_GP_TYPES = {
+    "GPFeatureRecordSetLayer" : GPFeatureRecordSetLayer,
+    "GPString" : GPString,
+    "GPLong" : GPLong,
+    "GPDouble" : GPDouble,
+    "GPDate" : GPDate,
+    "GPBoolean" : GPBoolean,
+    "GPDataFile" : GPDataFile,
+    "GPLinearUnit" : GPLinearUnit,
+    "GPMultiValue" : GPMultiValue,
+    "GPRasterData" : GPRasterData,
+    "GPRasterDataLayer" : GPRasterDataLayer,
+    "GPRecordSet" : GPRecordSet
+}
 ########################################################################
 class GPService(BaseAGSServer):
     """
@@ -308,7 +330,7 @@ class GPTask(BaseAGSServer):
         if not outSR is None:
             params['env:outSR'] = outSR
         if not processSR is None:
-            params['end:processSR'] = processSR
+            params['env:processSR'] = processSR
         params['returnZ'] = returnZ
         params['returnM'] = returnM
         if not inputs is None:
@@ -361,7 +383,7 @@ class GPTask(BaseAGSServer):
         if not outSR is None:
             params['env:outSR'] = outSR
         if not processSR is None:
-            params['end:processSR'] = processSR
+            params['env:processSR'] = processSR
         params['returnZ'] = returnZ
         params['returnM'] = returnM
         for p in inputs:
@@ -380,19 +402,91 @@ class GPTask(BaseAGSServer):
                                  securityHandler=self._securityHandler,
                                  proxy_url=self._proxy_url,
                                  proxy_port=self._proxy_port)
+    #----------------------------------------------------------------------
+    def runJobs(self, inputSets, max_jobs=DEFAULT_WORKERS, max_retries=1,
+                timeout=None, interval=1.0, max_interval=30.0,
+                ordered=False, raise_errors=False, outSR=None,
+                processSR=None, returnZ=False, returnM=False):
+        """
+           submits one job per input set and follows up to max_jobs of
+           them at once, yielding the results as the jobs finish.  A job
+           that fails or times out is cancelled and submitted again up to
+           max_retries times.
+           Inputs:
+              inputSets - iterable of input lists as given to submitJob
+              max_jobs - jobs running on the server at the same time
+              max_retries - times a failed job is submitted again
+              timeout - seconds a job may run before it counts as failed
+              interval - first wait between status polls in seconds
+              max_interval - longest wait between status polls in seconds
+              ordered - yield in the order of inputSets instead of as the
+                        jobs finish
+              raise_errors - if True, the error of a job that still fails
+                             after its retries is raised. If False, a
+                             BatchError is yielded in place of its results
+              outSR, processSR, returnZ, returnM - see submitJob
+           Output:
+              generator of (index in inputSets, results dictionary)
+           Usage:
+           >>> inputSets = []
+           >>> for p in precincts:
+           ...     gp = GPString()
+           ...     gp.paramName = "precinct"
+           ...     gp.value = p
+           ...     inputSets.append([gp])
+           >>> for index, results in task.runJobs(inputSets, max_jobs=8):
+           ...     print(precincts[index], results)
+        """
+        def run(item):
+            index, inputs = item
+            attempt = 0
+            while True:
+                job = None
+                try:
+                    job = self.submitJob(inputs, outSR=outSR,
+                                         processSR=processSR,
+                                         returnZ=returnZ, returnM=returnM)
+                    return index, job._wait_results(
+                        timeout=timeout, interval=interval,
+                        max_interval=max_interval, backoff=1.5,
+                        max_workers=DEFAULT_WORKERS)
+                except Exception:
+                    failure = sys.exc_info()
+                    if job is not None and not job.isFinished:
+                        try:
+                            job.cancelJob()
+                        except Exception:
+                            pass
+                    if attempt >= max_retries:
+                        if raise_errors:
+                            six.reraise(*failure)
+                        return index, BatchError(failure)
+                    attempt += 1
+        for result in parallel_imap(run, enumerate(inputSets),
+                                    max_workers=max_jobs, ordered=ordered,
+                                    max_pending=max_jobs):
+            yield result
 ########################################################################
 class GPJob(BaseAGSServer):
     """
        Represents an ArcGIS GeoProcessing Job
+
+       The job document is kept between calls: once the job reached a
+       final status, jobStatus, messages, inputs and results are answered
+       without a request.  wait() polls the status with exponential
+       backoff, and whenDone() waits on a background thread and returns a
+       Future, so many jobs can be followed at once.
     """
     _proxy_url = None
     _proxy_port = None
     _jobId = None
     _messages = None
     _results = None
+    _resolved = None
     _jobStatus = None
     _inputs = None
     _json = None
+    _json_dict = None
     _securityHandler = None
     #----------------------------------------------------------------------
     def __init__(self, url, securityHandler=None,
@@ -410,16 +504,20 @@ class GPJob(BaseAGSServer):
     #----------------------------------------------------------------------
     def __str__(self):
         """returns object as a string"""
-        self.__init()
+        if self._json is None or not self.isFinished:
+            self.__init()
         return self._json
     #----------------------------------------------------------------------
-    def __init(self):
+    def __init(self, returnMessages=True):
         """ initializes all the properties """
         params = {"f" : "json"}
+        if not returnMessages:
+            params['returnMessages'] = False
         json_dict = self._get(url=self._url, param_dict=params,
                                  securityHandler=self._securityHandler,
                                  proxy_url=self._proxy_url,
                                  proxy_port=self._proxy_port)
+        self._json_dict = json_dict
         self._json = json.dumps(json_dict)
         attributes = [attr for attr in dir(self)
                     if not attr.startswith('__') and \
@@ -430,6 +528,26 @@ class GPJob(BaseAGSServer):
             else:
                 print (k, " - attribute not implemented for GPJob.")
             del k,v
+        self._resolved = None
+    #----------------------------------------------------------------------
+    def refresh(self):
+        """ downloads the job document again """
+        self.__init()
+    #----------------------------------------------------------------------
+    def _poll(self, returnMessages=False):
+        """
+        downloads the job document without its messages and returns the
+        status; a final status downloads the messages once
+        """
+        self.__init(returnMessages=returnMessages)
+        if self.isFinished and not returnMessages:
+            self.__init()
+        return self._jobStatus
+    #----------------------------------------------------------------------
+    @property
+    def isFinished(self):
+        """ returns True once the last known status is a final status """
+        return self._jobStatus in _FINAL_STATUS
     #----------------------------------------------------------------------
     def cancelJob(self):
         """ cancels the job """
@@ -445,7 +563,8 @@ class GPJob(BaseAGSServer):
     @property
     def messages(self):
         """ returns the messages """
-        self.__init()
+        if self._messages is None or not self.isFinished:
+            self.__init()
         return self._messages
     #----------------------------------------------------------------------
     def _get_json(self, urlpart):
@@ -461,46 +580,51 @@ class GPJob(BaseAGSServer):
                             param_dict=params,
                             securityHandler=self._securityHandler,
                             proxy_url=self._proxy_url,
-                            proxy_port=self.proxy_port)
+                            proxy_port=self._proxy_port)
+    #----------------------------------------------------------------------
+    def _get_result(self, item):
+        """ downloads one output parameter and returns its GP object """
+        k, v = item
+        if not isinstance(v, dict) or not 'paramUrl' in v:
+            return k, v
+        param = self._get_json(v['paramUrl'])
+        dataType = param.get('dataType', '')
+        if dataType.lower().find('gpmultivalue') > -1:
+            return k, GPMultiValue.fromJSON(json.dumps(param))
+        if dataType in _GP_TYPES:
+            return k, _GP_TYPES[dataType].fromJSON(json.dumps(param))
+        return k, v
+    #----------------------------------------------------------------------
+    def getResults(self, max_workers=DEFAULT_WORKERS):
+        """
+        returns the results; the output parameters are downloaded at the
+        same time, and only once after the job finished
+        Inputs:
+           max_workers - output parameters downloaded at the same time
+        Output:
+           dictionary of parameter name : GP object
+        """
+        if self._resolved is not None and self.isFinished:
+            return self._resolved
+        if self._results is None or not self.isFinished:
+            self.__init()
+        resolved = dict(parallel_map(self._get_result,
+                                     list((self._results or {}).items()),
+                                     max_workers=max_workers))
+        if self.isFinished:
+            self._resolved = resolved
+        return resolved
     #----------------------------------------------------------------------
     @property
     def results(self):
         """ returns the results """
-        self.__init()
-        for k,v in self._results.items():
-            param = self._get_json(v['paramUrl'])
-            if param['dataType'] == "GPFeatureRecordSetLayer":
-                self._results[k] = GPFeatureRecordSetLayer.fromJSON(json.dumps(param))
-            elif param['dataType'].lower().find('gpmultivalue') > -1:
-                self._results[k] = GPMultiValue.fromJSON(json.dumps(param))
-            elif param['dataType'] == "GPString":
-                self._results[k] = GPString.fromJSON(json.dumps(param))
-            elif param['dataType'] == "GPLong":
-                self._results[k] = GPLong.fromJSON(json.dumps(param))
-            elif param['dataType'] == "GPDouble":
-                self._results[k] = GPDouble.fromJSON(json.dumps(param))
-            elif param['dataType'] == "GPDate":
-                self._results[k] = GPDate.fromJSON(json.dumps(param))
-            elif param['dataType'] == "GPBoolean":
-                self._results[k] = GPBoolean.fromJSON(json.dumps(param))
-            elif param['dataType'] == "GPDataFile":
-                self._results[k] = GPDataFile.fromJSON(json.dumps(param))
-            elif param['dataType'] == "GPLinearUnit":
-                self._results[k] = GPLinearUnit.fromJSON(json.dumps(param))
-            elif param['dataType'] == "GPMultiValue":
-                self._results[k] = GPMultiValue.fromJSON(json.dumps(param))
-            elif param['dataType'] == "GPRasterData":
-                self._results[k] = GPRasterData.fromJSON(json.dumps(param))
-            elif param['dataType'] == "GPRasterDataLayer":
-                self._results[k] = GPRasterDataLayer.fromJSON(json.dumps(param))
-            elif param['dataType'] == "GPRecordSet":
-                self._results[k] = GPRecordSet.fromJSON(json.dumps(param))
-        return self._results
+        return self.getResults()
     #----------------------------------------------------------------------
     @property
     def jobStatus(self):
         """ returns the job status """
-        self.__init()
+        if not self.isFinished:
+            self._poll()
         return self._jobStatus
     #----------------------------------------------------------------------
     @property
@@ -513,7 +637,8 @@ class GPJob(BaseAGSServer):
     @property
     def inputs(self):
         """ returns the inputs of a service """
-        self.__init()
+        if self._inputs is None:
+            self.__init()
         return self._inputs
     #----------------------------------------------------------------------
     def getParameterValue(self, parameterName):
@@ -521,4 +646,80 @@ class GPJob(BaseAGSServer):
         if  self._results is None:
             self.__init()
         parameter = self._results[parameterName]
-        return parameter
\ No newline at end of file
+        return parameter
+    #----------------------------------------------------------------------
+    def wait(self, timeout=None, interval=1.0, max_interval=30.0,
+             backoff=1.5, progress=None):
+        """
+           polls the job status until the job finishes.  The wait between
+           polls starts at interval and grows by backoff up to
+           max_interval.
+           Inputs:
+              timeout - seconds to wait before raising an exception, None
+                        waits for ever
+              interval - first wait between polls in seconds
+              max_interval - longest wait between polls in seconds
+              backoff - factor applied to the wait after each poll
+              progress - optional callable(status, messages) run after
+                         each poll; the messages are only downloaded while
+                         polling when it is set
+           Output:
+              the final job status
+        """
+        start = time.time()
+        if progress is None:
+            status = self.jobStatus
+        else:
+            status = self._poll(returnMessages=True)
+            progress(status, self._messages)
+        while not self.isFinished:
+            delay = interval
+            if timeout is not None:
+                remaining = timeout - (time.time() - start)
+                if remaining <= 0:
+                    raise Exception("GP job %s did not finish in %s seconds "
+                                    "(status: %s)" % (self._url, timeout,
+                                                      status))
+                delay = min(delay, remaining)
+            time.sleep(delay)
+            interval = min(interval * backoff, max_interval)
+            status = self._poll(returnMessages=progress is not None)
+            if progress is not None:
+                progress(status, self._messages)
+        return status
+    #----------------------------------------------------------------------
+    def _wait_results(self, timeout, interval, max_interval, backoff,
+                      max_workers, progress=None):
+        """ waits for the job and returns its results """
+        status = self.wait(timeout=timeout, interval=interval,
+                           max_interval=max_interval, backoff=backoff,
+                           progress=progress)
+        if status != "esriJobSucceeded":
+            errors = [m.get('description') for m in self.messages or []
+                      if m.get('type') == "esriJobMessageTypeError"]
+            raise Exception("GP job %s ended with %s: %s" % \
+                            (self._url, status, "; ".join(errors)))
+        return self.getResults(max_workers=max_workers)
+    #----------------------------------------------------------------------
+    def whenDone(self, callback=None, timeout=None, interval=1.0,
+                 max_interval=30.0, backoff=1.5,
+                 max_workers=DEFAULT_WORKERS, progress=None):
+        """
+           waits for the job on a background thread.
+           Inputs:
+              callback - optional callable(future) run when the job ends
+              timeout, interval, max_interval, backoff, progress - see
+               wait()
+              max_workers - output parameters downloaded at the same time
+           Output:
+              Future whose result() is the results dictionary; it raises
+              when the job failed, was cancelled or timed out
+           Usage:
+           >>> futures = [task.submitJob(inputs).whenDone()
+           ...            for inputs in inputSets]
+           >>> results = [f.result() for f in futures]
+        """
+        return run_in_background(self._wait_results,
+                                 args=(timeout, interval, max_interval,
+                                       backoff, max_workers, progress),
+                                 callback=callback)
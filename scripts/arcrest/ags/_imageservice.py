@@ -6,6 +6,8 @@ from ..common.general import MosaicRuleObject, local_time_to_online
 import datetime, urllib
 import json
 from ..common import filters
+from ..web._parallel import DEFAULT_WORKERS
+from ._tiledexport import TiledExport
 ########################################################################
 class ImageService(BaseAGSServer):
     """
@@ -595,6 +597,84 @@ class ImageService(BaseAGSServer):
                              out_folder=saveFolder,
                              file_name=saveFile)
     #----------------------------------------------------------------------
+    def exportImageTiled(self,
+                         bbox,
+                         size,
+                         output,
+                         imageSR=None,
+                         pixelType=None,
+                         noData=None,
+                         interpolation=None,
+                         compression=None,
+                         bandIds=None,
+                         mosaicRule=None,
+                         renderingRule=None,
+                         time=None,
+                         tile_size=None,
+                         max_workers=DEFAULT_WORKERS,
+                         keep_tiles=False,
+                         as_array=False):
+        """
+        Exports an image of any size.  The extent is split into tiles no
+        larger than maxImageWidth by maxImageHeight that are exported as
+        TIFF at the same time and mosaicked into one GeoTIFF, with the
+        service's pixel values, and a world file.  An interrupted export
+        downloads only the missing tiles when it is run again.
+
+        Inputs:
+           bbox - Envelope or [xmin, ymin, xmax, ymax] in imageSR
+           size - [width, height] of the whole image in pixels
+           output - path of the GeoTIFF to write
+           imageSR - spatial reference of the bbox and the image, the
+                     bbox's or the service's by default
+           pixelType, noData, interpolation, bandIds, time - see
+            exportImage
+           compression - None or LZ77 (deflate) for the tile transfer
+           mosaicRule - MosaicRuleObject
+           renderingRule - rendering rule JSON
+           tile_size - optional largest tile side in pixels
+           max_workers - number of tiles exported at the same time
+           keep_tiles - keep the downloaded tiles next to the output
+           as_array - return a NumPy array (rows, columns, bands) of the
+                      mosaic instead of its path
+        Output:
+           path of the GeoTIFF, or a NumPy array
+        """
+        if imageSR is None and hasattr(bbox, 'asDictionary'):
+            imageSR = bbox.asDictionary.get('spatialReference')
+        if imageSR is None:
+            imageSR = self.spatialReference
+        params = {}
+        if pixelType is not None:
+            params['pixelType'] = pixelType
+        if noData is not None:
+            params['noData'] = noData
+        if interpolation is not None:
+            params['interpolation'] = interpolation
+        if compression is not None:
+            params['compression'] = compression
+        if bandIds is not None:
+            params['bandIds'] = ",".join("%s" % b for b in bandIds)
+        if isinstance(mosaicRule, MosaicRuleObject):
+            params['mosaicRule'] = json.dumps(mosaicRule.value)
+        if isinstance(renderingRule, dict):
+            params['renderingRule'] = json.dumps(renderingRule)
+        elif renderingRule is not None:
+            params['renderingRule'] = renderingRule
+        if isinstance(time, datetime.datetime):
+            params['time'] = local_time_to_online(time)
+        export = TiledExport(service=self,
+                             operation="exportImage",
+                             params=params,
+                             extent=bbox,
+                             size=size,
+                             spatialReference=imageSR,
+                             image_format="tiff",
+                             tile_size=tile_size,
+                             max_workers=max_workers)
+        return export.run(output=output, keep_tiles=keep_tiles,
+                          as_array=as_array)
+    #----------------------------------------------------------------------
     def query(self,
               where="1=1",
               out_fields="*",
@@ -0,0 +1,401 @@
+"""
+   Splits closest facility, service area and route solves that exceed a
+   network layer's limits into spatially clustered batches, solves them
+   at the same time and merges the results into one response.
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+import json
+import hashlib
+import threading
+import collections
+
+from .._abstract import abstract
+from ..packages import six
+from ..web._parallel import parallel_map, DEFAULT_WORKERS
+########################################################################
+__version__ = "3.5.3"
+__all__ = ["NetworkBatchSolver"]
+# used when the layer does not publish serviceLimits
+_DEFAULT_LIMITS = {
+    "maximumStops" : 150,
+    "maximumIncidents" : 100,
+    "maximumFacilities" : 100
+}
+# attributes of result features that hold the 1-based position of an
+# input feature in its batch
+_ID_FIELDS = {
+    "IncidentID" : "incidents",
+    "FacilityID" : "facilities"
+}
+#----------------------------------------------------------------------
+def _features(value):
+    """
+       returns (features, spatialReference) of a FeatureSet, a feature set
+       dictionary or JSON string, or a list of features, Points or point
+       dictionaries
+    """
+    spatialReference = None
+    if isinstance(value, six.string_types):
+        value = json.loads(value)
+    elif hasattr(value, 'value') and hasattr(value, 'fields'):
+        value = value.value
+    if isinstance(value, dict):
+        spatialReference = value.get('spatialReference')
+        value = value.get('features', [])
+    features = []
+    for item in value:
+        if isinstance(item, abstract.AbstractGeometry) or \
+           hasattr(item, 'asDictionary'):
+            item = item.asDictionary
+        if not 'geometry' in item:
+            item = {"geometry" : item, "attributes" : {}}
+        features.append(item)
+    return features, spatialReference
+#----------------------------------------------------------------------
+def _oid_field(attributes):
+    """returns the object id attribute name of a result feature"""
+    return 'OBJECTID' if 'OBJECTID' in attributes else 'ObjectID'
+#----------------------------------------------------------------------
+def _xy(feature):
+    """returns the x, y of a point feature"""
+    geometry = feature.get('geometry') or {}
+    return float(geometry.get('x', 0.0)), float(geometry.get('y', 0.0))
+#----------------------------------------------------------------------
+def _partition(items, size):
+    """
+       splits (index, x, y) items into groups of at most size by cutting
+       the widest side of their extent, so that each group covers a
+       compact area.  Groups are returned in spatial order and all but
+       the last of each cut are full.
+    """
+    if len(items) <= size:
+        return [items]
+    xs = [item[1] for item in items]
+    ys = [item[2] for item in items]
+    axis = 1 if max(xs) - min(xs) >= max(ys) - min(ys) else 2
+    items = sorted(items, key=lambda item: item[axis])
+    groups = -(-len(items) // size)
+    cut = -(-groups // 2) * size
+    return _partition(items[:cut], size) + _partition(items[cut:], size)
+#----------------------------------------------------------------------
+def _box_distance(x, y, box):
+    """returns the distance from a point to an (xmin, ymin, xmax, ymax)"""
+    dx = max(box[0] - x, 0.0, x - box[2])
+    dy = max(box[1] - y, 0.0, y - box[3])
+    return (dx * dx + dy * dy) ** 0.5
+#----------------------------------------------------------------------
+def _feature_set(features, spatialReference):
+    """returns the JSON feature set parameter of a list of features"""
+    value = {"features" : features}
+    if spatialReference is not None:
+        value['spatialReference'] = spatialReference
+    return json.dumps(value)
+########################################################################
+class _SolveCache(object):
+    """
+       Least recently used cache of solve responses keyed by the solve
+       operation and all of its parameters.
+    """
+    _max_entries = None
+    _entries = None
+    _lock = None
+    _hits = None
+    _misses = None
+    #----------------------------------------------------------------------
+    def __init__(self, max_entries):
+        """Constructor"""
+        self._max_entries = max_entries
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+    #----------------------------------------------------------------------
+    @staticmethod
+    def key(operation, params):
+        """returns the cache key of a solve"""
+        value = json.dumps([operation, params], sort_keys=True, default=str)
+        return hashlib.sha1(value.encode('utf-8')).hexdigest()
+    #----------------------------------------------------------------------
+    @property
+    def stats(self):
+        """gets the hits, misses and number of entries"""
+        with self._lock:
+            return {"hits" : self._hits, "misses" : self._misses,
+                    "entries" : len(self._entries)}
+    #----------------------------------------------------------------------
+    def get(self, key):
+        """returns a copy of a cached response or None"""
+        with self._lock:
+            value = self._entries.pop(key, None)
+            if value is None:
+                self._misses += 1
+                return None
+            self._entries[key] = value
+            self._hits += 1
+        return json.loads(value)
+    #----------------------------------------------------------------------
+    def put(self, key, response):
+        """stores a response"""
+        value = json.dumps(response)
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = value
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+    #----------------------------------------------------------------------
+    def clear(self):
+        """removes all the entries"""
+        with self._lock:
+            self._entries.clear()
+########################################################################
+class NetworkBatchSolver(object):
+    """
+       Solves closest facility, service area and route problems that are
+       larger than a network layer accepts in one request.  Inputs are cut
+       into batches within the layer's serviceLimits by recursive
+       bisection of their extent, so nearby incidents or facilities share
+       a batch.  The batches are solved at the same time and the routes,
+       polygons, lines and messages are merged into one response in which
+       IncidentID and FacilityID refer to positions (1-based) in the
+       caller's inputs.  Returned facilities and incidents are listed
+       once, in input order, with that position as their ObjectID, even
+       when a facility was sent with several batches.  Responses of
+       identical batches are cached.
+
+       Inputs:
+          layer - RouteNetworkLayer, ServiceAreaNetworkLayer or
+                  ClosestFacilityNetworkLayer
+          max_workers - number of batches solved at the same time
+          cache_size - number of batch responses kept, 0 disables caching
+          limits - optional dictionary overriding the layer's
+                   maximumStops, maximumIncidents and maximumFacilities
+
+       Usage:
+       >>> solver = cfLayer.batched(max_workers=8)
+       >>> res = solver.solveClosestFacility(incidents, stations,
+       ...                                   defaultTargetFacilityCount=1)
+       >>> len(res['routes']['features'])
+    """
+    _layer = None
+    _max_workers = None
+    _cache = None
+    _limits = None
+    #----------------------------------------------------------------------
+    def __init__(self, layer, max_workers=DEFAULT_WORKERS, cache_size=128,
+                 limits=None):
+        """Constructor"""
+        self._layer = layer
+        self._max_workers = max_workers
+        if cache_size:
+            self._cache = _SolveCache(cache_size)
+        self._limits = limits
+    #----------------------------------------------------------------------
+    @property
+    def limits(self):
+        """
+           gets the batch limits: the constructor's limits, else the
+           layer's serviceLimits, else conservative defaults
+        """
+        if self._limits is None:
+            limits = dict(_DEFAULT_LIMITS)
+            limits.update(self._layer.serviceLimits or {})
+            self._limits = limits
+        return self._limits
+    #----------------------------------------------------------------------
+    def _limit(self, name):
+        """returns one limit"""
+        return int(self.limits.get(name) or _DEFAULT_LIMITS[name])
+    #----------------------------------------------------------------------
+    @property
+    def cacheStats(self):
+        """gets the hits, misses and entries of the solve cache"""
+        if self._cache is None:
+            return {"hits" : 0, "misses" : 0, "entries" : 0}
+        return self._cache.stats
+    #----------------------------------------------------------------------
+    def _solve(self, operation, params):
+        """runs one batch through the layer, using the cache"""
+        key = None
+        if self._cache is not None:
+            key = _SolveCache.key(operation, params)
+            res = self._cache.get(key)
+            if res is not None:
+                return res
+        res = getattr(self._layer, operation)(**params)
+        if not isinstance(res, dict) or 'error' in res:
+            raise Exception("%s failed: %s" % (operation, res))
+        if key is not None:
+            self._cache.put(key, res)
+        return res
+    #----------------------------------------------------------------------
+    def _run(self, operation, batches):
+        """
+           solves (params, {input name : global positions}) batches and
+           merges the responses
+        """
+        def solve(batch):
+            return self._solve(operation, batch[0]), batch[1]
+        merged = {}
+        # global positions of the returned inputs already merged, as a
+        # facility can be sent with several batches
+        seen = {}
+        for res, positions in parallel_map(solve, batches,
+                                           max_workers=self._max_workers):
+            for key, value in res.items():
+                if isinstance(value, dict) and 'features' in value:
+                    features = value['features']
+                    for feature in features:
+                        attributes = feature.get('attributes') or {}
+                        for field, name in _ID_FIELDS.items():
+                            ids = positions.get(name)
+                            if ids is not None and \
+                               attributes.get(field) in ids:
+                                attributes[field] = ids[attributes[field]]
+                    ids = positions.get(key)
+                    if ids is not None:
+                        # the inputs echoed back (returnFacilities, ...):
+                        # their ObjectID is the position in the batch
+                        done = seen.setdefault(key, set())
+                        unique = []
+                        for n, feature in enumerate(features):
+                            attributes = feature.get('attributes') or {}
+                            oidField = _oid_field(attributes)
+                            position = ids.get(attributes.get(oidField, n + 1))
+                            if position is None or position in done:
+                                continue
+                            done.add(position)
+                            attributes[oidField] = position
+                            feature['attributes'] = attributes
+                            unique.append(feature)
+                        features = value['features'] = unique
+                    if key in merged:
+                        merged[key]['features'].extend(features)
+                    else:
+                        merged[key] = value
+                elif isinstance(value, list):
+                    merged.setdefault(key, []).extend(value)
+                elif not key in merged:
+                    merged[key] = value
+        for key in seen:
+            if key in merged:
+                # back in the order of the caller's inputs
+                merged[key]['features'].sort(
+                    key=lambda f: f['attributes'][_oid_field(f['attributes'])])
+        return merged
+    #----------------------------------------------------------------------
+    def solveClosestFacility(self, incidents, facilities, **kwargs):
+        """
+           solves a closest facility problem of any size.  Incidents are
+           clustered into batches of maximumIncidents.  When there are
+           more facilities than maximumFacilities, each batch gets the
+           facilities closest (in a straight line) to its incidents'
+           extent, so a facility far away by road but near by air can be
+           missed; raise the limit if that matters.
+           Inputs:
+              incidents - FeatureSet, feature set dictionary or JSON, or a
+                          list of features or point geometries
+              facilities - same types as incidents
+              kwargs - other ClosestFacilityNetworkLayer.
+                       solveClosestFacility parameters
+           Output:
+              merged response dictionary
+        """
+        incidents, incidentSR = _features(incidents)
+        facilities, facilitySR = _features(facilities)
+        maxFacilities = self._limit("maximumFacilities")
+        items = [(i, ) + _xy(f) for i, f in enumerate(incidents)]
+        facilityXY = [_xy(f) for f in facilities]
+        batches = []
+        for group in _partition(items, self._limit("maximumIncidents")):
+            chosen = list(range(len(facilities)))
+            if len(facilities) > maxFacilities:
+                box = (min(item[1] for item in group),
+                       min(item[2] for item in group),
+                       max(item[1] for item in group),
+                       max(item[2] for item in group))
+                chosen.sort(key=lambda i: _box_distance(
+                    facilityXY[i][0], facilityXY[i][1], box))
+                chosen = sorted(chosen[:maxFacilities])
+            params = dict(kwargs)
+            params['incidents'] = _feature_set(
+                [incidents[item[0]] for item in group], incidentSR)
+            params['facilities'] = _feature_set(
+                [facilities[i] for i in chosen], facilitySR)
+            positions = {
+                "incidents" : dict((n + 1, item[0] + 1)
+                                   for n, item in enumerate(group)),
+                "facilities" : dict((n + 1, i + 1)
+                                    for n, i in enumerate(chosen))
+            }
+            batches.append((params, positions))
+        return self._run("solveClosestFacility", batches)
+    #----------------------------------------------------------------------
+    def solveServiceArea(self, facilities, **kwargs):
+        """
+           solves service areas for any number of facilities, clustered
+           into batches of maximumFacilities.
+           Inputs:
+              facilities - FeatureSet, feature set dictionary or JSON, or a
+                           list of features or point geometries
+              kwargs - other ServiceAreaNetworkLayer.solveServiceArea
+                       parameters
+           Output:
+              merged response dictionary
+        """
+        facilities, facilitySR = _features(facilities)
+        items = [(i, ) + _xy(f) for i, f in enumerate(facilities)]
+        batches = []
+        for group in _partition(items, self._limit("maximumFacilities")):
+            params = dict(kwargs)
+            params['facilities'] = _feature_set(
+                [facilities[item[0]] for item in group], facilitySR)
+            positions = {"facilities" : dict((n + 1, item[0] + 1)
+                                             for n, item in enumerate(group))}
+            batches.append((params, positions))
+        return self._run("solveServiceArea", batches)
+    #----------------------------------------------------------------------
+    def solve(self, stops, routeField="RouteName", **kwargs):
+        """
+           solves many routes at once.  Stops are grouped into routes by
+           routeField and whole routes are packed, nearest first, into
+           batches of at most maximumStops stops.  A single route longer
+           than maximumStops is not split, as its sequence would change.
+           Inputs:
+              stops - FeatureSet, feature set dictionary or JSON, or a list
+                      of stop features
+              routeField - stop attribute naming the route of a stop
+              kwargs - other RouteNetworkLayer.solve parameters
+           Output:
+              merged response dictionary
+        """
+        stops, stopSR = _features(stops)
+        maxStops = self._limit("maximumStops")
+        routes = collections.OrderedDict()
+        for stop in stops:
+            name = (stop.get('attributes') or {}).get(routeField)
+            routes.setdefault(name, []).append(stop)
+        items = []
+        for n, (name, members) in enumerate(routes.items()):
+            if len(members) > maxStops:
+                raise ValueError("route %s has %s stops, more than the "
+                                 "layer's maximumStops of %s" % \
+                                 (name, len(members), maxStops))
+            points = [_xy(stop) for stop in members]
+            items.append((n,
+                          sum(p[0] for p in points) / len(points),
+                          sum(p[1] for p in points) / len(points)))
+        members = list(routes.values())
+        batches = []
+        batch = []
+        for group in _partition(items, 1):
+            route = members[group[0][0]]
+            if batch and len(batch) + len(route) > maxStops:
+                batches.append(batch)
+                batch = []
+            batch.extend(route)
+        if batch:
+            batches.append(batch)
+        return self._run("solve",
+                         [(dict(kwargs, stops=_feature_set(batch, stopSR)),
+                           {}) for batch in batches])
@@ -1,6 +1,8 @@
 from __future__ import absolute_import
 from __future__ import print_function
 from .._abstract.abstract import BaseAGSServer
+from ..web._parallel import DEFAULT_WORKERS
+from ._networkbatch import NetworkBatchSolver
 import json
 
 ########################################################################
@@ -371,6 +373,28 @@ class NetworkLayer(BaseAGSServer):
         if self._serviceLimits is None:
             self.__init()
         return self._serviceLimits
+    #----------------------------------------------------------------------
+    def batched(self, max_workers=DEFAULT_WORKERS, cache_size=128,
+                limits=None):
+        """
+           returns a NetworkBatchSolver that splits solve,
+           solveServiceArea and solveClosestFacility calls larger than
+           the layer's serviceLimits into spatially clustered batches,
+           solves them at the same time and merges the results.
+
+           Inputs:
+              max_workers - number of batches solved at the same time
+              cache_size - number of batch responses kept for identical
+                           inputs, 0 disables caching
+              limits - optional dictionary overriding maximumStops,
+                       maximumIncidents and maximumFacilities
+           Output:
+              NetworkBatchSolver
+        """
+        return NetworkBatchSolver(layer=self,
+                                  max_workers=max_workers,
+                                  cache_size=cache_size,
+                                  limits=limits)
 
 
 ########################################################################
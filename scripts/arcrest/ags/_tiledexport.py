@@ -0,0 +1,455 @@
+"""
+   Exports extents larger than a map or image service's maximum image
+   size as a grid of tiles fetched at the same time and mosaicked into one
+   GeoTIFF with a world file.
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+import os
+import json
+import zlib
+import array
+import shutil
+import struct
+
+from .._abstract import abstract
+from ..web._download import DownloadManager
+from ..web._parallel import parallel_imap, DEFAULT_WORKERS
+try:
+    import numpy as np
+    numpyFound = True
+except:
+    numpyFound = False
+########################################################################
+__version__ = "3.5.3"
+__all__ = ["TiledExport"]
+_DEFAULT_TILE_SIZE = 2048
+_EXTENSIONS = {"bmp" : "bmp", "tiff" : "tif"}
+# array typecodes by (bits per sample, TIFF SampleFormat)
+_TYPECODES = {
+    (16, 1) : "H", (16, 2) : "h", (32, 1) : "I", (32, 2) : "i",
+    (32, 3) : "f", (64, 3) : "d"
+}
+_TIFF_TYPES = {1 : "B", 3 : "H", 4 : "I", 6 : "b", 8 : "h", 9 : "i",
+               11 : "f", 12 : "d"}
+_TIFF_SIZES = {1 : 1, 2 : 1, 3 : 2, 4 : 4, 5 : 8, 6 : 1, 7 : 1, 8 : 2,
+               9 : 4, 10 : 8, 11 : 4, 12 : 8}
+# well-known ids that have a standard EPSG equivalent
+_EPSG = {102100 : 3857, 102113 : 3857}
+#----------------------------------------------------------------------
+def _wkid(spatialReference):
+    """returns the EPSG code of a spatial reference dictionary or None"""
+    if isinstance(spatialReference, dict):
+        wkid = spatialReference.get('latestWkid') or \
+            spatialReference.get('wkid')
+    elif hasattr(spatialReference, 'wkid'):
+        wkid = spatialReference.wkid
+    else:
+        wkid = spatialReference
+    if wkid is None:
+        return None
+    wkid = int(wkid)
+    return _EPSG.get(wkid, wkid)
+#----------------------------------------------------------------------
+def _read_bmp(data):
+    """
+       decodes an uncompressed 24 or 32 bit BMP
+       Output:
+          (width, height, bands, bits, sampleFormat, rows) with the rows
+          top down in RGB(A) order
+    """
+    offset = struct.unpack_from("<I", data, 10)[0]
+    width, height, planes, bpp, compression = struct.unpack_from(
+        "<iiHHI", data, 18)
+    if bpp not in (24, 32) or compression not in (0, 3):
+        raise ValueError("Unsupported BMP: %s bits, compression %s" % \
+                         (bpp, compression))
+    step = bpp // 8
+    # 32 bit BI_RGB leaves the fourth byte undefined, so it is dropped
+    bands = 4 if bpp == 32 and compression == 3 else 3
+    stride = (width * step + 3) & ~3
+    rows = []
+    for r in range(abs(height)):
+        start = offset + (r if height < 0 else abs(height) - 1 - r) * stride
+        source = bytearray(data[start:start + width * step])
+        row = bytearray(width * bands)
+        row[0::bands] = source[2::step]
+        row[1::bands] = source[1::step]
+        row[2::bands] = source[0::step]
+        if bands == 4:
+            row[3::bands] = source[3::step]
+        rows.append(bytes(row))
+    return width, abs(height), bands, 8, 1, rows
+#----------------------------------------------------------------------
+def _read_tiff(data):
+    """
+       decodes a striped TIFF, uncompressed or deflate (LZ77) compressed
+       Output:
+          (width, height, bands, bits, sampleFormat, rows) with little
+          endian samples
+    """
+    if data[:2] == b"II":
+        endian = "<"
+    elif data[:2] == b"MM":
+        endian = ">"
+    else:
+        raise ValueError("Not a TIFF file")
+    magic, ifd = struct.unpack_from(endian + "HI", data, 2)
+    if magic != 42:
+        raise ValueError("Only classic TIFF files are supported")
+    tags = {}
+    for i in range(struct.unpack_from(endian + "H", data, ifd)[0]):
+        tag, kind, count, value = struct.unpack_from(endian + "HHI4s",
+                                                     data, ifd + 2 + i * 12)
+        if not kind in _TIFF_TYPES:
+            continue
+        size = _TIFF_SIZES[kind] * count
+        if size > 4:
+            start = struct.unpack(endian + "I", value)[0]
+            value = data[start:start + size]
+        tags[tag] = struct.unpack(endian + _TIFF_TYPES[kind] * count,
+                                  value[:size])
+    width, height = tags[256][0], tags[257][0]
+    bits = tags.get(258, (1,))[0]
+    bands = tags.get(277, (1,))[0]
+    compression = tags.get(259, (1,))[0]
+    sampleFormat = tags.get(339, (1,))[0]
+    if 322 in tags or compression not in (1, 8, 32946) or \
+       tags.get(284, (1,))[0] != 1 or tags.get(317, (1,))[0] != 1 or \
+       bits % 8 != 0:
+        raise ValueError("Unsupported TIFF layout: compression %s, "
+                         "bits %s" % (compression, bits))
+    strips = []
+    for start, count in zip(tags[273], tags[279]):
+        strip = data[start:start + count]
+        strips.append(strip if compression == 1 else zlib.decompress(strip))
+    pixels = b"".join(strips)
+    if endian == ">" and bits > 8:
+        values = array.array(_TYPECODES[(bits, sampleFormat)], pixels)
+        values.byteswap()
+        pixels = values.tobytes() if hasattr(values, 'tobytes') \
+            else values.tostring()
+    rowBytes = width * bands * bits // 8
+    rows = [pixels[r * rowBytes:(r + 1) * rowBytes] for r in range(height)]
+    return width, height, bands, bits, sampleFormat, rows
+#----------------------------------------------------------------------
+def _read_image(data):
+    """decodes a BMP or TIFF tile"""
+    if data[:2] == b"BM":
+        return _read_bmp(data)
+    return _read_tiff(data)
+########################################################################
+class _GeoTiffWriter(object):
+    """
+       Writes an uncompressed, one row per strip GeoTIFF whose pixels are
+       filled in any order with write().  The file is allocated up front,
+       so a mosaic never has to be held in memory.
+    """
+    _file = None
+    _width = None
+    _pixel = None
+    _dataOffset = None
+    #----------------------------------------------------------------------
+    def __init__(self, path, width, height, bands, bits, sampleFormat,
+                 origin, resolution, wkid=None):
+        """Constructor"""
+        self._width = width
+        self._pixel = bands * bits // 8
+        rowBytes = width * self._pixel
+        if bands in (3, 4) and bits == 8:
+            photometric, extra = 2, [2] * (bands - 3)
+        else:
+            photometric, extra = 1, [0] * (bands - 1)
+        entries = [
+            (256, 4, [width]), (257, 4, [height]), (258, 3, [bits] * bands),
+            (259, 3, [1]), (262, 3, [photometric]), (273, 4, [0] * height),
+            (277, 3, [bands]), (278, 4, [1]), (279, 4, [rowBytes] * height),
+            (284, 3, [1]), (339, 3, [sampleFormat] * bands),
+            (33550, 12, [resolution[0], resolution[1], 0.0]),
+            (33922, 12, [0.0, 0.0, 0.0, origin[0], origin[1], 0.0])
+        ]
+        if extra:
+            entries.append((338, 3, extra))
+        if wkid is not None and wkid < 32767:
+            geographic = 4000 <= wkid < 5000
+            entries.append((34735, 3, [1, 1, 0, 3,
+                                       1024, 0, 1, 2 if geographic else 1,
+                                       1025, 0, 1, 1,
+                                       2048 if geographic else 3072, 0, 1,
+                                       wkid]))
+        entries.sort()
+        ifdSize = 2 + 12 * len(entries) + 4
+        external = sum(_TIFF_SIZES[kind] * len(values)
+                       for tag, kind, values in entries
+                       if _TIFF_SIZES[kind] * len(values) > 4)
+        self._dataOffset = (8 + ifdSize + external + 7) & ~7
+        total = self._dataOffset + rowBytes * height
+        if total > 0xFFFFFFFF:
+            raise ValueError("The mosaic is larger than the 4 GB a TIFF "
+                             "file can hold; export a smaller size")
+        entries = [(tag, kind, values) if tag != 273 else
+                   (tag, kind, [self._dataOffset + r * rowBytes
+                                for r in range(height)])
+                   for tag, kind, values in entries]
+        head = [struct.pack("<2sHI", b"II", 42, 8),
+                struct.pack("<H", len(entries))]
+        blobs = []
+        position = 8 + ifdSize
+        for tag, kind, values in entries:
+            packed = struct.pack("<" + _TIFF_TYPES[kind] * len(values),
+                                 *values)
+            if len(packed) > 4:
+                head.append(struct.pack("<HHII", tag, kind, len(values),
+                                        position))
+                blobs.append(packed)
+                position += len(packed)
+            else:
+                head.append(struct.pack("<HHI4s", tag, kind, len(values),
+                                        packed.ljust(4, b"\0")))
+        head.append(struct.pack("<I", 0))
+        self._file = open(path, "wb")
+        self._file.write(b"".join(head + blobs))
+        self._file.truncate(total)
+    #----------------------------------------------------------------------
+    @property
+    def dataOffset(self):
+        """gets the position of the first pixel in the file"""
+        return self._dataOffset
+    #----------------------------------------------------------------------
+    def write(self, column, row, rows):
+        """writes rows of pixels with their top left pixel at column, row"""
+        for r, data in enumerate(rows):
+            self._file.seek(self._dataOffset +
+                            ((row + r) * self._width + column) * self._pixel)
+            self._file.write(data)
+    #----------------------------------------------------------------------
+    def close(self):
+        """closes the file"""
+        self._file.close()
+########################################################################
+class TiledExport(object):
+    """
+       Splits an export of a map or image service into tiles no larger
+       than the service's maxImageWidth and maxImageHeight, downloads them
+       at the same time and mosaics them into one GeoTIFF with a world
+       file.  Tiles are kept in a folder next to the output until the
+       mosaic is written, so an interrupted export only downloads the
+       missing tiles when it is run again with the same parameters.
+
+       Pixels are square: the extent is widened on one side when its
+       shape differs from the pixel size.  Tiles are requested as BMP from
+       map services and as TIFF from image services, the lossless formats
+       that are read without extra libraries.
+
+       Inputs:
+          service - MapService or ImageService
+          operation - "export" or "exportImage"
+          params - the other export parameters (layers, renderingRule,...)
+          extent - [xmin, ymin, xmax, ymax] or an Envelope
+          size - [width, height] of the whole export in pixels
+          spatialReference - spatial reference of the extent and output
+          image_format - "bmp" or "tiff"
+          tile_size - optional largest tile side in pixels
+          max_workers - number of tiles downloaded at the same time
+    """
+    _service = None
+    _operation = None
+    _params = None
+    _extent = None
+    _size = None
+    _spatialReference = None
+    _format = None
+    _tile_size = None
+    _max_workers = None
+    #----------------------------------------------------------------------
+    def __init__(self, service, operation, params, extent, size,
+                 spatialReference, image_format, tile_size=None,
+                 max_workers=DEFAULT_WORKERS):
+        """Constructor"""
+        if isinstance(extent, abstract.AbstractGeometry):
+            values = extent.asDictionary
+            extent = [values['xmin'], values['ymin'],
+                      values['xmax'], values['ymax']]
+        if not image_format in _EXTENSIONS:
+            raise ValueError("image_format must be one of %s" % \
+                             ", ".join(_EXTENSIONS))
+        width, height = int(size[0]), int(size[1])
+        resolution = max(float(extent[2] - extent[0]) / width,
+                         float(extent[3] - extent[1]) / height)
+        cx = (extent[0] + extent[2]) / 2.0
+        cy = (extent[1] + extent[3]) / 2.0
+        self._extent = [cx - resolution * width / 2.0,
+                        cy - resolution * height / 2.0,
+                        cx + resolution * width / 2.0,
+                        cy + resolution * height / 2.0]
+        if spatialReference is not None and \
+           not isinstance(spatialReference, dict) and \
+           hasattr(spatialReference, 'wkid'):
+            spatialReference = {"wkid" : spatialReference.wkid}
+        self._service = service
+        self._operation = operation
+        self._params = dict(params)
+        self._size = [width, height]
+        self._spatialReference = spatialReference
+        self._format = image_format
+        self._tile_size = tile_size
+        self._max_workers = max_workers
+    #----------------------------------------------------------------------
+    @property
+    def resolution(self):
+        """gets the size of a pixel in map units"""
+        return (self._extent[2] - self._extent[0]) / self._size[0]
+    #----------------------------------------------------------------------
+    @property
+    def extent(self):
+        """gets the [xmin, ymin, xmax, ymax] of the output"""
+        return list(self._extent)
+    #----------------------------------------------------------------------
+    @property
+    def tiles(self):
+        """
+           gets the (row, column, x pixel, y pixel, width, height) of each
+           tile
+        """
+        service = self._service
+        tileWidth = service.maxImageWidth or _DEFAULT_TILE_SIZE
+        tileHeight = service.maxImageHeight or _DEFAULT_TILE_SIZE
+        if self._tile_size:
+            tileWidth = min(tileWidth, self._tile_size)
+            tileHeight = min(tileHeight, self._tile_size)
+        width, height = self._size
+        tiles = []
+        for row, top in enumerate(range(0, height, tileHeight)):
+            for column, left in enumerate(range(0, width, tileWidth)):
+                tiles.append((row, column, left, top,
+                              min(tileWidth, width - left),
+                              min(tileHeight, height - top)))
+        return tiles
+    #----------------------------------------------------------------------
+    def _tile_params(self, tile):
+        """returns the export parameters of one tile"""
+        row, column, left, top, width, height = tile
+        resolution = self.resolution
+        xmin = self._extent[0] + left * resolution
+        ymax = self._extent[3] - top * resolution
+        sr = self._spatialReference
+        if isinstance(sr, dict):
+            sr = json.dumps(sr)
+        params = dict(self._params)
+        params.update({
+            "f" : "image",
+            "bbox" : "%r,%r,%r,%r" % (xmin, ymax - height * resolution,
+                                      xmin + width * resolution, ymax),
+            "size" : "%s,%s" % (width, height),
+            "format" : self._format
+        })
+        if sr is not None:
+            params['bboxSR'] = sr
+            params['imageSR'] = sr
+        return params
+    #----------------------------------------------------------------------
+    def _prepare(self, folder):
+        """
+           creates the tile folder, clearing tiles of a different export
+        """
+        plan = json.dumps({"url" : self._service._url,
+                           "operation" : self._operation,
+                           "tiles" : [self._tile_params(t)
+                                      for t in self.tiles]},
+                          sort_keys=True, default=str)
+        plan_file = os.path.join(folder, "export.json")
+        if os.path.isdir(folder):
+            previous = None
+            if os.path.isfile(plan_file):
+                with open(plan_file, 'r') as reader:
+                    previous = reader.read()
+            if previous != plan:
+                shutil.rmtree(folder)
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+        with open(plan_file, 'w') as writer:
+            writer.write(plan)
+    #----------------------------------------------------------------------
+    def _world_file(self, output):
+        """writes the world file of the output"""
+        resolution = self.resolution
+        path = os.path.splitext(output)[0] + ".tfw"
+        with open(path, 'w') as writer:
+            writer.write("\n".join("%r" % v for v in [
+                resolution, 0.0, 0.0, -resolution,
+                self._extent[0] + resolution / 2.0,
+                self._extent[3] - resolution / 2.0]) + "\n")
+        return path
+    #----------------------------------------------------------------------
+    def run(self, output, keep_tiles=False, as_array=False):
+        """
+           downloads the missing tiles and writes the mosaic
+           Inputs:
+              output - path of the GeoTIFF to write
+              keep_tiles - keep the tile folder after the mosaic is
+                           written
+              as_array - return a read only NumPy array (rows, columns,
+                         bands) mapped onto the output instead of the path
+           Output:
+              path of the GeoTIFF, or a NumPy array
+        """
+        if as_array and numpyFound == False:
+            raise Exception("NumPy is required to return an array")
+        service = self._service
+        folder = output + ".tiles"
+        self._prepare(folder)
+        url = "%s/%s" % (service._url, self._operation)
+        manager = DownloadManager(securityHandler=service._securityHandler,
+                                  proxy_url=service._proxy_url,
+                                  proxy_port=service._proxy_port,
+                                  max_workers=1)
+        extension = _EXTENSIONS[self._format]
+        def fetch(tile):
+            name = "r%s_c%s.%s" % (tile[0], tile[1], extension)
+            path = os.path.join(folder, name)
+            if not os.path.isfile(path):
+                res = manager.download(url, out_folder=folder,
+                                       file_name=name,
+                                       param_dict=self._tile_params(tile))
+                if res != path:
+                    raise Exception("%s failed for tile %s: %s" % \
+                                    (self._operation, name, res))
+            with open(path, 'rb') as reader:
+                return tile, _read_image(reader.read())
+        writer = None
+        layout = None
+        try:
+            for tile, image in parallel_imap(fetch, self.tiles,
+                                             max_workers=self._max_workers,
+                                             ordered=False):
+                width, height, bands, bits, sampleFormat, rows = image
+                if (width, height) != tuple(tile[4:]):
+                    raise Exception("tile r%s_c%s is %sx%s pixels, "
+                                    "expected %sx%s" % ((tile[0], tile[1],
+                                     width, height) + tuple(tile[4:])))
+                if writer is None:
+                    layout = (bands, bits, sampleFormat)
+                    writer = _GeoTiffWriter(
+                        output, self._size[0], self._size[1], bands, bits,
+                        sampleFormat, (self._extent[0], self._extent[3]),
+                        (self.resolution, self.resolution),
+                        _wkid(self._spatialReference))
+                elif layout != (bands, bits, sampleFormat):
+                    raise Exception("tile r%s_c%s has %s bands of %s bits, "
+                                    "unlike the first tile" % \
+                                    (tile[0], tile[1], bands, bits))
+                writer.write(tile[2], tile[3], rows)
+        finally:
+            if writer is not None:
+                writer.close()
+        self._world_file(output)
+        if not keep_tiles:
+            shutil.rmtree(folder)
+        if as_array:
+            bands, bits, sampleFormat = layout
+            dtype = "<%s%s" % ({1 : "u", 2 : "i", 3 : "f"}[sampleFormat],
+                               bits // 8)
+            return np.memmap(output, dtype=dtype, mode='r',
+                             offset=writer.dataOffset,
+                             shape=(self._size[1], self._size[0], bands))
+        return output
@@ -872,7 +872,7 @@ class FeatureLayer(BaseAGSServer):
             params['groupByFieldsForStatistics'] = groupByFieldsForStatistics
         if not statisticFilter is None and \
            isinstance(statisticFilter, filters.StatisticFilter):
-            params['outStatistics'] = statisticFilter.filter
+            params['outStatistics'] = json.dumps(statisticFilter.filter)
         fURL = self._url + "/query"
         results = self._post(fURL, params,
                                securityHandler=self._securityHandler,
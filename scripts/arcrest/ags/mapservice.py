@@ -1,7 +1,7 @@
 from __future__ import absolute_import
 from __future__ import print_function
+import os
 import json
-import time
 import tempfile
 from .._abstract.abstract import BaseAGSServer, DynamicData, BaseSecurityHandler
 from .layer import FeatureLayer, TableLayer, RasterLayer, GroupLayer
@@ -10,6 +10,9 @@ from ..security import security
 from ..common import filters, geometry
 from ..common.geometry import Polygon, Envelope, SpatialReference
 from ..common.general import Feature
+from ..web._download import DownloadManager
+from ..web._parallel import DEFAULT_WORKERS, parallel_map
+from ._tiledexport import TiledExport
 
 ########################################################################
 class MapService(BaseAGSServer):
@@ -844,13 +847,86 @@ class MapService(BaseAGSServer):
         else:
             return None
     #----------------------------------------------------------------------
+    def exportMapTiled(self,
+                       bbox,
+                       size,
+                       output,
+                       imageSR=None,
+                       dpi=96,
+                       layerDefFilter=None,
+                       layers=None,
+                       timeFilter=None,
+                       layerTimeOptions=None,
+                       dynamicLayers=None,
+                       tile_size=None,
+                       max_workers=DEFAULT_WORKERS,
+                       keep_tiles=False,
+                       as_array=False):
+        """
+           Exports a map image of any size.  The extent is split into
+           tiles no larger than maxImageWidth by maxImageHeight that are
+           exported at the same time and mosaicked into one RGB GeoTIFF
+           with a world file.  An interrupted export downloads only the
+           missing tiles when it is run again.
+           Inputs:
+            bbox - Envelope or [xmin, ymin, xmax, ymax] in imageSR
+            size - [width, height] of the whole image in pixels
+            output - path of the GeoTIFF to write
+            imageSR - spatial reference of the bbox and the image, the
+                      bbox's or the service's by default
+            dpi - dots per inch
+            layerDefFilter, layers, timeFilter, layerTimeOptions,
+            dynamicLayers - see exportMap
+            tile_size - optional largest tile side in pixels
+            max_workers - number of tiles exported at the same time
+            keep_tiles - keep the downloaded tiles next to the output
+            as_array - return a NumPy array (rows, columns, bands) of the
+                       mosaic instead of its path
+           Output:
+              path of the GeoTIFF, or a NumPy array
+        """
+        if imageSR is None and isinstance(bbox, Envelope):
+            imageSR = bbox.asDictionary['spatialReference']
+        if imageSR is None:
+            imageSR = self.spatialReference
+        params = {"dpi" : dpi}
+        if layerDefFilter is not None and \
+           isinstance(layerDefFilter,
+                      filters.LayerDefinitionFilter):
+            params['layerDefs'] = layerDefFilter.filter
+        if layers is not None:
+            params['layers'] = layers
+        if timeFilter is not None and \
+           isinstance(timeFilter, filters.TimeFilter):
+            params['time'] = timeFilter.filter
+        if layerTimeOptions is not None:
+            params['layerTimeOptions'] = layerTimeOptions
+        if dynamicLayers is not None and \
+           isinstance(dynamicLayers, DynamicData):
+            params['dynamicLayers'] = dynamicLayers.asDictionary
+        export = TiledExport(service=self,
+                             operation="export",
+                             params=params,
+                             extent=bbox,
+                             size=size,
+                             spatialReference=imageSR,
+                             image_format="bmp",
+                             tile_size=tile_size,
+                             max_workers=max_workers)
+        return export.run(output=output, keep_tiles=keep_tiles,
+                          as_array=as_array)
+    #----------------------------------------------------------------------
     def estimateExportTilesSize(self,
                                 exportBy,
                                 levels,
                                 tilePackage=False,
                                 exportExtent="DEFAULTEXTENT",
                                 areaOfInterest=None,
-                                async=True):
+                                async=True,
+                                timeout=None,
+                                interval=1.0,
+                                max_interval=30.0,
+                                progress=None):
         """
         The estimateExportTilesSize operation is an asynchronous task that
         allows estimation of the size of the tile package or the cache data
@@ -894,12 +970,18 @@ class MapService(BaseAGSServer):
              [-100,45],[-90,45],[-90,35],[-100,35]]],
              "spatialReference":{"wkid":4326}}}]}
         async - (optional) the estimate function is run asynchronously
-         requiring the tool status to be checked manually to force it to
-         run synchronously the tool will check the status until the
-         estimation completes.  The default is True, which means the status
-         of the job and results need to be checked manually.  If the value
-         is set to False, the function will wait until the task completes.
+         and its GPJob is returned at once; follow it with
+         job.whenDone(progress=...) or job.wait().  The default is True.
+         If the value is set to False, the function will wait until the
+         task completes.
            Values: True | False
+        timeout - (optional) seconds to wait for the job when async is
+         False before an exception is raised. The default waits for ever.
+        interval - (optional) first wait between job status checks in
+         seconds; the wait grows after each check up to max_interval.
+        max_interval - (optional) longest wait between job status checks.
+        progress - (optional) callable(status, messages) run after each job
+         status check.
         """
         url = self._url + "/estimateExportTilesSize"
         params = {
@@ -911,37 +993,16 @@ class MapService(BaseAGSServer):
         }
         params["levels"] = levels
         if not areaOfInterest is None:
-            if isinstance(areaOfInterest, Polygon):
-                template = { "features": [areaOfInterest.asDictionary]}
-                params['areaOfInterest'] = template
-            else:
-                params['areaOfInterest'] = areaOfInterest
+            params['areaOfInterest'] = self._areaOfInterest(areaOfInterest)
+        gpJob = self._submitTileJob(url=url, params=params)
         if async == True:
-            return self._get(url=url,
-                                param_dict=params,
-                                securityHandler=self._securityHandler,
-                                proxy_url=self._proxy_url,
-                                proxy_port=self._proxy_port)
+            return gpJob
         else:
-            exportJob = self._get(url=url,
-                                     param_dict=params,
-                                     securityHandler=self._securityHandler,
-                                     proxy_url=self._proxy_url,
-                                     proxy_port=self._proxy_port)
-            jobUrl = "%s/jobs/%s" % (url, exportJob['jobId'])
-            gpJob = GPJob(url=jobUrl,
-                          securityHandler=self._securityHandler,
-                          proxy_port=self._proxy_port,
-                          proxy_url=self._proxy_url)
-            status = gpJob.jobStatus
-            while status != "esriJobSucceeded":
-                if status in ['esriJobFailed',
-                              'esriJobCancelling',
-                              'esriJobCancelled']:
-                    return gpJob.messages
-                else:
-                    time.sleep(5)
-                    status = gpJob.jobStatus
+            status = gpJob.wait(timeout=timeout, interval=interval,
+                                max_interval=max_interval,
+                                progress=progress)
+            if status != "esriJobSucceeded":
+                return gpJob.messages
             return gpJob.results
     #----------------------------------------------------------------------
     def exportTiles(self,
@@ -952,7 +1013,13 @@ class MapService(BaseAGSServer):
                     optimizeTilesForSize=True,
                     compressionQuality=0,
                     areaOfInterest=None,
-                    async=False
+                    async=False,
+                    out_folder=None,
+                    max_workers=DEFAULT_WORKERS,
+                    timeout=None,
+                    interval=1.0,
+                    max_interval=30.0,
+                    progress=None
                     ):
         """
         The exportTiles operation is performed as an asynchronous task and
@@ -1027,9 +1094,24 @@ class MapService(BaseAGSServer):
         Example: { "features": [{"geometry":{"rings":[[[-100,35],
          [-100,45],[-90,45],[-90,35],[-100,35]]],
          "spatialReference":{"wkid":4326}}}]}
-        async - default True, this value ensures the returns are returned
-         to the user instead of the user having the check the job status
-         manually.
+        async - default False, waits for the job and downloads the
+         result.  If True, the GPJob is returned as soon as the job is
+         submitted, so progress can be followed without blocking:
+           job = ms.exportTiles(levels="1-5", tilePackage=True, async=True)
+           future = job.whenDone(progress=report)
+           files = ms.fetchTileResult(job, tilePackage=True)
+        out_folder - (optional) folder the tile package files are saved
+         in. The default is the temp folder.
+        max_workers - (optional) number of byte ranges of a tile package
+         downloaded at the same time. Interrupted downloads resume from
+         the ranges already saved.
+        timeout - (optional) seconds to wait for the job when async is
+         False before an exception is raised. The default waits for ever.
+        interval - (optional) first wait between job status checks in
+         seconds; the wait grows after each check up to max_interval.
+        max_interval - (optional) longest wait between job status checks.
+        progress - (optional) callable(status, messages) run after each job
+         status check.
         """
         params = {
             "f" : "json",
@@ -1041,60 +1123,153 @@ class MapService(BaseAGSServer):
             "levels" : levels
         }
         url = self._url + "/exportTiles"
-        if isinstance(areaOfInterest, Polygon):
-            geom = areaOfInterest.asDictionary()
-            template = { "features": [geom]}
-            params["areaOfInterest"] = template
+        if not areaOfInterest is None:
+            params["areaOfInterest"] = self._areaOfInterest(areaOfInterest)
+        gpJob = self._submitTileJob(url=url, params=params)
         if async == True:
-            return self._get(url=url, param_dict=params,
-                            proxy_url=self._proxy_url,
-                            proxy_port=self._proxy_port)
+            return gpJob
         else:
-            exportJob = self._get(url=url, param_dict=params,
-                                     securityHandler=self._securityHandler,
-                                     proxy_url=self._proxy_url,
-                                     proxy_port=self._proxy_port)
-            jobUrl = "%s/jobs/%s" % (url, exportJob['jobId'])
-            gpJob = GPJob(url=jobUrl,
+            status = gpJob.wait(timeout=timeout, interval=interval,
+                                max_interval=max_interval,
+                                progress=progress)
+            if status != "esriJobSucceeded":
+                return None
+            return self.fetchTileResult(gpJob=gpJob,
+                                        tilePackage=tilePackage,
+                                        out_folder=out_folder,
+                                        max_workers=max_workers)
+    #----------------------------------------------------------------------
+    def exportTilesMany(self,
+                        areasOfInterest,
+                        levels,
+                        exportBy="LevelID",
+                        tilePackage=False,
+                        optimizeTilesForSize=True,
+                        compressionQuality=0,
+                        max_jobs=4,
+                        out_folder=None,
+                        max_workers=DEFAULT_WORKERS,
+                        timeout=None,
+                        interval=1.0,
+                        max_interval=30.0,
+                        progress=None):
+        """
+        exports the tiles of several areas of interest as export jobs that
+        run at the same time.  The tile package of each area is saved in
+        its own area_<index> sub folder of out_folder.
+
+        Inputs:
+        areasOfInterest - list of geometry.Polygon objects or
+         areaOfInterest dictionaries, see exportTiles
+        levels, exportBy, tilePackage, optimizeTilesForSize,
+         compressionQuality - see exportTiles
+        max_jobs - (optional) number of export jobs run at the same time
+        out_folder - (optional) parent folder of the area folders. The
+         default is the temp folder.
+        max_workers - (optional) byte ranges of a tile package downloaded
+         at the same time
+        timeout, interval, max_interval - see exportTiles
+        progress - (optional) callable(index, status, messages) run after
+         each job status check of the area at index
+
+        Output:
+        list with the exportTiles result of each area, in the order of
+        areasOfInterest; None for an area whose job did not succeed, and
+        the exception for an area whose job could not be submitted, timed
+        out or failed to download.  One failed area does not discard the
+        packages of the others.
+        """
+        if out_folder is None:
+            out_folder = tempfile.gettempdir()
+        def export(item):
+            index, areaOfInterest = item
+            folder = os.path.join(out_folder, "area_%s" % index)
+            if tilePackage and not os.path.isdir(folder):
+                os.makedirs(folder)
+            report = None
+            if progress is not None:
+                report = lambda status, messages: \
+                    progress(index, status, messages)
+            try:
+                return self.exportTiles(levels=levels,
+                                        exportBy=exportBy,
+                                        tilePackage=tilePackage,
+                                        optimizeTilesForSize=optimizeTilesForSize,
+                                        compressionQuality=compressionQuality,
+                                        areaOfInterest=areaOfInterest,
+                                        async=False,
+                                        out_folder=folder,
+                                        max_workers=max_workers,
+                                        timeout=timeout,
+                                        interval=interval,
+                                        max_interval=max_interval,
+                                        progress=report)
+            except Exception as e:
+                return e
+        return parallel_map(export, list(enumerate(areasOfInterest)),
+                            max_workers=max_jobs)
+    #----------------------------------------------------------------------
+    def _areaOfInterest(self, areaOfInterest):
+        """ returns the areaOfInterest parameter value """
+        if isinstance(areaOfInterest, Polygon):
+            areaOfInterest = { "features": [
+                {"geometry" : areaOfInterest.asDictionary}]}
+        if isinstance(areaOfInterest, dict):
+            return json.dumps(areaOfInterest)
+        return areaOfInterest
+    #----------------------------------------------------------------------
+    def _submitTileJob(self, url, params):
+        """ submits an export tiles operation and returns its GPJob """
+        exportJob = self._get(url=url,
+                              param_dict=params,
+                              securityHandler=self._securityHandler,
+                              proxy_url=self._proxy_url,
+                              proxy_port=self._proxy_port)
+        if not 'jobId' in exportJob:
+            raise Exception("%s did not start a job: %s" % (url, exportJob))
+        return GPJob(url="%s/jobs/%s" % (url, exportJob['jobId']),
+                     securityHandler=self._securityHandler,
+                     proxy_port=self._proxy_port,
+                     proxy_url=self._proxy_url)
+    #----------------------------------------------------------------------
+    def fetchTileResult(self, gpJob, tilePackage=False, out_folder=None,
+                        max_workers=DEFAULT_WORKERS):
+        """
+        reads the out_service_url result of a finished export job and
+        downloads the tile package files
+
+        Inputs:
+        gpJob - succeeded GPJob returned by exportTiles with async=True
+        tilePackage, out_folder, max_workers - see exportTiles
+
+        Output:
+        list of the downloaded files, or the cache folders when
+        tilePackage is False
+        """
+        value = gpJob.results.get("out_service_url")
+        if value is None:
+            return None
+        if isinstance(value, dict):
+            value = value.get('value')
+        else:
+            value = value.value
+        params = {
+            "f" : "json"
+        }
+        gpRes = self._get(url=value,
+                          param_dict=params,
                           securityHandler=self._securityHandler,
-                          proxy_port=self._proxy_port,
-                          proxy_url=self._proxy_url)
-            status = gpJob.jobStatus
-            while status != "esriJobSucceeded":
-                if status in ['esriJobFailed',
-                                       'esriJobCancelling',
-                                       'esriJobCancelled']:
-                    return None
-                else:
-                    time.sleep(5)
-                    status = gpJob.jobStatus
-            allResults = gpJob.results
-            for k,v in allResults.items():
-                if k == "out_service_url":
-                    value = v['value']
-                    params = {
-                        "f" : "json"
-                    }
-                    gpRes = self._get(url=v['value'],
-                                         param_dict=params,
-                                         securityHandler=self._securityHandler,
-                                         proxy_url=self._proxy_url,
-                                         proxy_port=self._proxy_port)
-                    if tilePackage == True:
-                        files = []
-                        for f in gpRes['files']:
-                            name = f['name']
-                            dlURL = f['url']
-                            files.append(
-                                self._get(url=dlURL,
-                                          out_folder=tempfile.gettempdir(),
-                                          file_name=name,
-                                          param_dict=params,
-                                          securityHandler=self._securityHandler,
-                                          proxy_url=self._proxy_url,
-                                          proxy_port=self._proxy_port))
-                        return files
-                    else:
-                        return gpRes['folders']
-                else:
-                    return None
+                          proxy_url=self._proxy_url,
+                          proxy_port=self._proxy_port)
+        if tilePackage == False:
+            return gpRes['folders']
+        if out_folder is None:
+            out_folder = tempfile.gettempdir()
+        dm = DownloadManager(securityHandler=self._securityHandler,
+                             proxy_url=self._proxy_url,
+                             proxy_port=self._proxy_port,
+                             max_workers=max_workers)
+        return [dm.download(url=f['url'],
+                            out_folder=out_folder,
+                            file_name=f['name'])
+                for f in gpRes['files']]
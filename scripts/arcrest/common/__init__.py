@@ -5,4 +5,6 @@ from . import geometry
 from . import filters
 from . import servicedef
 from . import find
+from . import columnar
+from . import pbf
 __version__ = "3.5.3"
\ No newline at end of file
@@ -0,0 +1,655 @@
+"""
+   Column oriented feature set.  Attributes are kept as typed arrays keyed
+   by the fields of the feature set and geometries as coordinate arrays,
+   so large query results use a fraction of the memory of a list of
+   Feature objects.
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+import os
+import json
+import array
+try:
+    import arcpy
+    arcpyFound = True
+except:
+    arcpyFound = False
+try:
+    import numpy as np
+    numpyFound = True
+except:
+    numpyFound = False
+from .general import Feature, FeatureSet, _date_handler
+from .spatial import create_feature_class, insert_json_rows
+__version__ = "3.5.3"
+__all__ = ["Column", "ColumnarFeatureSet"]
+# array typecode for each numeric ArcGIS field type
+_FIELD_TYPECODES = {
+    "esriFieldTypeOID" : "l",
+    "esriFieldTypeInteger" : "l",
+    "esriFieldTypeSmallInteger" : "h",
+    "esriFieldTypeDouble" : "d",
+    "esriFieldTypeSingle" : "f",
+    "esriFieldTypeDate" : "d"
+}
+_PART_KEYS = {
+    "esriGeometryMultipoint" : "points",
+    "esriGeometryPolyline" : "paths",
+    "esriGeometryPolygon" : "rings"
+}
+########################################################################
+class Column(object):
+    """
+       A single attribute column.  Numeric, OID and date fields are
+       stored in an array.array with a null mask that is only allocated
+       once a null value is appended; other field types are stored in a
+       list.
+       Inputs:
+          field - field dictionary ({"name" : ..., "type" : ...})
+    """
+    _field = None
+    _typecode = None
+    _values = None
+    _nulls = None
+    #----------------------------------------------------------------------
+    def __init__(self, field):
+        """Constructor"""
+        self._field = field
+        self._typecode = _FIELD_TYPECODES.get(field.get('type'))
+        if self._typecode is None:
+            self._values = []
+        else:
+            self._values = array.array(self._typecode)
+    #----------------------------------------------------------------------
+    def __len__(self):
+        """returns the number of values"""
+        return len(self._values)
+    #----------------------------------------------------------------------
+    @property
+    def name(self):
+        """gets the field name"""
+        return self._field['name']
+    #----------------------------------------------------------------------
+    @property
+    def field(self):
+        """gets the field dictionary"""
+        return self._field
+    #----------------------------------------------------------------------
+    @property
+    def isNumeric(self):
+        """True if the values are stored in a typed array"""
+        return self._typecode is not None
+    #----------------------------------------------------------------------
+    def append(self, value):
+        """adds a value to the end of the column"""
+        if self._typecode is None:
+            self._values.append(value)
+            return
+        if value is None:
+            if self._nulls is None:
+                self._nulls = bytearray(len(self._values))
+            self._values.append(0)
+            self._nulls.append(1)
+            return
+        self._values.append(value)
+        if self._nulls is not None:
+            self._nulls.append(0)
+    #----------------------------------------------------------------------
+    def get(self, index):
+        """returns the value of a row"""
+        if self._nulls is not None and self._nulls[index] == 1:
+            return None
+        value = self._values[index]
+        if self._typecode == "d" and \
+           self._field.get('type') == "esriFieldTypeDate":
+            return int(value)
+        return value
+    #----------------------------------------------------------------------
+    @property
+    def values(self):
+        """
+           gets a copy of the values as a NumPy array if NumPy is
+           installed, else the underlying array.array or list.  Null
+           values are 0 in numeric columns; see nulls.  The NumPy array
+           is a copy because appends can move the array.array buffer.
+        """
+        if numpyFound:
+            if self._typecode is None:
+                return np.array(self._values, dtype=object)
+            kind = "f" if self._typecode in ("d", "f") else "i"
+            return np.frombuffer(self._values,
+                                 dtype="%s%s" % (kind, self._values.itemsize)).copy()
+        return self._values
+    #----------------------------------------------------------------------
+    @property
+    def nulls(self):
+        """gets a list of booleans, True where the value is null"""
+        if self._typecode is None:
+            return [v is None for v in self._values]
+        if self._nulls is None:
+            return [False] * len(self._values)
+        return [n == 1 for n in self._nulls]
+########################################################################
+class ColumnarFeatureSet(object):
+    """
+       A FeatureSet stored by column.
+
+       Attribute values live in one Column per field. Point geometries
+       are stored as x/y (and z/m) arrays. Multipoint, polyline and
+       polygon geometries are stored as flat coordinate arrays with two
+       offset arrays: partOffsets gives the first vertex of each part and
+       geometryOffsets the first part of each feature, so feature i owns
+       parts geometryOffsets[i] to geometryOffsets[i+1].
+
+       Rows can still be read as Feature objects (feature(i), iteration
+       or the features property); they are only built when asked for.
+    """
+    _fields = None
+    _columns = None
+    _count = None
+    _hasZ = None
+    _hasM = None
+    _geometryType = None
+    _spatialReference = None
+    _objectIdFieldName = None
+    _globalIdFieldName = None
+    _displayFieldName = None
+    _x = None
+    _y = None
+    _z = None
+    _m = None
+    _partOffsets = None
+    _geometryOffsets = None
+    #----------------------------------------------------------------------
+    def __init__(self,
+                 fields,
+                 hasZ=False,
+                 hasM=False,
+                 geometryType=None,
+                 spatialReference=None,
+                 displayFieldName=None,
+                 objectIdFieldName=None,
+                 globalIdFieldName=None):
+        """Constructor"""
+        self._fields = fields or []
+        self._columns = [Column(field) for field in self._fields]
+        self._count = 0
+        self._hasZ = hasZ
+        self._hasM = hasM
+        self._geometryType = geometryType
+        self._spatialReference = spatialReference
+        self._displayFieldName = displayFieldName
+        self._objectIdFieldName = objectIdFieldName
+        self._globalIdFieldName = globalIdFieldName
+        if geometryType is not None:
+            self._x = array.array("d")
+            self._y = array.array("d")
+            if hasZ:
+                self._z = array.array("d")
+            if hasM:
+                self._m = array.array("d")
+            if geometryType in _PART_KEYS:
+                self._partOffsets = array.array("l", [0])
+                self._geometryOffsets = array.array("l", [0])
+    #----------------------------------------------------------------------
+    def __len__(self):
+        """returns the number of features"""
+        return self._count
+    #----------------------------------------------------------------------
+    def __iter__(self):
+        """iterates over the rows as Feature objects"""
+        for index in range(self._count):
+            yield self.feature(index)
+    #----------------------------------------------------------------------
+    def __getitem__(self, index):
+        """returns a row as a Feature object"""
+        if index < 0:
+            index += self._count
+        if index < 0 or index >= self._count:
+            raise IndexError("feature index out of range")
+        return self.feature(index)
+    #----------------------------------------------------------------------
+    def __str__(self):
+        """returns object as string"""
+        return json.dumps(self.value, default=_date_handler)
+    #----------------------------------------------------------------------
+    def _append_vertex(self, vertex):
+        """adds a vertex from an Esri JSON coordinate list"""
+        self._x.append(vertex[0])
+        self._y.append(vertex[1])
+        position = 2
+        if self._z is not None:
+            self._z.append(vertex[position] if len(vertex) > position \
+                           and vertex[position] is not None else float('nan'))
+            position += 1
+        if self._m is not None:
+            self._m.append(vertex[position] if len(vertex) > position \
+                           and vertex[position] is not None else float('nan'))
+    #----------------------------------------------------------------------
+    def append(self, feature):
+        """
+           adds a feature
+           Inputs:
+              feature - Esri JSON feature dictionary or Feature object
+        """
+        if isinstance(feature, Feature):
+            feature = feature.asDictionary
+        attributes = feature.get('attributes', {})
+        for column in self._columns:
+            column.append(attributes.get(column.name))
+        if self._geometryType is not None:
+            geom = feature.get('geometry') or {}
+            key = _PART_KEYS.get(self._geometryType)
+            if key is None:
+                for key, values in (("x", self._x), ("y", self._y),
+                                    ("z", self._z), ("m", self._m)):
+                    if values is not None:
+                        value = geom.get(key)
+                        values.append(float('nan') if value is None else value)
+            else:
+                parts = geom.get(key) or []
+                if key == "points" and len(parts) > 0:
+                    parts = [parts]
+                for part in parts:
+                    for vertex in part:
+                        self._append_vertex(vertex)
+                    self._partOffsets.append(len(self._x))
+                self._geometryOffsets.append(len(self._partOffsets) - 1)
+        self._count += 1
+    #----------------------------------------------------------------------
+    def extend(self, features):
+        """adds an iterable of features"""
+        for feature in features:
+            self.append(feature)
+    #----------------------------------------------------------------------
+    def _vertex(self, index):
+        """returns a vertex as an Esri JSON coordinate list"""
+        vertex = [self._x[index], self._y[index]]
+        if self._z is not None:
+            vertex.append(self._z[index])
+        if self._m is not None:
+            vertex.append(self._m[index])
+        return vertex
+    #----------------------------------------------------------------------
+    def geometry(self, index):
+        """returns the Esri JSON geometry of a row"""
+        if self._geometryType is None:
+            return None
+        key = _PART_KEYS.get(self._geometryType)
+        if key is None:
+            x = self._x[index]
+            if x != x:
+                return None
+            geom = {"x" : x, "y" : self._y[index]}
+            if self._z is not None:
+                geom['z'] = self._z[index]
+            if self._m is not None:
+                geom['m'] = self._m[index]
+            return geom
+        first = self._geometryOffsets[index]
+        last = self._geometryOffsets[index + 1]
+        if first == last:
+            return None
+        parts = []
+        for part in range(first, last):
+            parts.append([self._vertex(v) for v in
+                          range(self._partOffsets[part],
+                                self._partOffsets[part + 1])])
+        if key == "points":
+            parts = parts[0]
+        return {key : parts}
+    #----------------------------------------------------------------------
+    def row(self, index):
+        """returns a row as an Esri JSON feature dictionary"""
+        feature = {"attributes" : dict((c.name, c.get(index))
+                                       for c in self._columns)}
+        geom = self.geometry(index)
+        if geom is not None:
+            feature['geometry'] = geom
+        return feature
+    #----------------------------------------------------------------------
+    def feature(self, index):
+        """returns a row as a Feature object"""
+        wkid = None
+        if isinstance(self._spatialReference, dict) and \
+           'latestWkid' in self._spatialReference:
+            wkid = self._spatialReference['latestWkid']
+        return Feature(json_string=self.row(index), wkid=wkid)
+    #----------------------------------------------------------------------
+    @property
+    def features(self):
+        """gets the rows as a list of Feature objects"""
+        return [self.feature(index) for index in range(self._count)]
+    #----------------------------------------------------------------------
+    def column(self, name):
+        """
+           returns a copy of the values of a field as a NumPy array, or
+           the array.array/list when NumPy is not installed
+        """
+        for column in self._columns:
+            if column.name == name:
+                return column.values
+        raise KeyError(name)
+    #----------------------------------------------------------------------
+    @property
+    def columns(self):
+        """gets the Column objects in field order"""
+        return self._columns
+    #----------------------------------------------------------------------
+    def _coordinates(self, values):
+        """returns a copy of a coordinate array as a NumPy array if available"""
+        if values is None or not numpyFound:
+            return values
+        return np.frombuffer(values, dtype="f8").copy()
+    #----------------------------------------------------------------------
+    @property
+    def x(self):
+        """gets the x coordinates (one per point or per vertex)"""
+        return self._coordinates(self._x)
+    #----------------------------------------------------------------------
+    @property
+    def y(self):
+        """gets the y coordinates (one per point or per vertex)"""
+        return self._coordinates(self._y)
+    #----------------------------------------------------------------------
+    @property
+    def z(self):
+        """gets the z coordinates, if the feature set has z values"""
+        return self._coordinates(self._z)
+    #----------------------------------------------------------------------
+    @property
+    def m(self):
+        """gets the m values, if the feature set has m values"""
+        return self._coordinates(self._m)
+    #----------------------------------------------------------------------
+    @property
+    def partOffsets(self):
+        """gets the index of the first vertex of each part"""
+        return self._partOffsets
+    #----------------------------------------------------------------------
+    @property
+    def geometryOffsets(self):
+        """gets the index of the first part of each feature"""
+        return self._geometryOffsets
+    #----------------------------------------------------------------------
+    @property
+    def fields(self):
+        """gets the feature set's fields"""
+        return self._fields
+    #----------------------------------------------------------------------
+    @property
+    def spatialReference(self):
+        """gets the feature set's spatial reference"""
+        return self._spatialReference
+    #----------------------------------------------------------------------
+    @property
+    def hasZ(self):
+        """gets the Z-property"""
+        return self._hasZ
+    #----------------------------------------------------------------------
+    @property
+    def hasM(self):
+        """gets the M-property"""
+        return self._hasM
+    #----------------------------------------------------------------------
+    @property
+    def geometryType(self):
+        """gets the geometry type"""
+        return self._geometryType
+    #----------------------------------------------------------------------
+    @property
+    def objectIdFieldName(self):
+        """gets the object id field"""
+        return self._objectIdFieldName
+    #----------------------------------------------------------------------
+    @property
+    def globalIdFieldName(self):
+        """gets the globalIdFieldName"""
+        return self._globalIdFieldName
+    #----------------------------------------------------------------------
+    @property
+    def displayFieldName(self):
+        """gets the displayFieldName"""
+        return self._displayFieldName
+    #----------------------------------------------------------------------
+    @property
+    def value(self):
+        """returns object as dictionary"""
+        return {
+            "objectIdFieldName" : self._objectIdFieldName,
+            "displayFieldName" : self._displayFieldName,
+            "globalIdFieldName" : self._globalIdFieldName,
+            "geometryType" : self._geometryType,
+            "spatialReference" : self._spatialReference,
+            "hasZ" : self._hasZ,
+            "hasM" : self._hasM,
+            "fields" : self._fields,
+            "features" : [self.row(index) for index in range(self._count)]
+        }
+    #----------------------------------------------------------------------
+    @property
+    def toJSON(self):
+        """converts the object to JSON"""
+        return str(self)
+    #----------------------------------------------------------------------
+    def toFeatureSet(self):
+        """converts the object to a FeatureSet of Feature objects"""
+        return FeatureSet(self._fields,
+                          self.features,
+                          hasZ=self._hasZ,
+                          hasM=self._hasM,
+                          geometryType=self._geometryType,
+                          spatialReference=self._spatialReference,
+                          displayFieldName=self._displayFieldName,
+                          objectIdFieldName=self._objectIdFieldName,
+                          globalIdFieldName=self._globalIdFieldName)
+    #----------------------------------------------------------------------
+    @staticmethod
+    def fromJSON(jsonValue):
+        """
+           returns a ColumnarFeatureSet from a JSON string or dictionary
+           of an Esri feature set
+        """
+        if isinstance(jsonValue, dict):
+            jd = jsonValue
+        else:
+            jd = json.loads(jsonValue)
+        fs = ColumnarFeatureSet(fields=jd.get('fields', []),
+                                hasZ=jd.get('hasZ', False),
+                                hasM=jd.get('hasM', False),
+                                geometryType=jd.get('geometryType'),
+                                spatialReference=jd.get('spatialReference'),
+                                displayFieldName=jd.get('displayFieldName'),
+                                objectIdFieldName=jd.get('objectIdFieldName'),
+                                globalIdFieldName=jd.get('globalIdFieldName'))
+        fs.extend(jd.get('features', []))
+        return fs
+    #----------------------------------------------------------------------
+    @staticmethod
+    def fromFeatureSet(featureSet):
+        """returns a ColumnarFeatureSet from a FeatureSet"""
+        fs = ColumnarFeatureSet(fields=featureSet.fields,
+                                hasZ=featureSet.hasZ,
+                                hasM=featureSet.hasM,
+                                geometryType=featureSet.geometryType,
+                                spatialReference=featureSet.spatialReference,
+                                displayFieldName=featureSet.displayFieldName,
+                                objectIdFieldName=featureSet.objectIdFieldName,
+                                globalIdFieldName=featureSet.globalIdFieldName)
+        fs.extend(featureSet.features)
+        return fs
+    #----------------------------------------------------------------------
+    def toNumPyArray(self):
+        """
+           returns the attributes as a NumPy structured array.  Point
+           feature sets also get SHAPE@X and SHAPE@Y columns, so the
+           array can be passed to arcpy.da.NumPyArrayToFeatureClass.
+           Date fields are returned as epoch milliseconds.
+        """
+        if numpyFound == False:
+            raise Exception("NumPy is required to use this function")
+        names = []
+        dtypes = []
+        data = []
+        for column in self._columns:
+            names.append(str(column.name))
+            if column.isNumeric:
+                values = column.values
+                if column._nulls is not None and \
+                   values.dtype.kind == "f":
+                    values = np.where(np.frombuffer(column._nulls, dtype="u1") == 1,
+                                      np.nan, values)
+                dtypes.append(values.dtype)
+            else:
+                strings = ["" if v is None else v for v in column._values]
+                width = max([len(v) for v in strings] + [1])
+                values = np.array(strings, dtype="U%s" % width)
+                dtypes.append(values.dtype)
+            data.append(values)
+        if self._geometryType == "esriGeometryPoint":
+            for name, values in (("SHAPE@X", self.x), ("SHAPE@Y", self.y)):
+                names.append(name)
+                dtypes.append(values.dtype)
+                data.append(values)
+        result = np.empty(self._count, dtype=list(zip(names, dtypes)))
+        for name, values in zip(names, data):
+            result[name] = values
+        return result
+    #----------------------------------------------------------------------
+    @staticmethod
+    def fromNumPyArray(values, geometryType=None, spatialReference=None,
+                       objectIdFieldName=None):
+        """
+           returns a ColumnarFeatureSet from a NumPy structured array, such
+           as the output of arcpy.da.FeatureClassToNumPyArray.  SHAPE@X and
+           SHAPE@Y columns become point geometries.
+        """
+        if numpyFound == False:
+            raise Exception("NumPy is required to use this function")
+        kinds = {"i" : "esriFieldTypeInteger", "u" : "esriFieldTypeInteger",
+                 "f" : "esriFieldTypeDouble", "M" : "esriFieldTypeDate"}
+        names = [n for n in values.dtype.names
+                 if n not in ("SHAPE@X", "SHAPE@Y", "SHAPE@XY")]
+        fields = []
+        for name in names:
+            kind = values.dtype[name].kind
+            ftype = kinds.get(kind, "esriFieldTypeString")
+            if name == objectIdFieldName:
+                ftype = "esriFieldTypeOID"
+            fields.append({"name" : name, "type" : ftype})
+        hasXY = "SHAPE@X" in values.dtype.names and \
+                "SHAPE@Y" in values.dtype.names
+        if hasXY and geometryType is None:
+            geometryType = "esriGeometryPoint"
+        fs = ColumnarFeatureSet(fields=fields,
+                                geometryType=geometryType if hasXY else None,
+                                spatialReference=spatialReference,
+                                objectIdFieldName=objectIdFieldName)
+        for row in values:
+            attributes = {}
+            for field in fields:
+                value = row[field['name']]
+                if field['type'] == "esriFieldTypeDate":
+                    value = int(value.astype('datetime64[ms]').astype('i8'))
+                elif hasattr(value, 'item'):
+                    value = value.item()
+                attributes[field['name']] = value
+            feature = {"attributes" : attributes}
+            if hasXY:
+                feature['geometry'] = {"x" : float(row["SHAPE@X"]),
+                                       "y" : float(row["SHAPE@Y"])}
+            fs.append(feature)
+        return fs
+    #----------------------------------------------------------------------
+    @staticmethod
+    def fromFeatureClass(dataset):
+        """
+           reads a feature class or table into a ColumnarFeatureSet
+           without creating Feature objects
+        """
+        if arcpyFound == False:
+            raise Exception("ArcPy is required to use this function")
+        desc = arcpy.Describe(dataset)
+        fieldTypes = {"OID" : "esriFieldTypeOID",
+                      "Integer" : "esriFieldTypeInteger",
+                      "SmallInteger" : "esriFieldTypeSmallInteger",
+                      "Double" : "esriFieldTypeDouble",
+                      "Single" : "esriFieldTypeSingle",
+                      "Date" : "esriFieldTypeDate",
+                      "GUID" : "esriFieldTypeGUID",
+                      "GlobalID" : "esriFieldTypeGlobalID"}
+        geometryTypes = {"Point" : "esriGeometryPoint",
+                         "Multipoint" : "esriGeometryMultipoint",
+                         "Polyline" : "esriGeometryPolyline",
+                         "Polygon" : "esriGeometryPolygon"}
+        fields = [{"name" : f.name,
+                   "type" : fieldTypes.get(f.type, "esriFieldTypeString")}
+                  for f in arcpy.ListFields(dataset)
+                  if f.type not in ('Geometry', 'Blob', 'Raster')]
+        names = [f['name'] for f in fields]
+        dateFields = [f['name'] for f in fields
+                      if f['type'] == "esriFieldTypeDate"]
+        geometryType = None
+        spatialReference = None
+        cursorFields = list(names)
+        if hasattr(desc, "shapeFieldName"):
+            geometryType = geometryTypes.get(desc.shapeType)
+            spatialReference = {"wkid" : desc.spatialReference.factoryCode}
+            cursorFields.append("SHAPE@JSON")
+        fs = ColumnarFeatureSet(fields=fields,
+                                hasZ=getattr(desc, 'hasZ', False),
+                                hasM=getattr(desc, 'hasM', False),
+                                geometryType=geometryType,
+                                spatialReference=spatialReference,
+                                objectIdFieldName=getattr(desc, 'OIDFieldName', None))
+        with arcpy.da.SearchCursor(dataset, cursorFields) as rows:
+            for row in rows:
+                attributes = dict(zip(names, row))
+                for name in dateFields:
+                    if attributes[name] is not None:
+                        attributes[name] = _date_handler(attributes[name])
+                feature = {"attributes" : attributes}
+                if geometryType is not None and row[-1] is not None:
+                    feature['geometry'] = json.loads(row[-1])
+                fs.append(feature)
+        return fs
+    #----------------------------------------------------------------------
+    def save(self, saveLocation, outName):
+        """
+        Saves the feature set to a feature class or table
+        Input:
+           saveLocation - output location of the data
+           outName - name of the table the data will be saved to
+        """
+        if arcpyFound == False:
+            raise Exception("ArcPy is required to use this function")
+        out_fc = os.path.join(saveLocation, outName)
+        sr = self._spatialReference or {}
+        wkid = sr.get('latestWkid', sr.get('wkid'))
+        if numpyFound and self._geometryType in (None, "esriGeometryPoint") \
+           and len(self._fields) > 0:
+            values = self.toNumPyArray()
+            if self._objectIdFieldName in values.dtype.names:
+                keep = [n for n in values.dtype.names
+                        if n != self._objectIdFieldName]
+                values = values[keep]
+            if self._geometryType is None:
+                arcpy.da.NumPyArrayToTable(values, out_fc)
+            else:
+                arcpy.da.NumPyArrayToFeatureClass(values, out_fc,
+                                                  ("SHAPE@X", "SHAPE@Y"),
+                                                  arcpy.SpatialReference(wkid or 4326))
+            return out_fc
+        fc, field_names = create_feature_class(out_path=saveLocation,
+                                               out_name=outName,
+                                               geom_type=self._geometryType,
+                                               wkid=wkid or 4326,
+                                               fields=self._fields,
+                                               objectIdField=self._objectIdFieldName)
+        dateFields = [f['name'] for f in self._fields
+                      if f['type'] == "esriFieldTypeDate"]
+        insert_json_rows(fc=fc,
+                         features=(self.row(i) for i in range(self._count)),
+                         fields=field_names,
+                         date_fields=dateFields)
+        return fc
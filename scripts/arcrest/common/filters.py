@@ -14,12 +14,12 @@ class StatisticFilter(BaseFilter):
     The definitions for one or more field-based statistics to be calculated
     """
     _json = None
-    _array = []
+    _array = None
 
     #----------------------------------------------------------------------
     def __init__(self):
         """Constructor"""
-        pass
+        self._array = []
     #----------------------------------------------------------------------
     def add(self, statisticType, onStatisticField, outStatisticFieldName=None):
         """
@@ -47,7 +47,7 @@ class StatisticFilter(BaseFilter):
     #----------------------------------------------------------------------
     def remove(self, index):
         """removes the filter by index"""
-        self._array.remove(index)
+        del self._array[index]
     #----------------------------------------------------------------------
     def clear(self):
         """removes all the filters"""
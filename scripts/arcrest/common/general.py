@@ -16,7 +16,7 @@ from .spatial import json_to_featureclass
 from .geometry import Point, MultiPoint, Polygon, Polyline, SpatialReference
 from .._abstract.abstract import AbstractGeometry
 __all__ = ['_unicode_convert', "Feature", "FeatureSet",
-           "_date_handler", "local_time_to_online",
+           "_date_handler", "local_time_to_online", "local_time_to_epoch",
            "online_time_to_string", "timestamp_to_datetime",
            "MosaicRuleObject"]
 def _unicode_convert(obj):
@@ -52,6 +52,19 @@ def local_time_to_online(dt=None):
 
     return (time.mktime(dt.timetuple())  * 1000) + (utc_offset *1000)
 #----------------------------------------------------------------------
+def local_time_to_epoch(dt):
+    """
+       converts a naive datetime in the local time zone, as read from an
+       arcpy cursor, to UTC epoch milliseconds.  Unlike
+       local_time_to_online, no UTC offset is added: mktime already
+       converts local time to UTC.
+       Inputs:
+          dt - datetime object
+       Output:
+          Long value
+    """
+    return int(time.mktime(dt.timetuple())) * 1000 + dt.microsecond // 1000
+#----------------------------------------------------------------------
 def online_time_to_string(value,timeFormat):
     """
        Converts a timestamp to date/time string
@@ -81,6 +94,8 @@ class Feature(object):
     _geom = None
     _geomType = None
     _attributes = None
+    _fields = None
+    _fieldSet = None
     _wkid = None
     #----------------------------------------------------------------------
     def __init__(self, json_string, wkid=None):
@@ -90,24 +105,35 @@ class Feature(object):
             if not wkid is None:
                 if 'geometry' in json_string and 'spatialReference' in json_string['geometry']:
                     json_string['geometry']['spatialReference']  = {"wkid" : wkid}
-            self._json = json.dumps(json_string,
-                                    default=_date_handler)
             self._dict = json_string
         elif type(json_string) is str:
             self._dict = json.loads(json_string)
             if not wkid is None:
                 self._dict['geometry']['spatialReference']  = {"wkid" : wkid}
-            self._json = json.dumps(self._dict,
-                                    default=_date_handler)
+            self._json = json_string if wkid is None else None
         else:
             raise TypeError("Invalid Input, only dictionary or string allowed")
     #----------------------------------------------------------------------
+    def _changed(self, geometry=False):
+        """
+           drops the cached values after the feature was modified.  The
+           JSON string is only built again when it is asked for.
+        """
+        self._json = None
+        self._fields = None
+        self._fieldSet = None
+        if geometry:
+            self._geom = None
+            self._geomType = None
+    #----------------------------------------------------------------------
     def set_value(self, field_name, value):
         """ sets an attribute value for a given field name """
-        if field_name in self.fields:
+        if self._fieldSet is None:
+            self._fieldSet = frozenset(self.fields)
+        if field_name in self._fieldSet:
             if not value is None:
-                self._dict['attributes'][field_name] = _unicode_convert(value)
-                self._json = json.dumps(self._dict, default=_date_handler)
+                self._attributes[field_name] = _unicode_convert(value)
+                self._json = None
             else:
                 pass
         elif field_name.upper() in ['SHAPE', 'SHAPE@', "GEOMETRY"]:
@@ -131,7 +157,7 @@ class Feature(object):
                     }
                 else:
                     return False
-                self._json = json.dumps(self._dict, default=_date_handler)
+                self._changed(geometry=True)
             elif arcpyFound and isinstance(value, arcpy.Geometry):
                 if isinstance(value, arcpy.PointGeometry):
                     self.set_value( field_name, Point(value,value.spatialReference.factoryCode))
@@ -150,26 +176,33 @@ class Feature(object):
     #----------------------------------------------------------------------
     def get_value(self, field_name):
         """ returns a value for a given field name """
-        if field_name in self.fields:
-            return self._dict['attributes'][field_name]
+        if self._fieldSet is None:
+            self._fieldSet = frozenset(self.fields)
+        if field_name in self._fieldSet:
+            return self._attributes[field_name]
         elif field_name.upper() in ['SHAPE', 'SHAPE@', "GEOMETRY"]:
             return self._dict['geometry']
         return None
     #----------------------------------------------------------------------
     @property
     def asDictionary(self):
-        """returns the feature as a dictionary"""
-        feat_dict = {}
-        if self._geom is not None:
-            if self._dict.has_key('feature'):
-                feat_dict['geometry'] =  self._dict['feature']['geometry']
-            elif self._dict.has_key('geometry'):
-                feat_dict['geometry'] =  self._dict['geometry']
-        if self._dict.has_key("feature"):
-            feat_dict['attributes'] = self._dict['feature']['attributes']
-        else:
-            feat_dict['attributes'] = self._dict['attributes']
-        return self._dict
+        """
+           returns the feature as a new dictionary.  A {"feature" : {...}}
+           payload is unwrapped to its attributes and geometry.  The
+           attributes are copied, but the geometry dictionary is the one
+           the feature holds; use set_value to edit the feature.
+        """
+        feature = self._dict.get('feature', self._dict)
+        feat_dict = dict(feature)
+        feat_dict['attributes'] = dict(feature['attributes'])
+        return feat_dict
+    #----------------------------------------------------------------------
+    @property
+    def toJSON(self):
+        """returns the feature as a JSON string, built on first use"""
+        if self._json is None:
+            self._json = json.dumps(self._dict, default=_date_handler)
+        return self._json
     #----------------------------------------------------------------------
     @property
     def asRow(self):
@@ -178,12 +211,8 @@ class Feature(object):
                [row items], [field names]
                returns a list of fields and the row object
         """
-        fields = self.fields
-        row = [""] * len(fields)
-        for k,v in self._attributes.items():
-            row[fields.index(k)] = v
-            del v
-            del k
+        fields = list(self.fields)
+        row = [self._attributes[k] for k in fields]
         if self.geometry is not None:
             row.append(self.geometry)
             fields.append("SHAPE@")
@@ -208,11 +237,13 @@ class Feature(object):
     @property
     def fields(self):
         """ returns a list of feature fields """
-        if self._dict.has_key("feature"):
-            self._attributes = self._dict['feature']['attributes']
-        else:
-            self._attributes = self._dict['attributes']
-        return self._attributes.keys()
+        if self._fields is None:
+            if self._dict.has_key("feature"):
+                self._attributes = self._dict['feature']['attributes']
+            else:
+                self._attributes = self._dict['attributes']
+            self._fields = list(self._attributes.keys())
+        return self._fields
     #----------------------------------------------------------------------
     @property
     def geometryType(self):
@@ -263,7 +294,7 @@ class Feature(object):
     #----------------------------------------------------------------------
     def __str__(self):
         """"""
-        return json.dumps(self.asDictionary)
+        return self.toJSON
 
 ########################################################################
 class MosaicRuleObject(object):
@@ -1,6 +1,7 @@
 from __future__ import absolute_import
 from __future__ import print_function
 import json
+import array
 try:
     import arcpy
     arcpyFound = True
@@ -16,6 +17,18 @@ def _date_handler(obj):
         return local_time_to_online(obj)
     else:
         return obj
+_NAN = float('nan')
+#----------------------------------------------------------------------
+def _sr_values(value, wkid=None, wkt=None):
+    """
+       returns the (wkid, wkt) of an Esri JSON geometry dictionary, falling
+       back to the given values when it has no spatialReference
+    """
+    sr = value.get('spatialReference') or {}
+    if wkid is None and wkt is None:
+        wkid = sr.get('wkid', sr.get('latestWkid'))
+        wkt = sr.get('wkt')
+    return wkid, wkt
 ########################################################################
 class SpatialReference(abstract.AbstractGeometry):
     """ creates a spatial reference instance """
@@ -64,32 +77,32 @@ class SpatialReference(abstract.AbstractGeometry):
 class Point(abstract.AbstractGeometry):
     """ Point Geometry
         Inputs:
-           coord - list of [X,Y] pair or arcpy.Point Object
+           coord - list of [X,Y] pair, Esri JSON point dictionary or
+                   arcpy.Point Object
            wkid - well know id of spatial references
            z - is the Z coordinate value
            m - m value
     """
-    _x = None
-    _y = None
-    _z = None
-    _m = None
-    _wkid = None
-    _wkt = None
-    _json = None
-    _geom = None
-    _dict = None
+    __slots__ = ("_x", "_y", "_z", "_m", "_wkid", "_wkt", "_json")
     #----------------------------------------------------------------------
     def __init__(self, coord, wkid=None, wkt=None, z=None, m=None):
         """Constructor"""
-        if isinstance(coord, list):
+        self._x = self._y = self._z = self._m = None
+        self._json = None
+        if isinstance(coord, (list, tuple)):
             self._x = float(coord[0])
             self._y = float(coord[1])
+        elif isinstance(coord, dict):
+            self._x = coord.get('x')
+            self._y = coord.get('y')
+            self._z = coord.get('z')
+            self._m = coord.get('m')
+            wkid, wkt = _sr_values(coord, wkid, wkt)
         elif arcpyFound and isinstance(coord, arcpy.Geometry):
             self._x = coord.centroid.X
             self._y = coord.centroid.Y
             self._z = coord.centroid.Z
             self._m = coord.centroid.M
-            self._geom = coord.centroid
 
         self._wkid = wkid
         self._wkt = wkt
@@ -144,7 +157,7 @@ class Point(abstract.AbstractGeometry):
         if not self._z is None:
             template['z'] = self._z
         if not self._m is None:
-            template['z'] = self._m
+            template['m'] = self._m
         return template
     #----------------------------------------------------------------------
     @property
@@ -153,7 +166,7 @@ class Point(abstract.AbstractGeometry):
         base = [self._x, self._y]
         if not self._z is None:
             base.append(self._z)
-        elif not self._m is None:
+        if not self._m is None:
             base.append(self._m)
         return base
     #----------------------------------------------------------------------
@@ -168,6 +181,7 @@ class Point(abstract.AbstractGeometry):
         if isinstance(value, (int, float,
                               long, types.NoneType)):
             self._x = value
+            self._json = None
     #----------------------------------------------------------------------
     @property
     def Y(self):
@@ -180,6 +194,7 @@ class Point(abstract.AbstractGeometry):
         if isinstance(value, (int, float,
                               long, types.NoneType)):
             self._y = value
+            self._json = None
     #----------------------------------------------------------------------
     @property
     def Z(self):
@@ -192,6 +207,20 @@ class Point(abstract.AbstractGeometry):
         if isinstance(value, (int, float,
                               long, types.NoneType)):
             self._z = value
+            self._json = None
+    #----------------------------------------------------------------------
+    @property
+    def M(self):
+        """ gets the M value """
+        return self._m
+    #----------------------------------------------------------------------
+    @M.setter
+    def M(self, value):
+        """ sets the M value """
+        if isinstance(value, (int, float,
+                              long, types.NoneType)):
+            self._m = value
+            self._json = None
     #----------------------------------------------------------------------
     @property
     def wkid(self):
@@ -204,6 +233,7 @@ class Point(abstract.AbstractGeometry):
         if isinstance(value, (int,
                               long)):
             self._wkid = value
+            self._json = None
     #----------------------------------------------------------------------
     @property
     def wkt(self):
@@ -213,42 +243,206 @@ class Point(abstract.AbstractGeometry):
     def wkt(self, wkt):
         """ get/set the wkt """
         self._wkt = wkt
+        self._json = None
 ########################################################################
-class MultiPoint(abstract.AbstractGeometry):
-    """ Implements the ArcGIS JSON MultiPoint Geometry Object """
-    _geom = None
-    _json = None
-    _dict = None
-    _wkid = None
-    _wkt = None
-    _points = None
-    _hasZ = False
-    _hasM = False
+class _Multipart(abstract.AbstractGeometry):
+    """
+       Base class for the multipart geometries.  The vertices of all parts
+       are kept in flat array.array('d') coordinate arrays (z and m arrays
+       are only allocated when the geometry has them) and the parts are
+       described by an offsets array: part i spans
+       offsets[i]:offsets[i + 1].  The spatial reference is stored once on
+       the geometry instead of on every vertex.
+       Inputs:
+          parts - list of parts, each a list of [x,y,<z>,<m>] coordinates
+                  or Point objects, an Esri JSON geometry dictionary or an
+                  arcpy geometry
+          wkid - well know spatial reference id
+          wkt - spatial reference well known text
+          hasZ - boolean - vertices carry z values
+          hasM - boolean - vertices carry m values
+    """
+    __slots__ = ("_x", "_y", "_z", "_m", "_offsets",
+                 "_wkid", "_wkt", "_hasZ", "_hasM")
+    _partKey = None
+    _arcpyType = None
     #----------------------------------------------------------------------
-    def __init__(self, points, wkid=None, wkt=None, hasZ=False, hasM=False):
+    def __init__(self, parts, wkid=None, wkt=None, hasZ=False, hasM=False):
         """Constructor"""
-        if isinstance(points, list):
-            self._points = points
-        elif arcpyFound and isinstance(points, arcpy.Geometry):
-            self._points = self.__geomToPointList(points)
         self._wkid = wkid
         self._wkt = wkt
-        self._hasZ = hasZ
-        self._hasM = hasM
-    #----------------------------------------------------------------------
-    def __geomToPointList(self, geom):
-        """ converts a geometry object to a common.Geometry object """
-        if arcpyFound and isinstance(geom, arcpy.Multipoint):
-            feature_geom = []
-            fPart = []
-            for part in geom:
-                fPart = []
-                for pnt in part:
-                    fPart.append(Point(coord=[pnt.X, pnt.Y],
-                          wkid=geom.spatialReference.factoryCode,
-                          z=pnt.Z, m=pnt.M))
-                feature_geom.append(fPart)
-            return feature_geom
+        self._hasZ = bool(hasZ)
+        self._hasM = bool(hasM)
+        if arcpyFound and isinstance(parts, arcpy.Geometry):
+            sr = parts.spatialReference
+            if sr is not None and sr.factoryCode:
+                self._wkid = sr.factoryCode
+            parts = json.loads(parts.JSON)
+        if isinstance(parts, dict):
+            self._wkid, self._wkt = _sr_values(parts, self._wkid, self._wkt)
+            self._hasZ = self._hasZ or bool(parts.get('hasZ', False))
+            self._hasM = self._hasM or bool(parts.get('hasM', False))
+            parts = parts.get(self._partKey) or []
+        self._load(parts)
+    #----------------------------------------------------------------------
+    def _load(self, parts):
+        """fills the coordinate and offset arrays from a list of parts"""
+        xs = array.array('d')
+        ys = array.array('d')
+        offsets = array.array('l', [0])
+        flagged = self._hasZ or self._hasM
+        for part in parts:
+            if len(part) == 0:
+                continue
+            first = part[0]
+            if isinstance(first, Point):
+                self._hasZ = self._hasZ or first.Z is not None
+                self._hasM = self._hasM or first.M is not None
+            elif len(first) > 2 and not flagged:
+                # Esri JSON treats an unflagged third ordinate as z
+                self._hasZ = True
+        zs = array.array('d') if self._hasZ else None
+        ms = array.array('d') if self._hasM else None
+        zIndex = 2
+        mIndex = 3 if self._hasZ else 2
+        for part in parts:
+            if zs is None and ms is None and \
+               not any(isinstance(pt, Point) for pt in part[:1]):
+                xs.extend([pt[0] for pt in part])
+                ys.extend([pt[1] for pt in part])
+            else:
+                for pt in part:
+                    if isinstance(pt, Point):
+                        x, y, z, m = pt.X, pt.Y, pt.Z, pt.M
+                    else:
+                        n = len(pt)
+                        x, y = pt[0], pt[1]
+                        z = pt[zIndex] if n > zIndex else None
+                        m = pt[mIndex] if n > mIndex else None
+                    xs.append(x)
+                    ys.append(y)
+                    if zs is not None:
+                        zs.append(_NAN if z is None else z)
+                    if ms is not None:
+                        ms.append(_NAN if m is None else m)
+            offsets.append(len(xs))
+        self._x = xs
+        self._y = ys
+        self._z = zs
+        self._m = ms
+        self._offsets = offsets
+    #----------------------------------------------------------------------
+    def __str__(self):
+        """ returns the object as a string """
+        return self.asJSON
+    #----------------------------------------------------------------------
+    def getPart(self, index):
+        """
+           returns a part as a list of [x,y,<z>,<m>] coordinates
+           Inputs:
+              index - part index
+        """
+        start = self._offsets[index]
+        end = self._offsets[index + 1]
+        columns = [self._x[start:end], self._y[start:end]]
+        if self._z is None and self._m is None:
+            return [[x, y] for x, y in zip(*columns)]
+        if self._z is not None:
+            columns.append(self._z[start:end])
+        if self._m is not None:
+            columns.append(self._m[start:end])
+        # missing z/m values are stored as NaN and written back as null
+        return [[v if v == v else None for v in coord]
+                for coord in zip(*columns)]
+    #----------------------------------------------------------------------
+    def iterPoints(self, part=None):
+        """
+           yields the vertices as Point objects sharing the geometry's
+           spatial reference
+           Inputs:
+              part - optional part index, all parts are used when None
+        """
+        if part is None:
+            start, end = 0, len(self._x)
+        else:
+            start, end = self._offsets[part], self._offsets[part + 1]
+        for i in range(start, end):
+            z = m = None
+            if self._z is not None and self._z[i] == self._z[i]:
+                z = self._z[i]
+            if self._m is not None and self._m[i] == self._m[i]:
+                m = self._m[i]
+            yield Point(coord=[self._x[i], self._y[i]],
+                        wkid=self._wkid, wkt=self._wkt, z=z, m=m)
+    #----------------------------------------------------------------------
+    @property
+    def parts(self):
+        """returns the parts as lists of [x,y,<z>,<m>] coordinates"""
+        return [self.getPart(i) for i in range(len(self._offsets) - 1)]
+    #----------------------------------------------------------------------
+    @property
+    def partCount(self):
+        """returns the number of parts"""
+        return len(self._offsets) - 1
+    #----------------------------------------------------------------------
+    @property
+    def pointCount(self):
+        """returns the number of vertices in all parts"""
+        return len(self._x)
+    #----------------------------------------------------------------------
+    @property
+    def partOffsets(self):
+        """returns the array of part start offsets"""
+        return self._offsets
+    #----------------------------------------------------------------------
+    @property
+    def x(self):
+        """returns the x coordinate array"""
+        return self._x
+    #----------------------------------------------------------------------
+    @property
+    def y(self):
+        """returns the y coordinate array"""
+        return self._y
+    #----------------------------------------------------------------------
+    @property
+    def z(self):
+        """returns the z coordinate array or None"""
+        return self._z
+    #----------------------------------------------------------------------
+    @property
+    def m(self):
+        """returns the m value array or None"""
+        return self._m
+    #----------------------------------------------------------------------
+    @property
+    def hasZ(self):
+        """returns True if the vertices have z values"""
+        return self._hasZ
+    #----------------------------------------------------------------------
+    @property
+    def hasM(self):
+        """returns True if the vertices have m values"""
+        return self._hasM
+    #----------------------------------------------------------------------
+    @property
+    def extent(self):
+        """returns the bounding Envelope of the geometry"""
+        if len(self._x) == 0:
+            return None
+        return Envelope(xmin=min(self._x), ymin=min(self._y),
+                        xmax=max(self._x), ymax=max(self._y),
+                        wkid=self._wkid, wkt=self._wkt)
+    #----------------------------------------------------------------------
+    @property
+    def wkid(self):
+        """ gets the wkid """
+        return self._wkid
+    #----------------------------------------------------------------------
+    @property
+    def wkt(self):
+        """ gets the wkt """
+        return self._wkt
     #----------------------------------------------------------------------
     @property
     def spatialReference(self):
@@ -259,23 +453,14 @@ class MultiPoint(abstract.AbstractGeometry):
             return {"wkid": self._wkid}
     #----------------------------------------------------------------------
     @property
-    def type(self):
-        """ returns the geometry type """
-        return "esriGeometryMultipoint"
-    #----------------------------------------------------------------------
-    @property
     def asJSON(self):
         """ returns a geometry as JSON """
-        value = self._json
-        if value is None:
-            value = json.dumps(self.asDictionary,
-                               default=_date_handler)
-            self._json = value
-        return self._json
+        return json.dumps(self.asDictionary,
+                          default=_date_handler)
     #----------------------------------------------------------------------
     @property
     def asArcPyObject(self):
-        """ returns the Point as an ESRI arcpy.MultiPoint object """
+        """ returns the geometry as an ESRI arcpy geometry object """
         if arcpyFound == False:
             raise Exception("ArcPy is required to use this function")
         return arcpy.AsShape(self.asDictionary, True)
@@ -283,233 +468,110 @@ class MultiPoint(abstract.AbstractGeometry):
     @property
     def asDictionary(self):
         """ returns the object as a python dictionary """
-        #
-        value = self._dict
-        if value is None:
-            template = {
-                "hasM" : self._hasM,
-                "hasZ" : self._hasZ,
-                "points" : [],
-                "spatialReference" : self.spatialReference
-            }
-            for pt in self._points:
-                template['points'].append(pt.asList)
-            self._dict = template
-        return self._dict
+        return {
+            "hasM" : self._hasM,
+            "hasZ" : self._hasZ,
+            self._partKey : self.parts,
+            "spatialReference" : self.spatialReference
+        }
 ########################################################################
-class Polyline(abstract.AbstractGeometry):
-    """ Implements the ArcGIS REST API Polyline Object
+class MultiPoint(_Multipart):
+    """ Implements the ArcGIS JSON MultiPoint Geometry Object
         Inputs:
-           paths - list - list of lists of Point objects
+           points - list of Point objects or [x,y,<z>,<m>] coordinates,
+                    an Esri JSON multipoint dictionary or an
+                    arcpy.Multipoint
            wkid - integer - well know spatial reference id
            hasZ - boolean -
            hasM - boolean -
     """
-    _paths = None
-    _wkid = None
-    _wkt = None
-    _json = None
-    _dict = None
-    _geom = None
-    _hasZ = None
-    _hasM = None
+    __slots__ = ()
+    _partKey = "points"
     #----------------------------------------------------------------------
-    def __init__(self, paths, wkid=None,wkt=None, hasZ=False, hasM=False):
+    def __init__(self, points, wkid=None, wkt=None, hasZ=False, hasM=False):
         """Constructor"""
-        if isinstance(paths, list):
-            self._paths = paths
-        elif arcpyFound and isinstance(paths, arcpy.Geometry):
-            self._paths = self.__geomToPointList(paths)
-        self._wkid = wkid
-        self._wkt = wkt
-        self._hasM = hasM
-        self._hasZ = hasZ
-    #----------------------------------------------------------------------
-    def __geomToPointList(self, geom):
-        """ converts a geometry object to a common.Geometry object """
-        if arcpyFound and isinstance(geom, arcpy.Polyline):
-            feature_geom = []
-            fPart = []
-            wkt = None
-            wkid = None
-            for part in geom:
-                fPart = []
-                for pnt in part:
-                    if geom.spatialReference is None:
-                        if self._wkid is None and self._wkt is not None:
-                            wkt = self._wkt
-                        else:
-                            wkid = self._wkid
-                    else:
-                        wkid = geom.spatialReference.factoryCode
-                    fPart.append(Point(coord=[pnt.X, pnt.Y],
-                          wkid=wkid,
-                          wkt=wkt,
-                          z=pnt.Z, m=pnt.M))
-                feature_geom.append(fPart)
-            return feature_geom
+        super(MultiPoint, self).__init__(points, wkid=wkid, wkt=wkt,
+                                         hasZ=hasZ, hasM=hasM)
     #----------------------------------------------------------------------
-    @property
-    def spatialReference(self):
-        """returns the geometry spatial reference"""
-        if self._wkid == None and self._wkt is not None:
-            return {"wkt": self._wkt}
-        else:
-            return {"wkid": self._wkid}
+    def _load(self, points):
+        """stores the points as the single part of the geometry"""
+        super(MultiPoint, self)._load([points])
     #----------------------------------------------------------------------
     @property
     def type(self):
         """ returns the geometry type """
-        return "esriGeometryPolyline"
+        return "esriGeometryMultipoint"
     #----------------------------------------------------------------------
     @property
-    def asJSON(self):
-        """ returns a geometry as JSON """
-        value = self._json
-        if value is None:
-            value = json.dumps(self.asDictionary,
-                               default=_date_handler)
-            self._json = value
-        return self._json
-    #----------------------------------------------------------------------
-    @property
-    def asArcPyObject(self):
-        """ returns the Polyline as an ESRI arcpy.Polyline object """
-        if arcpyFound == False:
-            raise Exception("ArcPy is required to use this function")
-        return arcpy.AsShape(self.asDictionary, True)
+    def points(self):
+        """returns the points as [x,y,<z>,<m>] coordinates"""
+        return self.getPart(0) if self.partCount > 0 else []
     #----------------------------------------------------------------------
     @property
     def asDictionary(self):
         """ returns the object as a python dictionary """
-        value = self._dict
-        if value is None:
-            template = {
-                "hasM" : self._hasM,
-                "hasZ" : self._hasZ,
-                "paths" : [],
-                "spatialReference" : self.spatialReference
-            }
-            for part in self._paths:
-                lpart = []
-                for pt in part:
-                    lpart.append(pt.asList)
-                template['paths'].append(lpart)
-                del lpart
-            self._dict = template
-        return self._dict
+        return {
+            "hasM" : self._hasM,
+            "hasZ" : self._hasZ,
+            "points" : self.points,
+            "spatialReference" : self.spatialReference
+        }
 ########################################################################
-class Polygon(abstract.AbstractGeometry):
-    """ Implements the ArcGIS REST JSON for Polygon Object """
-    _rings = None
-    _wkid = None
-    _wkt = None
-    _json = None
-    _dict = None
-    _geom = None
-    _hasZ = None
-    _hasM = None
+class Polyline(_Multipart):
+    """ Implements the ArcGIS REST API Polyline Object
+        Inputs:
+           paths - list - list of lists of Point objects or
+                   [x,y,<z>,<m>] coordinates, an Esri JSON polyline
+                   dictionary or an arcpy.Polyline
+           wkid - integer - well know spatial reference id
+           hasZ - boolean -
+           hasM - boolean -
+    """
+    __slots__ = ()
+    _partKey = "paths"
     #----------------------------------------------------------------------
-    def __init__(self, rings, wkid=None,wkt=None, hasZ=False, hasM=False):
+    def __init__(self, paths, wkid=None,wkt=None, hasZ=False, hasM=False):
         """Constructor"""
-        if isinstance(rings, list):
-            self._rings = rings
-        elif arcpyFound and isinstance(rings, arcpy.Geometry):
-            self._rings = self.__geomToPointList(rings)
-##            self._json = rings.JSON
-##            self._dict = _unicode_convert(json.loads(self._json))
-        self._wkid = wkid
-        self._hasM = hasM
-        self._hasZ = hasZ
-    #----------------------------------------------------------------------
-    def __geomToPointList(self, geom):
-        """ converts a geometry object to a common.Geometry object """
-        sr = geom.spatialReference
-        wkid = None
-        wkt = None
-        if sr is None:
-            if self._wkid is None and self._wkt is not None:
-                wkt = self._wkt
-            else:
-                wkid = self._wkid
-        else:
-            wkid = sr.factoryCode
-        g = json.loads(geom.JSON)
-        top = []
-        for gring in g['rings']:
-            ring = []
-            for g in gring:
-                ring.append(Point(coord=g, wkid=wkid, wkt=wkt, z=None, m=None))
-            top.append(ring)
-        return top
-        #if isinstance(geom, arcpy.Polygon):
-            #feature_geom = []
-            #fPart = []
-            #for part in geom:
-                #fPart = []
-                #for pnt in part:
-                    #if geom.spatialReference is None:
-                        #wkid = self._wkid
-                    #else:
-                        #wkid = geom.spatialReference.factoryCode
-                    #fPart.append(Point(coord=[pnt.X, pnt.Y],
-                          #wkid=wkid,
-                          #z=pnt.Z, m=pnt.M))
-                #feature_geom.append(fPart)
-            #return feature_geom
-    #----------------------------------------------------------------------
-    @property
-    def spatialReference(self):
-        """returns the geometry spatial reference"""
-        if self._wkid == None and self._wkt is not None:
-            return {"wkt": self._wkt}
-        else:
-            return {"wkid": self._wkid}
+        super(Polyline, self).__init__(paths, wkid=wkid, wkt=wkt,
+                                       hasZ=hasZ, hasM=hasM)
     #----------------------------------------------------------------------
     @property
     def type(self):
         """ returns the geometry type """
-        return "esriGeometryPolygon"
+        return "esriGeometryPolyline"
     #----------------------------------------------------------------------
     @property
-    def asJSON(self):
-        """ returns a geometry as JSON """
-        value = self._json
-        if value is None:
-            value = json.dumps(self.asDictionary,
-                               default=_date_handler)
-            self._json = value
-        return self._json
+    def paths(self):
+        """returns the paths as lists of [x,y,<z>,<m>] coordinates"""
+        return self.parts
+########################################################################
+class Polygon(_Multipart):
+    """ Implements the ArcGIS REST JSON for Polygon Object
+        Inputs:
+           rings - list - list of lists of Point objects or
+                   [x,y,<z>,<m>] coordinates, an Esri JSON polygon
+                   dictionary or an arcpy.Polygon
+           wkid - integer - well know spatial reference id
+           hasZ - boolean -
+           hasM - boolean -
+    """
+    __slots__ = ()
+    _partKey = "rings"
+    #----------------------------------------------------------------------
+    def __init__(self, rings, wkid=None,wkt=None, hasZ=False, hasM=False):
+        """Constructor"""
+        super(Polygon, self).__init__(rings, wkid=wkid, wkt=wkt,
+                                      hasZ=hasZ, hasM=hasM)
     #----------------------------------------------------------------------
     @property
-    def asArcPyObject(self):
-        """ returns the Polyline as an ESRI arcpy.Polyline object """
-        if arcpyFound == False:
-            raise Exception("ArcPy is required to use this function")
-        return arcpy.AsShape(self.asDictionary, True)
+    def type(self):
+        """ returns the geometry type """
+        return "esriGeometryPolygon"
     #----------------------------------------------------------------------
     @property
-    def asDictionary(self):
-        """ returns the object as a python dictionary """
-        value = self._dict
-        if value is None:
-            template = {
-                "hasM" : self._hasM,
-                "hasZ" : self._hasZ,
-                "rings" : [],
-                "spatialReference" : self.spatialReference
-            }
-            for part in self._rings:
-                lpart = []
-                for pt in part:
-                    if isinstance(pt, list):
-                        lpart.append(pt)
-                    elif isinstance(pt, Point):
-                        lpart.append(pt.asList)
-                template['rings'].append(lpart)
-                del lpart
-            self._dict = template
-        return self._dict
+    def rings(self):
+        """returns the rings as lists of [x,y,<z>,<m>] coordinates"""
+        return self.parts
 ########################################################################
 class Envelope(abstract.AbstractGeometry):
     """
@@ -517,19 +579,9 @@ class Envelope(abstract.AbstractGeometry):
        coordinate and attribute. It also has a spatialReference field.
        The fields for the z and m ranges are optional.
     """
-    _json = None
-    _dict = None
-    _geom = None
-    _xmin = None
-    _ymin = None
-    _zmin = None
-    _mmin = None
-    _xmax = None
-    _ymax = None
-    _zmax = None
-    _mmax = None
-    _wkid = None
-    _wkt = None
+    __slots__ = ("_xmin", "_ymin", "_zmin", "_mmin",
+                 "_xmax", "_ymax", "_zmax", "_mmax",
+                 "_wkid", "_wkt", "_json")
     #----------------------------------------------------------------------
     def __init__(self, xmin, ymin, xmax, ymax, wkid=None, wkt=None,
                  zmin=None, zmax=None, mmin=None, mmax=None):
@@ -544,6 +596,7 @@ class Envelope(abstract.AbstractGeometry):
         self._mmax = mmax
         self._wkid = wkid
         self._wkt = wkt
+        self._json = None
     #----------------------------------------------------------------------
     @property
     def spatialReference(self):
@@ -619,15 +672,15 @@ class Envelope(abstract.AbstractGeometry):
     @property
     def asArcPyObject(self):
         """ returns the Envelope as an ESRI arcpy.Polygon object """
-        env = self.asDictionary
         ring = [[
-            Point(env['xmin'], env['ymin'], self._wkid),
-            Point(env['xmax'], env['ymin'], self._wkid),
-            Point(env['xmax'], env['ymax'], self._wkid),
-            Point(env['xmin'], env['ymax'], self._wkid)
+            [self._xmin, self._ymin],
+            [self._xmin, self._ymax],
+            [self._xmax, self._ymax],
+            [self._xmax, self._ymin],
+            [self._xmin, self._ymin]
             ]]
         return Polygon(rings=ring,
                        wkid=self._wkid,
-                       wkt=self._wkid,
+                       wkt=self._wkt,
                        hasZ=False,
                        hasM=False).asArcPyObject
\ No newline at end of file
@@ -3,7 +3,7 @@ Contains all the spatial functions
 """
 from __future__ import absolute_import
 from __future__ import print_function
-import os, datetime
+import os, json, datetime, shutil, tempfile
 try:
     import arcpy
     from arcpy import env
@@ -30,6 +30,47 @@ def featureclass_to_json(fc):
     else:
         return arcpy.FeatureSet(fc).JSON
 #----------------------------------------------------------------------
+def featureclass_to_features(fc, where_clause=None, lowerCaseFieldNames=False):
+    """
+       reads a feature class or table one row at a time
+       Inputs:
+          fc - path to the feature class, table or layer
+          where_clause - optional sql filter
+          lowerCaseFieldNames - lower case the attribute names
+       Output:
+          generator of Esri JSON feature dictionaries.  Date values are
+          converted from local time to UTC epoch milliseconds, as the
+          arcpy FeatureSet JSON does.  The generator holds an arcpy
+          cursor, which is not thread safe: iterate it on one thread.
+    """
+    if arcpyFound == False:
+        raise Exception("ArcPy is required to use this function")
+    from .general import local_time_to_epoch
+    desc = arcpy.Describe(fc)
+    listed = [field for field in arcpy.ListFields(fc)
+              if field.type not in ('Geometry', 'Blob', 'Raster')]
+    fields = [field.name for field in listed]
+    dates = [i for i, field in enumerate(listed) if field.type == 'Date']
+    names = fields
+    if lowerCaseFieldNames == True:
+        names = [name.lower() for name in fields]
+    cursor_fields = list(fields)
+    hasShape = hasattr(desc, 'shapeFieldName')
+    if hasShape:
+        cursor_fields.append("SHAPE@JSON")
+    with arcpy.da.SearchCursor(fc, cursor_fields,
+                               where_clause=where_clause) as rows:
+        for row in rows:
+            if dates:
+                row = list(row)
+                for i in dates:
+                    if isinstance(row[i], datetime.datetime):
+                        row[i] = local_time_to_epoch(row[i])
+            feature = {"attributes" : dict(zip(names, row))}
+            if hasShape and row[-1] is not None:
+                feature['geometry'] = json.loads(row[-1])
+            yield feature
+#----------------------------------------------------------------------
 def recordset_to_json(table):
     """ converts the table to JSON """
     if arcpyFound == False:
@@ -53,7 +94,12 @@ def get_attachment_data(attachmentTable, sql,
                         nameField="ATT_NAME", blobField="DATA",
                         contentTypeField="CONTENT_TYPE",
                         rel_object_field="REL_OBJECTID"):
-    """ gets all the data to pass to a feature service """
+    """
+       gets all the data to pass to a feature service.  Each attachment
+       is written to its own temporary folder under its original name, so
+       attachments sharing a name do not overwrite each other.  Call
+       remove_attachment_data once they are uploaded.
+    """
     if arcpyFound == False:
         raise Exception("ArcPy is required to use this function")
     ret_rows = []
@@ -64,7 +110,8 @@ def get_attachment_data(attachmentTable, sql,
                                 rel_object_field],
                                where_clause=sql) as rows:
         for row in rows:
-            temp_f = os.environ['temp'] + os.sep + row[0]
+            temp_f = os.path.join(tempfile.mkdtemp(prefix="arcrest_att_"),
+                                  row[0])
             writer = open(temp_f,'wb')
             writer.write(row[1])
             writer.flush()
@@ -79,6 +126,11 @@ def get_attachment_data(attachmentTable, sql,
             del row
     return ret_rows
 #----------------------------------------------------------------------
+def remove_attachment_data(rows):
+    """removes the temporary files written by get_attachment_data"""
+    for row in rows:
+        shutil.rmtree(os.path.dirname(row['blob']), ignore_errors=True)
+#----------------------------------------------------------------------
 def get_records_with_attachments(attachment_table, rel_object_field="REL_OBJECTID"):
     """"""
     if arcpyFound == False:
@@ -205,21 +257,67 @@ def insert_rows(fc,
     else:
         return fc
 #----------------------------------------------------------------------
+def insert_json_rows(fc, features, fields, date_fields=None):
+    """
+       inserts Esri JSON features into a feature class or table with a
+       single insert cursor.  The geometry is written with the SHAPE@JSON
+       token so no temporary JSON file or conversion tool is needed.
+       Inputs:
+          fc - path to the feature class or table
+          features - iterable of feature dictionaries ({"attributes" : {},
+                     "geometry" : {}}). It can be a generator.
+          fields - list of attribute field names to write
+          date_fields - names of the fields holding epoch milliseconds
+                        that are written as UTC datetime values, as the
+                        JSON To Features tool writes them
+       Output:
+          number of rows inserted
+    """
+    if arcpyFound == False:
+        raise Exception("ArcPy is required to use this function")
+    date_fields = set(date_fields or [])
+    desc = arcpy.Describe(fc)
+    hasShape = hasattr(desc, 'shapeFieldName')
+    cursor_fields = list(fields)
+    if hasShape:
+        cursor_fields.append("SHAPE@JSON")
+    count = 0
+    with arcpy.da.InsertCursor(fc, cursor_fields) as icur:
+        for feat in features:
+            attributes = feat.get('attributes', {})
+            row = []
+            for field in fields:
+                value = attributes.get(field)
+                if field in date_fields and value is not None:
+                    value = _utc_datetime(value)
+                row.append(value)
+            if hasShape:
+                geom = feat.get('geometry')
+                row.append(json.dumps(geom) if geom is not None else None)
+            icur.insertRow(row)
+            count += 1
+    return count
+#----------------------------------------------------------------------
 def create_feature_class(out_path,
                          out_name,
                          geom_type,
                          wkid,
                          fields,
                          objectIdField):
-    """ creates a feature class in a given gdb or folder """
+    """ creates a feature class in a given gdb or folder, or a table if
+        geom_type is None """
     if arcpyFound == False:
         raise Exception("ArcPy is required to use this function")
     arcpy.env.overwriteOutput = True
     field_names = []
-    fc =arcpy.CreateFeatureclass_management(out_path=out_path,
-                                            out_name=out_name,
-                                            geometry_type=lookUpGeometry(geom_type),
-                                            spatial_reference=arcpy.SpatialReference(wkid))[0]
+    if geom_type is None:
+        fc = arcpy.CreateTable_management(out_path=out_path,
+                                          out_name=out_name)[0]
+    else:
+        fc =arcpy.CreateFeatureclass_management(out_path=out_path,
+                                                out_name=out_name,
+                                                geometry_type=lookUpGeometry(geom_type),
+                                                spatial_reference=arcpy.SpatialReference(wkid))[0]
     for field in fields:
         if field['name'] != objectIdField:
             field_names.append(field['name'])
@@ -239,8 +337,11 @@ def lookUpGeometry(geom_type):
         return "POINT"
     elif geom_type == "esriGeometryPolygon":
         return "POLYGON"
-    elif geom_type == "esriGeometryLine":
+    elif geom_type == "esriGeometryLine" or \
+         geom_type == "esriGeometryPolyline":
         return "POLYLINE"
+    elif geom_type == "esriGeometryMultipoint":
+        return "MULTIPOINT"
     else:
         return "POINT"
 #----------------------------------------------------------------------
@@ -279,6 +380,11 @@ def toDateTime(unix_timestamp):
     unix_timestamp = unix_timestamp/1000
     return datetime.datetime.fromtimestamp(unix_timestamp)
 #----------------------------------------------------------------------
+def _utc_datetime(unix_timestamp):
+    """converts a unix time stamp in milliseconds to a UTC datetime object"""
+    return datetime.datetime(1970, 1, 1) + \
+           datetime.timedelta(milliseconds=unix_timestamp)
+#----------------------------------------------------------------------
 def _unicode_convert(obj):
     """ converts unicode to anscii """
     if isinstance(obj, dict):
@@ -1,4 +1,6 @@
 from __future__ import absolute_import
 from .geometryservice import GeometryService
+from ._batch import GeometryServiceBatch
+from ._local import LocalGeometryService
 
 __version__ = "3.5.3"
\ No newline at end of file
@@ -0,0 +1,417 @@
+"""
+   Splits large geometry service requests into batches sized by vertex
+   count and payload, sends them at the same time and puts the results
+   back together in input order.
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+import sys
+import json
+
+from .._abstract import abstract
+from ..web._batch import BatchError
+from ..web._parallel import parallel_imap, DEFAULT_WORKERS
+########################################################################
+__version__ = "3.5.3"
+__all__ = ["GeometryServiceBatch"]
+_TYPES = {
+    "points" : "esriGeometryMultipoint",
+    "paths" : "esriGeometryPolyline",
+    "rings" : "esriGeometryPolygon",
+    "x" : "esriGeometryPoint",
+    "xmin" : "esriGeometryEnvelope"
+}
+#----------------------------------------------------------------------
+def _as_dictionary(geometry):
+    """returns a common.geometry object or Esri JSON dict as a dict"""
+    if isinstance(geometry, abstract.AbstractGeometry):
+        return geometry.asDictionary
+    return geometry
+#----------------------------------------------------------------------
+def _geometry_type(geometry):
+    """returns the esriGeometry type of a geometry or dictionary"""
+    if isinstance(geometry, abstract.AbstractGeometry):
+        return geometry.type
+    for key, value in _TYPES.items():
+        if key in geometry:
+            return value
+    raise ValueError("Unknown geometry: %s" % geometry)
+#----------------------------------------------------------------------
+def _vertex_count(geometry):
+    """returns the number of vertices of a geometry or dictionary"""
+    if hasattr(geometry, 'pointCount'):
+        return geometry.pointCount
+    geometry = _as_dictionary(geometry)
+    if 'points' in geometry:
+        return len(geometry['points'])
+    for key in ('rings', 'paths'):
+        if key in geometry:
+            return sum(len(part) for part in geometry[key])
+    if 'xmin' in geometry:
+        return 4
+    return 1
+#----------------------------------------------------------------------
+def _sr(value):
+    """encodes a spatial reference parameter"""
+    if isinstance(value, dict):
+        return json.dumps(value)
+    elif isinstance(value, abstract.AbstractGeometry):
+        return json.dumps(value.asDictionary)
+    return value
+########################################################################
+class GeometryServiceBatch(object):
+    """
+       Batching front end for a GeometryService.  The geometries of a
+       call are split into requests of at most max_geometries geometries,
+       max_vertices vertices and max_bytes of encoded JSON; the requests
+       are POSTed on a pool of threads and the results are returned in
+       the order of the inputs.  When a request fails, each of its
+       geometries is sent again on its own so one bad geometry does not
+       fail the whole call.
+
+       Inputs:
+          service - GeometryService instance
+          max_geometries - most geometries in one request
+          max_vertices - most vertices in one request
+          max_bytes - most bytes of geometry JSON in one request
+          max_workers - number of requests sent at the same time
+          raise_errors - if True, a geometry that still fails on its own
+                         raises. If False, a BatchError is returned in
+                         its place.
+
+       Usage:
+       >>> gs = GeometryService(url)
+       >>> batch = gs.batched(max_workers=8)
+       >>> res = batch.project(points, inSR=4326, outSR=3857)
+       >>> res['geometries'][0]
+    """
+    _service = None
+    _max_geometries = None
+    _max_vertices = None
+    _max_bytes = None
+    _max_workers = None
+    _raise_errors = None
+    #----------------------------------------------------------------------
+    def __init__(self, service, max_geometries=1000, max_vertices=100000,
+                 max_bytes=2097152, max_workers=DEFAULT_WORKERS,
+                 raise_errors=True):
+        """Constructor"""
+        self._service = service
+        self._max_geometries = max_geometries
+        self._max_vertices = max_vertices
+        self._max_bytes = max_bytes
+        self._max_workers = max_workers
+        self._raise_errors = raise_errors
+    #----------------------------------------------------------------------
+    @property
+    def service(self):
+        """gets the GeometryService the requests are sent to"""
+        return self._service
+    #----------------------------------------------------------------------
+    def _batches(self, geometries, min_geometries=1):
+        """
+           encodes the geometries and yields lists of
+           (index, vertex count, json) tuples that fit the batch limits;
+           a batch is only closed once it holds min_geometries geometries
+        """
+        batch = []
+        vertices = 0
+        size = 0
+        for index, geometry in enumerate(geometries):
+            count = _vertex_count(geometry)
+            encoded = json.dumps(_as_dictionary(geometry))
+            if len(batch) >= max(min_geometries, 1) and \
+               (len(batch) >= self._max_geometries or
+                vertices + count > self._max_vertices or
+                size + len(encoded) > self._max_bytes):
+                yield batch
+                batch = []
+                vertices = 0
+                size = 0
+            batch.append((index, count, encoded))
+            vertices += count
+            size += len(encoded) + 1
+        if len(batch) > 0:
+            yield batch
+    #----------------------------------------------------------------------
+    def _send(self, operation, params):
+        """POSTs one request and raises on a service error"""
+        service = self._service
+        params = dict(params)
+        params['f'] = "json"
+        res = service._post(url=service._url + "/" + operation,
+                            param_dict=params,
+                            securityHandler=service._securityHandler,
+                            proxy_url=service._proxy_url,
+                            proxy_port=service._proxy_port)
+        if not isinstance(res, dict) or 'error' in res:
+            raise Exception("%s request failed: %s" % (operation, res))
+        return res
+    #----------------------------------------------------------------------
+    def _request(self, operation, key, geometryType, batch, params,
+                 resultKeys):
+        """sends one batch and returns its result lists"""
+        encoded = ",".join(entry[2] for entry in batch)
+        values = dict(params)
+        if geometryType is None:
+            values[key] = "[%s]" % encoded
+        else:
+            values[key] = '{"geometryType":"%s","geometries":[%s]}' % \
+                (geometryType, encoded)
+        res = self._send(operation, values)
+        results = []
+        for resultKey in resultKeys:
+            value = res.get(resultKey)
+            if not isinstance(value, list) or len(value) != len(batch):
+                raise Exception("%s returned %s %s for %s geometries" % \
+                                (operation,
+                                 len(value) if isinstance(value, list) else 0,
+                                 resultKey, len(batch)))
+            results.append(value)
+        return results
+    #----------------------------------------------------------------------
+    def _run_batch(self, operation, key, geometryType, params, resultKeys):
+        """returns a function that sends a batch, retrying one by one"""
+        def run(batch):
+            try:
+                return self._request(operation, key, geometryType, batch,
+                                     params, resultKeys)
+            except Exception:
+                if len(batch) == 1 and self._raise_errors:
+                    raise
+                failure = sys.exc_info()
+            if len(batch) == 1:
+                error = BatchError(failure)
+                return [[error] for resultKey in resultKeys]
+            results = [[] for resultKey in resultKeys]
+            for entry in batch:
+                for values, value in zip(results, run([entry])):
+                    values.extend(value)
+            return results
+        return run
+    #----------------------------------------------------------------------
+    def _run(self, operation, key, geometries, params, resultKeys,
+             typed=True):
+        """
+           sends the geometries of an operation in batches
+           Output:
+              dictionary of result key to list of results in input order
+        """
+        geometries = list(geometries)
+        output = dict((resultKey, []) for resultKey in resultKeys)
+        if len(geometries) == 0:
+            return output
+        geometryType = None
+        if typed:
+            geometryType = _geometry_type(geometries[0])
+            if 'geometries' in resultKeys:
+                output['geometryType'] = geometryType
+        run = self._run_batch(operation, key, geometryType, params,
+                              resultKeys)
+        for results in parallel_imap(run, self._batches(geometries),
+                                     max_workers=self._max_workers):
+            for resultKey, values in zip(resultKeys, results):
+                output[resultKey].extend(values)
+        return output
+    #----------------------------------------------------------------------
+    def project(self, geometries, inSR, outSR, transformation=None,
+                transformForward=False):
+        """
+           projects geometries in batches
+           Inputs:
+              geometries - list of common.geometry objects or Esri JSON
+                           geometry dictionaries of a single type
+              inSR - wkid or spatial reference dictionary of the inputs
+              outSR - wkid or spatial reference dictionary to project to
+              transformation - optional geographic transformation wkid
+                               or dictionary
+              transformForward - direction of the transformation
+           Output:
+              dictionary with geometryType and the projected geometries
+              in input order
+        """
+        params = {
+            "inSR" : _sr(inSR),
+            "outSR" : _sr(outSR),
+            "transformForward" : transformForward
+        }
+        if transformation:
+            params['transformation'] = _sr(transformation)
+        return self._run("project", "geometries", geometries, params,
+                         ["geometries"])
+    #----------------------------------------------------------------------
+    def buffer(self, geometries, inSR, distance, units, outSR=None,
+               bufferSR=None, geodesic=True):
+        """
+           buffers geometries in batches.  Results are not unioned; use
+           union() on the output to dissolve them.
+           Inputs:
+              geometries - list of geometries of a single type
+              inSR - spatial reference of the inputs
+              distance - buffer distance
+              units - esriSRUnit_* constant of the distance
+              outSR - optional spatial reference of the buffers
+              bufferSR - optional spatial reference to buffer in
+              geodesic - buffer with geodesic distances
+           Output:
+              dictionary with geometryType and one buffer polygon per
+              input geometry
+        """
+        params = {
+            "inSR" : _sr(inSR),
+            "distances" : str(distance),
+            "unit" : units,
+            "unionResults" : False,
+            "geodesic" : geodesic
+        }
+        if outSR is not None:
+            params['outSR'] = _sr(outSR)
+        if bufferSR is not None:
+            params['bufferSR'] = _sr(bufferSR)
+        res = self._run("buffer", "geometries", geometries, params,
+                        ["geometries"])
+        if 'geometryType' in res:
+            res['geometryType'] = "esriGeometryPolygon"
+        return res
+    #----------------------------------------------------------------------
+    def simplify(self, geometries, sr):
+        """
+           simplifies geometries in batches
+           Output:
+              dictionary with geometryType and geometries in input order
+        """
+        return self._run("simplify", "geometries", geometries,
+                         {"sr" : _sr(sr)}, ["geometries"])
+    #----------------------------------------------------------------------
+    def generalize(self, geometries, sr, maxDeviation, deviationUnit=None):
+        """
+           generalizes geometries in batches
+           Output:
+              dictionary with geometryType and geometries in input order
+        """
+        params = {"sr" : _sr(sr), "maxDeviation" : maxDeviation}
+        if deviationUnit is not None:
+            params['deviationUnit'] = deviationUnit
+        return self._run("generalize", "geometries", geometries, params,
+                         ["geometries"])
+    #----------------------------------------------------------------------
+    def densify(self, geometries, sr, maxSegmentLength, lengthUnit=None,
+                geodesic=False):
+        """
+           densifies geometries in batches
+           Output:
+              dictionary with geometryType and geometries in input order
+        """
+        params = {"sr" : _sr(sr),
+                  "maxSegmentLength" : maxSegmentLength,
+                  "geodesic" : geodesic}
+        if lengthUnit is not None:
+            params['lengthUnit'] = lengthUnit
+        return self._run("densify", "geometries", geometries, params,
+                         ["geometries"])
+    #----------------------------------------------------------------------
+    def lengths(self, polylines, sr, lengthUnit=None,
+                calculationType="planar"):
+        """
+           calculates polyline lengths in batches
+           Output:
+              dictionary with the lengths in input order
+        """
+        params = {"sr" : _sr(sr), "calculationType" : calculationType}
+        if lengthUnit is not None:
+            params['lengthUnit'] = lengthUnit
+        return self._run("lengths", "polylines", polylines, params,
+                         ["lengths"], typed=False)
+    #----------------------------------------------------------------------
+    def areasAndLengths(self, polygons, sr, lengthUnit=None, areaUnit=None,
+                        calculationType="planar"):
+        """
+           calculates polygon areas and perimeters in batches
+           Output:
+              dictionary with the areas and lengths in input order
+        """
+        params = {"sr" : _sr(sr), "calculationType" : calculationType}
+        if lengthUnit is not None:
+            params['lengthUnit'] = lengthUnit
+        if areaUnit is not None:
+            params['areaUnit'] = json.dumps({"areaUnit" : areaUnit})
+        return self._run("areasAndLengths", "polygons", polygons, params,
+                         ["areas", "lengths"], typed=False)
+    #----------------------------------------------------------------------
+    def labelPoints(self, polygons, sr):
+        """
+           returns a label point for each polygon, in batches
+           Output:
+              dictionary with the label points in input order
+        """
+        return self._run("labelPoints", "polygons", polygons,
+                         {"sr" : _sr(sr)}, ["labelPoints"], typed=False)
+    #----------------------------------------------------------------------
+    def union(self, geometries, sr):
+        """
+           unions a large list of geometries: each batch is unioned, then
+           the partial results are unioned until one geometry remains
+           Output:
+              dictionary with geometryType and the unioned geometry
+        """
+        geometries = list(geometries)
+        if len(geometries) == 0:
+            return {}
+        geometryType = _geometry_type(geometries[0])
+        params = {"sr" : _sr(sr)}
+        def run(batch):
+            values = dict(params)
+            values['geometries'] = \
+                '{"geometryType":"%s","geometries":[%s]}' % \
+                (geometryType, ",".join(entry[2] for entry in batch))
+            return self._send("union", values)['geometry']
+        def combine(batch):
+            if len(batch) == 1:
+                # the odd one out of a reduction round is carried over
+                return json.loads(batch[0][2])
+            return run(batch)
+        geometries = list(parallel_imap(run, self._batches(geometries),
+                                        max_workers=self._max_workers))
+        if geometryType == "esriGeometryPoint":
+            # the union of points is a multipoint
+            geometryType = "esriGeometryMultipoint"
+        while len(geometries) > 1:
+            # partial unions can exceed the vertex limit on their own, so
+            # each batch of a reduction round takes at least two of them
+            # and every round halves the count
+            batches = list(self._batches(geometries, min_geometries=2))
+            geometries = list(parallel_imap(combine, batches,
+                                            max_workers=self._max_workers))
+        return {"geometryType" : geometryType,
+                "geometry" : geometries[0]}
+    #----------------------------------------------------------------------
+    def distances(self, pairs, sr, distanceUnit=None, geodesic=False):
+        """
+           measures the distance between many pairs of geometries, one
+           request per pair sent at the same time
+           Inputs:
+              pairs - list of (geometry1, geometry2) tuples
+              sr - spatial reference of the geometries
+              distanceUnit - optional esriSRUnit_* constant
+              geodesic - measure geodesic distances
+           Output:
+              list of distances in input order
+        """
+        params = {"sr" : _sr(sr), "geodesic" : geodesic}
+        if distanceUnit is not None:
+            params['distanceUnit'] = distanceUnit
+        def template(geometry):
+            return json.dumps({"geometryType" : _geometry_type(geometry),
+                               "geometry" : _as_dictionary(geometry)})
+        def run(pair):
+            values = dict(params,
+                          geometry1=template(pair[0]),
+                          geometry2=template(pair[1]))
+            try:
+                return self._send("distance", values)['distance']
+            except Exception:
+                if self._raise_errors:
+                    raise
+                return BatchError(sys.exc_info())
+        return list(parallel_imap(run, pairs,
+                                  max_workers=self._max_workers))
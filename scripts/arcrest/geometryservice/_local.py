@@ -0,0 +1,1049 @@
+"""
+   Local stand-in for a GeometryService.  Projections between WGS84,
+   Web Mercator, UTM and user supplied transverse mercator / lambert
+   conformal conic (State Plane) systems, planar and geodesic lengths,
+   distances, areas and point buffers are computed in process.  Anything
+   else is sent to a remote GeometryService when one is given.
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+import math
+
+from .._abstract import abstract
+from ..packages import six
+try:
+    import numpy as np
+    numpyFound = True
+except:
+    numpyFound = False
+try:
+    import pyproj
+    pyprojFound = True
+except:
+    pyprojFound = False
+########################################################################
+__version__ = "3.5.3"
+__all__ = ["LocalGeometryService"]
+_WGS84 = (6378137.0, 1 / 298.257223563)
+_GRS80 = (6378137.0, 1 / 298.257222101)
+# only ellipsoids and datums that need no datum shift to WGS84; any other
+# (clrk66/NAD27, intl, bessel, ...) is sent to the remote service
+_ELLIPSOIDS = {"WGS84" : _WGS84, "GRS80" : _GRS80}
+_DATUMS = {"WGS84" : _WGS84, "NAD83" : _GRS80}
+_WEB_MERCATOR = (3857, 102100, 102113, 900913)
+# meters per unit for the esriSRUnit constants accepted by the service
+_LINEAR_UNITS = {
+    9001 : 1.0,
+    9002 : 0.3048,
+    9003 : 1200.0 / 3937.0,
+    9030 : 1852.0,
+    9035 : 6336000.0 / 3937.0,
+    9036 : 1000.0,
+    9093 : 1609.344,
+    9096 : 0.9144,
+    109008 : 0.0254,
+    1033 : 0.01,
+    1025 : 0.001,
+    "esriSRUnit_Meter" : 1.0,
+    "esriSRUnit_Foot" : 0.3048,
+    "esriSRUnit_SurveyFoot" : 1200.0 / 3937.0,
+    "esriSRUnit_NauticalMile" : 1852.0,
+    "esriSRUnit_SurveyMile" : 6336000.0 / 3937.0,
+    "esriSRUnit_Kilometer" : 1000.0,
+    "esriSRUnit_StatuteMile" : 1609.344,
+    "esriSRUnit_InternationalYard" : 0.9144,
+    "esriSRUnit_InternationalInch" : 0.0254,
+    "esriSRUnit_Centimeter" : 0.01,
+    "esriSRUnit_Millimeter" : 0.001
+}
+# square meters per unit for the esriAreaUnits constants
+_AREA_UNITS = {
+    "esriSquareInches" : 0.00064516,
+    "esriSquareFeet" : 0.09290304,
+    "esriSquareYards" : 0.83612736,
+    "esriAcres" : 4046.8564224,
+    "esriSquareMiles" : 2589988.110336,
+    "esriSquareMillimeters" : 0.000001,
+    "esriSquareCentimeters" : 0.0001,
+    "esriSquareDecimeters" : 0.01,
+    "esriSquareMeters" : 1.0,
+    "esriAres" : 100.0,
+    "esriHectares" : 10000.0,
+    "esriSquareKilometers" : 1000000.0
+}
+# meters per unit for the proj "units" parameter
+_PROJ_UNITS = {
+    "m" : 1.0,
+    "km" : 1000.0,
+    "ft" : 0.3048,
+    "us-ft" : 1200.0 / 3937.0
+}
+_BUFFER_VERTICES = 90
+_ITERATIONS = 10
+########################################################################
+class _Ops(object):
+    """
+       math functions used by the projection formulas.  The same formula
+       runs on floats with the math module or on whole coordinate arrays
+       with numpy.
+    """
+    #----------------------------------------------------------------------
+    def __init__(self, **functions):
+        """Constructor"""
+        for name, function in functions.items():
+            setattr(self, name, function)
+_MATH = _Ops(sin=math.sin, cos=math.cos, tan=math.tan, atan=math.atan,
+             atan2=math.atan2, asin=math.asin, sinh=math.sinh,
+             cosh=math.cosh, atanh=math.atanh, log=math.log, exp=math.exp,
+             sqrt=math.sqrt, radians=math.radians, degrees=math.degrees,
+             maximum=max, clip=lambda v, low, high: min(max(v, low), high))
+if numpyFound:
+    _NUMPY = _Ops(sin=np.sin, cos=np.cos, tan=np.tan, atan=np.arctan,
+                  atan2=np.arctan2, asin=np.arcsin, sinh=np.sinh,
+                  cosh=np.cosh, atanh=np.arctanh, log=np.log, exp=np.exp,
+                  sqrt=np.sqrt, radians=np.radians, degrees=np.degrees,
+                  maximum=np.maximum, clip=np.clip)
+#----------------------------------------------------------------------
+def _apply(function, xs, ys, *args):
+    """
+       runs a two coordinate formula over lists of coordinates, as one
+       numpy call when numpy is installed
+       Output:
+          (list, list)
+    """
+    if len(xs) == 0:
+        return [], []
+    if numpyFound:
+        a, b = function(np.asarray(xs, dtype="f8"),
+                        np.asarray(ys, dtype="f8"), _NUMPY, *args)
+        return a.tolist(), b.tolist()
+    results = [function(x, y, _MATH, *args) for x, y in zip(xs, ys)]
+    return [r[0] for r in results], [r[1] for r in results]
+#----------------------------------------------------------------------
+def _vincenty_inverse(lon1, lat1, lon2, lat2, ops, ellipsoid):
+    """
+       geodesic distance in meters between points given in degrees
+       (Vincenty's inverse formula with a fixed iteration count so it can
+       run on arrays)
+    """
+    a, f = ellipsoid
+    b = a * (1 - f)
+    L = ops.radians(lon2 - lon1)
+    U1 = ops.atan((1 - f) * ops.tan(ops.radians(lat1)))
+    U2 = ops.atan((1 - f) * ops.tan(ops.radians(lat2)))
+    sinU1, cosU1 = ops.sin(U1), ops.cos(U1)
+    sinU2, cosU2 = ops.sin(U2), ops.cos(U2)
+    lam = L
+    for i in range(_ITERATIONS):
+        sinLam, cosLam = ops.sin(lam), ops.cos(lam)
+        sinSigma = ops.sqrt((cosU2 * sinLam) ** 2 +
+                            (cosU1 * sinU2 - sinU1 * cosU2 * cosLam) ** 2)
+        cosSigma = sinU1 * sinU2 + cosU1 * cosU2 * cosLam
+        sigma = ops.atan2(sinSigma, cosSigma)
+        # coincident points have sinSigma == 0 and a distance of 0
+        sinAlpha = cosU1 * cosU2 * sinLam / ops.maximum(sinSigma, 1e-300)
+        cos2Alpha = 1 - sinAlpha ** 2
+        # equatorial lines have cos2Alpha == 0 and sinU1 == sinU2 == 0
+        cos2SigmaM = cosSigma - 2 * sinU1 * sinU2 / \
+            ops.maximum(cos2Alpha, 1e-300)
+        C = f / 16 * cos2Alpha * (4 + f * (4 - 3 * cos2Alpha))
+        lam = L + (1 - C) * f * sinAlpha * \
+            (sigma + C * sinSigma *
+             (cos2SigmaM + C * cosSigma * (-1 + 2 * cos2SigmaM ** 2)))
+    u2 = cos2Alpha * (a ** 2 - b ** 2) / b ** 2
+    A = 1 + u2 / 16384 * (4096 + u2 * (-768 + u2 * (320 - 175 * u2)))
+    B = u2 / 1024 * (256 + u2 * (-128 + u2 * (74 - 47 * u2)))
+    deltaSigma = B * sinSigma * \
+        (cos2SigmaM + B / 4 *
+         (cosSigma * (-1 + 2 * cos2SigmaM ** 2) -
+          B / 6 * cos2SigmaM * (-3 + 4 * sinSigma ** 2) *
+          (-3 + 4 * cos2SigmaM ** 2)))
+    return b * A * (sigma - deltaSigma)
+#----------------------------------------------------------------------
+def _vincenty_direct(lon, lat, azimuth, distance, ops, ellipsoid):
+    """
+       returns the (lon, lat) in degrees reached from a point by going
+       distance meters along the azimuth given in degrees (Vincenty's
+       direct formula with a fixed iteration count)
+    """
+    a, f = ellipsoid
+    b = a * (1 - f)
+    alpha1 = ops.radians(azimuth)
+    sinAlpha1, cosAlpha1 = ops.sin(alpha1), ops.cos(alpha1)
+    tanU1 = (1 - f) * ops.tan(ops.radians(lat))
+    cosU1 = 1 / ops.sqrt(1 + tanU1 ** 2)
+    sinU1 = tanU1 * cosU1
+    sigma1 = ops.atan2(tanU1, cosAlpha1)
+    sinAlpha = cosU1 * sinAlpha1
+    cos2Alpha = 1 - sinAlpha ** 2
+    u2 = cos2Alpha * (a ** 2 - b ** 2) / b ** 2
+    A = 1 + u2 / 16384 * (4096 + u2 * (-768 + u2 * (320 - 175 * u2)))
+    B = u2 / 1024 * (256 + u2 * (-128 + u2 * (74 - 47 * u2)))
+    sigma = distance / (b * A)
+    for i in range(_ITERATIONS):
+        cos2SigmaM = ops.cos(2 * sigma1 + sigma)
+        sinSigma, cosSigma = ops.sin(sigma), ops.cos(sigma)
+        deltaSigma = B * sinSigma * \
+            (cos2SigmaM + B / 4 *
+             (cosSigma * (-1 + 2 * cos2SigmaM ** 2) -
+              B / 6 * cos2SigmaM * (-3 + 4 * sinSigma ** 2) *
+              (-3 + 4 * cos2SigmaM ** 2)))
+        sigma = distance / (b * A) + deltaSigma
+    cos2SigmaM = ops.cos(2 * sigma1 + sigma)
+    sinSigma, cosSigma = ops.sin(sigma), ops.cos(sigma)
+    x = sinU1 * sinSigma - cosU1 * cosSigma * cosAlpha1
+    lat2 = ops.atan2(sinU1 * cosSigma + cosU1 * sinSigma * cosAlpha1,
+                     (1 - f) * ops.sqrt(sinAlpha ** 2 + x ** 2))
+    lam = ops.atan2(sinSigma * sinAlpha1,
+                    cosU1 * cosSigma - sinU1 * sinSigma * cosAlpha1)
+    C = f / 16 * cos2Alpha * (4 + f * (4 - 3 * cos2Alpha))
+    L = lam - (1 - C) * f * sinAlpha * \
+        (sigma + C * sinSigma *
+         (cos2SigmaM + C * cosSigma * (-1 + 2 * cos2SigmaM ** 2)))
+    return lon + ops.degrees(L), ops.degrees(lat2)
+########################################################################
+class _Projection(object):
+    """
+       A coordinate system.  forward converts longitude/latitude degrees
+       to the system's coordinates, inverse converts back; both take the
+       math functions (_MATH or _NUMPY) so they run on floats or arrays.
+    """
+    geographic = False
+    vectorized = False
+    to_meter = 1.0
+    ellipsoid = _WGS84
+    #----------------------------------------------------------------------
+    def forward(self, lon, lat, ops):
+        """degrees to projected coordinates"""
+        return lon, lat
+    #----------------------------------------------------------------------
+    def inverse(self, x, y, ops):
+        """projected coordinates to degrees"""
+        return x, y
+########################################################################
+class _Geographic(_Projection):
+    """longitude/latitude in degrees"""
+    geographic = True
+    #----------------------------------------------------------------------
+    def __init__(self, ellipsoid=_WGS84):
+        """Constructor"""
+        self.ellipsoid = ellipsoid
+########################################################################
+class _WebMercator(_Projection):
+    """spherical (Web) Mercator on the WGS84 semi-major axis"""
+    _R = 6378137.0
+    _LIMIT = 85.0511287798066
+    #----------------------------------------------------------------------
+    def forward(self, lon, lat, ops):
+        """degrees to Web Mercator meters"""
+        lat = ops.clip(lat, -self._LIMIT, self._LIMIT)
+        return (self._R * ops.radians(lon),
+                self._R * ops.log(ops.tan(math.pi / 4 +
+                                          ops.radians(lat) / 2)))
+    #----------------------------------------------------------------------
+    def inverse(self, x, y, ops):
+        """Web Mercator meters to degrees"""
+        return (ops.degrees(x / self._R),
+                ops.degrees(2 * ops.atan(ops.exp(y / self._R)) -
+                            math.pi / 2))
+########################################################################
+class _TransverseMercator(_Projection):
+    """
+       ellipsoidal transverse mercator using the Kruger series (accurate
+       to well under a millimeter within the usual zone widths)
+    """
+    #----------------------------------------------------------------------
+    def __init__(self, lon_0, lat_0=0.0, k_0=1.0, x_0=0.0, y_0=0.0,
+                 ellipsoid=_WGS84, to_meter=1.0):
+        """Constructor"""
+        a, f = ellipsoid
+        n = f / (2 - f)
+        self.ellipsoid = ellipsoid
+        self.to_meter = to_meter
+        self._lon0 = lon_0
+        self._k0 = k_0
+        self._x0 = x_0
+        self._y0 = y_0
+        self._e = math.sqrt(f * (2 - f))
+        self._A = a / (1 + n) * (1 + n ** 2 / 4 + n ** 4 / 64)
+        self._alpha = (n / 2 - 2 * n ** 2 / 3 + 5 * n ** 3 / 16,
+                       13 * n ** 2 / 48 - 3 * n ** 3 / 5,
+                       61 * n ** 3 / 240)
+        self._beta = (n / 2 - 2 * n ** 2 / 3 + 37 * n ** 3 / 96,
+                      n ** 2 / 48 + n ** 3 / 15,
+                      17 * n ** 3 / 480)
+        self._delta = (2 * n - 2 * n ** 2 / 3 - 2 * n ** 3,
+                       7 * n ** 2 / 3 - 8 * n ** 3 / 5,
+                       56 * n ** 3 / 15)
+        # meridian distance of the latitude of origin
+        self._m0 = 0.0
+        if lat_0:
+            self._m0 = self.forward(lon_0, lat_0, _MATH)[1] * to_meter - y_0
+    #----------------------------------------------------------------------
+    def forward(self, lon, lat, ops):
+        """degrees to projected coordinates"""
+        e = self._e
+        phi = ops.radians(lat)
+        lam = ops.radians(lon - self._lon0)
+        sinPhi = ops.sin(phi)
+        t = ops.sinh(ops.atanh(sinPhi) - e * ops.atanh(e * sinPhi))
+        xi = ops.atan2(t, ops.cos(lam))
+        eta = ops.atanh(ops.sin(lam) / ops.sqrt(1 + t ** 2))
+        x = eta
+        y = xi
+        for j, alpha in enumerate(self._alpha):
+            j2 = 2 * (j + 1)
+            x = x + alpha * ops.cos(j2 * xi) * ops.sinh(j2 * eta)
+            y = y + alpha * ops.sin(j2 * xi) * ops.cosh(j2 * eta)
+        k = self._k0 * self._A
+        return ((self._x0 + k * x) / self.to_meter,
+                (self._y0 + k * y - self._m0) / self.to_meter)
+    #----------------------------------------------------------------------
+    def inverse(self, x, y, ops):
+        """projected coordinates to degrees"""
+        k = self._k0 * self._A
+        xi = (y * self.to_meter - self._y0 + self._m0) / k
+        eta = (x * self.to_meter - self._x0) / k
+        xi1 = xi
+        eta1 = eta
+        for j, beta in enumerate(self._beta):
+            j2 = 2 * (j + 1)
+            xi1 = xi1 - beta * ops.sin(j2 * xi) * ops.cosh(j2 * eta)
+            eta1 = eta1 - beta * ops.cos(j2 * xi) * ops.sinh(j2 * eta)
+        chi = ops.asin(ops.sin(xi1) / ops.cosh(eta1))
+        phi = chi
+        for j, delta in enumerate(self._delta):
+            phi = phi + delta * ops.sin(2 * (j + 1) * chi)
+        lam = ops.atan2(ops.sinh(eta1), ops.cos(xi1))
+        return self._lon0 + ops.degrees(lam), ops.degrees(phi)
+########################################################################
+class _LambertConformalConic(_Projection):
+    """ellipsoidal lambert conformal conic with one or two standard
+    parallels (Snyder, Map Projections - A Working Manual, 15)"""
+    #----------------------------------------------------------------------
+    def __init__(self, lat_1, lon_0, lat_0, lat_2=None, k_0=1.0, x_0=0.0,
+                 y_0=0.0, ellipsoid=_WGS84, to_meter=1.0):
+        """Constructor"""
+        a, f = ellipsoid
+        self.ellipsoid = ellipsoid
+        self.to_meter = to_meter
+        self._a = a
+        self._e = math.sqrt(f * (2 - f))
+        self._lon0 = lon_0
+        self._k0 = k_0
+        self._x0 = x_0
+        self._y0 = y_0
+        if lat_2 is None:
+            lat_2 = lat_1
+        m1 = self._m(math.radians(lat_1))
+        m2 = self._m(math.radians(lat_2))
+        t1 = self._t(math.radians(lat_1), _MATH)
+        t2 = self._t(math.radians(lat_2), _MATH)
+        t0 = self._t(math.radians(lat_0), _MATH)
+        if lat_1 == lat_2:
+            self._n = math.sin(math.radians(lat_1))
+        else:
+            self._n = (math.log(m1) - math.log(m2)) / \
+                (math.log(t1) - math.log(t2))
+        self._F = m1 / (self._n * t1 ** self._n)
+        self._rho0 = a * k_0 * self._F * t0 ** self._n
+        self._sign = 1.0 if self._n > 0 else -1.0
+    #----------------------------------------------------------------------
+    def _m(self, phi):
+        """m of Snyder 14-15"""
+        return math.cos(phi) / \
+            math.sqrt(1 - (self._e * math.sin(phi)) ** 2)
+    #----------------------------------------------------------------------
+    def _t(self, phi, ops):
+        """t of Snyder 15-9"""
+        e = self._e
+        sinPhi = ops.sin(phi)
+        return ops.tan(math.pi / 4 - phi / 2) / \
+            ((1 - e * sinPhi) / (1 + e * sinPhi)) ** (e / 2)
+    #----------------------------------------------------------------------
+    def forward(self, lon, lat, ops):
+        """degrees to projected coordinates"""
+        rho = self._a * self._k0 * self._F * \
+            self._t(ops.radians(lat), ops) ** self._n
+        theta = self._n * ops.radians(lon - self._lon0)
+        return ((self._x0 + rho * ops.sin(theta)) / self.to_meter,
+                (self._y0 + self._rho0 - rho * ops.cos(theta)) / \
+                self.to_meter)
+    #----------------------------------------------------------------------
+    def inverse(self, x, y, ops):
+        """projected coordinates to degrees"""
+        e = self._e
+        s = self._sign
+        dx = x * self.to_meter - self._x0
+        dy = self._rho0 - (y * self.to_meter - self._y0)
+        rho = s * ops.sqrt(dx ** 2 + dy ** 2)
+        t = (rho / (self._a * self._k0 * self._F)) ** (1 / self._n)
+        theta = ops.atan2(s * dx, s * dy)
+        phi = math.pi / 2 - 2 * ops.atan(t)
+        for i in range(_ITERATIONS):
+            sinPhi = ops.sin(phi)
+            phi = math.pi / 2 - 2 * ops.atan(
+                t * ((1 - e * sinPhi) / (1 + e * sinPhi)) ** (e / 2))
+        return self._lon0 + ops.degrees(theta / self._n), ops.degrees(phi)
+########################################################################
+class _PyProj(_Projection):
+    """any coordinate system pyproj knows, used when it is installed"""
+    vectorized = True
+    #----------------------------------------------------------------------
+    def __init__(self, crs):
+        """Constructor"""
+        self._crs = pyproj.CRS.from_user_input(crs)
+        self.geographic = self._crs.is_geographic
+        if not self.geographic:
+            self.to_meter = self._crs.axis_info[0].unit_conversion_factor
+        self._forward = pyproj.Transformer.from_crs(
+            "EPSG:4326", self._crs, always_xy=True)
+        self._inverse = pyproj.Transformer.from_crs(
+            self._crs, "EPSG:4326", always_xy=True)
+    #----------------------------------------------------------------------
+    def forward(self, lon, lat, ops):
+        """degrees to projected coordinates"""
+        return self._forward.transform(lon, lat)
+    #----------------------------------------------------------------------
+    def inverse(self, x, y, ops):
+        """projected coordinates to degrees"""
+        return self._inverse.transform(x, y)
+#----------------------------------------------------------------------
+def _parse_proj(value):
+    """
+       returns a dictionary of proj parameters from a dictionary or a
+       "+proj=lcc +lat_1=..." string
+    """
+    if isinstance(value, dict):
+        return dict(value)
+    params = {}
+    for token in value.split():
+        token = token.lstrip("+")
+        if "=" in token:
+            key, val = token.split("=", 1)
+            try:
+                val = float(val)
+            except ValueError:
+                pass
+            params[key] = val
+        elif token:
+            params[token] = True
+    return params
+#----------------------------------------------------------------------
+def _ellipsoid(params):
+    """
+       returns the ellipsoid of proj style parameters.  WGS84 is used when
+       none is given; any ellipsoid, datum or datum shift other than
+       WGS84, GRS80 and NAD83 raises _Unsupported.
+    """
+    for key in ("towgs84", "nadgrids", "geoidgrids", "a", "b", "rf", "f",
+                "es", "e"):
+        if key in params:
+            if key == "towgs84" and \
+               all(float(v) == 0 for v in ("%s" % params[key]).split(",")):
+                continue
+            if key == "nadgrids" and params[key] == "@null":
+                continue
+            raise _Unsupported("proj parameter %s is not supported" % key)
+    ellipsoid = None
+    if 'datum' in params:
+        ellipsoid = _DATUMS.get(params['datum'])
+        if ellipsoid is None:
+            raise _Unsupported("datum %s is not supported" % params['datum'])
+    if 'ellps' in params:
+        value = _ELLIPSOIDS.get(params['ellps'])
+        if value is None:
+            raise _Unsupported("ellipsoid %s is not supported" % params['ellps'])
+        ellipsoid = ellipsoid or value
+    return ellipsoid or _WGS84
+#----------------------------------------------------------------------
+def _from_proj(value):
+    """
+       builds a _Projection from proj style parameters.  Raises
+       _Unsupported for an ellipsoid or datum that needs a datum shift.
+    """
+    params = _parse_proj(value)
+    kind = params.get('proj')
+    if kind == "webmerc" or \
+       (kind == "merc" and params.get('a') == params.get('b') == 6378137):
+        return _WebMercator()
+    ellipsoid = _ellipsoid(params)
+    to_meter = params.get('to_meter') or \
+        _PROJ_UNITS.get(params.get('units', "m"), 1.0)
+    if kind in ("longlat", "latlong", "lonlat", "latlon"):
+        return _Geographic(ellipsoid)
+    elif kind == "utm":
+        zone = int(params['zone'])
+        return _TransverseMercator(lon_0=zone * 6 - 183, k_0=0.9996,
+                                   x_0=500000.0,
+                                   y_0=10000000.0 if params.get('south') \
+                                   else 0.0,
+                                   ellipsoid=ellipsoid, to_meter=to_meter)
+    elif kind == "tmerc":
+        return _TransverseMercator(lon_0=params.get('lon_0', 0.0),
+                                   lat_0=params.get('lat_0', 0.0),
+                                   k_0=params.get('k_0', params.get('k', 1.0)),
+                                   x_0=params.get('x_0', 0.0),
+                                   y_0=params.get('y_0', 0.0),
+                                   ellipsoid=ellipsoid, to_meter=to_meter)
+    elif kind == "lcc":
+        return _LambertConformalConic(lat_1=params['lat_1'],
+                                      lat_2=params.get('lat_2'),
+                                      lon_0=params.get('lon_0', 0.0),
+                                      lat_0=params.get('lat_0', 0.0),
+                                      k_0=params.get('k_0', params.get('k', 1.0)),
+                                      x_0=params.get('x_0', 0.0),
+                                      y_0=params.get('y_0', 0.0),
+                                      ellipsoid=ellipsoid, to_meter=to_meter)
+    raise ValueError("Unsupported projection: %s" % value)
+#----------------------------------------------------------------------
+def _builtin(wkid):
+    """returns the _Projection of a well known id or None"""
+    if wkid == 4326:
+        return _Geographic(_WGS84)
+    elif wkid == 4269:
+        return _Geographic(_GRS80)
+    elif wkid in _WEB_MERCATOR:
+        return _WebMercator()
+    elif 32601 <= wkid <= 32660 or 32701 <= wkid <= 32760:
+        return _from_proj({"proj" : "utm", "zone" : wkid % 100,
+                           "south" : wkid > 32700})
+    elif 26901 <= wkid <= 26923:
+        return _from_proj({"proj" : "utm", "zone" : wkid - 26900,
+                           "ellps" : "GRS80"})
+    return None
+#----------------------------------------------------------------------
+def _wkid(sr):
+    """returns the wkid of a spatial reference value"""
+    if isinstance(sr, dict):
+        return sr.get('latestWkid', sr.get('wkid'))
+    elif isinstance(sr, six.string_types):
+        try:
+            return int(sr)
+        except ValueError:
+            return None
+    return sr
+#----------------------------------------------------------------------
+def _as_dictionary(geometry):
+    """returns a common.geometry object or Esri JSON dict as a dict"""
+    if isinstance(geometry, abstract.AbstractGeometry):
+        return geometry.asDictionary
+    return geometry
+#----------------------------------------------------------------------
+def _parts(geometry):
+    """returns the coordinate lists of a geometry dictionary"""
+    if 'x' in geometry:
+        return [[[geometry['x'], geometry['y']]]]
+    elif 'points' in geometry:
+        return [geometry['points']]
+    elif 'paths' in geometry:
+        return geometry['paths']
+    elif 'rings' in geometry:
+        return geometry['rings']
+    elif 'xmin' in geometry:
+        return [[[geometry['xmin'], geometry['ymin']],
+                 [geometry['xmax'], geometry['ymax']]]]
+    raise ValueError("Unknown geometry: %s" % geometry)
+#----------------------------------------------------------------------
+def _unit(value, default=1.0):
+    """meters per unit of an esriSRUnit code or name"""
+    if value in (None, ""):
+        return default
+    if isinstance(value, six.string_types) and value.isdigit():
+        value = int(value)
+    if value not in _LINEAR_UNITS:
+        raise ValueError("Unsupported unit: %s" % value)
+    return _LINEAR_UNITS[value]
+########################################################################
+class _Unsupported(Exception):
+    """raised when an operation has to be sent to the remote service"""
+    pass
+# marks a registered wkid whose parameters can not be used locally
+_REMOTE = object()
+########################################################################
+class LocalGeometryService(object):
+    """
+       Performs the common GeometryService operations in process with the
+       same method signatures: project, buffer (of points), lengths,
+       areasAndLengths and distance.  Coordinates of all the geometries of
+       a call are converted in one pass, as numpy arrays when numpy is
+       installed.
+
+       Built in coordinate systems are WGS84 (4326), NAD83 (4269), Web
+       Mercator (3857, 102100) and UTM (326xx, 327xx, 269xx).  Others,
+       such as State Plane zones, are registered with proj style
+       parameters, or resolved by pyproj when it is installed.  No datum
+       transformation is applied between WGS84 and NAD83, which matches
+       the remote service when no transformation is given.
+
+       Calls that cannot be done locally (other geometry operations,
+       unknown coordinate systems, geographic transformations, buffers
+       of lines and polygons, geodesic areas) are sent to the remote
+       service; other GeometryService methods are forwarded as well.
+
+       Throughput: without numpy the coordinates are converted one at a
+       time in Python, about 340,000 points a second to Web Mercator and
+       190,000 to UTM under CPython 2.7.  Rates near a million points a
+       second need numpy.
+
+       Inputs:
+          service - optional remote GeometryService for fallback
+          projections - optional dictionary of wkid to proj parameters as
+                        a dictionary or string, for example
+                        {2227 : "+proj=lcc +lat_1=38.43333333333333
+                        +lat_2=37.06666666666667 +lat_0=36.5 +lon_0=-120.5
+                        +x_0=2000000.0001016 +y_0=500000.0001016
+                        +ellps=GRS80 +units=us-ft"}
+    """
+    _service = None
+    _projections = None
+    #----------------------------------------------------------------------
+    def __init__(self, service=None, projections=None):
+        """Constructor"""
+        self._service = service
+        self._projections = {}
+        for wkid, params in (projections or {}).items():
+            self.addProjection(wkid, params)
+    #----------------------------------------------------------------------
+    def __getattr__(self, name):
+        """forwards the other GeometryService methods to the service"""
+        if name.startswith("_") or self._service is None:
+            raise AttributeError(name)
+        return getattr(self._service, name)
+    #----------------------------------------------------------------------
+    @property
+    def service(self):
+        """gets the remote GeometryService used for fallback"""
+        return self._service
+    #----------------------------------------------------------------------
+    def addProjection(self, wkid, params):
+        """
+           registers a coordinate system
+           Inputs:
+              wkid - well known id used in spatial references
+              params - proj style parameters, as a dictionary or a
+                       "+proj=tmerc +lat_0=..." string. Supported
+                       projections are longlat, webmerc, utm, tmerc and
+                       lcc; units and to_meter are honored.  The ellps
+                       (WGS84 or GRS80) or datum (WGS84 or NAD83) must
+                       be one that needs no datum shift; calls using a
+                       system on any other ellipsoid or datum are sent
+                       to the remote service.
+        """
+        try:
+            self._projections[int(wkid)] = _from_proj(params)
+        except _Unsupported:
+            self._projections[int(wkid)] = _REMOTE
+    #----------------------------------------------------------------------
+    def _projection(self, sr):
+        """returns the _Projection of a spatial reference"""
+        wkid = _wkid(sr)
+        if wkid is None:
+            raise _Unsupported()
+        wkid = int(wkid)
+        projection = self._projections.get(wkid)
+        if projection is _REMOTE:
+            raise _Unsupported()
+        if projection is None:
+            projection = _builtin(wkid)
+            if projection is None and pyprojFound:
+                try:
+                    projection = _PyProj("EPSG:%s" % wkid)
+                except Exception:
+                    projection = None
+            if projection is None:
+                raise _Unsupported()
+            self._projections[wkid] = projection
+        return projection
+    #----------------------------------------------------------------------
+    def _fallback(self, name, *args, **kwargs):
+        """sends an unsupported call to the remote service"""
+        if self._service is None:
+            raise ValueError("%s is not supported locally for these "
+                             "inputs and no GeometryService was given" % name)
+        return getattr(self._service, name)(*args, **kwargs)
+    #----------------------------------------------------------------------
+    def _transform(self, inProjection, outProjection, xs, ys):
+        """converts coordinate lists between two coordinate systems"""
+        if inProjection is outProjection:
+            return xs, ys
+        for projection, method in ((inProjection, "inverse"),
+                                   (outProjection, "forward")):
+            if projection.geographic:
+                continue
+            function = getattr(projection, method)
+            if projection.vectorized:
+                xs, ys = function(xs, ys, None)
+                xs, ys = list(xs), list(ys)
+            else:
+                xs, ys = _apply(function, xs, ys)
+        return xs, ys
+    #----------------------------------------------------------------------
+    def _to_lonlat(self, projection, xs, ys):
+        """converts coordinate lists to longitude/latitude degrees"""
+        if projection.geographic:
+            return xs, ys
+        return self._transform(projection, _Geographic(), xs, ys)
+    #----------------------------------------------------------------------
+    def project(self,
+                geometries,
+                inSR,
+                outSR,
+                transformation="",
+                transformFoward=False):
+        """
+           projects geometries locally
+           Inputs:
+              geometries - list of common.geometry objects or Esri JSON
+                           geometry dictionaries
+              inSR - wkid or spatial reference of the inputs
+              outSR - wkid or spatial reference to project to
+              transformation - a geographic transformation sends the
+                               call to the remote service
+              transformFoward - passed to the remote service
+           Output:
+              dictionary with the projected geometries, as the service
+              returns them
+        """
+        try:
+            if transformation:
+                raise _Unsupported()
+            inProjection = self._projection(inSR)
+            outProjection = self._projection(outSR)
+        except _Unsupported:
+            return self._fallback("project", geometries, inSR, outSR,
+                                  transformation, transformFoward)
+        dicts = [_as_dictionary(g) for g in geometries]
+        xs = []
+        ys = []
+        for geometry in dicts:
+            if 'x' in geometry:
+                xs.append(geometry['x'])
+                ys.append(geometry['y'])
+                continue
+            for part in _parts(geometry):
+                xs.extend([c[0] for c in part])
+                ys.extend([c[1] for c in part])
+        xs, ys = self._transform(inProjection, outProjection, xs, ys)
+        sr = outSR if isinstance(outSR, dict) else {"wkid" : _wkid(outSR)}
+        output = []
+        position = 0
+        for geometry in dicts:
+            result = dict(geometry)
+            result['spatialReference'] = sr
+            if 'x' in geometry:
+                result['x'] = xs[position]
+                result['y'] = ys[position]
+                position += 1
+            elif 'xmin' in geometry:
+                result['xmin'], result['xmax'] = \
+                    xs[position], xs[position + 1]
+                result['ymin'], result['ymax'] = \
+                    ys[position], ys[position + 1]
+                position += 2
+            else:
+                key = "points" if 'points' in geometry else \
+                    "paths" if 'paths' in geometry else "rings"
+                parts = []
+                for part in _parts(geometry):
+                    end = position + len(part)
+                    parts.append([[x, y] + list(c[2:]) for x, y, c in
+                                  zip(xs[position:end], ys[position:end],
+                                      part)])
+                    position = end
+                result[key] = parts[0] if key == "points" else parts
+            output.append(result)
+        return {"geometries" : output}
+    #----------------------------------------------------------------------
+    def buffer(self,
+               geometries,
+               inSR,
+               distances,
+               units,
+               outSR=None,
+               bufferSR=None,
+               unionResults=True,
+               geodesic=True
+               ):
+        """
+           buffers points locally.  Geodesic buffers are true geodesic
+           circles; planar buffers are circles in bufferSR (or inSR).
+           Lines, polygons and unioned results of several geometries are
+           buffered by the remote service.
+           Inputs:
+              geometries - list of Point objects or point dictionaries
+              inSR - spatial reference of the points
+              distances - distance or list of distances
+              units - esriSRUnit code or name of the distances, defaults
+                      to the units of the buffer spatial reference
+              outSR - spatial reference of the output, defaults to inSR
+              bufferSR - spatial reference planar buffers are built in
+              unionResults - unioning several buffers is done remotely
+              geodesic - build geodesic circles
+           Output:
+              dictionary with one polygon per point per distance, grouped
+              by distance
+        """
+        dicts = [_as_dictionary(g) for g in geometries]
+        if not isinstance(distances, (list, tuple)):
+            distances = [distances]
+        distances = [float(d) for d in distances]
+        try:
+            if any('x' not in g for g in dicts) or \
+               (unionResults and len(dicts) * len(distances) > 1):
+                raise _Unsupported()
+            inProjection = self._projection(inSR)
+            outProjection = self._projection(outSR or inSR)
+            bufferProjection = self._projection(bufferSR or inSR)
+            if not geodesic and bufferProjection.geographic:
+                raise _Unsupported()
+            factor = _unit(units, bufferProjection.to_meter)
+        except _Unsupported:
+            return self._fallback("buffer", geometries, inSR, distances,
+                                  units, outSR, bufferSR, unionResults,
+                                  geodesic)
+        xs = [g['x'] for g in dicts]
+        ys = [g['y'] for g in dicts]
+        steps = [360.0 * i / _BUFFER_VERTICES for i in range(_BUFFER_VERTICES)]
+        if geodesic:
+            lons, lats = self._to_lonlat(inProjection, xs, ys)
+            ellipsoid = bufferProjection.ellipsoid
+            projection = _Geographic(ellipsoid)
+        else:
+            lons, lats = self._transform(inProjection, bufferProjection, xs, ys)
+            projection = bufferProjection
+        rings = []
+        for distance in distances:
+            meters = distance * factor
+            ringX = []
+            ringY = []
+            for lon, lat in zip(lons, lats):
+                ringX.extend([lon] * _BUFFER_VERTICES)
+                ringY.extend([lat] * _BUFFER_VERTICES)
+            azimuths = steps * len(lons)
+            if geodesic:
+                if numpyFound:
+                    bx, by = _vincenty_direct(np.asarray(ringX), np.asarray(ringY),
+                                              np.asarray(azimuths), meters,
+                                              _NUMPY, ellipsoid)
+                    bx, by = bx.tolist(), by.tolist()
+                else:
+                    points = [_vincenty_direct(x, y, az, meters, _MATH,
+                                               ellipsoid)
+                              for x, y, az in zip(ringX, ringY, azimuths)]
+                    bx = [p[0] for p in points]
+                    by = [p[1] for p in points]
+            else:
+                radius = meters / projection.to_meter
+                bx = [x + radius * math.sin(math.radians(az))
+                      for x, az in zip(ringX, azimuths)]
+                by = [y + radius * math.cos(math.radians(az))
+                      for y, az in zip(ringY, azimuths)]
+            bx, by = self._transform(projection, outProjection, bx, by)
+            for start in range(0, len(bx), _BUFFER_VERTICES):
+                ring = [[x, y] for x, y in
+                        zip(bx[start:start + _BUFFER_VERTICES],
+                            by[start:start + _BUFFER_VERTICES])]
+                ring.append(list(ring[0]))
+                rings.append(ring)
+        sr = outSR or inSR
+        sr = sr if isinstance(sr, dict) else {"wkid" : _wkid(sr)}
+        return {"geometryType" : "esriGeometryPolygon",
+                "geometries" : [{"rings" : [ring], "spatialReference" : sr}
+                                for ring in rings]}
+    #----------------------------------------------------------------------
+    def _segment_lengths(self, projection, parts, geodesic):
+        """returns the length in meters (or SR units) of each part"""
+        x1 = []
+        y1 = []
+        x2 = []
+        y2 = []
+        counts = []
+        for part in parts:
+            counts.append(max(len(part) - 1, 0))
+            x1.extend([c[0] for c in part[:-1]])
+            y1.extend([c[1] for c in part[:-1]])
+            x2.extend([c[0] for c in part[1:]])
+            y2.extend([c[1] for c in part[1:]])
+        if geodesic:
+            x1, y1 = self._to_lonlat(projection, x1, y1)
+            x2, y2 = self._to_lonlat(projection, x2, y2)
+            if numpyFound and len(x1) > 0:
+                lengths = _vincenty_inverse(np.asarray(x1), np.asarray(y1),
+                                            np.asarray(x2), np.asarray(y2),
+                                            _NUMPY,
+                                            projection.ellipsoid).tolist()
+            else:
+                lengths = [_vincenty_inverse(a, b, c, d, _MATH,
+                                             projection.ellipsoid)
+                           for a, b, c, d in zip(x1, y1, x2, y2)]
+        else:
+            lengths = [math.hypot(c - a, d - b) * projection.to_meter
+                       for a, b, c, d in zip(x1, y1, x2, y2)]
+        totals = []
+        position = 0
+        for count in counts:
+            totals.append(sum(lengths[position:position + count]))
+            position += count
+        return totals
+    #----------------------------------------------------------------------
+    def lengths(self,
+                sr,
+                polylines,
+                lengthUnit,
+                calculationType
+                ):
+        """
+           calculates polyline lengths locally for the planar and geodesic
+           calculation types; preserveShape is sent to the remote service
+           Inputs:
+              sr - spatial reference of the polylines
+              polylines - list of Polyline objects or dictionaries
+              lengthUnit - esriSRUnit code or name, defaults to the units
+                           of sr for planar and meters for geodesic
+              calculationType - planar | geodesic | preserveShape
+           Output:
+              dictionary with the lengths
+        """
+        try:
+            if calculationType not in ("planar", "geodesic"):
+                raise _Unsupported()
+            projection = self._projection(sr)
+            geodesic = calculationType == "geodesic"
+            if not geodesic and projection.geographic and \
+               lengthUnit not in (None, ""):
+                raise _Unsupported()
+            factor = _unit(lengthUnit,
+                           1.0 if geodesic else projection.to_meter)
+        except _Unsupported:
+            return self._fallback("lengths", sr, polylines, lengthUnit,
+                                  calculationType)
+        results = []
+        for polyline in polylines:
+            parts = _parts(_as_dictionary(polyline))
+            results.append(sum(self._segment_lengths(projection, parts,
+                                                     geodesic)) / factor)
+        return {"lengths" : results}
+    #----------------------------------------------------------------------
+    def areasAndLengths(self,
+                        polygons,
+                        lengthUnit,
+                        areaUnit,
+                        calculationType,
+                        ):
+        """
+           calculates planar polygon areas and perimeters locally; the
+           geodesic and preserveShape types are sent to the remote service
+           Inputs:
+              polygons - list of Polygon objects or dictionaries with a
+                         spatialReference
+              lengthUnit - esriSRUnit code or name of the perimeters
+              areaUnit - esriAreaUnits name of the areas
+              calculationType - planar | geodesic | preserveShape
+           Output:
+              dictionary with the areas and lengths
+        """
+        dicts = [_as_dictionary(p) for p in polygons]
+        try:
+            if calculationType != "planar" or len(dicts) == 0:
+                raise _Unsupported()
+            projection = self._projection(dicts[0].get('spatialReference'))
+            if projection.geographic and \
+               (lengthUnit not in (None, "") or areaUnit not in (None, "")):
+                raise _Unsupported()
+            factor = _unit(lengthUnit, projection.to_meter)
+            if isinstance(areaUnit, dict):
+                areaUnit = areaUnit.get('areaUnit')
+            if areaUnit in (None, ""):
+                areaFactor = projection.to_meter ** 2
+            elif areaUnit in _AREA_UNITS:
+                areaFactor = _AREA_UNITS[areaUnit]
+            else:
+                raise _Unsupported()
+        except _Unsupported:
+            return self._fallback("areasAndLengths", polygons, lengthUnit,
+                                  areaUnit, calculationType)
+        areas = []
+        lengths = []
+        for polygon in dicts:
+            rings = polygon.get('rings', [])
+            area = 0.0
+            for ring in rings:
+                # shoelace sum; clockwise outer rings are positive,
+                # counterclockwise holes negative
+                xs = [c[0] for c in ring]
+                ys = [c[1] for c in ring]
+                area += sum(x1 * y2 - x2 * y1 for x1, y1, x2, y2 in
+                            zip(xs, ys, xs[1:], ys[1:])) / -2.0
+            areas.append(area * projection.to_meter ** 2 / areaFactor)
+            lengths.append(sum(self._segment_lengths(projection, rings,
+                                                     False)) / factor)
+        return {"areas" : areas, "lengths" : lengths}
+    #----------------------------------------------------------------------
+    def distance(self,
+                 sr,
+                 geometry1,
+                 geometry2,
+                 distanceUnit="",
+                 geodesic=False
+                 ):
+        """
+           returns the distance between two geometries.  Point to point
+           distances are computed locally (planar or geodesic), as are
+           planar distances from a point to a multipoint or polyline;
+           other combinations are sent to the remote service.
+           Inputs:
+              sr - spatial reference of the geometries
+              geometry1, geometry2 - geometries or dictionaries
+              distanceUnit - esriSRUnit code or name, defaults to the
+                             units of sr (meters when geodesic)
+              geodesic - measure the geodesic distance
+           Output:
+              dictionary with the distance
+        """
+        g1 = _as_dictionary(geometry1)
+        g2 = _as_dictionary(geometry2)
+        if 'x' not in g1:
+            g1, g2 = g2, g1
+        try:
+            if 'x' not in g1 or 'rings' in g2 or 'xmin' in g2 or \
+               (geodesic and 'x' not in g2):
+                raise _Unsupported()
+            projection = self._projection(sr)
+            if not geodesic and projection.geographic and \
+               distanceUnit not in (None, ""):
+                raise _Unsupported()
+            factor = _unit(distanceUnit,
+                           1.0 if geodesic else projection.to_meter)
+        except _Unsupported:
+            return self._fallback("distance", sr, geometry1, geometry2,
+                                  distanceUnit, geodesic)
+        if geodesic:
+            meters = self._segment_lengths(projection,
+                                           [[[g1['x'], g1['y']],
+                                             [g2['x'], g2['y']]]], True)[0]
+            return {"distance" : meters / factor}
+        px, py = g1['x'], g1['y']
+        best = None
+        for part in _parts(g2):
+            if len(part) == 1:
+                candidates = [math.hypot(part[0][0] - px, part[0][1] - py)]
+            elif 'points' in g2:
+                candidates = [math.hypot(c[0] - px, c[1] - py) for c in part]
+            else:
+                candidates = []
+                for (ax, ay), (bx, by) in zip([c[:2] for c in part[:-1]],
+                                              [c[:2] for c in part[1:]]):
+                    dx = bx - ax
+                    dy = by - ay
+                    length = dx * dx + dy * dy
+                    t = 0.0
+                    if length > 0:
+                        t = max(0.0, min(1.0, ((px - ax) * dx +
+                                               (py - ay) * dy) / length))
+                    candidates.append(math.hypot(ax + t * dx - px,
+                                                 ay + t * dy - py))
+            if candidates:
+                value = min(candidates)
+                best = value if best is None else min(best, value)
+        return {"distance" : best * projection.to_meter / factor}
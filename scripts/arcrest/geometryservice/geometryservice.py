@@ -2,6 +2,8 @@ from __future__ import absolute_import
 from __future__ import print_function
 from .._abstract import abstract
 from ..common.geometry import Point, Polyline, Polygon, MultiPoint, Envelope
+from ..web._parallel import DEFAULT_WORKERS
+from ._batch import GeometryServiceBatch
 import json
 
 
@@ -708,16 +710,41 @@ class GeometryService(abstract.BaseAGSServer):
         params = {
             "f" : "json",
             "inSR" : inSR,
-            "geometries": self.__geometryListToGeomTemplate(geometries=geometries),
+            "geometries": json.dumps(self.__geometryListToGeomTemplate(geometries=geometries)),
             "outSR" : outSR,
             "transformation" : transformation,
-            "transformFoward": transformFoward
+            "transformForward": transformFoward
         }
-        return self._get(url=url, param_dict=params,
+        return self._post(url=url, param_dict=params,
                             securityHandler=self._securityHandler,
                             proxy_url=self._proxy_url,
                             proxy_port=self._proxy_port)
     #----------------------------------------------------------------------
+    def batched(self, max_geometries=1000, max_vertices=100000,
+                max_bytes=2097152, max_workers=DEFAULT_WORKERS,
+                raise_errors=True):
+        """
+           returns a GeometryServiceBatch that splits project, buffer,
+           simplify, lengths, areasAndLengths, union and distance calls
+           on large geometry lists into batches sent at the same time.
+
+           Inputs:
+              max_geometries - most geometries in one request
+              max_vertices - most vertices in one request
+              max_bytes - most bytes of geometry JSON in one request
+              max_workers - number of requests sent at the same time
+              raise_errors - if False, geometries that fail on their own
+                             get a BatchError in place of a result
+           Output:
+              GeometryServiceBatch
+        """
+        return GeometryServiceBatch(service=self,
+                                    max_geometries=max_geometries,
+                                    max_vertices=max_vertices,
+                                    max_bytes=max_bytes,
+                                    max_workers=max_workers,
+                                    raise_errors=raise_errors)
+    #----------------------------------------------------------------------
     def relation(self,
                  geometries1,
                  geometries2,
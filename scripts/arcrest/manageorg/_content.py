@@ -6,6 +6,8 @@ from ..security import OAuthSecurityHandler, AGOLTokenSecurityHandler, PortalTok
 from .._abstract.abstract import BaseAGOLClass
 from ._parameters import ItemParameter, BaseParameters, AnalyzeParameters, PublishCSVParameters
 from ._community import Group as CommunityGroup
+from ..web._parts import PartUploader, part_numbers, succeeded
+from ..web._download import DownloadManager
 import json
 import os
 import mmap
@@ -749,14 +751,12 @@ class Item(BaseAGOLClass):
                 raise AttributeError('savePath must be provided for a item of type: %s' % self.type)
             if os.path.isdir(savePath) == False:
                 os.makedirs(savePath)
-            result = self._get(url=url,
+            dm = DownloadManager(securityHandler=self._securityHandler,
+                                 proxy_url=self._proxy_url,
+                                 proxy_port=self._proxy_port)
+            return dm.download(url=url,
                                param_dict=params,
-                               securityHandler=self._securityHandler,
-                               proxy_url=self._proxy_url,
-                               proxy_port=self._proxy_port,
-                               out_folder=savePath,
-                               file_name=self.name)
-            return result
+                               out_folder=savePath)
         else:
             results =  self._get(url, params,
                                  proxy_port=self._proxy_port,
@@ -1016,6 +1016,7 @@ class Item(BaseAGOLClass):
 class UserItem(BaseAGOLClass):
     """represents a single item on the site for a given user"""
     _url = None
+    _uploader = None
     _itemType = None
     _uploaded = None
     _lastModified = None
@@ -1781,35 +1782,37 @@ class UserItem(BaseAGOLClass):
         }
         for key, value in additionalParams.items():
             params[key] = value
-        if wait == True:
-            res = self._post(url=url,
-                                param_dict=params,
-                                securityHandler=self._securityHandler,
-                                proxy_port=self._proxy_port,
-                                proxy_url=self._proxy_url)
+        res = self._post(url=url,
+                         param_dict=params,
+                         securityHandler=self._securityHandler,
+                         proxy_port=self._proxy_port,
+                         proxy_url=self._proxy_url)
+        if wait == True and succeeded(res):
             res = self.status()
-            import time
             while res['status'].lower() in ["partial", "processing"]:
                 time.sleep(2)
                 res = self.status()
-            return res
-        else:
-            return self._post(url=url,
-                                 param_dict=params,
-                                 securityHandler=self._securityHandler,
-                                 proxy_port=self._proxy_port,
-                                 proxy_url=self._proxy_url)
+        if succeeded(res) and self._uploader is not None:
+            # the parts are merged, a resumed addByPart has nothing to skip
+            self._uploader.clear_manifest()
+            self._uploader = None
+        return res
     #----------------------------------------------------------------------
-    def addByPart(self, filePath):
+    def addByPart(self, filePath, part_size=10000000, max_workers=4,
+                  resume=True):
         """
-           Allows for large file uploads to be split into 50 MB chunks and
+           Allows for large file uploads to be split into 10 MB chunks and
            to be sent to AGOL/Portal.  This resolves an issue in Python,
-           where the multi-part POST runs out of memory.
+           where the multi-part POST runs out of memory.  The parts are
+           posted from a memory mapped view of the file on several threads.
+           When resume is True, running the function again on the same
+           item only sends the parts the portal does not have yet.
            To use this function, an addItem() must be run first and that
            item id must be passed into this function.
 
            Once the file is uploaded, a commit() must be performed on the
-           data to have all the parts merged together.
+           data to have all the parts merged together.  The resume
+           manifest is kept until that commit() returns success.
 
            No item properties will be inherited from the initial AddItem()
            call unless it is an sd file.  Therefore you must call
@@ -1830,43 +1833,48 @@ class UserItem(BaseAGOLClass):
               # Item added and updated.
            Inputs:
               filePath - location of the file on disk
-              itemId - empty item added to AGOL/Portal
-              folder - folder id
-        """
-        def read_in_chunks(file_object, chunk_size=10000000):
-            """Generate file chunks of 10MB"""
-            while True:
-                data = file_object.read(chunk_size)
-                if not data:
-                    break
-                yield data
-        params = {
-        "f" : "json",
-        'itemType' : 'file'
-        }
+              part_size - size of each part in bytes, default 10 MB.
+              max_workers - number of parts uploaded at the same time.
+              resume - default True, skips parts uploaded by an earlier
+                       call.
+           Output:
+              list of the part responses in part order
+        """
         url = '%s/addPart' % self.root
+        def upload_part(part_num, part):
+            params = {
+                "f" : "json",
+                'itemType' : 'file',
+                'partNum' : part_num
+            }
+            return self._post(url=url,
+                              param_dict=params,
+                              files={'file' : part},
+                              securityHandler=self._securityHandler,
+                              proxy_url=self._proxy_url,
+                              proxy_port=self._proxy_port)
+        committed = None
+        if resume:
+            committed = part_numbers(self.parts)
+        uploader = PartUploader(filePath=filePath,
+                                upload_part=upload_part,
+                                key=self.root,
+                                part_size=part_size,
+                                max_workers=max_workers,
+                                manifest_path=None if resume else False)
+        result = uploader.upload(committed=committed)
         messages = []
-        files = {}
-        with open(filePath, 'rb') as f:
-            for part_num, piece in enumerate(read_in_chunks(f), start=1):
-                params['partNum'] = part_num
-                tempFile = os.path.join(os.environ['TEMP'], "split.part%s" % part_num)
-                files['file'] =  [tempFile, os.path.basename(filePath)]
-                with open(tempFile, 'wb') as writer:
-                    writer.write(piece)
-                    del writer
-                res = self._post(url=url,
-                                 param_dict=params,
-                                 files=files,
-                                 securityHandler=self._securityHandler,
-                                 proxy_url=self._proxy_url,
-                                 proxy_port=self._proxy_port)
-                if os.path.isfile(tempFile):
-                    os.remove(tempFile)
-                del files
-                del tempFile
-                files = {}
-                messages.append(res)
+        for part_num in result['parts']:
+            if part_num in result['failed']:
+                messages.append(result['failed'][part_num])
+            elif part_num in result['responses']:
+                messages.append(result['responses'][part_num])
+            else:
+                messages.append({"partNum" : part_num,
+                                 "success" : True,
+                                 "skipped" : True})
+        # the manifest is removed by commit() once the parts are merged
+        self._uploader = uploader
         return messages
 ########################################################################
 class User(BaseAGOLClass):
@@ -6,6 +6,7 @@ from __future__ import print_function
 import json
 from ._base import BaseOpenData
 from ._web import WebOperations
+from ..web._download import DownloadManager
 ########################################################################
 class OpenData(BaseOpenData, WebOperations):
     """Represents an open data site
@@ -143,10 +144,11 @@ class OpenDataItem(BaseOpenData, WebOperations):
         """exports a dataset t"""
         export_formats = {'shp':".zip", 'kml':'.kml', 'geojson':".geojson",'csv': '.csv'}
         url = "%s/%s%s" % (self._url, self._itemId, export_formats[outFormat])
-        results =  self._get(url=url,
-                    securityHandler=self._securityHandler,
-                    out_folder=outFolder)
-        if 'status' in results:
+        dm = DownloadManager(securityHandler=self._securityHandler,
+                             proxy_url=self._proxy_url,
+                             proxy_port=self._proxy_port)
+        results = dm.download(url=url, out_folder=outFolder)
+        if isinstance(results, dict) and 'status' in results:
             self.time.sleep(7)
             results = self.export(outFormat=outFormat, outFolder=outFolder)
         return results
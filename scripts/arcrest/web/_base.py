@@ -4,35 +4,34 @@
 """
 from __future__ import absolute_import
 from __future__ import print_function
-import io
 import os
 import re
+import mmap
 import ssl
 import sys
 import json
 import uuid
 import zlib
 from inspect import getargspec
-import shutil
 import tempfile
 import mimetypes
 import email.generator
 
-from io import BytesIO
-try:
-    from cStringIO import StringIO
-except ImportError:
-    from io import StringIO
-
+from ..packages import six
 from ..packages.six.moves.urllib import request
 from ..packages.six.moves import http_cookiejar as cookiejar
 from ..packages.six.moves.urllib_parse import urlencode
 from ..packages.six.moves.urllib.error import HTTPError
+from ._retry import RetryPolicy, RateLimiter
 ########################################################################
 __version__ = "3.5.3"
 ########################################################################
 VERIFY_SSL_CERTIFICATES = True
 USER_AGENT = "python-requests/2.9.1"
+# default retry policy used by every web operation, set to None to disable
+RETRY_POLICY = RetryPolicy()
+# marks a retry_policy that was never set on an object
+_DEFAULT_POLICY = object()
 class BaseOperation(object):
     """base class for all objects"""
     _error = None
@@ -68,6 +67,159 @@ class RedirectHandler(request.HTTPRedirectHandler):
         result.status = code
         return result
 ########################################################################
+def _to_bytes(value):
+    """converts a form value to bytes for a multipart body"""
+    if isinstance(value, bytes):
+        return value
+    elif isinstance(value, six.text_type):
+        return value.encode('utf-8')
+    return _to_bytes(str(value))
+########################################################################
+class _BufferSegment(object):
+    """a window of a bytes like object (bytes, mmap) in a multipart body"""
+    _data = None
+    _offset = 0
+    _length = 0
+    _pos = 0
+    #----------------------------------------------------------------------
+    def __init__(self, data, offset=0, length=None):
+        """Constructor"""
+        self._data = data
+        self._offset = offset
+        if length is None:
+            length = len(data) - offset
+        self._length = length
+        self._pos = 0
+    #----------------------------------------------------------------------
+    def __len__(self):
+        return self._length
+    #----------------------------------------------------------------------
+    def read(self, size):
+        """reads up to size bytes from the segment"""
+        size = min(size, self._length - self._pos)
+        if size <= 0:
+            return b""
+        start = self._offset + self._pos
+        self._pos += size
+        return self._data[start:start + size]
+    #----------------------------------------------------------------------
+    def close(self):
+        """rewinds the segment"""
+        self._pos = 0
+########################################################################
+class BufferPart(_BufferSegment):
+    """
+    A slice of a bytes or mmap object that can be passed as a value of
+    the files dictionary of a POST instead of a file path.
+    Inputs:
+       data - bytes or mmap object
+       filename - name of the file reported to the server
+       offset - position of the first byte to send
+       length - number of bytes to send, default is to the end of data
+    """
+    filename = None
+    #----------------------------------------------------------------------
+    def __init__(self, data, filename, offset=0, length=None):
+        """Constructor"""
+        _BufferSegment.__init__(self, data, offset, length)
+        self.filename = filename
+########################################################################
+class _FileSegment(_BufferSegment):
+    """a file on disk in a multipart body, read only while it is sent"""
+    _path = None
+    _handle = None
+    _mmap = None
+    #----------------------------------------------------------------------
+    def __init__(self, path):
+        """Constructor"""
+        self._path = path
+        self._length = os.path.getsize(path)
+        self._pos = 0
+    #----------------------------------------------------------------------
+    def _open(self):
+        """opens the file, memory mapping it when the platform allows"""
+        self._handle = open(self._path, 'rb')
+        self._data = None
+        if self._length > 0:
+            try:
+                self._mmap = mmap.mmap(self._handle.fileno(), 0,
+                                       access=mmap.ACCESS_READ)
+                self._data = self._mmap
+            except (ValueError, EnvironmentError, OverflowError):
+                self._mmap = None
+    #----------------------------------------------------------------------
+    def read(self, size):
+        """reads up to size bytes from the file"""
+        if self._handle is None:
+            self._open()
+        if self._data is not None:
+            return _BufferSegment.read(self, size)
+        size = min(size, self._length - self._pos)
+        if size <= 0:
+            return b""
+        data = self._handle.read(size)
+        self._pos += len(data)
+        return data
+    #----------------------------------------------------------------------
+    def close(self):
+        """releases the file handle and memory map"""
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+        self._data = None
+        self._pos = 0
+########################################################################
+class MultiPartStream(object):
+    """
+    File like object that produces a multipart/form-data body on demand.
+    The length of the body is known up front, but files are only read
+    from disk, piece by piece, while the request is being sent.
+    """
+    _segments = None
+    _index = 0
+    _length = 0
+    #----------------------------------------------------------------------
+    def __init__(self, segments):
+        """Constructor"""
+        self._segments = [_BufferSegment(seg) if isinstance(seg, bytes) else seg
+                          for seg in segments]
+        self._index = 0
+        self._length = sum(len(seg) for seg in self._segments)
+    #----------------------------------------------------------------------
+    def __len__(self):
+        return self._length
+    #----------------------------------------------------------------------
+    def read(self, size=-1):
+        """reads up to size bytes of the body, all of it if size < 0"""
+        if size is None or size < 0:
+            size = self._length
+        chunks = []
+        while size > 0 and self._index < len(self._segments):
+            segment = self._segments[self._index]
+            data = segment.read(size)
+            if not data:
+                segment.close()
+                self._index += 1
+                continue
+            chunks.append(data)
+            size -= len(data)
+        return b"".join(chunks)
+    #----------------------------------------------------------------------
+    def seek(self, offset, whence=0):
+        """rewinds the body, only seek(0) is supported"""
+        if offset != 0 or whence != 0:
+            raise IOError("MultiPartStream can only be rewound")
+        self.close()
+    #----------------------------------------------------------------------
+    def close(self):
+        """releases any open files and rewinds the body"""
+        for segment in self._segments:
+            segment.close()
+        self._index = 0
+########################################################################
 class MultiPartForm(object):
     """Accumulate the data to be used when posting a form."""
     PY2 = sys.version_info[0] == 2
@@ -94,6 +246,11 @@ class MultiPartForm(object):
             self.files = []
         else:
             for key,v in files.items():
+                if isinstance(v, BufferPart):
+                    self.add_buffer(fieldname=key,
+                                    filename=v.filename,
+                                    data=v)
+                    continue
                 if isinstance(v, list):
                     fileName = os.path.basename(v[1])
                     filePath = v[0]
@@ -128,66 +285,62 @@ class MultiPartForm(object):
             mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
         self.files.append((fieldname, filename, mimetype, body))
     #----------------------------------------------------------------------
-    @property
-    def make_result(self):
-        if self.PY2:
-            self._2()
-        elif self.PY3:
-            self._3()
-        return self.form_data
+    def add_buffer(self, fieldname, filename, data, offset=0, length=None,
+                   mimetype=None):
+        """Add an in memory file to be uploaded.
+        Inputs:
+           fieldname - name of the POST value
+           filename - name of the file to pass to the server
+           data - bytes, mmap or BufferPart object holding the file
+                  contents
+           offset - position of the first byte to send
+           length - number of bytes to send, default is to the end of data
+           mimetype - content type of the data. Default is None.
+        """
+        if mimetype is None:
+            mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        if not isinstance(data, _BufferSegment):
+            data = _BufferSegment(data, offset, length)
+        self.files.append((fieldname, filename, mimetype, data))
     #----------------------------------------------------------------------
-    def _2(self):
-        """python 2.x version of formatting body data"""
+    @property
+    def make_stream(self):
+        """returns the form body as a MultiPartStream"""
         boundary = self.boundary
-        buf = StringIO()
+        segments = []
         for (key, value) in self.form_fields:
-            buf.write('--%s\r\n' % boundary)
-            buf.write('Content-Disposition: form-data; name="%s"' % key)
-            buf.write('\r\n\r\n%s\r\n' % value)
-        for (key, filename, mimetype, filepath) in self.files:
-            if os.path.isfile(filepath):
-                buf.write('--{boundary}\r\n'
-                          'Content-Disposition: form-data; name="{key}"; '
-                          'filename="{filename}"\r\n'
-                          'Content-Type: {content_type}\r\n\r\n'.format(
-                              boundary=boundary,
-                              key=key,
-                              filename=filename,
-                              content_type=mimetype))
-                with open(filepath, "rb") as f:
-                    shutil.copyfileobj(f, buf)
-                buf.write('\r\n')
-        buf.write('--' + boundary + '--\r\n\r\n')
-        buf = buf.getvalue()
-        self.form_data = buf
-    #----------------------------------------------------------------------
-    def _3(self):
-        """ python 3 method"""
-        boundary = self.boundary
-        buf = BytesIO()
-        textwriter = io.TextIOWrapper(
-            buf, 'utf8', newline='', write_through=True)
-
-        for (key, value) in self.form_fields:
-            textwriter.write(
+            segments.append(_to_bytes(
+                '--%s\r\n'
+                'Content-Disposition: form-data; name="%s"\r\n\r\n' % (boundary, key)) +
+                            _to_bytes(value) + b'\r\n')
+        for (key, filename, mimetype, body) in self.files:
+            if isinstance(body, _BufferSegment):
+                segment = body
+            elif os.path.isfile(body):
+                segment = _FileSegment(body)
+            else:
+                continue
+            segments.append(_to_bytes(
                 '--{boundary}\r\n'
-                'Content-Disposition: form-data; name="{key}"\r\n\r\n'
-                '{value}\r\n'.format(
-                    boundary=boundary, key=key, value=value))
-        for(key, filename, mimetype, filepath) in self.files:
-            if os.path.isfile(filepath):
-                textwriter.write(
-                    '--{boundary}\r\n'
-                    'Content-Disposition: form-data; name="{key}"; '
-                    'filename="{filename}"\r\n'
-                    'Content-Type: {content_type}\r\n\r\n'.format(
-                        boundary=boundary, key=key, filename=filename,
-                        content_type=mimetype))
-                with open(filepath, "rb") as f:
-                    shutil.copyfileobj(f, buf)
-                textwriter.write('\r\n')
-        textwriter.write('--{}--\r\n\r\n'.format(boundary))
-        self.form_data = buf.getvalue()
+                'Content-Disposition: form-data; name="{key}"; '
+                'filename="{filename}"\r\n'
+                'Content-Type: {content_type}\r\n\r\n'.format(
+                    boundary=boundary, key=key, filename=filename,
+                    content_type=mimetype)))
+            segments.append(segment)
+            segments.append(b'\r\n')
+        segments.append(_to_bytes('--%s--\r\n\r\n' % boundary))
+        return MultiPartStream(segments)
+    #----------------------------------------------------------------------
+    @property
+    def make_result(self):
+        """returns the whole form body in memory"""
+        stream = self.make_stream
+        try:
+            self.form_data = stream.read()
+        finally:
+            stream.close()
+        return self.form_data
 ########################################################################
 class BaseWebOperations(BaseOperation):
     """performs the get/post operations"""
@@ -197,9 +350,53 @@ class BaseWebOperations(BaseOperation):
     _last_url = None
     _last_code = None
     _last_method = None
+    _last_retries = None
+    _retry_policy = _DEFAULT_POLICY
     _useragent = "Mozilla/5.0 (Windows NT 6.3; rv:36.0) Gecko/20100101 Firefox/36.0"
     #----------------------------------------------------------------------
     @property
+    def retry_policy(self):
+        """
+        gets/sets the RetryPolicy used by this object.  If it is not set,
+        the module level RETRY_POLICY is used.  None, or a policy with
+        max_retries=0, sends every request once.
+        """
+        if self._retry_policy is _DEFAULT_POLICY:
+            return RETRY_POLICY
+        return self._retry_policy
+    #----------------------------------------------------------------------
+    @retry_policy.setter
+    def retry_policy(self, value):
+        """gets/sets the RetryPolicy used by this object"""
+        if value is None or isinstance(value, RetryPolicy):
+            self._retry_policy = value
+    #----------------------------------------------------------------------
+    @property
+    def last_retries(self):
+        """gets the number of retries made by the last web operation"""
+        return self._last_retries
+    #----------------------------------------------------------------------
+    def _send(self, method, url, param_dict, attempt):
+        """
+        performs a web operation through the retry policy
+        Inputs:
+           method - GET, POST or FORM-MULTIPART
+           url - url of the operation
+           param_dict - request parameters
+           attempt - callable that sends the request once and returns the
+                     processed response
+        """
+        policy = self.retry_policy
+        if policy is None:
+            self._last_retries = 0
+            return attempt()
+        result, self._last_retries = policy.call(method=method,
+                                                 url=self._asString(url),
+                                                 param_dict=param_dict,
+                                                 attempt=attempt)
+        return result
+    #----------------------------------------------------------------------
+    @property
     def last_method(self):
         """gets the last method used (either POST or GET)"""
         return self._last_method
@@ -306,6 +503,9 @@ class BaseWebOperations(BaseOperation):
                     del data
                 del writer
             return file_name
+        elif contentType is not None and \
+             contentType.lower().startswith('application/x-protobuf'):
+            return b"".join(self._chunk(response=resp, size=65536))
         else:
             read = ""
             for data in self._chunk(response=resp, size=4096):
@@ -455,29 +655,42 @@ class BaseWebOperations(BaseOperation):
             request.install_opener(opener)
             req = request.Request(self._asString(url),
                                    data = data)
-            if hasContext and VERIFY_SSL_CERTIFICATES == False:
-                resp = request.urlopen(self._asString(url), data=data, context=ctx)
-            else:
-                resp = request.urlopen(self._asString(url), data=data)
+            def _open():
+                if hasContext and VERIFY_SSL_CERTIFICATES == False:
+                    return request.urlopen(self._asString(url), data=data, context=ctx)
+                else:
+                    return request.urlopen(self._asString(url), data=data)
         else:
             mpf = MultiPartForm(param_dict=param_dict,
                                 files=files)
             req = request.Request(self._asString(url))
-            body = mpf.make_result
+            body = mpf.make_stream
+            req.data = body
             req.add_header('User-agent', self.useragent)
             req.add_header('Content-type', mpf.get_content_type())
-            req.add_header('Content-length', len(body))
-            req.data = body
-            if 'context' in getargspec(request.urlopen).args and \
-               VERIFY_SSL_CERTIFICATES == False:
-                resp = request.urlopen(req, context=ctx)
-            else:
-                resp = request.urlopen(req)
-            del body, mpf
-        self._last_code = resp.getcode()
-        self._last_url = resp.geturl()
-        return_value = self._process_response(resp=resp,
-                                              out_folder=out_folder)
+            req.add_header('Content-length', str(len(body)))
+            del mpf
+            def _open():
+                body.seek(0)
+                if 'context' in getargspec(request.urlopen).args and \
+                   VERIFY_SSL_CERTIFICATES == False:
+                    return request.urlopen(req, context=ctx)
+                else:
+                    return request.urlopen(req)
+        def _attempt():
+            resp = _open()
+            self._last_code = resp.getcode()
+            self._last_url = resp.geturl()
+            return self._process_response(resp=resp,
+                                          out_folder=out_folder)
+        try:
+            return_value = self._send(method=self._last_method,
+                                      url=url,
+                                      param_dict=param_dict,
+                                      attempt=_attempt)
+        finally:
+            if force_form_post:
+                body.close()
         if isinstance(return_value, dict):
             if "error" in return_value and \
                'message' in return_value['error']:
@@ -564,109 +777,96 @@ class BaseWebOperations(BaseOperation):
             ctx.check_hostname = False
             ctx.verify_mode = ssl.CERT_NONE
             hasContext = True
-        if hasContext == False:
-            if param_dict is None:
-                resp = request.urlopen(self._asString(url), data=param_dict)
-            elif len(str(urlencode(param_dict))) + len(url) >= 1999:
-                resp = request.urlopen(url=self._asString(url),
-                                       data=param_dict)
-            else:
-                format_url = self._asString(url) + "?%s" % urlencode(param_dict)
-                try:
-                    resp = request.urlopen(url=format_url)
-                except HTTPError as err:
-                    if err.code == 403:
-                        if url.startswith('http://'):
-                            url = url.replace('http://', 'https://')
-                            return self._get(url,
-                                     param_dict,
-                                     securityHandler,
-                                     additional_headers,
-                                     handlers,
-                                     proxy_url,
-                                     proxy_port,
-                                     compress,
-                                     custom_handlers,
-                                     out_folder,
-                                     file_name)
-
-                    else:
-                        raise err
+        def _attempt(url=url):
+            chunk_size = CHUNK
+            save_folder = out_folder
+            if hasContext == False:
+                if param_dict is None:
+                    resp = request.urlopen(self._asString(url), data=param_dict)
+                elif len(str(urlencode(param_dict))) + len(url) >= 1999:
+                    resp = request.urlopen(url=self._asString(url),
+                                           data=param_dict)
+                else:
+                    format_url = self._asString(url) + "?%s" % urlencode(param_dict)
+                    try:
+                        resp = request.urlopen(url=format_url)
+                    except HTTPError as err:
+                        if err.code == 403:
+                            if url.startswith('http://'):
+                                # sent once more inside this attempt, the
+                                # retry policy only wraps the outer call
+                                return _attempt(url.replace('http://', 'https://'))
+                            raise err
+                        else:
+                            raise err
 
-        else:
-            if param_dict is None:
-                resp = request.urlopen(self._asString(url), data=param_dict,
-                                       context=ctx)
-            elif len(str(urlencode(param_dict))) + len(url) >= 1999:
-                resp = request.urlopen(url=self._asString(url),
-                                       data=param_dict,
-                                       context=ctx)
             else:
-                format_url = self._asString(url) + "?%s" % urlencode(param_dict)
-                resp = request.urlopen(url=format_url,
-                                       context=ctx)
-        self._last_code = resp.getcode()
-        self._last_url = resp.geturl()
-        #  Get some headers from the response
-        maintype = self._mainType(resp)
-        contentDisposition = resp.headers.get('content-disposition')
-        contentMD5 = resp.headers.get('Content-MD5')
-        contentEncoding = resp.headers.get('content-encoding')
-        contentType = resp.headers.get('content-Type').split(';')[0].lower()
-        contentLength = resp.headers.get('content-length')
-        if maintype.lower() in ('image',
-                                'application/x-zip-compressed') or \
-           contentType == 'application/x-zip-compressed' or \
-           contentMD5 is not None or\
-           (contentDisposition is not None and \
-            contentDisposition.lower().find('attachment;') > -1):
+                if param_dict is None:
+                    resp = request.urlopen(self._asString(url), data=param_dict,
+                                           context=ctx)
+                elif len(str(urlencode(param_dict))) + len(url) >= 1999:
+                    resp = request.urlopen(url=self._asString(url),
+                                           data=param_dict,
+                                           context=ctx)
+                else:
+                    format_url = self._asString(url) + "?%s" % urlencode(param_dict)
+                    resp = request.urlopen(url=format_url,
+                                           context=ctx)
+            self._last_code = resp.getcode()
+            self._last_url = resp.geturl()
+            #  Get some headers from the response
+            maintype = self._mainType(resp)
+            contentDisposition = resp.headers.get('content-disposition')
+            contentMD5 = resp.headers.get('Content-MD5')
+            contentEncoding = resp.headers.get('content-encoding')
+            contentType = resp.headers.get('content-Type').split(';')[0].lower()
+            contentLength = resp.headers.get('content-length')
+            if maintype.lower() in ('image',
+                                    'application/x-zip-compressed') or \
+               contentType == 'application/x-zip-compressed' or \
+               contentMD5 is not None or\
+               (contentDisposition is not None and \
+                contentDisposition.lower().find('attachment;') > -1):
 
-            fname = self._get_file_name(
-                contentDisposition=contentDisposition,
-                url=url)
-            if out_folder is None:
-                out_folder = tempfile.gettempdir()
-            if contentLength is not None:
-                max_length = int(contentLength)
-                if max_length < CHUNK:
-                    CHUNK = max_length
-            file_name = os.path.join(out_folder, fname)
-            with open(file_name, 'wb') as writer:
-                for data in self._chunk(response=resp,
-                                        size=CHUNK):
-                    writer.write(data)
+                fname = self._get_file_name(
+                    contentDisposition=contentDisposition,
+                    url=url)
+                if save_folder is None:
+                    save_folder = tempfile.gettempdir()
+                if contentLength is not None:
+                    max_length = int(contentLength)
+                    if max_length < chunk_size:
+                        chunk_size = max_length
+                out_file = os.path.join(save_folder, fname)
+                with open(out_file, 'wb') as writer:
+                    for data in self._chunk(response=resp,
+                                            size=chunk_size):
+                        writer.write(data)
+                        writer.flush()
                     writer.flush()
-                writer.flush()
-                del writer
-            return file_name
-        else:
-            read = ""
-            for data in self._chunk(response=resp,
-                                    size=CHUNK):
-                if self.PY3 == True:
-                    read += data.decode('utf-8')
-                else:
-                    read += data
+                    del writer
+                return out_file
+            else:
+                read = ""
+                for data in self._chunk(response=resp,
+                                        size=chunk_size):
+                    if self.PY3 == True:
+                        read += data.decode('utf-8')
+                    else:
+                        read += data
 
-                del data
-            try:
-                results = json.loads(read)
-                if 'error' in results:
-                    if 'message' in results['error']:
-                        if results['error']['message'] == 'Request not made over ssl':
-                            if url.startswith('http://'):
-                                url = url.replace('http://', 'https://')
-                                return self._get(url,
-                                                 param_dict,
-                                                 securityHandler,
-                                                 additional_headers,
-                                                 handlers,
-                                                 proxy_url,
-                                                 proxy_port,
-                                                 compress,
-                                                 custom_handlers,
-                                                 out_folder,
-                                                 file_name)
-                return results
-            except:
-                return read
+                    del data
+                try:
+                    results = json.loads(read)
+                    if 'error' in results:
+                        if 'message' in results['error']:
+                            if results['error']['message'] == 'Request not made over ssl':
+                                if url.startswith('http://'):
+                                    return _attempt(url.replace('http://', 'https://'))
+                    return results
+                except:
+                    return read
+        return self._send(method="GET",
+                          url=url,
+                          param_dict=param_dict,
+                          attempt=_attempt)
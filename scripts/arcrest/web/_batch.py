@@ -0,0 +1,107 @@
+"""
+   Collects per object web operations and sends them as one batch.
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+import sys
+
+from ._parallel import parallel_map, DEFAULT_WORKERS
+########################################################################
+__version__ = "3.5.3"
+########################################################################
+class BatchError(object):
+    """
+       Placeholder returned for a call that raised an exception when the
+       batch is executed with raise_errors=False.
+    """
+    _exc_info = None
+    #----------------------------------------------------------------------
+    def __init__(self, exc_info):
+        """Constructor"""
+        self._exc_info = exc_info
+    #----------------------------------------------------------------------
+    def __str__(self):
+        """returns the error message"""
+        return "%s" % self._exc_info[1]
+    #----------------------------------------------------------------------
+    @property
+    def exception(self):
+        """gets the exception raised by the call"""
+        return self._exc_info[1]
+    #----------------------------------------------------------------------
+    @property
+    def exc_info(self):
+        """gets the (type, value, traceback) tuple of the exception"""
+        return self._exc_info
+########################################################################
+class RequestBatch(object):
+    """
+       Queues calls that each issue one web request (addAttachment,
+       getItem, user lookups, ...) and dispatches them together on a
+       bounded pool of threads.  Results are returned in the order the
+       calls were added.
+
+       Inputs:
+          max_workers - number of requests sent at the same time
+          raise_errors - if True, the first exception stops the batch and
+                         is raised. If False, a BatchError is returned in
+                         place of the result of each failed call.
+
+       Usage:
+       >>> batch = RequestBatch(max_workers=8)
+       >>> for oid, path in attachments:
+       ...     batch.add(fl.addAttachment, oid, path)
+       >>> results = batch.execute()
+    """
+    _calls = None
+    _max_workers = None
+    _raise_errors = None
+    #----------------------------------------------------------------------
+    def __init__(self, max_workers=DEFAULT_WORKERS, raise_errors=True):
+        """Constructor"""
+        self._calls = []
+        self._max_workers = max_workers
+        self._raise_errors = raise_errors
+    #----------------------------------------------------------------------
+    def __len__(self):
+        """returns the number of queued calls"""
+        return len(self._calls)
+    #----------------------------------------------------------------------
+    def add(self, func, *args, **kwargs):
+        """
+           queues a call
+           Inputs:
+              func - callable performing the web operation
+              args, kwargs - arguments passed to func
+           Output:
+              position of the call's result in the list returned by
+              execute()
+        """
+        self._calls.append((func, args, kwargs))
+        return len(self._calls) - 1
+    #----------------------------------------------------------------------
+    def clear(self):
+        """removes all queued calls"""
+        self._calls = []
+    #----------------------------------------------------------------------
+    def _run(self, call):
+        """performs a single queued call"""
+        func, args, kwargs = call
+        if self._raise_errors:
+            return func(*args, **kwargs)
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            return BatchError(sys.exc_info())
+    #----------------------------------------------------------------------
+    def execute(self):
+        """
+           sends the queued calls and empties the queue
+           Output:
+              list of results in the order the calls were added
+        """
+        calls = self._calls
+        self._calls = []
+        if len(calls) == 0:
+            return []
+        return parallel_map(self._run, calls, max_workers=self._max_workers)
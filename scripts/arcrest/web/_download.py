@@ -0,0 +1,262 @@
+"""
+   Segmented, resumable file downloads for the ArcREST Python Package.
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+import os
+import re
+import ssl
+import json
+import base64
+import hashlib
+import tempfile
+import threading
+
+from ..packages.six.moves.urllib import request
+from ..packages.six.moves.urllib_parse import urlencode
+from ._base import BaseWebOperations, RedirectHandler
+from . import _base
+from ._parallel import parallel_map, DEFAULT_WORKERS
+########################################################################
+__version__ = "3.5.3"
+_CONTENT_RANGE = re.compile(r"bytes\s+(\d+)-(\d+)/(\d+)", re.IGNORECASE)
+########################################################################
+class DownloadManager(BaseWebOperations):
+    """
+       Downloads large files with HTTP Range requests.
+
+       The first request asks for the first segment of the file.  If the
+       server answers with 206 Partial Content, the remaining segments are
+       fetched on a pool of threads and written at their offset in the
+       destination file; otherwise the full response is streamed to disk.
+       Completed segments are recorded next to the partial file, so a
+       download that is interrupted continues where it stopped the next
+       time it is requested.  The file length and any Content-MD5 header
+       are checked before the file is moved into place.
+
+       Inputs:
+          securityHandler - security handler used to access the url
+          proxy_url - url of the proxy
+          proxy_port - port of the proxy
+          max_workers - number of segments downloaded at the same time
+          segment_size - size in bytes of each Range request
+          buffer_size - size of the reads from the network
+    """
+    _securityHandler = None
+    _proxy_url = None
+    _proxy_port = None
+    _max_workers = None
+    _segment_size = None
+    _buffer_size = None
+    _lock = None
+    #----------------------------------------------------------------------
+    def __init__(self,
+                 securityHandler=None,
+                 proxy_url=None,
+                 proxy_port=None,
+                 max_workers=DEFAULT_WORKERS,
+                 segment_size=8388608,
+                 buffer_size=1048576):
+        """Constructor"""
+        self._securityHandler = securityHandler
+        self._proxy_url = proxy_url
+        self._proxy_port = proxy_port
+        self._max_workers = max_workers
+        self._segment_size = int(segment_size)
+        self._buffer_size = int(buffer_size)
+        self._lock = threading.Lock()
+    #----------------------------------------------------------------------
+    def _opener(self, param_dict):
+        """builds an opener with the security and proxy handlers"""
+        param_dict, handler, cj = self._processHandler(self._securityHandler,
+                                                       param_dict)
+        handlers = [RedirectHandler()]
+        if handler is not None:
+            handlers.append(handler)
+        if cj is not None:
+            handlers.append(request.HTTPCookieProcessor(cj))
+        if self._proxy_url is not None:
+            port = self._proxy_port or 80
+            handlers.append(request.ProxyHandler(
+                {"http" : "http://%s:%s" % (self._proxy_url, port),
+                 "https" : "https://%s:%s" % (self._proxy_url, port)}))
+        if _base.VERIFY_SSL_CERTIFICATES == False and \
+           hasattr(ssl, 'create_default_context'):
+            ctx = ssl.create_default_context()
+            ctx.check_hostname = False
+            ctx.verify_mode = ssl.CERT_NONE
+            handlers.append(request.HTTPSHandler(context=ctx))
+        return param_dict, request.build_opener(*handlers)
+    #----------------------------------------------------------------------
+    def _open(self, opener, url, start=None, end=None):
+        """opens the url, optionally for a byte range"""
+        req = request.Request(self._asString(url))
+        req.add_header('User-Agent', self.useragent)
+        req.add_header('Accept-Encoding', 'identity')
+        if start is not None:
+            req.add_header('Range', 'bytes=%s-%s' % (start, end))
+        return opener.open(req)
+    #----------------------------------------------------------------------
+    def _copy(self, resp, writer, expected=None):
+        """
+           streams a response body into an open file
+           Output:
+              tuple of number of bytes written and the MD5 of the bytes
+        """
+        md5 = hashlib.md5()
+        written = 0
+        while True:
+            data = resp.read(self._buffer_size)
+            if not data:
+                break
+            writer.write(data)
+            md5.update(data)
+            written += len(data)
+        resp.close()
+        if expected is not None and written != expected:
+            raise IOError("Incomplete download: received %s of %s bytes" % \
+                          (written, expected))
+        return written, md5
+    #----------------------------------------------------------------------
+    def _check_md5(self, resp, md5):
+        """compares the Content-MD5 header with the received bytes"""
+        header = resp.headers.get('Content-MD5')
+        if header is None:
+            return
+        if base64.b64encode(md5.digest()).decode('ascii') != header.strip():
+            raise IOError("Content-MD5 mismatch for %s" % resp.geturl())
+    #----------------------------------------------------------------------
+    def _load_state(self, state_file, key):
+        """returns the completed segments of a previous attempt"""
+        if not os.path.isfile(state_file):
+            return set()
+        try:
+            with open(state_file, 'r') as reader:
+                state = json.load(reader)
+            if state.get('key') == key:
+                return set(state.get('done', []))
+        except (ValueError, EnvironmentError):
+            pass
+        return set()
+    #----------------------------------------------------------------------
+    def _save_state(self, state_file, key, done):
+        """records the completed segments"""
+        with open(state_file, 'w') as writer:
+            json.dump({"key" : key, "done" : sorted(done)}, writer)
+    #----------------------------------------------------------------------
+    def _is_file(self, resp):
+        """checks if a response holds a file rather than a JSON message"""
+        contentType = (resp.headers.get('content-type') or "").split(';')[0].lower()
+        contentDisposition = resp.headers.get('content-disposition')
+        if contentDisposition is not None and \
+           contentDisposition.lower().find('attachment') > -1:
+            return True
+        return contentType not in ('application/json', 'text/plain',
+                                   'text/html', 'text/javascript')
+    #----------------------------------------------------------------------
+    def download(self, url, out_folder=None, file_name=None, param_dict=None):
+        """
+           downloads a file
+           Inputs:
+              url - web address of the file
+              out_folder - save location, default is the temp folder
+              file_name - name of the saved file. By default the name is
+                          taken from the response headers or the url.
+              param_dict - optional query parameters
+           Output:
+              path to the file, or the parsed response if the server
+              returned a JSON message instead of a file
+        """
+        if out_folder is None:
+            out_folder = tempfile.gettempdir()
+        param_dict, opener = self._opener(dict(param_dict or {}))
+        if len(param_dict) > 0:
+            url = "%s%s%s" % (url, "&" if url.find('?') > -1 else "?",
+                              urlencode(param_dict))
+        def first():
+            return self._open(opener, url, 0, self._segment_size - 1)
+        resp = self._send(method="GET", url=url, param_dict=param_dict,
+                          attempt=first)
+        self._last_code = resp.getcode()
+        self._last_url = resp.geturl()
+        if not self._is_file(resp):
+            body = resp.read()
+            resp.close()
+            if not isinstance(body, str):
+                body = body.decode('utf-8')
+            try:
+                return json.loads(body)
+            except ValueError:
+                return body
+        if file_name is None:
+            contentDisposition = resp.headers.get('content-disposition')
+            if contentDisposition is not None and \
+               contentDisposition.lower().find('filename') == -1:
+                contentDisposition = None
+            file_name = self._get_file_name(
+                contentDisposition=contentDisposition,
+                url=resp.geturl().split('?')[0])
+        out_file = os.path.join(out_folder, file_name)
+        part_file = out_file + ".part"
+        match = _CONTENT_RANGE.match(resp.headers.get('content-range') or "")
+        if resp.getcode() != 206 or match is None:
+            with open(part_file, 'wb') as writer:
+                length = resp.headers.get('content-length')
+                written, md5 = self._copy(resp, writer,
+                                          int(length) if length else None)
+            self._check_md5(resp, md5)
+            return self._finish(part_file, out_file)
+        total = int(match.group(3))
+        source = resp.geturl()
+        key = "%s|%s|%s" % (total, resp.headers.get('etag'),
+                            resp.headers.get('last-modified'))
+        state_file = part_file + ".json"
+        done = set()
+        if os.path.isfile(part_file) and \
+           os.path.getsize(part_file) == total:
+            done = self._load_state(state_file, key)
+        else:
+            with open(part_file, 'wb') as writer:
+                writer.truncate(total)
+        starts = list(range(0, total, self._segment_size))
+        if 0 in done:
+            resp.close()
+        else:
+            with open(part_file, 'r+b') as writer:
+                written, md5 = self._copy(resp, writer,
+                                          min(self._segment_size, total))
+            self._check_md5(resp, md5)
+            done.add(0)
+            self._save_state(state_file, key, done)
+        def fetch(start):
+            end = min(start + self._segment_size, total) - 1
+            def attempt():
+                seg = self._open(opener, source, start, end)
+                if seg.getcode() != 206:
+                    seg.close()
+                    raise IOError("Range request not honored for %s" % source)
+                with open(part_file, 'r+b') as writer:
+                    writer.seek(start)
+                    written, md5 = self._copy(seg, writer, end - start + 1)
+                self._check_md5(seg, md5)
+                return start
+            self._send(method="GET", url=source, param_dict=None,
+                       attempt=attempt)
+            with self._lock:
+                done.add(start)
+                self._save_state(state_file, key, done)
+            return start
+        parallel_map(fetch, [s for s in starts if s not in done],
+                     max_workers=self._max_workers)
+        if os.path.getsize(part_file) != total:
+            raise IOError("Download size mismatch for %s" % source)
+        if os.path.isfile(state_file):
+            os.remove(state_file)
+        return self._finish(part_file, out_file)
+    #----------------------------------------------------------------------
+    def _finish(self, part_file, out_file):
+        """moves the completed download into place"""
+        if os.path.isfile(out_file):
+            os.remove(out_file)
+        os.rename(part_file, out_file)
+        return out_file
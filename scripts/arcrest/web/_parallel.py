@@ -0,0 +1,209 @@
+"""
+   Thread pool helpers used to run several web operations at once.
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+import sys
+import threading
+from multiprocessing.pool import ThreadPool
+
+from ..packages import six
+from ..packages.six.moves import queue
+########################################################################
+__version__ = "3.5.3"
+DEFAULT_WORKERS = 4
+#----------------------------------------------------------------------
+def _call(func, index, item):
+    """runs func and captures the outcome so it can cross threads"""
+    try:
+        return index, True, func(item)
+    except Exception:
+        return index, False, sys.exc_info()
+#----------------------------------------------------------------------
+def parallel_imap(func, items, max_workers=DEFAULT_WORKERS,
+                  ordered=True, max_pending=None):
+    """
+       Runs func over items on a pool of threads and yields the results.
+       Items are pulled from the iterable lazily so that no more than
+       max_pending calls are queued or running at any time, which keeps
+       memory flat when items is a large generator.
+       Inputs:
+          func - callable taking a single item
+          items - iterable of inputs
+          max_workers - number of threads
+          ordered - if True, results are yielded in input order,
+                    otherwise as soon as they finish
+          max_pending - maximum calls in flight, defaults to twice the
+                        number of workers
+       Output:
+          generator of results.  The first exception raised by func is
+          raised again in the calling thread.
+    """
+    if max_workers is None or max_workers < 1:
+        max_workers = 1
+    if max_pending is None or max_pending < max_workers:
+        max_pending = max_workers * 2
+    if max_workers == 1:
+        for item in items:
+            yield func(item)
+        return
+    done = queue.Queue()
+    pool = ThreadPool(max_workers)
+    finished = {}
+    next_index = 0
+    in_flight = 0
+    try:
+        iterator = iter(items)
+        exhausted = False
+        index = 0
+        while True:
+            while not exhausted and in_flight < max_pending:
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    exhausted = True
+                    break
+                pool.apply_async(_call, (func, index, item),
+                                 callback=done.put)
+                index += 1
+                in_flight += 1
+            if in_flight == 0:
+                break
+            position, ok, value = done.get()
+            in_flight -= 1
+            if not ok:
+                six.reraise(*value)
+            if not ordered:
+                yield value
+                continue
+            finished[position] = value
+            while next_index in finished:
+                yield finished.pop(next_index)
+                next_index += 1
+    finally:
+        pool.terminate()
+        pool.join()
+#----------------------------------------------------------------------
+def parallel_map(func, items, max_workers=DEFAULT_WORKERS):
+    """
+       Runs func over items on a pool of threads.
+       Output:
+          list of results in the order of the inputs
+    """
+    return list(parallel_imap(func, items, max_workers=max_workers))
+########################################################################
+class Future(object):
+    """
+       Result of a call running on a background thread.  Mirrors the
+       common part of concurrent.futures.Future: done(), result(),
+       exception() and add_done_callback().
+    """
+    _event = None
+    _lock = None
+    _value = None
+    _exc_info = None
+    _callbacks = None
+    #----------------------------------------------------------------------
+    def __init__(self):
+        """Constructor"""
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+    #----------------------------------------------------------------------
+    def _finish(self, ok, value):
+        """stores the outcome and runs the callbacks"""
+        with self._lock:
+            if ok:
+                self._value = value
+            else:
+                self._exc_info = value
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback(self)
+    #----------------------------------------------------------------------
+    def done(self):
+        """returns True once the call finished"""
+        return self._event.is_set()
+    #----------------------------------------------------------------------
+    def _wait(self, timeout):
+        """waits for the call or raises when timeout passes first"""
+        if not self._event.wait(timeout) and not self._event.is_set():
+            raise Exception("call did not finish in %s seconds" % timeout)
+    #----------------------------------------------------------------------
+    def result(self, timeout=None):
+        """
+           waits for the call and returns its value, raising the error
+           the call raised
+        """
+        self._wait(timeout)
+        if self._exc_info is not None:
+            six.reraise(*self._exc_info)
+        return self._value
+    #----------------------------------------------------------------------
+    def exception(self, timeout=None):
+        """waits for the call and returns its error or None"""
+        self._wait(timeout)
+        if self._exc_info is not None:
+            return self._exc_info[1]
+        return None
+    #----------------------------------------------------------------------
+    def add_done_callback(self, callback):
+        """
+           calls callback(future) when the call finishes, at once if it
+           already did
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+#----------------------------------------------------------------------
+def run_in_background(func, args=(), kwargs=None, callback=None):
+    """
+       Runs func(*args, **kwargs) on a daemon thread.
+       Inputs:
+          func - callable
+          args - positional arguments
+          kwargs - keyword arguments
+          callback - optional callable(future) run when func finishes
+       Output:
+          Future
+    """
+    future = Future()
+    if callback is not None:
+        future.add_done_callback(callback)
+    def run():
+        try:
+            value = func(*args, **(kwargs or {}))
+        except Exception:
+            future._finish(False, sys.exc_info())
+            return
+        future._finish(True, value)
+    thread = threading.Thread(target=run)
+    thread.daemon = True
+    thread.start()
+    return future
+#----------------------------------------------------------------------
+def serial_imap(func, items):
+    """
+       Runs func over items one call at a time on a background thread.
+       The next item is read on the calling thread while the previous
+       call runs, so reading a cursor overlaps with the requests without
+       the cursor leaving its thread.  A call only starts after the
+       result of the previous one was consumed, so a caller that stops
+       iterating sends nothing more.
+       Inputs:
+          func - callable taking a single item
+          items - iterable of inputs
+       Output:
+          generator of results in input order.  An exception raised by
+          func is raised again in the calling thread.
+    """
+    pending = None
+    for item in items:
+        if pending is not None:
+            yield pending.result()
+        pending = run_in_background(func, args=(item,))
+    if pending is not None:
+        yield pending.result()
@@ -0,0 +1,197 @@
+"""
+   Parallel, resumable multipart uploads used by the uploads and
+   addPart operations of the ArcREST Python Package.
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+import os
+import json
+import mmap
+import hashlib
+import tempfile
+import threading
+
+from ._base import BufferPart
+from ._parallel import parallel_imap, DEFAULT_WORKERS
+########################################################################
+__version__ = "3.5.3"
+#----------------------------------------------------------------------
+def part_numbers(response):
+    """
+       reads the part numbers out of a parts listing response
+       Inputs:
+          response - dictionary returned by a parts operation
+       Output:
+          set of integers
+    """
+    numbers = set()
+    if not isinstance(response, dict):
+        return numbers
+    parts = response.get('parts', response.get('partNumbers', []))
+    for part in parts or []:
+        if isinstance(part, dict):
+            part = part.get('partNum', part.get('partNumber'))
+        try:
+            numbers.add(int(part))
+        except (TypeError, ValueError):
+            pass
+    return numbers
+#----------------------------------------------------------------------
+def succeeded(response):
+    """checks if a part, commit or status response reports success"""
+    if not isinstance(response, dict) or 'error' in response:
+        return False
+    if response.get('success', True) == False:
+        return False
+    return ("%s" % response.get('status', "")).lower() != "failed"
+########################################################################
+class PartUploader(object):
+    """
+       Uploads a file in parts.  Each part is posted straight from a
+       memory mapped slice of the file, parts are sent on a pool of
+       threads, and an MD5 checksum of every posted part is written to a
+       manifest so an interrupted upload only sends the parts that are
+       missing when it is run again.
+
+       Inputs:
+          filePath - path to the file to upload
+          upload_part - callable(partNum, BufferPart) that posts one part
+                        and returns the JSON response
+          key - unique id of the upload (registered item or item id)
+          part_size - size in bytes of each part
+          max_workers - number of parts uploaded at the same time
+          manifest_path - path of the resume manifest. By default it is
+                          stored in the temp folder.  False disables it.
+    """
+    _filePath = None
+    _upload_part = None
+    _key = None
+    _part_size = None
+    _max_workers = None
+    _manifest_path = None
+    _manifest = None
+    _lock = None
+    #----------------------------------------------------------------------
+    def __init__(self, filePath, upload_part, key,
+                 part_size=1000000,
+                 max_workers=DEFAULT_WORKERS,
+                 manifest_path=None):
+        """Constructor"""
+        self._filePath = filePath
+        self._upload_part = upload_part
+        self._key = "%s" % key
+        self._part_size = int(part_size)
+        self._max_workers = max_workers
+        if manifest_path is None:
+            name = hashlib.md5(("%s|%s" % (os.path.abspath(filePath),
+                                           self._key)).encode('utf-8')).hexdigest()
+            manifest_path = os.path.join(tempfile.gettempdir(),
+                                         "arcrest_upload_%s.json" % name)
+        self._manifest_path = manifest_path
+        self._lock = threading.Lock()
+    #----------------------------------------------------------------------
+    @property
+    def manifest_path(self):
+        """gets the path of the resume manifest"""
+        return self._manifest_path
+    #----------------------------------------------------------------------
+    def _load_manifest(self, size):
+        """loads the manifest if it belongs to this file and upload"""
+        stat = os.stat(self._filePath)
+        manifest = {"key" : self._key,
+                    "size" : size,
+                    "mtime" : int(stat.st_mtime),
+                    "partSize" : self._part_size,
+                    "parts" : {}}
+        if self._manifest_path and os.path.isfile(self._manifest_path):
+            try:
+                with open(self._manifest_path, 'r') as reader:
+                    saved = json.load(reader)
+                if all(saved.get(k) == manifest[k]
+                       for k in ("key", "size", "mtime", "partSize")):
+                    manifest['parts'] = saved.get('parts', {})
+            except (ValueError, EnvironmentError):
+                pass
+        self._manifest = manifest
+    #----------------------------------------------------------------------
+    def _save_manifest(self):
+        """writes the manifest, replacing the previous copy"""
+        if not self._manifest_path:
+            return
+        temp = self._manifest_path + ".tmp"
+        with open(temp, 'w') as writer:
+            json.dump(self._manifest, writer)
+        if os.path.isfile(self._manifest_path):
+            os.remove(self._manifest_path)
+        os.rename(temp, self._manifest_path)
+    #----------------------------------------------------------------------
+    def clear_manifest(self):
+        """
+           removes the resume manifest.  Only call it once the commit of
+           the upload returned success, the manifest is what lets a failed
+           commit be resumed.
+        """
+        if self._manifest_path and os.path.isfile(self._manifest_path):
+            os.remove(self._manifest_path)
+    #----------------------------------------------------------------------
+    def upload(self, committed=None):
+        """
+           uploads the parts of the file that are not on the server yet
+           Inputs:
+              committed - part numbers the server already holds, as
+                          returned by the parts operation.  Parts are only
+                          skipped if they are listed here and their
+                          checksum matches the manifest.
+           Output:
+              dictionary with the part numbers, the JSON response of each
+              uploaded part, the parts skipped because an earlier call
+              uploaded them, and the failed parts (None when the part
+              returned nothing).  Failed parts are sent again on resume.
+        """
+        committed = set(committed or [])
+        size = os.path.getsize(self._filePath)
+        self._load_manifest(size)
+        count = max(1, (size + self._part_size - 1) // self._part_size)
+        filename = os.path.basename(self._filePath)
+        result = {"parts" : list(range(1, count + 1)),
+                  "responses" : {},
+                  "skipped" : [],
+                  "failed" : {}}
+        with open(self._filePath, 'rb') as f:
+            if size > 0:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                data = b""
+            try:
+                def send(part_num):
+                    offset = (part_num - 1) * self._part_size
+                    length = min(self._part_size, size - offset)
+                    checksum = hashlib.md5(data[offset:offset + length]).hexdigest()
+                    if part_num in committed and \
+                       self._manifest['parts'].get(str(part_num)) == checksum:
+                        return part_num, None, True, True
+                    part = BufferPart(data=data, filename=filename,
+                                      offset=offset, length=length)
+                    res = self._upload_part(part_num, part)
+                    ok = succeeded(res)
+                    with self._lock:
+                        if ok:
+                            self._manifest['parts'][str(part_num)] = checksum
+                        else:
+                            self._manifest['parts'].pop(str(part_num), None)
+                        self._save_manifest()
+                    return part_num, res, ok, False
+                for part_num, res, ok, skipped in parallel_imap(send, result['parts'],
+                                                                max_workers=self._max_workers,
+                                                                ordered=False):
+                    if skipped:
+                        result['skipped'].append(part_num)
+                    elif ok:
+                        result['responses'][part_num] = res
+                    else:
+                        result['failed'][part_num] = res
+            finally:
+                if size > 0:
+                    data.close()
+        result['skipped'].sort()
+        return result
@@ -0,0 +1,356 @@
+"""
+   Retry, backoff and client side rate limiting used by the POST and GET
+   web operations of the ArcREST Python Package.
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+import re
+import ssl
+import time
+import random
+import socket
+import threading
+import email.utils
+
+from ..packages.six.moves import http_client as httplib
+from ..packages.six.moves.urllib_parse import urlparse
+from ..packages.six.moves.urllib.error import HTTPError, URLError
+########################################################################
+__version__ = "3.5.3"
+#----------------------------------------------------------------------
+def _path_segments(url):
+    """returns the lower case path segments of a REST url"""
+    path = urlparse(url).path.rstrip('/')
+    return path.lower().split('/')
+#----------------------------------------------------------------------
+def _operation_name(url):
+    """returns the last path segment of a REST url (ex: 'query')"""
+    return _path_segments(url)[-1]
+#----------------------------------------------------------------------
+def _is_true(value):
+    """checks a request parameter value that may be a bool or a string"""
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('true', '1')
+########################################################################
+class TokenBucket(object):
+    """
+       Thread safe token bucket.  Tokens are added at a fixed rate up to
+       the capacity of the bucket; every request removes one token.
+       Inputs:
+          rate - tokens added per second
+          capacity - maximum number of tokens the bucket holds (burst)
+    """
+    _rate = None
+    _capacity = None
+    _tokens = None
+    _stamp = None
+    _lock = None
+    #----------------------------------------------------------------------
+    def __init__(self, rate, capacity=1):
+        """Constructor"""
+        self._rate = float(rate)
+        self._capacity = float(max(capacity, 1))
+        self._tokens = self._capacity
+        self._stamp = time.time()
+        self._lock = threading.Lock()
+    #----------------------------------------------------------------------
+    def _refill(self):
+        """adds the tokens earned since the last call"""
+        now = time.time()
+        self._tokens = min(self._capacity,
+                           self._tokens + (now - self._stamp) * self._rate)
+        self._stamp = now
+    #----------------------------------------------------------------------
+    def acquire(self):
+        """
+           blocks until a token is available and consumes it
+           Output:
+              seconds spent waiting
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                wait = (1 - self._tokens) / self._rate
+            time.sleep(wait)
+            waited += wait
+########################################################################
+class RateLimiter(object):
+    """
+       Keeps one token bucket per host so that a script talking to several
+       servers is only throttled against the host that is being called.
+       Inputs:
+          rate - requests per second allowed for each host
+          burst - number of requests that may be sent back to back
+          host_rates - optional dictionary of {host : rate} overrides
+    """
+    _rate = None
+    _burst = None
+    _host_rates = None
+    _buckets = None
+    _lock = None
+    #----------------------------------------------------------------------
+    def __init__(self, rate, burst=1, host_rates=None):
+        """Constructor"""
+        self._rate = rate
+        self._burst = burst
+        self._host_rates = host_rates or {}
+        self._buckets = {}
+        self._lock = threading.Lock()
+    #----------------------------------------------------------------------
+    @property
+    def rate(self):
+        """gets the default requests per second for a host"""
+        return self._rate
+    #----------------------------------------------------------------------
+    def acquire(self, host):
+        """waits for a request slot for a given host"""
+        host = (host or "").lower()
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                rate = self._host_rates.get(host, self._rate)
+                if rate is None or rate <= 0:
+                    return 0.0
+                bucket = TokenBucket(rate=rate, capacity=self._burst)
+                self._buckets[host] = bucket
+        return bucket.acquire()
+########################################################################
+class RetryPolicy(object):
+    """
+       Describes when and how a failed web operation is sent again.
+
+       Requests are only retried when they are safe to repeat: GET calls
+       and read only POST operations (query, identify, geocode, geometry
+       operations, map service export, ...) are retried automatically.
+       An export of a content item (items/<id>/export), of a replica or of
+       the portal customers starts a job, so it is not retried.  Edit
+       operations (addFeatures, applyEdits, ...) are only retried when
+       retry_edits is
+       True and the request was sent with rollbackOnFailure, so a failed
+       batch is never partially applied.
+
+       Inputs:
+          max_retries - number of times a request is sent again, 0 sends
+                        every request once
+          backoff_factor - base delay in seconds, doubled on each retry
+          max_backoff - largest delay in seconds between two attempts
+          jitter - if True, a random delay between 0 and the exponential
+                   backoff is used (full jitter)
+          status_codes - HTTP or ArcGIS JSON error codes that are retried
+          retry_edits - if True, edit operations sent with
+                        rollbackOnFailure are retried
+          respect_retry_after - honor the Retry-After response header
+          max_retry_after - upper limit in seconds for Retry-After
+          rate_limiter - RateLimiter object or None
+          on_retry - optional callback(url, attempt, delay, reason)
+    """
+    READ_OPERATIONS = set([
+        "query", "queryrelatedrecords", "querydomains", "identify",
+        "find", "export", "exportimage", "generaterenderer",
+        "geocodeaddresses", "findaddresscandidates", "reversegeocode",
+        "suggest", "project", "buffer", "simplify", "union", "distance",
+        "lengths", "areasandlengths", "intersect", "difference", "densify",
+        "generalize", "offset", "relation", "labelpoints", "convexhull",
+        "cut", "trimextend", "autocomplete", "reshape", "solve",
+        "solveclosestfacility", "solveservicearea", "generatetoken",
+        "fromgeocoordinatestring", "togeocoordinatestring", "status"])
+    # an export directly under one of these segments starts a job
+    EXPORT_JOB_PARENTS = set(["replicas", "customers"])
+    EDIT_OPERATIONS = set([
+        "addfeatures", "updatefeatures", "deletefeatures", "applyedits",
+        "calculate", "addattachment", "updateattachment",
+        "deleteattachments"])
+    BUSY_PATTERN = re.compile(r"busy|too many requests|try again|timed out",
+                              re.IGNORECASE)
+    _lock = None
+    _stats = None
+    #----------------------------------------------------------------------
+    def __init__(self,
+                 max_retries=3,
+                 backoff_factor=0.5,
+                 max_backoff=60,
+                 jitter=True,
+                 status_codes=(429, 502, 503, 504),
+                 retry_edits=False,
+                 respect_retry_after=True,
+                 max_retry_after=300,
+                 rate_limiter=None,
+                 on_retry=None):
+        """Constructor"""
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.status_codes = set(status_codes)
+        self.retry_edits = retry_edits
+        self.respect_retry_after = respect_retry_after
+        self.max_retry_after = max_retry_after
+        self.rate_limiter = rate_limiter
+        self.on_retry = on_retry
+        self._lock = threading.Lock()
+        self._stats = {"requests" : 0, "retries" : 0,
+                       "failures" : 0, "hosts" : {}}
+    #----------------------------------------------------------------------
+    @property
+    def stats(self):
+        """
+           gets a copy of the counters collected by the policy:
+           requests, retries, failures and per host retries
+        """
+        with self._lock:
+            value = dict(self._stats)
+            value['hosts'] = dict(self._stats['hosts'])
+        return value
+    #----------------------------------------------------------------------
+    def reset_stats(self):
+        """clears the request and retry counters"""
+        with self._lock:
+            self._stats = {"requests" : 0, "retries" : 0,
+                           "failures" : 0, "hosts" : {}}
+    #----------------------------------------------------------------------
+    def _record(self, key, host=None):
+        """increments a counter"""
+        with self._lock:
+            self._stats[key] += 1
+            if host is not None:
+                hosts = self._stats['hosts']
+                hosts[host] = hosts.get(host, 0) + 1
+    #----------------------------------------------------------------------
+    def is_idempotent(self, method, url, param_dict=None):
+        """
+           determines if a request can safely be sent more than once
+           Inputs:
+              method - GET, POST or FORM-MULTIPART
+              url - url of the operation
+              param_dict - request parameters
+        """
+        if method == "GET":
+            return True
+        segments = _path_segments(url)
+        op = segments[-1]
+        if op == "export":
+            if len(segments) > 1 and segments[-2] in self.EXPORT_JOB_PARENTS:
+                return False
+            # content/.../items/<id>/export exports an item
+            return not (len(segments) > 2 and segments[-3] == "items" and \
+                        "content" in segments)
+        if op in self.EDIT_OPERATIONS:
+            if not self.retry_edits:
+                return False
+            # the server default for rollbackOnFailure is true
+            rollback = (param_dict or {}).get('rollbackOnFailure', True)
+            return _is_true(rollback)
+        return op in self.READ_OPERATIONS
+    #----------------------------------------------------------------------
+    def retryable_error(self, err):
+        """checks if an exception raised by a request is transient"""
+        if isinstance(err, HTTPError):
+            return err.code in self.status_codes
+        if isinstance(err, URLError):
+            err = err.reason
+        if isinstance(err, ssl.SSLError):
+            return False
+        return isinstance(err, (socket.error, socket.timeout,
+                                httplib.HTTPException))
+    #----------------------------------------------------------------------
+    def retryable_result(self, result):
+        """checks if an ArcGIS JSON error response is transient"""
+        if not isinstance(result, dict) or \
+           not isinstance(result.get('error'), dict):
+            return False
+        error = result['error']
+        try:
+            code = int(error.get('code', 0))
+        except (TypeError, ValueError):
+            code = 0
+        if code in self.status_codes:
+            return True
+        message = "%s" % error.get('message', "")
+        return self.BUSY_PATTERN.search(message) is not None
+    #----------------------------------------------------------------------
+    def retry_after(self, err):
+        """returns the Retry-After value of an HTTPError in seconds"""
+        # python 2 only sets headers on an HTTPError that has a body
+        headers = getattr(err, 'headers', None)
+        if not self.respect_retry_after or \
+           not isinstance(err, HTTPError) or headers is None:
+            return None
+        value = headers.get('Retry-After')
+        if value is None:
+            return None
+        value = value.strip()
+        if value.isdigit():
+            seconds = float(value)
+        else:
+            parsed = email.utils.parsedate_tz(value)
+            if parsed is None:
+                return None
+            seconds = email.utils.mktime_tz(parsed) - time.time()
+        return max(0.0, min(seconds, self.max_retry_after))
+    #----------------------------------------------------------------------
+    def backoff(self, attempt, retry_after=None):
+        """
+           returns the number of seconds to wait before a retry
+           Inputs:
+              attempt - number of retries already made (0 based)
+              retry_after - server provided delay, if any
+        """
+        delay = min(self.max_backoff,
+                    self.backoff_factor * (2 ** attempt))
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+    #----------------------------------------------------------------------
+    def throttle(self, host):
+        """waits on the rate limiter, if one is set"""
+        if self.rate_limiter is not None:
+            return self.rate_limiter.acquire(host)
+        return 0.0
+    #----------------------------------------------------------------------
+    def call(self, method, url, param_dict, attempt):
+        """
+           runs attempt() until it succeeds, fails with a non transient
+           error or runs out of retries.
+           Inputs:
+              method - GET, POST or FORM-MULTIPART
+              url - url of the operation
+              param_dict - request parameters
+              attempt - callable performing a single request
+           Output:
+              tuple of (result, number of retries)
+        """
+        host = urlparse(url).netloc.lower()
+        idempotent = self.is_idempotent(method, url, param_dict)
+        retries = 0
+        self._record("requests")
+        while True:
+            self.throttle(host)
+            try:
+                result = attempt()
+            except Exception as err:
+                if not idempotent or \
+                   retries >= self.max_retries or \
+                   not self.retryable_error(err):
+                    self._record("failures")
+                    raise
+                reason = err
+                delay = self.backoff(retries, self.retry_after(err))
+            else:
+                if not idempotent or \
+                   retries >= self.max_retries or \
+                   not self.retryable_result(result):
+                    return result, retries
+                reason = result['error']
+                delay = self.backoff(retries)
+            retries += 1
+            self._record("retries", host)
+            if self.on_retry is not None:
+                self.on_retry(url, retries, delay, reason)
+            time.sleep(delay)
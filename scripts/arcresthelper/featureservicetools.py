@@ -11,11 +11,13 @@ from arcrest.ags import FeatureService
 
 from arcrest.hostedservice import AdminFeatureService
 from arcrest.common.spatial import scratchFolder, scratchGDB, json_to_featureclass
-from arcrest.common.general import FeatureSet
+from arcrest.common.spatial import featureclass_to_features
+from arcrest.common.general import FeatureSet, local_time_to_online, _date_handler
 from arcresthelper.common import chunklist
 
 import datetime, time
 import json
+import hashlib
 import os
 import common
 import gc
@@ -44,10 +46,33 @@ def trace():
     #
     synerror = traceback.format_exc().splitlines()[-1]
     return line, filename, synerror
+#----------------------------------------------------------------------
+def _key_value(value):
+    """normalizes an id value so local and service keys compare equal"""
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+#----------------------------------------------------------------------
+def _row_hash(feature, skip):
+    """hashes the attributes and geometry of a feature dictionary"""
+    attributes = sorted((k.lower(), v) for k, v in feature['attributes'].items()
+                        if k.lower() not in skip)
+    value = json.dumps([attributes, feature.get('geometry')],
+                       sort_keys=True, default=_date_handler)
+    return hashlib.md5(value.encode('utf-8')).hexdigest()
 
 class featureservicetools(securityhandlerhelper):
     #----------------------------------------------------------------------
-    def RemoveAndAddFeatures(self, url, pathToFeatureClass,id_field,chunksize=1000):
+    def RemoveAndAddFeatures(self, url, pathToFeatureClass,id_field,chunksize=1000,
+                             mode="replace",hash_field=None,date_field=None,max_workers=4):
+        if mode == "sync":
+            return self.SyncFeatures(url=url,
+                                     pathToFeatureClass=pathToFeatureClass,
+                                     id_field=id_field,
+                                     hash_field=hash_field,
+                                     date_field=date_field,
+                                     chunksize=chunksize,
+                                     max_workers=max_workers)
         fl = None
 
         try:
@@ -176,6 +201,167 @@ class featureservicetools(securityhandlerhelper):
             gc.collect()
 
     #----------------------------------------------------------------------
+    def SyncFeatures(self, url, pathToFeatureClass, id_field, hash_field=None,
+                     date_field=None, chunksize=1000, max_workers=4):
+        """Makes a feature layer match a feature class, sending only the changes.
+
+        Rows are matched on id_field.  Local ids missing from the service
+        are added, service features whose id is not in the feature class
+        (or that repeat an id) are deleted, and changed rows are updated.
+
+        A row has changed when:
+            hash_field - the MD5 of its attributes and geometry differs
+                from the value stored in this service field.  The hash is
+                written to the field by every add and update, so the first
+                sync rewrites the layer and later syncs only send changes.
+            date_field - its date in this field (present in both the
+                feature class and the service, e.g. an editor tracking
+                field) is newer than the service's.
+
+        Args:
+            url (str): The url of the feature layer.
+            pathToFeatureClass (str): The feature class or table to load.
+            id_field (str): The key field shared by both.
+            hash_field (str): Service text field (32 chars) holding the hash.
+            date_field (str): Date field used when hash_field is not set.
+            chunksize (int): Features per page and per applyEdits request.
+            max_workers (int): Number of requests sent at the same time.
+
+        Returns:
+            dict: Counts of the adds, updates and deletes, and the
+            applyEdits results. A summary is also set on ``message``.
+
+        """
+        fl = None
+        try:
+            if arcpyFound == False:
+                raise common.ArcRestHelperError({
+                    "function": "SyncFeatures",
+                    "line": inspect.currentframe().f_back.f_lineno,
+                    "filename":  'featureservicetools',
+                    "synerror": "ArcPy required for this function"
+                })
+            if hash_field is None and date_field is None:
+                raise common.ArcRestHelperError({
+                    "function": "SyncFeatures",
+                    "line": inspect.currentframe().f_back.f_lineno,
+                    "filename":  'featureservicetools',
+                    "synerror": "hash_field or date_field is required"
+                })
+            if not arcpy.Exists(pathToFeatureClass):
+                raise common.ArcRestHelperError({
+                    "function": "SyncFeatures",
+                    "line": inspect.currentframe().f_back.f_lineno,
+                    "filename":  'featureservicetools',
+                    "synerror": "%s does not exist" % pathToFeatureClass
+                })
+            fl = FeatureLayer(
+                    url=url,
+                    securityHandler=self._securityHandler)
+            serviceFields = dict((f['name'].lower(), f['name']) for f in fl.fields)
+            compare_field = hash_field or date_field
+            for name in (id_field, compare_field):
+                if name.lower() not in serviceFields:
+                    raise common.ArcRestHelperError({
+                        "function": "SyncFeatures",
+                        "line": inspect.currentframe().f_back.f_lineno,
+                        "filename":  'featureservicetools',
+                        "synerror": "%s field does not exist in the service" % name
+                    })
+            oidField = fl.objectIdField
+            serviceId = serviceFields[id_field.lower()]
+            serviceCompare = serviceFields[compare_field.lower()]
+            localOID = arcpy.Describe(pathToFeatureClass).OIDFieldName.lower()
+            skip = set([localOID, oidField.lower()])
+            if hash_field is not None:
+                skip.add(hash_field.lower())
+
+            def local_rows():
+                for feature in featureclass_to_features(pathToFeatureClass):
+                    attributes = dict((k.lower(), v) for k, v in feature['attributes'].items())
+                    yield _key_value(attributes.get(id_field.lower())), attributes, feature
+
+            local = {}
+            for key, attributes, feature in local_rows():
+                if key in local:
+                    # the first row of a repeated key is the one synced
+                    continue
+                if hash_field is not None:
+                    local[key] = _row_hash(feature, skip)
+                else:
+                    value = attributes.get(date_field.lower())
+                    if isinstance(value, datetime.datetime):
+                        value = local_time_to_online(value)
+                    local[key] = value
+
+            service = {}
+            deletes = []
+            for feature in fl.query_all(out_fields="%s,%s,%s" % (oidField, serviceId, serviceCompare),
+                                        returnGeometry=False,
+                                        page_size=chunksize,
+                                        max_workers=max_workers):
+                attributes = feature.asDictionary['attributes']
+                key = _key_value(attributes.get(serviceId))
+                if key in service or key not in local:
+                    deletes.append(attributes[oidField])
+                else:
+                    service[key] = (attributes[oidField], attributes.get(serviceCompare))
+
+            adds = set(key for key in local if key not in service)
+            updates = set()
+            for key, (oid, value) in service.items():
+                if hash_field is not None:
+                    if local[key] != value:
+                        updates.add(key)
+                elif value is None or (local[key] is not None and local[key] > value):
+                    updates.add(key)
+
+            def edits(keys, update):
+                # a key repeated in the feature class is sent once, with
+                # its first row like the comparison above
+                sent = set()
+                for key, attributes, feature in local_rows():
+                    if key not in keys or key in sent:
+                        continue
+                    sent.add(key)
+                    feature['attributes'] = dict((k, v) for k, v in feature['attributes'].items()
+                                                 if k.lower() not in skip)
+                    if hash_field is not None:
+                        feature['attributes'][serviceCompare] = local[key]
+                    if update:
+                        feature['attributes'][oidField] = service[key][0]
+                    yield feature
+
+            results = fl.applyEditsInChunks(addFeatures=edits(adds, False) if adds else None,
+                                            updateFeatures=edits(updates, True) if updates else None,
+                                            deleteFeatures=deletes if deletes else None,
+                                            rollbackOnFailure=False,
+                                            max_count=chunksize,
+                                            max_workers=max_workers)
+            self._message = "%s features in the feature class, %s in the service: " \
+                            "%s adds, %s updates, %s deletes, %s failed" % \
+                            (len(local), len(service) + len(deletes), len(adds),
+                             len(updates), len(deletes), len(results['failed']))
+            return {"adds" : len(adds),
+                    "updates" : len(updates),
+                    "deletes" : len(deletes),
+                    "results" : results}
+        except common.ArcRestHelperError:
+            raise
+        except:
+            line, filename, synerror = trace()
+            raise common.ArcRestHelperError({
+                        "function": "SyncFeatures",
+                        "line": line,
+                        "filename":  filename,
+                        "synerror": synerror,
+                                        }
+                                        )
+        finally:
+            fl = None
+            del fl
+            gc.collect()
+    #----------------------------------------------------------------------
     def EnableEditingOnService(self, url, definition = None):
         adminFS = AdminFeatureService(url=url, securityHandler=self._securityHandler)
 
@@ -522,7 +708,7 @@ class featureservicetools(securityhandlerhelper):
             gc.collect()
 
     #----------------------------------------------------------------------
-    def QueryAllFeatures(self,url,sql,out_fields="*",chunksize=1000,saveLocation="",outName=""):
+    def QueryAllFeatures(self,url,sql,out_fields="*",chunksize=1000,saveLocation="",outName="",max_workers=4):
         fl = None
         try:
             fl = FeatureLayer(url=url, securityHandler=self._securityHandler)
@@ -538,34 +724,26 @@ class featureservicetools(securityhandlerhelper):
                     return  {'success':True, 'message':"No features matched the query"}
 
                 print ("%s features to be downloaded" % total)
-                chunksize = min(chunksize, fl.maxRecordCount)
-                combinedResults = None
-                totalQueried = 0
-                for chunk in chunklist(l=oids, n=chunksize):
-                    oidsQuery = ",".join(map(str, chunk))
-                    if not oidsQuery:
-                        continue
-                    else:
-                        results = fl.query(objectIds=oidsQuery,
-                                           returnGeometry=True,
-                                           out_fields=out_fields)
-                        if isinstance(results,FeatureSet):
-                            if combinedResults is None:
-                                combinedResults = results
-                            else:
-                                for feature in results.features:
-                                    combinedResults.features.append(feature)
-
-                            totalQueried += len(results.features)
-                            print("{:.0%} Completed: {}/{}".format(totalQueried / float(total), totalQueried, total))
-
-                        else:
-                            print (results)
-
                 if saveLocation == "" or outName == "":
-                    return combinedResults
+                    features = []
+                    for feature in fl.query_all(where=sql,
+                                                out_fields=out_fields,
+                                                page_size=chunksize,
+                                                max_workers=max_workers):
+                        features.append(feature)
+                        if len(features) % chunksize == 0 or len(features) == total:
+                            print("{:.0%} Completed: {}/{}".format(len(features) / float(total), len(features), total))
+                    return FeatureSet(fields=fl.fields,
+                                      features=features,
+                                      geometryType=fl.geometryType,
+                                      spatialReference=(fl.extent or {}).get('spatialReference'),
+                                      objectIdFieldName=fl.objectIdField)
                 else:
-                    return combinedResults.save(saveLocation=saveLocation, outName=outName)
+                    return fl.query_all_to_featureclass(out_fc=os.path.join(saveLocation, outName),
+                                                        where=sql,
+                                                        out_fields=out_fields,
+                                                        page_size=chunksize,
+                                                        max_workers=max_workers)
 
             else:
                 print (qRes)
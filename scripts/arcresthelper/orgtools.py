@@ -8,12 +8,23 @@ import arcrest
 from arcrest.agol import FeatureLayer
 from arcrest.agol import FeatureService
 from arcrest.hostedservice import AdminFeatureService
+from arcrest.web._batch import RequestBatch
 import datetime, time
 import json
 import os
 import common
 import gc
 
+#----------------------------------------------------------------------
+def _load_item(content, itemId):
+    """
+        returns an item with its properties loaded.  getItem only builds
+        the Item, reading a property sends the request, so it runs on the
+        batch worker instead of later on the calling thread.
+    """
+    item = content.getItem(itemId=itemId)
+    item.id
+    return item
 #----------------------------------------------------------------------
 def trace():
     """
@@ -115,7 +126,7 @@ class orgtools(securityhandlerhelper):
             del result
             gc.collect()
     #----------------------------------------------------------------------
-    def getGroupContentItems(self,groupName):
+    def getGroupContentItems(self,groupName,max_workers=4):
 
         admin = None
         userCommunity = None
@@ -135,14 +146,15 @@ class orgtools(securityhandlerhelper):
                        #sortOrder="asc")
 
             if not groupIds is None:
+                batch = RequestBatch(max_workers=max_workers)
                 for groupId in groupIds:
                     groupContent = admin.content.groupContent(groupId=groupId)
                     if 'error' in groupContent:
                         print (groupContent)
                     else:
                         for result in groupContent['items']:
-                            item = admin.content.getItem(itemId = result['id'])
-                            items.append(item)
+                            batch.add(_load_item, admin.content, result['id'])
+                items = batch.execute()
             return items
         except:
             line, filename, synerror = trace()
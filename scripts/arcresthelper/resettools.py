@@ -7,6 +7,7 @@ import arcrest
 from arcrest.agol import FeatureLayer
 from arcrest.agol import FeatureService
 from arcrest.hostedservice import AdminFeatureService
+from arcrest.web._batch import RequestBatch, BatchError
 import datetime, time
 import json
 import os
@@ -34,7 +35,32 @@ def trace():
 class resetTools(securityhandlerhelper):
 
     #----------------------------------------------------------------------
-    def removeUserData(self,users=None):
+    def _removeContent(self, user):
+        """
+            Deletes the items and folders of a single user and returns
+            the messages to print.  Each user is handled on its own
+            thread by removeUserData.
+        """
+        messages = ["Loading content for user: %s" % user.username]
+        itemsToDel = []
+        for userItem in user.items:
+            itemsToDel.append(userItem.id)
+        if len(itemsToDel) > 0:
+            messages.append(user.deleteItems(items=",".join(itemsToDel)))
+        if user.folders:
+            for userFolder in user.folders:
+                if (user.currentFolder['title'] != userFolder['title']):
+                    user.currentFolder = userFolder['title']
+                    itemsToDel = []
+                    for userItem in user.items:
+                        itemsToDel.append(userItem.id)
+                    if len(itemsToDel) > 0:
+                        messages.append(user.deleteItems(items=",".join(itemsToDel)))
+
+                    messages.append(user.deleteFolder())
+        return messages
+    #----------------------------------------------------------------------
+    def removeUserData(self,users=None,max_workers=4):
         """
             This function deletes content for the list of users,
             if no users are specified, all users in the org are queried
@@ -42,6 +68,7 @@ class resetTools(securityhandlerhelper):
 
             Inputs:
             users - Comma delimited list of user names
+            max_workers - number of users processed at the same time
 
         """
 
@@ -65,34 +92,23 @@ class resetTools(securityhandlerhelper):
                 return
             else:
                 usersObj = []
-                userStr = users.split(',')
+                userStr = [str(user).strip() for user in users.split(',')]
+                batch = RequestBatch(max_workers=max_workers, raise_errors=False)
                 for user in userStr:
-                    try:
-                        user = admin.content.users.user(str(user).strip())
+                    batch.add(admin.content.users.user, user)
+                for userName, user in zip(userStr, batch.execute()):
+                    if isinstance(user, BatchError):
+                        print ("%s does not exist" % userName)
+                    else:
                         usersObj.append(user)
-                    except:
-                        print ("%s does not exist" % str(user).strip())
 
             if usersObj:
+                batch = RequestBatch(max_workers=max_workers)
                 for user in usersObj:
-                    print ("Loading content for user: %s" % user.username)
-
-                    itemsToDel = []
-                    for userItem in user.items:
-                        itemsToDel.append(userItem.id)
-                    if len(itemsToDel) > 0:
-                        print (user.deleteItems(items=",".join(itemsToDel)))
-                    if user.folders:
-                        for userFolder in user.folders:
-                            if (user.currentFolder['title'] != userFolder['title']):
-                                user.currentFolder = userFolder['title']
-                                itemsToDel = []
-                                for userItem in user.items:
-                                    itemsToDel.append(userItem.id)
-                                if len(itemsToDel) > 0:
-                                    print (user.deleteItems(items=",".join(itemsToDel)))
-
-                                print (user.deleteFolder())
+                    batch.add(self._removeContent, user)
+                for messages in batch.execute():
+                    for message in messages:
+                        print (message)
 
         except:
             line, filename, synerror = trace()
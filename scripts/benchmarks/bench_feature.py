@@ -0,0 +1,99 @@
+"""
+   times common.Feature construction, set_value, asRow, asDictionary and
+   str() on point features with 10 attributes, next to BaselineFeature,
+   a copy of the Feature code of release 3.5.3 for attribute edits
+
+   Usage:
+      python benchmarks/bench_feature.py [number of features]
+"""
+from __future__ import print_function
+import os
+import json
+import sys
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from arcrest.common.general import Feature, _date_handler, _unicode_convert
+########################################################################
+class BaselineFeature(Feature):
+    """Feature as it was in release 3.5.3, for attribute edits"""
+    #----------------------------------------------------------------------
+    def __init__(self, json_string, wkid=None):
+        Feature.__init__(self, json_string, wkid)
+        self._json = json.dumps(self._dict, default=_date_handler)
+    #----------------------------------------------------------------------
+    def set_value(self, field_name, value):
+        if field_name in self.fields:
+            if not value is None:
+                self._dict['attributes'][field_name] = _unicode_convert(value)
+                self._json = json.dumps(self._dict, default=_date_handler)
+            return True
+        return False
+    #----------------------------------------------------------------------
+    @property
+    def asDictionary(self):
+        feat_dict = {}
+        if 'feature' in self._dict:
+            feat_dict['attributes'] = self._dict['feature']['attributes']
+        else:
+            feat_dict['attributes'] = self._dict['attributes']
+        return self._dict
+    #----------------------------------------------------------------------
+    @property
+    def asRow(self):
+        fields = self.fields
+        row = [""] * len(fields)
+        for k, v in self._attributes.items():
+            row[fields.index(k)] = v
+        return row, fields
+    #----------------------------------------------------------------------
+    @property
+    def fields(self):
+        if 'feature' in self._dict:
+            self._attributes = self._dict['feature']['attributes']
+        else:
+            self._attributes = self._dict['attributes']
+        return list(self._attributes.keys())
+    #----------------------------------------------------------------------
+    def __str__(self):
+        return json.dumps(self.asDictionary)
+#----------------------------------------------------------------------
+def template(i):
+    """returns the dictionary of one feature"""
+    attributes = dict(("FIELD%s" % f, "value %s" % (i * f)) for f in range(9))
+    attributes['OBJECTID'] = i
+    return {"attributes" : attributes,
+            "geometry" : {"x" : float(i), "y" : float(i),
+                          "spatialReference" : {"wkid" : 4326}}}
+#----------------------------------------------------------------------
+def timed(func):
+    """runs func and returns its time"""
+    start = time.time()
+    func()
+    return time.time() - start
+#----------------------------------------------------------------------
+def run(cls, templates):
+    """returns a list of (label, seconds) for one Feature class"""
+    features = []
+    def edit():
+        for feature in features:
+            for f in range(5):
+                feature.set_value("FIELD%s" % f, "edited %s" % f)
+    return [("Feature(dict) construction",
+             timed(lambda: features.extend(cls(t) for t in templates))),
+            ("5 x set_value per feature", timed(edit)),
+            ("asRow", timed(lambda: [feature.asRow for feature in features])),
+            ("str(feature), after the edits",
+             timed(lambda: [str(feature) for feature in features])),
+            ("asDictionary then str(feature)",
+             timed(lambda: [(feature.asDictionary, str(feature))
+                            for feature in features]))]
+#----------------------------------------------------------------------
+def main(count):
+    baseline = run(BaselineFeature, [template(i) for i in range(count)])
+    current = run(Feature, [template(i) for i in range(count)])
+    print("%-36s %9s %9s" % ("%s features" % count, "baseline", "current"))
+    for (label, before), (_, after) in zip(baseline, current):
+        print("%-36s %8.2fs %8.2fs" % (label, before, after))
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
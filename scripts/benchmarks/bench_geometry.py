@@ -0,0 +1,72 @@
+"""
+   times common.geometry.Polygon construction from Esri JSON and
+   asDictionary, and sizes the flat coordinate arrays, against the
+   per-vertex Point lists the multipart geometries used to hold
+
+   Usage:
+      python benchmarks/bench_geometry.py [rings] [vertices per ring]
+"""
+from __future__ import print_function
+import os
+import sys
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from arcrest.common.geometry import Point, Polygon
+#----------------------------------------------------------------------
+def template(rings, vertices, hasZ):
+    """returns the Esri JSON of a polygon"""
+    width = 3 if hasZ else 2
+    return {"rings" : [[[float(r * vertices + v), float(v), float(r)][:width]
+                        for v in range(vertices)]
+                       for r in range(rings)],
+            "hasZ" : hasZ,
+            "spatialReference" : {"wkid" : 3857}}
+#----------------------------------------------------------------------
+def timed(label, func):
+    """runs func, prints its time and returns its result"""
+    start = time.time()
+    result = func()
+    print("%-36s %.3fs" % (label, time.time() - start))
+    return result
+#----------------------------------------------------------------------
+def size_of_points(rings):
+    """returns the bytes held by nested lists of Point objects"""
+    total = sys.getsizeof(rings)
+    for ring in rings:
+        total += sys.getsizeof(ring)
+        for pt in ring:
+            values = [v for v in pt.asList if v is not None]
+            total += sys.getsizeof(pt) + sum(sys.getsizeof(v) for v in values)
+    return total
+#----------------------------------------------------------------------
+def size_of_arrays(polygon):
+    """returns the bytes held by the coordinate and offset arrays"""
+    arrays = [polygon.x, polygon.y, polygon.z, polygon.m, polygon.partOffsets]
+    return sys.getsizeof(polygon) + \
+           sum(sys.getsizeof(a) for a in arrays if a is not None)
+#----------------------------------------------------------------------
+def run(rings, vertices, hasZ):
+    value = template(rings, vertices, hasZ)
+    print("polygon with %s rings x %s vertices%s" % \
+          (rings, vertices, ", with z" if hasZ else ""))
+    points = timed("per-vertex Points from JSON",
+                   lambda: [[Point(coord=c[:2], wkid=3857,
+                                   z=c[2] if hasZ else None)
+                             for c in ring] for ring in value['rings']])
+    timed("per-vertex Points to dict",
+          lambda: [[pt.asList for pt in ring] for ring in points])
+    polygon = timed("Polygon(dict)", lambda: Polygon(value))
+    timed("Polygon.asDictionary", lambda: polygon.asDictionary)
+    print("%-36s %.1f MB" % ("memory, per-vertex Points",
+                             size_of_points(points) / 1e6))
+    print("%-36s %.1f MB" % ("memory, flat arrays",
+                             size_of_arrays(polygon) / 1e6))
+#----------------------------------------------------------------------
+def main(rings, vertices):
+    run(rings, vertices, False)
+    print()
+    run(rings, vertices, True)
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 5000)
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+   tests for arcrest.ags._batchgeocode
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from arcrest.ags._batchgeocode import read_csv, write_csv, BatchGeocoder
+from arcrest.ags._geocodecache import GeocodeCache
+########################################################################
+class _FakeService(object):
+    """answers geocodeAddresses, failing the first fail_count requests"""
+    _url = "http://fake/arcgis/rest/services/World/GeocodeServer"
+    _securityHandler = _proxy_url = _proxy_port = None
+    cacheLocator = _url + "|10.8"
+    locatorProperties = {}
+    #----------------------------------------------------------------------
+    def __init__(self, cache, fail_count=0):
+        self.cache = cache
+        self.fail_count = fail_count
+        self.sent = []
+    #----------------------------------------------------------------------
+    def _post(self, url, param_dict, **kwargs):
+        records = json.loads(param_dict['addresses'])['records']
+        self.sent.append([r['attributes']['SingleLine'] for r in records])
+        if len(self.sent) <= self.fail_count:
+            return {"error" : {"code" : 500, "message" : "busy"}}
+        return {"locations" : [
+            {"address" : r['attributes']['SingleLine'].upper(),
+             "location" : {"x" : 1.0, "y" : 2.0}, "score" : 100,
+             "attributes" : {"ResultID" : r['attributes']['OBJECTID']}}
+            for r in records]}
+########################################################################
+class CsvTest(unittest.TestCase):
+    #----------------------------------------------------------------------
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+    #----------------------------------------------------------------------
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+    #----------------------------------------------------------------------
+    def test_non_ascii_round_trip(self):
+        path = os.path.join(self.folder, "out.csv")
+        rows = [{u"Match_addr" : u"12 Rue de l'Église, Montréal",
+                 u"Score" : 98.5},
+                {u"Match_addr" : u"Straße 1, München", u"Score" : 100}]
+        self.assertEqual(write_csv(path, rows,
+                                   fields=[u"Match_addr", u"Score"]), 2)
+        result = list(read_csv(path))
+        self.assertEqual([r[u"Match_addr"] for r in result],
+                         [r[u"Match_addr"] for r in rows])
+        self.assertEqual([r[u"Score"] for r in result], [u"98.5", u"100"])
+########################################################################
+class BatchGeocoderTest(unittest.TestCase):
+    #----------------------------------------------------------------------
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.cache = GeocodeCache(os.path.join(self.folder, "g.sqlite"))
+    #----------------------------------------------------------------------
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+    #----------------------------------------------------------------------
+    def _geocoder(self, service):
+        return BatchGeocoder(service, address_fields={"SingleLine" : "ADDR"},
+                             batch_size=10, max_workers=1, backoff_factor=0)
+    #----------------------------------------------------------------------
+    def test_cache_hits_counted_once_per_batch(self):
+        service = _FakeService(self.cache)
+        list(self._geocoder(service).geocode([{"ADDR" : "1 Main St"}]))
+        service = _FakeService(self.cache, fail_count=2)
+        geocoder = self._geocoder(service)
+        rows = list(geocoder.geocode([{"ADDR" : "1 Main Street"},
+                                      {"ADDR" : "2 Main St"}]))
+        self.assertEqual(service.sent, [["2 Main St"]] * 3)
+        self.assertEqual([(r['Match_addr'], r['Status']) for r in rows],
+                         [("1 MAIN ST", "M"), ("2 MAIN ST", "M")])
+        stats = geocoder.stats
+        self.assertEqual((stats['cached'], stats['retries'], stats['requests']),
+                         (1, 2, 3))
+        self.assertEqual(self.cache.stats['hits'], 1)
+    #----------------------------------------------------------------------
+    def test_cached_batch_sends_nothing(self):
+        service = _FakeService(self.cache)
+        list(self._geocoder(service).geocode([{"ADDR" : "1 Main St"}]))
+        geocoder = self._geocoder(service)
+        rows = list(geocoder.geocode([{"ADDR" : "1 main st"}]))
+        self.assertEqual(len(service.sent), 1)
+        self.assertEqual(rows[0]['Status'], "M")
+        self.assertEqual(geocoder.stats['cached'], 1)
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+"""
+   tests for arcrest.agol._changes
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+import os
+import shutil
+import tempfile
+import unittest
+
+from arcrest.agol._changes import ChangeTracker
+from arcrest.common.general import Feature
+#----------------------------------------------------------------------
+def _feature(oid):
+    return {"attributes" : {"OBJECTID" : oid, "EditDate" : 1000 + oid},
+            "geometry" : {"x" : oid, "y" : oid}}
+########################################################################
+class _FakeLayer(object):
+    objectIdField = "OBJECTID"
+    id = 0
+    fields = [{"name" : "OBJECTID", "type" : "esriFieldTypeOID"}]
+    geometryType = "esriGeometryPoint"
+    extent = {}
+    editFieldsInfo = {"editDateField" : "EditDate"}
+    #----------------------------------------------------------------------
+    def query_all(self, where, **kwargs):
+        for oid in (1, 2, 3):
+            yield Feature(_feature(oid))
+    #----------------------------------------------------------------------
+    def query(self, where, returnIDsOnly):
+        return {"objectIds" : [1, 2, 3]}
+########################################################################
+class _FakeService(object):
+    """a sync enabled service whose replicas expire on request"""
+    syncEnabled = True
+    syncCapabilities = {"supportsPerLayerSync" : True}
+    #----------------------------------------------------------------------
+    def __init__(self):
+        self.calls = []
+        self.expired = False
+        self.replicas = 0
+    #----------------------------------------------------------------------
+    def createReplica(self, **kwargs):
+        self.replicas += 1
+        self.calls.append(("create", kwargs['replicaName']))
+        return {"replicaID" : "r%s" % self.replicas,
+                "layerServerGens" : [{"id" : 0, "serverGen" : 10}],
+                "layers" : [{"id" : 0, "features" : [_feature(1)]}]}
+    #----------------------------------------------------------------------
+    def synchronizeReplica(self, replicaID, **kwargs):
+        self.calls.append(("sync", replicaID))
+        if self.expired:
+            return {"error" : {"code" : 400,
+                               "message" : "Replica has expired."}}
+        return {"layerServerGens" : [{"id" : 0, "serverGen" : 11}],
+                "edits" : []}
+    #----------------------------------------------------------------------
+    def unRegisterReplica(self, replica_id):
+        self.calls.append(("unregister", replica_id))
+        return {"error" : {"code" : 400,
+                           "message" : "Replica %s not found." % replica_id}}
+########################################################################
+class ChangeTrackerTest(unittest.TestCase):
+    #----------------------------------------------------------------------
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, "mirror.sqlite")
+    #----------------------------------------------------------------------
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+    #----------------------------------------------------------------------
+    def test_expired_replica_is_unregistered(self):
+        service = _FakeService()
+        tracker = ChangeTracker(_FakeLayer(), service, self.path)
+        tracker.sync()
+        service.expired = True
+        tracker.sync()
+        self.assertEqual(service.calls,
+                         [("create", "mirror_mirror"),
+                          ("sync", "r1"),
+                          ("unregister", "r1"),
+                          ("create", "mirror_mirror")])
+    #----------------------------------------------------------------------
+    def test_explicit_mode_wins(self):
+        service = _FakeService()
+        ChangeTracker(_FakeLayer(), service, self.path).sync()
+        tracker = ChangeTracker(_FakeLayer(), service, self.path,
+                                mode="full")
+        self.assertEqual(tracker.mode, "full")
+        self.assertEqual(tracker.sync()['mode'], "full")
+        self.assertEqual(tracker.count, 3)
+        self.assertEqual(service.calls[-1], ("unregister", "r1"))
+        auto = ChangeTracker(_FakeLayer(), service, self.path)
+        self.assertEqual(auto.mode, "full")
+if __name__ == "__main__":
+    unittest.main()
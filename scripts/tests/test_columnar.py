@@ -0,0 +1,122 @@
+"""
+   tests for arcrest.common.columnar
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+import json
+import unittest
+
+from arcrest.common import columnar
+from arcrest.common.columnar import ColumnarFeatureSet
+from arcrest.common.general import FeatureSet
+FIELDS = [{"name" : "OBJECTID", "type" : "esriFieldTypeOID"},
+          {"name" : "COUNT", "type" : "esriFieldTypeInteger"},
+          {"name" : "SMALL", "type" : "esriFieldTypeSmallInteger"},
+          {"name" : "RATE", "type" : "esriFieldTypeDouble"},
+          {"name" : "SEEN", "type" : "esriFieldTypeDate"},
+          {"name" : "NAME", "type" : "esriFieldTypeString"}]
+#----------------------------------------------------------------------
+def _points():
+    return {"objectIdFieldName" : "OBJECTID",
+            "displayFieldName" : "NAME",
+            "globalIdFieldName" : None,
+            "geometryType" : "esriGeometryPoint",
+            "spatialReference" : {"wkid" : 4326},
+            "hasZ" : False,
+            "hasM" : False,
+            "fields" : FIELDS,
+            "features" : [
+                {"attributes" : {"OBJECTID" : 1, "COUNT" : 10, "SMALL" : 2,
+                                 "RATE" : 0.5, "SEEN" : 1577836800000,
+                                 "NAME" : "a"},
+                 "geometry" : {"x" : 1.5, "y" : -2.5}},
+                {"attributes" : {"OBJECTID" : 2, "COUNT" : None,
+                                 "SMALL" : None, "RATE" : None,
+                                 "SEEN" : None, "NAME" : None}},
+                {"attributes" : {"OBJECTID" : 3, "COUNT" : -7, "SMALL" : 0,
+                                 "RATE" : 2.25, "SEEN" : -86400000,
+                                 "NAME" : u"\u00e9"},
+                 "geometry" : {"x" : 3.0, "y" : 4.0}}]}
+#----------------------------------------------------------------------
+def _polygons():
+    return {"objectIdFieldName" : "OBJECTID",
+            "displayFieldName" : None,
+            "globalIdFieldName" : None,
+            "geometryType" : "esriGeometryPolygon",
+            "spatialReference" : {"wkid" : 3857},
+            "hasZ" : True,
+            "hasM" : False,
+            "fields" : FIELDS[:1],
+            "features" : [
+                {"attributes" : {"OBJECTID" : 1},
+                 "geometry" : {"rings" : [[[0.0, 0.0, 1.0], [0.0, 1.0, 1.0],
+                                           [1.0, 1.0, 1.0], [0.0, 0.0, 1.0]],
+                                          [[0.2, 0.2, 2.0], [0.2, 0.4, 2.0],
+                                           [0.2, 0.2, 2.0]]]}},
+                {"attributes" : {"OBJECTID" : 2}},
+                {"attributes" : {"OBJECTID" : 3},
+                 "geometry" : {"rings" : [[[5.0, 5.0, 0.0], [5.0, 6.0, 0.0],
+                                           [6.0, 6.0, 0.0], [5.0, 5.0, 0.0]]]}}]}
+########################################################################
+class ColumnarFeatureSetTest(unittest.TestCase):
+    #----------------------------------------------------------------------
+    def test_points_round_trip(self):
+        data = _points()
+        fs = ColumnarFeatureSet.fromJSON(json.dumps(data))
+        self.assertEqual(len(fs), 3)
+        self.assertEqual(json.loads(fs.toJSON), data)
+    #----------------------------------------------------------------------
+    def test_polygons_round_trip(self):
+        data = _polygons()
+        fs = ColumnarFeatureSet.fromJSON(data)
+        self.assertEqual(list(fs.geometryOffsets), [0, 2, 2, 3])
+        self.assertEqual(list(fs.partOffsets), [0, 4, 7, 11])
+        self.assertEqual(json.loads(fs.toJSON), data)
+    #----------------------------------------------------------------------
+    def test_nulls(self):
+        fs = ColumnarFeatureSet.fromJSON(_points())
+        self.assertEqual(fs.row(1), {"attributes" : _points()['features'][1]['attributes']})
+        self.assertEqual(fs.geometry(1), None)
+        for column in fs.columns:
+            self.assertEqual(column.nulls, [False, column.name != "OBJECTID", False])
+        self.assertEqual(fs[-1].get_value("SEEN"), -86400000)
+    #----------------------------------------------------------------------
+    def test_nulls_after_values(self):
+        column = columnar.Column({"name" : "A", "type" : "esriFieldTypeInteger"})
+        for value in (1, 2, None, 4):
+            column.append(value)
+        self.assertEqual([column.get(i) for i in range(4)], [1, 2, None, 4])
+        self.assertEqual(column.nulls, [False, False, True, False])
+    #----------------------------------------------------------------------
+    def test_feature_set_round_trip(self):
+        fs = ColumnarFeatureSet.fromJSON(_points())
+        features = FeatureSet.fromJSON(fs.toJSON)
+        again = ColumnarFeatureSet.fromFeatureSet(fs.toFeatureSet())
+        self.assertEqual(len(features.features), 3)
+        self.assertEqual(again.value, fs.value)
+    #----------------------------------------------------------------------
+    @unittest.skipUnless(columnar.numpyFound, "NumPy is not installed")
+    def test_append_after_numpy_view(self):
+        fs = ColumnarFeatureSet.fromJSON(_points())
+        counts = fs.column("COUNT")
+        x = fs.x
+        for i in range(50000):
+            fs.append({"attributes" : {"OBJECTID" : i + 4, "COUNT" : i},
+                       "geometry" : {"x" : float(i), "y" : 0.0}})
+        garbage = [bytearray(b"\xff" * 64) for _ in range(10000)]
+        self.assertEqual(list(counts), [10, 0, -7])
+        self.assertEqual(list(x[[0, 2]]), [1.5, 3.0])
+        self.assertEqual(len(fs.column("COUNT")), 50003)
+        self.assertEqual(fs.column("COUNT")[-1], 49999)
+        self.assertEqual(fs.x[-1], 49999.0)
+        del garbage
+    #----------------------------------------------------------------------
+    @unittest.skipUnless(columnar.numpyFound, "NumPy is not installed")
+    def test_numpy_round_trip(self):
+        fs = ColumnarFeatureSet.fromJSON(_points())
+        values = fs.toNumPyArray()
+        self.assertEqual(values['COUNT'][0], 10)
+        self.assertTrue(values['RATE'][1] != values['RATE'][1])
+        self.assertEqual(list(values['SHAPE@X'][[0, 2]]), [1.5, 3.0])
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+"""
+   tests for arcrest.agol._edits
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+import threading
+import unittest
+
+from arcrest.agol._edits import EditPipeline, _SIZE_ERROR
+from arcrest.agol.services import FeatureLayer
+########################################################################
+class _FakeLayer(object):
+    """records the applyEdits requests and answers with success"""
+    url = "http://server/arcgis/rest/services/X/FeatureServer/0"
+    _securityHandler = None
+    _proxy_url = None
+    _proxy_port = None
+    #----------------------------------------------------------------------
+    def __init__(self, fail_chunk=None):
+        self.requests = []
+        self.active = 0
+        self.most_active = 0
+        self.fail_chunk = fail_chunk
+        self.lock = threading.Lock()
+    #----------------------------------------------------------------------
+    def _post(self, url, param_dict, **kwargs):
+        with self.lock:
+            self.active += 1
+            self.most_active = max(self.most_active, self.active)
+            self.requests.append(param_dict)
+            number = len(self.requests)
+        try:
+            ids = param_dict['deletes'].split(",")
+            if number == self.fail_chunk:
+                return {"error" : {"code" : 500, "message" : "failed"}}
+            return {"deleteResults" : [{"objectId" : int(i), "success" : True}
+                                       for i in ids]}
+        finally:
+            with self.lock:
+                self.active -= 1
+########################################################################
+class _Layer(FeatureLayer):
+    """a FeatureLayer answering applyEdits with the _FakeLayer above"""
+    #----------------------------------------------------------------------
+    def __init__(self, fail_chunk=None):
+        FeatureLayer.__init__(self, url=_FakeLayer.url)
+        self.fake = _FakeLayer(fail_chunk=fail_chunk)
+    #----------------------------------------------------------------------
+    def _post(self, url, param_dict, **kwargs):
+        if 'adds' in param_dict:
+            with self.fake.lock:
+                self.fake.requests.append(param_dict)
+                number = len(self.fake.requests)
+            if number == self.fake.fail_chunk:
+                return {"error" : {"code" : 500, "message" : "failed"}}
+            count = param_dict['adds'].count("attributes")
+            return {"addResults" : [{"success" : True}] * count}
+        return self.fake._post(url, param_dict, **kwargs)
+########################################################################
+class EditPipelineTest(unittest.TestCase):
+    #----------------------------------------------------------------------
+    def test_unicode_deletes(self):
+        layer = _FakeLayer()
+        res = EditPipeline(layer).run(deletes=u"1, 2,3")
+        self.assertEqual(layer.requests[0]['deletes'], "1,2,3")
+        self.assertEqual([r['objectId'] for r in res['deleteResults']],
+                         [1, 2, 3])
+    #----------------------------------------------------------------------
+    def test_integer_delete(self):
+        layer = _FakeLayer()
+        EditPipeline(layer).run(deletes=7)
+        self.assertEqual(layer.requests[0]['deletes'], "7")
+    #----------------------------------------------------------------------
+    def test_rollback_sends_serially_and_stops(self):
+        layer = _FakeLayer(fail_chunk=2)
+        res = EditPipeline(layer, max_count=2, max_workers=4,
+                           rollbackOnFailure=True).run(deletes=range(10))
+        self.assertEqual(layer.most_active, 1)
+        self.assertEqual(len(layer.requests), 2)
+        self.assertEqual(len(res['failed']), 8)
+    #----------------------------------------------------------------------
+    def test_no_rollback_sends_in_parallel(self):
+        layer = _FakeLayer()
+        res = EditPipeline(layer, max_count=2, max_workers=4,
+                           rollbackOnFailure=False).run(deletes=range(10))
+        self.assertEqual(len(layer.requests), 5)
+        self.assertEqual(res['failed'], [])
+    #----------------------------------------------------------------------
+    def test_items_are_read_on_the_calling_thread(self):
+        for rollback in (True, False):
+            threads = set()
+            def cursor():
+                for oid in range(10):
+                    threads.add(threading.current_thread())
+                    yield oid
+            layer = _FakeLayer()
+            res = EditPipeline(layer, max_count=2, max_workers=4,
+                               rollbackOnFailure=rollback).run(deletes=cursor())
+            self.assertEqual(threads, set([threading.current_thread()]))
+            self.assertEqual(len(res['deleteResults']), 10)
+    #----------------------------------------------------------------------
+    def test_size_error_messages(self):
+        for message in ["Request Entity Too Large",
+                        "The request size exceeded the limit",
+                        "Maximum request length exceeded.",
+                        "maxRequestLength"]:
+            self.assertTrue(_SIZE_ERROR.search(message), message)
+        for message in ["Field length exceeds the maximum of 50",
+                        "Unable to complete operation.",
+                        "Value exceeds maximum for field"]:
+            self.assertFalse(_SIZE_ERROR.search(message), message)
+########################################################################
+class FeatureLayerEditsTest(unittest.TestCase):
+    #----------------------------------------------------------------------
+    def test_delete_features_returns_failed_chunks(self):
+        layer = _Layer(fail_chunk=1)
+        res = layer.deleteFeatures(objectIds=range(1500))
+        self.assertEqual(len(layer.fake.requests), 1)
+        self.assertEqual(len(res['failed']), 1500)
+        self.assertEqual(res['failed'][0]['type'], "deletes")
+    #----------------------------------------------------------------------
+    def test_add_feature_returns_failed_chunks(self):
+        layer = _Layer(fail_chunk=1)
+        features = [{"attributes" : {"A" : i}} for i in range(1001)]
+        res = layer.addFeature(features, rollbackOnFailure=False)
+        self.assertEqual(len(res['addResults']), 1001)
+        self.assertEqual(len(res['failed']), 1000)
+    #----------------------------------------------------------------------
+    def test_post_features_sends_chunks_in_parallel(self):
+        layer = _Layer(fail_chunk=2)
+        features = [{"attributes" : {"A" : i}} for i in range(10)]
+        res = layer._post_features(features, max_chunk=2, max_workers=4)
+        self.assertEqual(len(layer.fake.requests), 5)
+        self.assertEqual([r['rollbackOnFailure'] for r in layer.fake.requests],
+                         [False] * 5)
+        self.assertEqual(len(res['addResults']), 10)
+        self.assertEqual(len(res['errors']), 2)
+if __name__ == "__main__":
+    unittest.main()
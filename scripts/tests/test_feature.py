@@ -0,0 +1,51 @@
+"""
+   tests for arcrest.common.general.Feature
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+import json
+import unittest
+
+from arcrest.common.general import Feature
+########################################################################
+class FeatureTest(unittest.TestCase):
+    #----------------------------------------------------------------------
+    def _feature(self):
+        return Feature({"attributes" : {"OBJECTID" : 1, "NAME" : "a"},
+                        "geometry" : {"x" : 1.0, "y" : 2.0}})
+    #----------------------------------------------------------------------
+    def test_as_dictionary_keeps_caches(self):
+        feature = self._feature()
+        text = feature.toJSON
+        fields = feature.fields
+        self.assertEqual(feature.asDictionary, feature.asDictionary)
+        self.assertIs(feature.toJSON, text)
+        self.assertIs(feature.fields, fields)
+    #----------------------------------------------------------------------
+    def test_set_value_updates_json(self):
+        feature = self._feature()
+        feature.toJSON
+        self.assertTrue(feature.set_value("NAME", "b"))
+        self.assertEqual(json.loads(str(feature))['attributes']['NAME'], "b")
+        self.assertEqual(feature.get_value("NAME"), "b")
+        row, fields = feature.asRow
+        self.assertEqual(dict(zip(fields, row)), {"OBJECTID" : 1, "NAME" : "b"})
+    #----------------------------------------------------------------------
+    def test_as_dictionary_is_a_copy(self):
+        feature = self._feature()
+        feature.asDictionary['attributes']['NAME'] = "b"
+        feature.asDictionary['extra'] = True
+        self.assertEqual(feature.get_value("NAME"), "a")
+        self.assertEqual(json.loads(feature.toJSON),
+                         {"attributes" : {"OBJECTID" : 1, "NAME" : "a"},
+                          "geometry" : {"x" : 1.0, "y" : 2.0}})
+    #----------------------------------------------------------------------
+    def test_as_dictionary_unwraps_feature_payload(self):
+        feature = Feature({"feature" : {"attributes" : {"OBJECTID" : 1},
+                                        "geometry" : {"x" : 1.0, "y" : 2.0}}})
+        self.assertEqual(feature.asDictionary,
+                         {"attributes" : {"OBJECTID" : 1},
+                          "geometry" : {"x" : 1.0, "y" : 2.0}})
+        self.assertEqual(feature.get_value("OBJECTID"), 1)
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+"""
+   tests for arcrest.ags._geocodecache
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+import os
+import shutil
+import tempfile
+import unittest
+
+from arcrest.ags import _geocodecache
+from arcrest.ags._geocodecache import GeocodeCache, normalize_address
+LOCATOR = "http://fake/arcgis/rest/services/World/GeocodeServer|10.8"
+########################################################################
+class _Clock(object):
+    """replaces the time module of _geocodecache"""
+    now = 1000.0
+    #----------------------------------------------------------------------
+    def time(self):
+        return self.now
+########################################################################
+class NormalizeTest(unittest.TestCase):
+    #----------------------------------------------------------------------
+    def test_street_words_and_punctuation(self):
+        self.assertEqual(normalize_address("123 North Main Street, Apt. #4"),
+                         normalize_address("123  n main st apt #4"))
+        self.assertEqual(normalize_address(" 380 New York St., Redlands "),
+                         "380 NEW YORK ST REDLANDS")
+        self.assertNotEqual(normalize_address("12 Main St"),
+                            normalize_address("21 Main St"))
+    #----------------------------------------------------------------------
+    def test_address_fields(self):
+        self.assertEqual(
+            normalize_address({"Address" : "1 First Avenue", "City" : "Oslo",
+                               "Region" : "", "OBJECTID" : 7}),
+            normalize_address({"address" : "1 first ave", "city" : "OSLO",
+                               "OBJECTID" : 8, "Postal" : None}))
+        self.assertEqual(normalize_address(None), "")
+        self.assertEqual(normalize_address(92373), "92373")
+########################################################################
+class GeocodeCacheTest(unittest.TestCase):
+    #----------------------------------------------------------------------
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, "geocodes.sqlite")
+        self.clock = _Clock()
+        self.saved = _geocodecache.time
+        _geocodecache.time = self.clock
+    #----------------------------------------------------------------------
+    def tearDown(self):
+        _geocodecache.time = self.saved
+        shutil.rmtree(self.folder)
+    #----------------------------------------------------------------------
+    def test_lookups_are_keyed_by_locator_and_params(self):
+        cache = GeocodeCache(self.path)
+        cache.put(LOCATOR, "findAddressCandidates", "1 Main Street",
+                  {"score" : 100}, params={"outSR" : 4326})
+        self.assertEqual(cache.get(LOCATOR, "findAddressCandidates",
+                                   "1 MAIN ST", params={"outSR" : 4326}),
+                         {"score" : 100})
+        self.assertEqual(cache.get(LOCATOR, "findAddressCandidates",
+                                   "1 Main St", params={"outSR" : 3857}), None)
+        self.assertEqual(cache.get("other|10.8", "findAddressCandidates",
+                                   "1 Main St", params={"outSR" : 4326}), None)
+        stats = cache.stats
+        self.assertEqual((stats['hits'], stats['misses'], stats['stores']),
+                         (1, 2, 1))
+        self.assertEqual(stats['entries'], 1)
+    #----------------------------------------------------------------------
+    def test_ttl_expiry(self):
+        cache = GeocodeCache(self.path, ttl=60)
+        cache.put(LOCATOR, "op", "1 Main St", {"a" : 1})
+        self.clock.now += 30
+        cache.put(LOCATOR, "op", "2 Main St", {"a" : 2})
+        self.clock.now += 40
+        self.assertEqual(cache.get(LOCATOR, "op", "1 Main St"), None)
+        self.assertEqual(cache.get(LOCATOR, "op", "2 Main St"), {"a" : 2})
+        self.assertEqual(cache.stats['expired'], 1)
+        self.assertEqual(len(cache), 1)
+        self.clock.now += 60
+        self.assertEqual(cache.purge(), 1)
+        self.assertEqual(len(cache), 0)
+    #----------------------------------------------------------------------
+    def test_least_recently_used_are_evicted(self):
+        cache = GeocodeCache(self.path, max_entries=2)
+        for number in (1, 2):
+            cache.put(LOCATOR, "op", "%s Main St" % number, number)
+            self.clock.now += 1
+        cache.get(LOCATOR, "op", "1 Main St")
+        self.clock.now += 1
+        cache.put(LOCATOR, "op", "3 Main St", 3)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get(LOCATOR, "op", "2 Main St"), None)
+        self.assertEqual(cache.getMany(LOCATOR, "op", ["1 Main St", "3 Main St"]),
+                         [1, 3])
+        self.assertEqual(cache.stats['evictions'], 1)
+        self.clock.now += 1
+        cache.max_entries = 1
+        self.assertEqual(cache.getMany(LOCATOR, "op", ["1 Main St", "3 Main St"]),
+                         [None, 3])
+    #----------------------------------------------------------------------
+    def test_split_and_store_remap_result_ids(self):
+        cache = GeocodeCache(self.path)
+        sent = [{"attributes" : {"OBJECTID" : 1, "Address" : "1 Main St"}},
+                {"attributes" : {"OBJECTID" : 2, "Address" : "2 Main St"}}]
+        cache.storeLocations(LOCATOR, sent,
+                             [{"address" : "2 MAIN ST", "score" : 99,
+                               "attributes" : {"ResultID" : 2, "Score" : 99}},
+                              {"address" : "1 MAIN ST", "score" : 98,
+                               "attributes" : {"ResultID" : 1, "Score" : 98}},
+                              {"address" : "unknown",
+                               "attributes" : {"ResultID" : 9}}])
+        self.assertEqual(len(cache), 2)
+        records = [{"attributes" : {"OBJECTID" : 5, "Address" : "3 Main St"}},
+                   {"attributes" : {"OBJECTID" : 6, "Address" : "2 Main Street"}},
+                   {"attributes" : {"OBJECTID" : 7, "Address" : "1 main st"}}]
+        locations, missing = cache.splitRecords(LOCATOR, records)
+        self.assertEqual(missing, records[:1])
+        self.assertEqual([(l['address'], l['attributes']['ResultID'])
+                          for l in locations],
+                         [("2 MAIN ST", 6), ("1 MAIN ST", 7)])
+        self.assertEqual(locations[0]['attributes']['Score'], 99)
+if __name__ == "__main__":
+    unittest.main()
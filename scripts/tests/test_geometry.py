@@ -0,0 +1,59 @@
+"""
+   tests for the flat coordinate arrays of arcrest.common.geometry
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+import json
+import unittest
+
+from arcrest.common.geometry import Point, MultiPoint, Polyline, Polygon
+RINGS = [[[0.0, 0.0], [0.0, 10.0], [10.0, 10.0], [0.0, 0.0]],
+         [[2.0, 2.0], [3.0, 2.0], [2.0, 3.0], [2.0, 2.0]]]
+PATHS_ZM = [[[0.0, 0.0, 5.0, 1.0], [1.0, 1.0, None, 2.0]],
+            [[4.0, 4.0, 6.0, None]]]
+########################################################################
+class MultipartRoundTripTest(unittest.TestCase):
+    """checks the nested rings/paths layout survives the flat arrays"""
+    #----------------------------------------------------------------------
+    def test_polygon_dictionary_round_trip(self):
+        value = {"rings" : RINGS, "hasZ" : False, "hasM" : False,
+                 "spatialReference" : {"wkid" : 3857}}
+        polygon = Polygon(value)
+        self.assertEqual(polygon.asDictionary, value)
+        self.assertEqual(Polygon(json.loads(polygon.asJSON)).asDictionary,
+                         value)
+        self.assertEqual(list(polygon.partOffsets), [0, 4, 8])
+    #----------------------------------------------------------------------
+    def test_polyline_with_z_and_m_round_trip(self):
+        value = {"paths" : PATHS_ZM, "hasZ" : True, "hasM" : True,
+                 "spatialReference" : {"wkid" : 4326}}
+        polyline = Polyline(value)
+        self.assertEqual(polyline.asDictionary, value)
+        self.assertEqual(polyline.paths, PATHS_ZM)
+    #----------------------------------------------------------------------
+    def test_parts_match_point_as_list(self):
+        value = {"paths" : PATHS_ZM, "hasZ" : True, "hasM" : True,
+                 "spatialReference" : {"wkid" : 4326}}
+        polyline = Polyline(value)
+        for index, path in enumerate(PATHS_ZM):
+            points = list(polyline.iterPoints(index))
+            self.assertEqual([pt.asList for pt in points],
+                             [[c for c in coord if c is not None]
+                              for coord in path])
+        rebuilt = Polyline([list(polyline.iterPoints(i))
+                            for i in range(polyline.partCount)], wkid=4326)
+        self.assertEqual(rebuilt.paths, PATHS_ZM)
+    #----------------------------------------------------------------------
+    def test_point_objects_and_unflagged_z(self):
+        points = [[Point([x, y], wkid=4326) for x, y in ring]
+                  for ring in RINGS]
+        self.assertEqual(Polygon(points, wkid=4326).rings, RINGS)
+        rings = [[[0, 0, 1], [0, 1, 2], [1, 1, 3], [0, 0, 1]]]
+        polygon = Polygon({"rings" : rings})
+        self.assertTrue(polygon.hasZ)
+        self.assertEqual(polygon.rings, rings)
+    #----------------------------------------------------------------------
+    def test_multipoint_round_trip(self):
+        value = {"points" : RINGS[0], "hasZ" : False, "hasM" : False,
+                 "spatialReference" : {"wkid" : 4326}}
+        self.assertEqual(MultiPoint(value).asDictionary, value)
@@ -0,0 +1,62 @@
+"""
+   tests for arcrest.geometryservice._batch
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+import json
+import unittest
+
+from arcrest.geometryservice._batch import GeometryServiceBatch
+########################################################################
+class _FakeService(object):
+    """answers union requests by merging the rings of the geometries"""
+    _url = "http://server/arcgis/rest/services/Geometry/GeometryServer"
+    _securityHandler = None
+    _proxy_url = None
+    _proxy_port = None
+    #----------------------------------------------------------------------
+    def __init__(self):
+        self.requests = []
+    #----------------------------------------------------------------------
+    def _post(self, url, param_dict, **kwargs):
+        geometries = json.loads(param_dict['geometries'])['geometries']
+        self.requests.append(len(geometries))
+        if len(self.requests) > 100:
+            raise AssertionError("union does not converge")
+        rings = []
+        for geometry in geometries:
+            rings.extend(geometry['rings'])
+        return {"geometry" : {"rings" : rings}}
+########################################################################
+class GeometryServiceBatchUnionTest(unittest.TestCase):
+    #----------------------------------------------------------------------
+    def _square(self, x):
+        return {"rings" : [[[x, 0], [x, 1], [x + 1, 1], [x + 1, 0], [x, 0]]]}
+    #----------------------------------------------------------------------
+    def test_union_small_batches(self):
+        service = _FakeService()
+        batch = GeometryServiceBatch(service, max_geometries=3,
+                                     max_workers=2)
+        res = batch.union([self._square(x) for x in range(10)], sr=4326)
+        self.assertEqual(res['geometryType'], "esriGeometryPolygon")
+        self.assertEqual(len(res['geometry']['rings']), 10)
+    #----------------------------------------------------------------------
+    def test_union_oversized_partial_results(self):
+        # every partial union is larger than max_vertices / 2, so a
+        # reduction round that honoured the vertex limit would never
+        # put two of them in one request
+        service = _FakeService()
+        batch = GeometryServiceBatch(service, max_vertices=6,
+                                     max_workers=2)
+        res = batch.union([self._square(x) for x in range(9)], sr=4326)
+        self.assertEqual(len(res['geometry']['rings']), 9)
+        # 9 single geometry requests, then rounds of 9 -> 5 -> 3 -> 2 -> 1
+        # where the odd geometry of a round is carried over unsent
+        self.assertEqual(service.requests.count(1), 9)
+        self.assertEqual(len(service.requests), 9 + 4 + 2 + 1 + 1)
+    #----------------------------------------------------------------------
+    def test_union_empty(self):
+        batch = GeometryServiceBatch(_FakeService())
+        self.assertEqual(batch.union([], sr=4326), {})
+if __name__ == "__main__":
+    unittest.main()
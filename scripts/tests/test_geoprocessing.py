@@ -0,0 +1,251 @@
+"""
+   tests for arcrest.ags._geoprocessing
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+import threading
+import unittest
+
+from arcrest.ags import _geoprocessing
+from arcrest.ags._geoprocessing import GPTask, GPJob
+JOB_URL = "http://fake/arcgis/rest/services/t/GPServer/Buffer/jobs/j1"
+########################################################################
+class _Clock(object):
+    """replaces the time module of _geoprocessing, sleeping costs nothing"""
+    #----------------------------------------------------------------------
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+        self.lock = threading.Lock()
+    #----------------------------------------------------------------------
+    def time(self):
+        with self.lock:
+            return self.now
+    #----------------------------------------------------------------------
+    def sleep(self, seconds):
+        with self.lock:
+            self.sleeps.append(seconds)
+            self.now += seconds
+########################################################################
+class _FakeJob(GPJob):
+    """
+       answers the job document from a list of statuses, one per request;
+       the last status is repeated
+    """
+    #----------------------------------------------------------------------
+    def __init__(self, statuses, url=JOB_URL, errors=None, blocker=None):
+        GPJob.__init__(self, url=url)
+        self.statuses = list(statuses)
+        self.errors = errors or []
+        self.blocker = blocker
+        self.requests = []
+        self.cancelled = False
+    #----------------------------------------------------------------------
+    def _get(self, url, param_dict, **kwargs):
+        self.requests.append((url, dict(param_dict)))
+        if url.endswith("/cancel"):
+            self.cancelled = True
+            return {"jobId" : "j1", "jobStatus" : "esriJobCancelling"}
+        if url.endswith("/results/out"):
+            return {"paramName" : "out", "dataType" : "GPString",
+                    "value" : self._url}
+        if self.blocker is not None:
+            self.blocker.wait(5)
+        status = self.statuses.pop(0) if len(self.statuses) > 1 \
+            else self.statuses[0]
+        doc = {"jobId" : "j1", "jobStatus" : status, "inputs" : {}}
+        if param_dict.get('returnMessages', True):
+            doc['messages'] = [{"type" : "esriJobMessageTypeError",
+                                "description" : e} for e in self.errors]
+        if status == "esriJobSucceeded":
+            doc['results'] = {"out" : {"paramUrl" : "results/out"}}
+        return doc
+########################################################################
+class _FakeTask(GPTask):
+    """returns the parameters it was sent"""
+    #----------------------------------------------------------------------
+    def _post(self, url, param_dict, **kwargs):
+        return param_dict
+########################################################################
+class _JobTask(GPTask):
+    """
+       submits _FakeJob objects.  plans maps an input to the statuses of
+       each of its submissions; the last plan is reused
+    """
+    #----------------------------------------------------------------------
+    def __init__(self, plans, blockers=None):
+        GPTask.__init__(self, "http://fake/arcgis/rest/services/t/GPServer/Buffer")
+        self.plans = plans
+        self.blockers = blockers or {}
+        self.jobs = []
+        self.lock = threading.Lock()
+    #----------------------------------------------------------------------
+    def submitJob(self, inputs, **kwargs):
+        key = inputs[0]
+        with self.lock:
+            attempt = len([j for j in self.jobs if j[0] == key])
+            plan = self.plans[key]
+            statuses = plan[min(attempt, len(plan) - 1)]
+            if statuses is None:
+                self.jobs.append((key, None))
+                raise Exception("submitJob failed")
+            job = _FakeJob(statuses, url="%s/jobs/%s_%s" % (self._url, key, attempt),
+                           errors=["failed"], blocker=self.blockers.get(key))
+            self.jobs.append((key, job))
+        return job
+########################################################################
+class GPTaskTest(unittest.TestCase):
+    """checks the environment parameters of a task"""
+    #----------------------------------------------------------------------
+    def test_spatial_references_use_env_prefix(self):
+        task = _FakeTask("http://fake/arcgis/rest/services/t/GPServer/Buffer")
+        params = task.executeTask([], outSR=4326, processSR=3857)
+        self.assertEqual(params['env:outSR'], 4326)
+        self.assertEqual(params['env:processSR'], 3857)
+        self.assertFalse('end:processSR' in params)
+########################################################################
+class RunJobsTest(unittest.TestCase):
+    """runs many fake jobs through GPTask.runJobs"""
+    SUCCEEDED = ["esriJobExecuting", "esriJobSucceeded"]
+    FAILED = ["esriJobExecuting", "esriJobFailed"]
+    #----------------------------------------------------------------------
+    def setUp(self):
+        self.clock = _Clock()
+        self.saved = _geoprocessing.time
+        _geoprocessing.time = self.clock
+    #----------------------------------------------------------------------
+    def tearDown(self):
+        _geoprocessing.time = self.saved
+    #----------------------------------------------------------------------
+    def test_failed_submission_is_retried(self):
+        task = _JobTask({"a" : [None, self.SUCCEEDED],
+                         "b" : [self.FAILED, self.SUCCEEDED]})
+        results = dict(task.runJobs([["a"], ["b"]], interval=0,
+                                    max_retries=1))
+        self.assertEqual(results[0]['out'].value, task._url + "/jobs/a_1")
+        self.assertEqual(results[1]['out'].value, task._url + "/jobs/b_1")
+        self.assertEqual(len(task.jobs), 4)
+    #----------------------------------------------------------------------
+    def test_timed_out_job_is_cancelled(self):
+        task = _JobTask({"a" : [["esriJobExecuting"], self.SUCCEEDED]})
+        results = list(task.runJobs([["a"]], timeout=10, interval=1.0,
+                                    max_retries=1))
+        first, second = [job for key, job in task.jobs]
+        self.assertTrue(first.cancelled)
+        self.assertFalse(second.cancelled)
+        self.assertEqual(results[0][1]['out'].value, task._url + "/jobs/a_1")
+    #----------------------------------------------------------------------
+    def test_finished_failure_is_not_cancelled(self):
+        task = _JobTask({"a" : [self.FAILED]})
+        results = list(task.runJobs([["a"]], interval=0, max_retries=2))
+        self.assertEqual(len(task.jobs), 3)
+        self.assertFalse(any(job.cancelled for key, job in task.jobs))
+        self.assertTrue(isinstance(results[0][1], _geoprocessing.BatchError))
+        self.assertTrue("failed" in str(results[0][1]))
+    #----------------------------------------------------------------------
+    def test_raise_errors(self):
+        task = _JobTask({"a" : [None], "b" : [self.SUCCEEDED]})
+        self.assertRaises(Exception, list,
+                          task.runJobs([["b"], ["a"]], interval=0,
+                                       max_retries=1, raise_errors=True))
+        self.assertEqual(len([key for key, job in task.jobs if key == "a"]), 2)
+    #----------------------------------------------------------------------
+    def _run_slow_first(self, ordered):
+        """job a only finishes once job b was read"""
+        done = threading.Event()
+        task = _JobTask({"a" : [self.SUCCEEDED], "b" : [self.SUCCEEDED]},
+                        blockers={"a" : done})
+        indexes = []
+        for index, results in task.runJobs([["a"], ["b"]], interval=0,
+                                           max_jobs=2, ordered=ordered):
+            indexes.append(index)
+            if index == 1:
+                done.set()
+        done.set()
+        return indexes
+    #----------------------------------------------------------------------
+    def test_unordered_yields_as_jobs_finish(self):
+        self.assertEqual(self._run_slow_first(ordered=False), [1, 0])
+    #----------------------------------------------------------------------
+    def test_ordered_yields_in_input_order(self):
+        task = _JobTask(dict((key, [self.SUCCEEDED]) for key in "abcdef"))
+        indexes = [index for index, results in
+                   task.runJobs([[key] for key in "abcdef"], interval=0,
+                                max_jobs=3, ordered=True)]
+        self.assertEqual(indexes, list(range(6)))
+########################################################################
+class GPJobTest(unittest.TestCase):
+    """follows fake jobs with a fake clock"""
+    #----------------------------------------------------------------------
+    def setUp(self):
+        self.clock = _Clock()
+        self.saved = _geoprocessing.time
+        _geoprocessing.time = self.clock
+    #----------------------------------------------------------------------
+    def tearDown(self):
+        _geoprocessing.time = self.saved
+    #----------------------------------------------------------------------
+    def test_wait_backs_off(self):
+        job = _FakeJob(["esriJobSubmitted"] + ["esriJobExecuting"] * 4 +
+                       ["esriJobSucceeded"])
+        status = job.wait(interval=1.0, max_interval=5.0, backoff=2.0)
+        self.assertEqual(status, "esriJobSucceeded")
+        self.assertEqual(self.clock.sleeps, [1.0, 2.0, 4.0, 5.0, 5.0])
+        # status polls leave out the messages, which are read once at the end
+        self.assertEqual([p.get('returnMessages', True)
+                          for url, p in job.requests],
+                         [False] * 6 + [True])
+    #----------------------------------------------------------------------
+    def test_wait_times_out(self):
+        job = _FakeJob(["esriJobExecuting"])
+        self.assertRaises(Exception, job.wait, timeout=10, interval=4.0,
+                          backoff=1.0)
+        self.assertEqual(self.clock.sleeps, [4.0, 4.0, 2.0])
+        self.assertEqual(len(job.requests), 4)
+    #----------------------------------------------------------------------
+    def test_progress_gets_messages(self):
+        seen = []
+        job = _FakeJob(["esriJobExecuting", "esriJobSucceeded"])
+        job.wait(interval=0, progress=lambda s, m: seen.append((s, m)))
+        self.assertEqual(seen, [("esriJobExecuting", []),
+                                ("esriJobSucceeded", [])])
+        self.assertEqual(len(job.requests), 2)
+    #----------------------------------------------------------------------
+    def test_finished_job_sends_no_requests(self):
+        job = _FakeJob(["esriJobExecuting", "esriJobSucceeded"])
+        job.wait(interval=0)
+        results = job.getResults()
+        self.assertEqual(results['out'].value, JOB_URL)
+        count = len(job.requests)
+        self.assertEqual(job.jobStatus, "esriJobSucceeded")
+        self.assertEqual(job.messages, [])
+        self.assertTrue(job.results is results)
+        self.assertEqual(job.inputs, {})
+        self.assertEqual(str(job), job._json)
+        self.assertEqual(len(job.requests), count)
+        self.assertEqual(len([url for url, p in job.requests
+                              if url.endswith("/results/out")]), 1)
+    #----------------------------------------------------------------------
+    def test_when_done_returns_results(self):
+        done = []
+        job = _FakeJob(["esriJobExecuting", "esriJobSucceeded"])
+        future = job.whenDone(callback=done.append, interval=0)
+        self.assertEqual(future.result(5)['out'].value, JOB_URL)
+        self.assertTrue(future.done())
+        self.assertEqual(done, [future])
+    #----------------------------------------------------------------------
+    def test_when_done_raises_job_errors(self):
+        job = _FakeJob(["esriJobExecuting", "esriJobFailed"],
+                       errors=["bad input"])
+        future = job.whenDone(interval=0)
+        error = future.exception(5)
+        self.assertTrue("esriJobFailed" in str(error))
+        self.assertTrue("bad input" in str(error))
+        self.assertRaises(Exception, future.result, 5)
+    #----------------------------------------------------------------------
+    def test_when_done_times_out(self):
+        job = _FakeJob(["esriJobExecuting"])
+        future = job.whenDone(timeout=3, interval=1.0, backoff=1.0)
+        self.assertTrue("did not finish" in str(future.exception(5)))
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+"""
+   tests for arcrest.geometryservice._local
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+import unittest
+
+from arcrest.geometryservice._local import LocalGeometryService
+########################################################################
+class _FakeService(object):
+    """records the calls sent to the remote service"""
+    #----------------------------------------------------------------------
+    def __init__(self):
+        self.calls = []
+    #----------------------------------------------------------------------
+    def project(self, geometries, inSR, outSR, *args):
+        self.calls.append((inSR, outSR))
+        return {"geometries" : "remote"}
+########################################################################
+class LocalProjectionTest(unittest.TestCase):
+    #----------------------------------------------------------------------
+    def _service(self):
+        service = _FakeService()
+        local = LocalGeometryService(service=service, projections={
+            26711 : "+proj=utm +zone=11 +ellps=clrk66 +datum=NAD27",
+            2000 : "+proj=tmerc +lat_0=0 +lon_0=-62 +k=0.9995 "
+                   "+x_0=400000 +y_0=0 +ellps=clrk80",
+            3000 : {"proj" : "utm", "zone" : 33, "ellps" : "intl"},
+            3001 : "+proj=utm +zone=33 +ellps=bessel +towgs84=598.1,73.7,418.2",
+            3002 : "+proj=utm +zone=11 +a=6378206.4 +b=6356583.8",
+            3003 : "+proj=utm +zone=11 +ellps=GRS80 +towgs84=0,0,0",
+            3004 : "+proj=utm +zone=11 +datum=NAD83"})
+        return service, local
+    #----------------------------------------------------------------------
+    def test_other_ellipsoids_go_to_the_service(self):
+        service, local = self._service()
+        point = {"x" : -117.0, "y" : 34.0}
+        for wkid in (26711, 2000, 3000, 3001, 3002):
+            res = local.project([point], 4326, wkid)
+            self.assertEqual(res, {"geometries" : "remote"})
+        self.assertEqual([c[1] for c in service.calls],
+                         [26711, 2000, 3000, 3001, 3002])
+    #----------------------------------------------------------------------
+    def test_grs80_and_nad83_are_local(self):
+        service, local = self._service()
+        point = {"x" : -117.0, "y" : 34.0}
+        for wkid in (3003, 3004, 26911):
+            res = local.project([point], 4326, wkid)
+            self.assertAlmostEqual(res['geometries'][0]['x'], 500000.0, 3)
+        self.assertEqual(service.calls, [])
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+"""
+   tests for the export tiles operations of arcrest.ags.mapservice
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+import shutil
+import tempfile
+import unittest
+
+from arcrest.ags.mapservice import MapService
+from arcrest.ags._geoprocessing import GPJob
+URL = "http://fake/arcgis/rest/services/t/MapServer"
+########################################################################
+class _FakeMapService(MapService):
+    """submits jobs without a server and fails the export of one area"""
+    #----------------------------------------------------------------------
+    def __init__(self, failing=None):
+        MapService.__init__(self, url=URL)
+        self.failing = failing
+    #----------------------------------------------------------------------
+    def _get(self, url, param_dict, **kwargs):
+        return {"jobId" : "j1", "jobStatus" : "esriJobSubmitted"}
+    #----------------------------------------------------------------------
+    def exportTiles(self, areaOfInterest=None, async=False, **kwargs):
+        if async or areaOfInterest is None:
+            return MapService.exportTiles(self, async=async, **kwargs)
+        if areaOfInterest == self.failing:
+            raise Exception("GP job did not finish in 1 seconds")
+        return ["%s.tpk" % areaOfInterest]
+########################################################################
+class ExportTilesTest(unittest.TestCase):
+    """checks the async and many area exports"""
+    #----------------------------------------------------------------------
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+    #----------------------------------------------------------------------
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+    #----------------------------------------------------------------------
+    def test_async_returns_the_job(self):
+        job = _FakeMapService().exportTiles(levels="1-3", async=True)
+        self.assertTrue(isinstance(job, GPJob))
+        self.assertEqual(job.url, URL + "/exportTiles/jobs/j1")
+    #----------------------------------------------------------------------
+    def test_one_failed_area_keeps_the_others(self):
+        service = _FakeMapService(failing="b")
+        results = service.exportTilesMany(["a", "b", "c"], levels="1-3",
+                                          tilePackage=True,
+                                          out_folder=self.folder)
+        self.assertEqual(results[0], ["a.tpk"])
+        self.assertTrue(isinstance(results[1], Exception))
+        self.assertEqual(results[2], ["c.tpk"])
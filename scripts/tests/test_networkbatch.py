@@ -0,0 +1,52 @@
+"""
+   tests for arcrest.ags._networkbatch
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+import json
+import unittest
+
+from arcrest.ags._networkbatch import NetworkBatchSolver
+#----------------------------------------------------------------------
+def _point(x):
+    return {"geometry" : {"x" : x, "y" : 0}, "attributes" : {"X" : x}}
+########################################################################
+class _FakeLayer(object):
+    """routes every incident to its nearest facility in a straight line"""
+    serviceLimits = {"maximumIncidents" : 2, "maximumFacilities" : 2}
+    #----------------------------------------------------------------------
+    def solveClosestFacility(self, incidents, facilities, **kwargs):
+        incidents = json.loads(incidents)['features']
+        facilities = json.loads(facilities)['features']
+        routes = []
+        for i, incident in enumerate(incidents):
+            x = incident['geometry']['x']
+            f = min(range(len(facilities)), key=lambda n: abs(
+                facilities[n]['geometry']['x'] - x))
+            routes.append({"attributes" : {"IncidentID" : i + 1,
+                                           "FacilityID" : f + 1}})
+        echoed = [{"attributes" : dict(f['attributes'], ObjectID=n + 1),
+                   "geometry" : f['geometry']}
+                  for n, f in enumerate(facilities)]
+        return {"routes" : {"features" : routes},
+                "facilities" : {"features" : echoed},
+                "messages" : []}
+########################################################################
+class NetworkBatchSolverTest(unittest.TestCase):
+    """checks how the batch responses are merged"""
+    #----------------------------------------------------------------------
+    def test_shared_facilities_are_returned_once(self):
+        solver = NetworkBatchSolver(_FakeLayer(), max_workers=2, cache_size=0)
+        incidents = [_point(x) for x in (0, 1, 2, 3, 10, 11)]
+        facilities = [_point(x) for x in (0.5, 2.5, 5, 10.5)]
+        res = solver.solveClosestFacility(incidents, facilities)
+        echoed = res['facilities']['features']
+        self.assertEqual([f['attributes']['ObjectID'] for f in echoed],
+                         [1, 2, 3, 4])
+        self.assertEqual([f['attributes']['X'] for f in echoed],
+                         [0.5, 2.5, 5, 10.5])
+        routes = sorted((r['attributes']['IncidentID'],
+                         r['attributes']['FacilityID'])
+                        for r in res['routes']['features'])
+        self.assertEqual(routes, [(1, 1), (2, 1), (3, 2), (4, 2),
+                                  (5, 4), (6, 4)])
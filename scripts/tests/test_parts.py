@@ -0,0 +1,82 @@
+"""
+   tests for arcrest.web._parts and the uploads that resume with it
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+import os
+import shutil
+import tempfile
+import unittest
+
+from arcrest.web._parts import PartUploader
+from arcrest.agol._uploads import Uploads
+########################################################################
+class _FakeUploads(Uploads):
+    """records the parts posted and answers commit with a given response"""
+    #----------------------------------------------------------------------
+    def __init__(self, commit_response, fail_parts=(), parts=()):
+        Uploads.__init__(self, url="http://fake/arcgis/rest/services/uploads")
+        self.commit_response = commit_response
+        self.fail_parts = set(fail_parts)
+        self.sent = []
+        self.parts_held = set(parts)
+    #----------------------------------------------------------------------
+    def _post(self, url, param_dict, **kwargs):
+        if url.endswith("/uploadPart"):
+            self.sent.append(param_dict['partNum'])
+            if param_dict['partNum'] in self.fail_parts:
+                return None
+            self.parts_held.add(param_dict['partNum'])
+            return {"success" : True}
+        return self.commit_response
+    #----------------------------------------------------------------------
+    def _get(self, url, param_dict, **kwargs):
+        return {"parts" : sorted(self.parts_held)}
+########################################################################
+class PartUploaderTest(unittest.TestCase):
+    """checks what is resumed after a failed part or commit"""
+    #----------------------------------------------------------------------
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, "data.bin")
+        with open(self.path, 'wb') as writer:
+            writer.write(b"x" * 25)
+    #----------------------------------------------------------------------
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+    #----------------------------------------------------------------------
+    def _upload(self, uploads):
+        return uploads.uploadByParts("reg1", self.path, part_size=10,
+                                     max_workers=2)
+    #----------------------------------------------------------------------
+    def test_part_without_response_is_failed_not_skipped(self):
+        answers = {1 : {"success" : True}, 2 : None, 3 : {"success" : True}}
+        uploader = PartUploader(self.path, lambda num, part: answers[num],
+                                key="k", part_size=10,
+                                manifest_path=os.path.join(self.folder, "m.json"))
+        result = uploader.upload()
+        self.assertEqual(result['skipped'], [])
+        self.assertEqual(result['failed'], {2 : None})
+        sent = []
+        def upload_part(num, part):
+            sent.append(num)
+            return {"success" : True}
+        uploader = PartUploader(self.path, upload_part, key="k", part_size=10,
+                                manifest_path=os.path.join(self.folder, "m.json"))
+        result = uploader.upload(committed=[1, 2, 3])
+        self.assertEqual(sent, [2])
+        self.assertEqual(result['skipped'], [1, 3])
+    #----------------------------------------------------------------------
+    def test_failed_commit_keeps_manifest(self):
+        uploads = _FakeUploads({"error" : {"code" : 500, "message" : "failed"}})
+        self._upload(uploads)
+        manifest = PartUploader(self.path, None, key="reg1").manifest_path
+        try:
+            self.assertTrue(os.path.isfile(manifest))
+            uploads = _FakeUploads({"success" : True}, parts=[1, 2, 3])
+            self.assertEqual(self._upload(uploads), {"success" : True})
+            self.assertEqual(uploads.sent, [])
+            self.assertFalse(os.path.isfile(manifest))
+        finally:
+            if os.path.isfile(manifest):
+                os.remove(manifest)
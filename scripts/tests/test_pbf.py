@@ -0,0 +1,173 @@
+"""
+   tests for arcrest.common.pbf
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+import json
+import struct
+import unittest
+
+from arcrest.common import pbf
+from arcrest.common.general import FeatureSet
+#----------------------------------------------------------------------
+def _varint(value):
+    out = bytearray()
+    while True:
+        bits = value & 0x7f
+        value >>= 7
+        if value:
+            out.append(bits | 0x80)
+        else:
+            out.append(bits)
+            return bytes(out)
+#----------------------------------------------------------------------
+def _zigzag(value):
+    return (value << 1) ^ (value >> 63)
+#----------------------------------------------------------------------
+def _int(number, value):
+    """a varint field; proto3 leaves out fields equal to 0"""
+    if value == 0:
+        return b""
+    return _varint(number << 3) + _varint(value)
+#----------------------------------------------------------------------
+def _bytes(number, value):
+    return _varint((number << 3) | 2) + _varint(len(value)) + value
+#----------------------------------------------------------------------
+def _double(number, value):
+    return _varint((number << 3) | 1) + struct.pack('<d', value)
+#----------------------------------------------------------------------
+def _packed(number, values):
+    return _bytes(number, b"".join(_varint(v) for v in values))
+#----------------------------------------------------------------------
+def _string(number, value):
+    return _bytes(number, value.encode('utf-8'))
+#----------------------------------------------------------------------
+def _geometry(vertices, lengths=()):
+    """delta and zigzag encodes quantized vertices"""
+    coords = []
+    last = [0] * len(vertices[0])
+    for vertex in vertices:
+        coords.extend(_zigzag(v - l) for v, l in zip(vertex, last))
+        last = vertex
+    body = _packed(3, coords)
+    if lengths:
+        body = _packed(2, lengths) + body
+    return body
+#----------------------------------------------------------------------
+def _collection(geometryType, fields, features, hasZ=False,
+                scale=(0.5, 0.5), translate=(100.0, 50.0)):
+    """
+       builds an f=pbf FeatureCollection.  fields are (name, type) and
+       features are (values, geometry bytes) with string or int values
+    """
+    transform = _int(1, 0) + \
+        _bytes(2, _double(1, scale[0]) + _double(2, scale[1])) + \
+        _bytes(3, _double(1, translate[0]) + _double(2, translate[1]))
+    body = _string(1, "OBJECTID") + _int(7, geometryType) + \
+        _bytes(8, _int(1, 3857)) + _int(10, int(hasZ)) + _bytes(12, transform)
+    for name, fieldType in fields:
+        body += _bytes(13, _string(1, name) + _int(2, fieldType))
+    for values, geometry in features:
+        feature = b""
+        for value in values:
+            if isinstance(value, int):
+                feature += _bytes(1, _varint((4 << 3)) + _varint(_zigzag(value)))
+            else:
+                feature += _bytes(1, _string(1, value))
+        if geometry is not None:
+            feature += _bytes(2, geometry)
+        body += _bytes(15, feature)
+    return _bytes(2, _bytes(1, body))
+########################################################################
+class DecodeTest(unittest.TestCase):
+    """decodes hand built protocol buffer responses"""
+    #----------------------------------------------------------------------
+    def test_points_with_default_enums(self):
+        data = _collection(0, [("OBJECTID", 6), ("SMALL", 0), ("NAME", 4)],
+                           [((1, 0, "a"), _geometry([[10, 20]])),
+                            ((2, -3, "b"), _geometry([[4, 8]]))])
+        res = pbf.decode_feature_collection(data)
+        self.assertEqual(res['geometryType'], "esriGeometryPoint")
+        self.assertEqual([f['type'] for f in res['fields']],
+                         ["esriFieldTypeOID", "esriFieldTypeSmallInteger",
+                          "esriFieldTypeString"])
+        self.assertEqual(res['spatialReference'], {"wkid" : 3857})
+        self.assertEqual(res['features'][0],
+                         {"attributes" : {"OBJECTID" : 1, "SMALL" : 0,
+                                          "NAME" : "a"},
+                          "geometry" : {"x" : 105.0, "y" : 40.0}})
+        self.assertEqual(res['features'][1]['geometry'],
+                         {"x" : 102.0, "y" : 46.0})
+        self.assertEqual(res['features'][1]['attributes']['SMALL'], -3)
+    #----------------------------------------------------------------------
+    def test_polygon_parts_and_z(self):
+        rings = [[0, 0, 1], [0, 4, 2], [4, 4, 3], [0, 0, 1],
+                 [1, 1, 5], [1, 2, 5], [1, 1, 5]]
+        data = _collection(3, [("OBJECTID", 6)],
+                           [((7,), _geometry(rings, lengths=[4, 3]))],
+                           hasZ=True, scale=(1.0, 1.0), translate=(0.0, 10.0))
+        res = pbf.decode_feature_collection(data)
+        geometry = res['features'][0]['geometry']
+        self.assertEqual(res['geometryType'], "esriGeometryPolygon")
+        self.assertTrue(geometry['hasZ'])
+        self.assertEqual([len(ring) for ring in geometry['rings']], [4, 3])
+        self.assertEqual(geometry['rings'][0][1], [0.0, 6.0, 2])
+        self.assertEqual(geometry['rings'][1][0], [1.0, 9.0, 5])
+    #----------------------------------------------------------------------
+    def test_table_without_geometry(self):
+        data = _collection(127, [("OBJECTID", 6)], [((1,), None)])
+        res = pbf.decode_feature_collection(data)
+        self.assertFalse('geometryType' in res)
+        self.assertEqual(res['features'], [{"attributes" : {"OBJECTID" : 1}}])
+    #----------------------------------------------------------------------
+    def test_count_and_object_ids(self):
+        count = _bytes(2, _bytes(2, _int(1, 42)))
+        self.assertEqual(pbf.decode_feature_collection(count), {"count" : 42})
+        empty = _bytes(2, _bytes(2, b""))
+        self.assertEqual(pbf.decode_feature_collection(empty), {"count" : 0})
+        ids = _bytes(2, _bytes(3, _string(1, "OBJECTID") +
+                                  _packed(3, [1, 5, 300])))
+        self.assertEqual(pbf.decode_feature_collection(ids),
+                         {"objectIdFieldName" : "OBJECTID",
+                          "objectIds" : [1, 5, 300]})
+    #----------------------------------------------------------------------
+    def test_decoded_result_loads_as_feature_set(self):
+        data = _collection(0, [("OBJECTID", 6), ("NAME", 4)],
+                           [((1, "a"), _geometry([[10, 20]]))])
+        fs = FeatureSet.fromJSON(json.dumps(pbf.decode_feature_collection(data)))
+        self.assertEqual(len(fs.features), 1)
+        self.assertEqual(fs.features[0].get_value("NAME"), "a")
+    #----------------------------------------------------------------------
+    def test_dequantize_json(self):
+        res = {"transform" : {"originPosition" : "upperLeft",
+                              "scale" : [0.5, 0.5],
+                              "translate" : [100.0, 50.0]},
+               "features" : [{"geometry" : {"x" : 10, "y" : 20}},
+                             {"geometry" : {"paths" : [[[0, 0], [2, 2], [2, -4]]]}}]}
+        pbf.dequantize(res)
+        self.assertFalse('transform' in res)
+        self.assertEqual(res['features'][0]['geometry'], {"x" : 105.0, "y" : 40.0})
+        self.assertEqual(res['features'][1]['geometry']['paths'],
+                         [[[100.0, 50.0], [101.0, 49.0], [102.0, 51.0]]])
+########################################################################
+class WorthDecodingTest(unittest.TestCase):
+    """checks when auto asks for f=pbf"""
+    #----------------------------------------------------------------------
+    def test_remote_geometry_queries_use_pbf(self):
+        self.assertTrue(pbf.worth_decoding(
+            "https://services.arcgis.com/x/arcgis/rest/services/t/FeatureServer/0"))
+        self.assertTrue(pbf.worth_decoding("https://[2001:db8::1]:6443/arcgis"))
+    #----------------------------------------------------------------------
+    def test_local_network_uses_json(self):
+        for url in ("http://localhost:6080/arcgis", "http://gis/arcgis",
+                    "https://10.1.2.3/arcgis", "https://172.20.0.5/arcgis",
+                    "https://192.168.1.9:6443/arcgis", "http://[::1]/arcgis",
+                    "https://user@gisserver.local/arcgis"):
+            self.assertFalse(pbf.worth_decoding(url), url)
+    #----------------------------------------------------------------------
+    def test_attribute_queries_use_json(self):
+        url = "https://services.arcgis.com/x/arcgis/rest/services/t/FeatureServer/0"
+        self.assertFalse(pbf.worth_decoding(url, returnGeometry=False))
+        self.assertFalse(pbf.worth_decoding(url, returnGeometry="false"))
+if __name__ == "__main__":
+    unittest.main()
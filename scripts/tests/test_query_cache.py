@@ -0,0 +1,120 @@
+"""
+   tests for arcrest.agol._cache
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+import os
+import time
+import shutil
+import datetime
+import tempfile
+import unittest
+
+from arcrest.agol._cache import QueryCache, _parse_where, _implies, _time_value
+########################################################################
+class _Row(object):
+    def __init__(self, value):
+        self.asDictionary = value
+########################################################################
+class _FakeLayer(object):
+    """a point layer of ten features, OBJECTID 1..10"""
+    objectIdField = "OBJECTID"
+    geometryType = "esriGeometryPoint"
+    extent = {"spatialReference" : {"wkid" : 4326}}
+    editFieldsInfo = None
+    timeInfo = None
+    fields = [{"name" : "OBJECTID", "type" : "esriFieldTypeOID"},
+              {"name" : "STATUS", "type" : "esriFieldTypeString"},
+              {"name" : "REPORTED", "type" : "esriFieldTypeDate"}]
+    #----------------------------------------------------------------------
+    def __init__(self):
+        self.remote = []
+    #----------------------------------------------------------------------
+    def _features(self):
+        return [{"attributes" : {"OBJECTID" : i,
+                                 "STATUS" : "OPEN" if i % 2 else "CLOSED",
+                                 "REPORTED" : 1400000000000 + i},
+                 "geometry" : {"x" : i, "y" : i}} for i in range(1, 11)]
+    #----------------------------------------------------------------------
+    def query_all(self, where, page_size=None, max_workers=None):
+        for feature in self._features():
+            if where == "1=1" or \
+               (where == "STATUS = 'OPEN'" and
+                feature['attributes']['STATUS'] == "OPEN"):
+                yield _Row(feature)
+    #----------------------------------------------------------------------
+    def query(self, **kwargs):
+        self.remote.append(kwargs['where'])
+        return {"count" : -1}
+########################################################################
+class _FakeService(object):
+    syncEnabled = False
+########################################################################
+class ParseWhereTest(unittest.TestCase):
+    columns = {"status" : "STATUS", "reported" : "REPORTED"}
+    #----------------------------------------------------------------------
+    def test_date_compared_with_text_runs_on_server(self):
+        self.assertIsNone(_parse_where("REPORTED > '2015-01-01'",
+                                       self.columns, ["reported"]))
+        self.assertIsNone(_parse_where("REPORTED > DATE '2015-01-01'",
+                                       self.columns, ["reported"]))
+        self.assertEqual(_parse_where("reported > 1400000000000",
+                                      self.columns, ["reported"]),
+                         '"REPORTED" > 1400000000000')
+    #----------------------------------------------------------------------
+    def test_implies(self):
+        self.assertTrue(_implies("STATUS = 'X'", "1=1"))
+        self.assertTrue(_implies("status = 'OPEN' AND x > 1",
+                                 "STATUS = 'OPEN'"))
+        self.assertTrue(_implies("x BETWEEN 1 AND 2 AND (STATUS = 'OPEN')",
+                                 "STATUS = 'OPEN'"))
+        self.assertFalse(_implies("1=1", "STATUS = 'OPEN'"))
+        self.assertFalse(_implies("STATUS = 'OPEN' OR x > 1",
+                                  "STATUS = 'OPEN'"))
+########################################################################
+class QueryCacheTest(unittest.TestCase):
+    #----------------------------------------------------------------------
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+    #----------------------------------------------------------------------
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+    #----------------------------------------------------------------------
+    def _cache(self, where="1=1"):
+        layer = _FakeLayer()
+        cache = QueryCache(layer, _FakeService(),
+                           os.path.join(self.folder, "mirror.sqlite"),
+                           mode="full", where=where)
+        return layer, cache
+    #----------------------------------------------------------------------
+    def test_offset_without_record_count(self):
+        layer, cache = self._cache()
+        res = cache.query(where="1=1", returnIDsOnly=True, resultOffset=7)
+        self.assertEqual(res['objectIds'], [8, 9, 10])
+        self.assertEqual(layer.remote, [])
+    #----------------------------------------------------------------------
+    def test_partial_mirror(self):
+        layer, cache = self._cache(where="STATUS = 'OPEN'")
+        res = cache.query(where="1=1", returnCountOnly=True)
+        self.assertEqual(layer.remote, ["1=1"])
+        res = cache.query(where="STATUS = 'OPEN' AND OBJECTID < 5",
+                          returnIDsOnly=True)
+        self.assertEqual(res['objectIds'], [1, 3])
+        self.assertEqual(cache.stats, {"local" : 1, "remote" : 1})
+    #----------------------------------------------------------------------
+    def test_time_filter_datetimes_are_utc_epochs(self):
+        saved = os.environ.get('TZ')
+        os.environ['TZ'] = "EST5EDT"
+        time.tzset()
+        try:
+            value = _time_value(datetime.datetime(2020, 1, 1))
+        finally:
+            if saved is None:
+                del os.environ['TZ']
+            else:
+                os.environ['TZ'] = saved
+            time.tzset()
+        self.assertEqual(value, 1577854800000)
+        self.assertEqual(_time_value("1577854800000"), 1577854800000)
+if __name__ == "__main__":
+    unittest.main()
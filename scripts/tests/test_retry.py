@@ -0,0 +1,90 @@
+"""
+   tests for arcrest.web._retry and the retries of BaseWebOperations
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+import unittest
+
+from arcrest.web import _base
+from arcrest.web._retry import RetryPolicy
+from arcrest.packages.six.moves.urllib.error import HTTPError
+#----------------------------------------------------------------------
+def _busy():
+    return {"error" : {"code" : 503, "message" : "Service busy"}}
+########################################################################
+class RetryPolicyTest(unittest.TestCase):
+    """checks which requests are retried"""
+    #----------------------------------------------------------------------
+    def test_map_exports_are_retried(self):
+        policy = RetryPolicy()
+        self.assertTrue(policy.is_idempotent(
+            "POST", "http://fake/arcgis/rest/services/t/MapServer/export", {}))
+        self.assertTrue(policy.is_idempotent(
+            "POST", "http://fake/arcgis/rest/services/Items/MapServer/export/", {}))
+        self.assertTrue(policy.is_idempotent(
+            "POST", "http://fake/arcgis/rest/services/t/ImageServer/exportImage", {}))
+    #----------------------------------------------------------------------
+    def test_export_jobs_are_not_retried(self):
+        policy = RetryPolicy()
+        self.assertFalse(policy.is_idempotent(
+            "POST", "http://fake/sharing/rest/content/users/u/items/abc123/export", {}))
+        self.assertFalse(policy.is_idempotent(
+            "POST", "http://fake/arcgis/rest/services/t/FeatureServer/replicas/export", {}))
+        self.assertFalse(policy.is_idempotent(
+            "POST", "http://fake/sharing/rest/portals/self/customers/export", {}))
+        self.assertTrue(policy.is_idempotent(
+            "GET", "http://fake/sharing/rest/content/users/u/items/abc123/export", {}))
+########################################################################
+class SendTest(unittest.TestCase):
+    """checks how the retry_policy of an object is applied"""
+    #----------------------------------------------------------------------
+    def _calls(self, web):
+        calls = []
+        def attempt():
+            calls.append(1)
+            return _busy()
+        web._send("GET", "http://fake/query", {}, attempt)
+        return len(calls)
+    #----------------------------------------------------------------------
+    def test_default_policy_retries(self):
+        web = _base.BaseWebOperations()
+        saved = _base.RETRY_POLICY
+        _base.RETRY_POLICY = RetryPolicy(max_retries=2, backoff_factor=0)
+        try:
+            self.assertEqual(self._calls(web), 3)
+        finally:
+            _base.RETRY_POLICY = saved
+    #----------------------------------------------------------------------
+    def test_explicit_none_disables_retries(self):
+        web = _base.BaseWebOperations()
+        web.retry_policy = None
+        self.assertTrue(web.retry_policy is None)
+        self.assertEqual(self._calls(web), 1)
+    #----------------------------------------------------------------------
+    def test_zero_retries_sends_once(self):
+        web = _base.BaseWebOperations()
+        web.retry_policy = RetryPolicy(max_retries=0)
+        self.assertEqual(self._calls(web), 1)
+    #----------------------------------------------------------------------
+    def test_https_fallback_does_not_nest_retries(self):
+        opened = []
+        def urlopen(url, data=None, **kwargs):
+            opened.append(url)
+            if url.startswith("http://"):
+                raise HTTPError(url, 403, "Forbidden", None, None)
+            raise HTTPError(url, 503, "Unavailable", None, None)
+        web = _base.BaseWebOperations()
+        web.retry_policy = RetryPolicy(max_retries=2, backoff_factor=0)
+        saved = _base.request.urlopen
+        _base.request.urlopen = urlopen
+        try:
+            self.assertRaises(HTTPError, web._get,
+                              "http://fake/arcgis/rest/services/t/MapServer",
+                              param_dict={"f" : "json"}, handlers=[])
+        finally:
+            _base.request.urlopen = saved
+        self.assertEqual(len(opened), 6)
+        self.assertEqual(len([url for url in opened
+                              if url.startswith("https://")]), 3)
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,137 @@
+"""
+   tests for arcrest.common.spatial without arcpy
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+import os
+import time
+import datetime
+import unittest
+
+from arcrest.common import spatial
+########################################################################
+class _Cursor(object):
+    """SearchCursor returning fixed rows"""
+    rows = []
+    #----------------------------------------------------------------------
+    def __init__(self, table, fields, where_clause=None):
+        pass
+    #----------------------------------------------------------------------
+    def __enter__(self):
+        return iter(self.rows)
+    #----------------------------------------------------------------------
+    def __exit__(self, *args):
+        return False
+########################################################################
+class _Field(object):
+    """a field returned by ListFields"""
+    #----------------------------------------------------------------------
+    def __init__(self, name, type):
+        self.name = name
+        self.type = type
+########################################################################
+class _InsertCursor(object):
+    """InsertCursor keeping the inserted rows"""
+    rows = []
+    #----------------------------------------------------------------------
+    def __init__(self, table, fields):
+        self.fields = fields
+    #----------------------------------------------------------------------
+    def __enter__(self):
+        return self
+    #----------------------------------------------------------------------
+    def __exit__(self, *args):
+        return False
+    #----------------------------------------------------------------------
+    def insertRow(self, row):
+        _InsertCursor.rows.append(row)
+########################################################################
+class _Describe(object):
+    """a table without a shape field"""
+    OIDFieldName = "OBJECTID"
+########################################################################
+class _ArcPy(object):
+    """the arcpy.da cursors used by spatial"""
+    class da(object):
+        SearchCursor = _Cursor
+        InsertCursor = _InsertCursor
+    #----------------------------------------------------------------------
+    @staticmethod
+    def Describe(fc):
+        return _Describe()
+    #----------------------------------------------------------------------
+    @staticmethod
+    def ListFields(fc):
+        return [_Field("OBJECTID", "OID"), _Field("SEEN", "Date")]
+########################################################################
+class SpatialTest(unittest.TestCase):
+    """checks the cursor helpers against a fake arcpy"""
+    #----------------------------------------------------------------------
+    def setUp(self):
+        self.saved = (getattr(spatial, 'arcpy', None), spatial.arcpyFound)
+        spatial.arcpy = _ArcPy
+        spatial.arcpyFound = True
+    #----------------------------------------------------------------------
+    def tearDown(self):
+        spatial.arcpy, spatial.arcpyFound = self.saved
+    #----------------------------------------------------------------------
+    def test_same_names_do_not_overwrite(self):
+        _Cursor.rows = [("photo.jpg", b"first", "image/jpeg", 1),
+                        ("photo.jpg", b"second", "image/jpeg", 2)]
+        rows = spatial.get_attachment_data("table", "1=1")
+        try:
+            self.assertEqual([os.path.basename(r['blob']) for r in rows],
+                             ["photo.jpg", "photo.jpg"])
+            blobs = []
+            for row in rows:
+                with open(row['blob'], 'rb') as reader:
+                    blobs.append(reader.read())
+            self.assertEqual(blobs, [b"first", b"second"])
+        finally:
+            spatial.remove_attachment_data(rows)
+        self.assertFalse(any(os.path.exists(r['blob']) for r in rows))
+    #----------------------------------------------------------------------
+    def test_cursor_dates_are_utc_epochs(self):
+        saved = os.environ.get('TZ')
+        os.environ['TZ'] = "EST5EDT"
+        time.tzset()
+        try:
+            _Cursor.rows = [(1, datetime.datetime(2020, 1, 1, 0, 0)),
+                            (2, datetime.datetime(2020, 7, 1, 0, 0, 0, 500000)),
+                            (3, None)]
+            features = list(spatial.featureclass_to_features("table"))
+        finally:
+            if saved is None:
+                del os.environ['TZ']
+            else:
+                os.environ['TZ'] = saved
+            time.tzset()
+        # midnight EST is 05:00 UTC, midnight EDT is 04:00 UTC
+        self.assertEqual([f['attributes']['SEEN'] for f in features],
+                         [1577854800000, 1593576000500, None])
+    #----------------------------------------------------------------------
+    def test_inserted_dates_are_utc(self):
+        saved = os.environ.get('TZ')
+        os.environ['TZ'] = "EST5EDT"
+        time.tzset()
+        _InsertCursor.rows = []
+        try:
+            count = spatial.insert_json_rows(
+                "table",
+                [{"attributes" : {"OBJECTID" : 1, "SEEN" : 1577854800000}},
+                 {"attributes" : {"OBJECTID" : 2, "SEEN" : -500}},
+                 {"attributes" : {"OBJECTID" : 3, "SEEN" : None}}],
+                ["OBJECTID", "SEEN"], date_fields=["SEEN"])
+        finally:
+            if saved is None:
+                del os.environ['TZ']
+            else:
+                os.environ['TZ'] = saved
+            time.tzset()
+        self.assertEqual(count, 3)
+        self.assertEqual([row[1] for row in _InsertCursor.rows],
+                         [datetime.datetime(2020, 1, 1, 5, 0),
+                          datetime.datetime(1969, 12, 31, 23, 59, 59, 500000),
+                          None])
+if __name__ == "__main__":
+    unittest.main()
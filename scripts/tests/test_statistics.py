@@ -0,0 +1,115 @@
+"""
+   tests for arcrest.agol._statistics
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+import re
+import json
+import calendar
+import datetime
+import unittest
+
+from arcrest.agol import _statistics
+from arcrest.common.general import Feature
+#----------------------------------------------------------------------
+def _ms(dt):
+    return calendar.timegm(dt.timetuple()) * 1000
+START = datetime.datetime(2020, 1, 1)
+ROWS = [{"OBJECTID" : i, "TYPE" : "AB"[i % 2],
+         "D" : _ms(START + datetime.timedelta(hours=13 * i))}
+        for i in range(1, 601)]
+_EXTRACT = re.compile(r"EXTRACT\((\w+) FROM D\)")
+########################################################################
+class _FakeLayer(object):
+    """answers outStatistics queries, including EXTRACT group by fields"""
+    objectIdField = "OBJECTID"
+    maxRecordCount = 1000
+    url = "http://fake/FeatureServer/0"
+    _securityHandler = _proxy_url = _proxy_port = None
+    supportsStatistics = True
+    #----------------------------------------------------------------------
+    def __init__(self, expressions=True):
+        self.advancedQueryCapabilities = {
+            "supportsPaginationOnAggregatedQueries" : True,
+            "supportsSqlExpression" : expressions}
+        self.posts = []
+        self.scans = 0
+    #----------------------------------------------------------------------
+    def _post(self, url, param_dict, **kwargs):
+        self.posts.append(param_dict)
+        statistics = json.loads(param_dict['outStatistics'])
+        bounds = [_ms(datetime.datetime.strptime(value, "%Y-%m-%d %H:%M:%S"))
+                  for value in re.findall(r"timestamp '([^']*)'",
+                                          param_dict['where'])]
+        group_by = param_dict.get('groupByFieldsForStatistics')
+        group_by = group_by.split(",") if group_by else []
+        groups = {}
+        for row in ROWS:
+            if bounds and not bounds[0] <= row['D'] < bounds[1]:
+                continue
+            date = datetime.datetime.utcfromtimestamp(row['D'] / 1000)
+            key = []
+            for field in group_by:
+                unit = _EXTRACT.match(field)
+                key.append(getattr(date, unit.group(1).lower())
+                           if unit else row[field])
+            groups[tuple(key)] = groups.get(tuple(key), 0) + 1
+        features = []
+        for key in sorted(groups):
+            attributes = {statistics[0]['outStatisticFieldName'] : groups[key]}
+            for i, field in enumerate(group_by):
+                name = "EXPR_%s" % i if _EXTRACT.match(field) else field
+                attributes[name] = key[i]
+            features.append({"attributes" : attributes})
+        if not features and not group_by:
+            features = [{"attributes" : {
+                statistics[0]['outStatisticFieldName'] : 0}}]
+        return {"features" : features}
+    #----------------------------------------------------------------------
+    def query_all(self, where, out_fields, **kwargs):
+        self.scans += 1
+        for row in ROWS:
+            yield Feature({"attributes" : dict(row)})
+########################################################################
+class TimeBinsTest(unittest.TestCase):
+    """checks the number of requests time_bins sends"""
+    #----------------------------------------------------------------------
+    def _bins(self, layer, interval, **kwargs):
+        return _statistics.time_bins(layer, "D", interval, start=START,
+                                     end=START + datetime.timedelta(days=325),
+                                     **kwargs)
+    #----------------------------------------------------------------------
+    def test_day_bins_use_one_grouped_query(self):
+        layer = _FakeLayer()
+        rows = self._bins(layer, "day")
+        self.assertEqual(len(layer.posts), 1)
+        self.assertEqual(layer.scans, 0)
+        self.assertEqual(rows, self._bins(_FakeLayer(), "day", client_side=True))
+        self.assertEqual(sum(row['count'] for row in rows), 600)
+    #----------------------------------------------------------------------
+    def test_grouped_query_keeps_group_by(self):
+        layer = _FakeLayer()
+        rows = self._bins(layer, "month", group_by=["TYPE"])
+        self.assertEqual(len(layer.posts), 1)
+        self.assertEqual(rows, self._bins(_FakeLayer(), "month",
+                                          group_by=["TYPE"], client_side=True))
+    #----------------------------------------------------------------------
+    def test_many_bins_without_expressions_scan_once(self):
+        layer = _FakeLayer(expressions=False)
+        rows = self._bins(layer, "day")
+        self.assertEqual(len(layer.posts), 0)
+        self.assertEqual(layer.scans, 1)
+        self.assertEqual(len(rows), 326)
+    #----------------------------------------------------------------------
+    def test_few_bins_without_expressions_query_each_bin(self):
+        layer = _FakeLayer(expressions=False)
+        rows = self._bins(layer, "month")
+        self.assertEqual(len(layer.posts), len(rows))
+        self.assertTrue(len(rows) <= _statistics.MAX_BIN_QUERIES)
+        self.assertEqual(layer.scans, 0)
+    #----------------------------------------------------------------------
+    def test_server_only_refuses_too_many_bin_queries(self):
+        layer = _FakeLayer(expressions=False)
+        self.assertRaises(ValueError, self._bins, layer, "day",
+                          client_side=False)
+        self.assertEqual(len(layer.posts), 0)